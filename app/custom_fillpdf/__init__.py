@@ -3,7 +3,9 @@ Enhanced fillpdf module with subfield support
 基于fillpdf库，增强了对特殊子字段结构的支持
 """
 
-from .enhanced_fillpdfs import get_form_fields, write_fillable_pdf
+from .enhanced_fillpdfs import get_form_fields, write_fillable_pdf, compile_fill_plan, FillPlan
+from .option_sets import FieldOptionSets, InvalidFieldValueError
+from .template_pool import TemplatePool
 
 __version__ = "1.0.0-enhanced"
-__all__ = ["get_form_fields", "write_fillable_pdf"] 
\ No newline at end of file
+__all__ = ["get_form_fields", "write_fillable_pdf", "compile_fill_plan", "FillPlan", "FieldOptionSets", "InvalidFieldValueError", "TemplatePool"] 
\ No newline at end of file
@@ -4,8 +4,10 @@ import pdfrw
 from pdf2image import convert_from_path # Needs conda install -c conda-forge poppler
 from PIL import Image
 from collections import OrderedDict
+from loguru import logger
 
 from .utils.field_format import is_text_field_multiline, make_read_only
+from .option_sets import FieldOptionSets
 def _safe_int_convert(value):
     """
     安全地将值转换为整数 - 修复版本
@@ -43,10 +45,37 @@ def _safe_int_convert(value):
         return None
 
 
-def _get_acroform_fields(pdf):
+def build_widget_page_index(pdf):
+    """
+    Enhanced: 扫描一遍页面注释，建立 控件字典 id -> 页码（从 1 开始）的索引
+    只读取 /Annots 数组，不解码任何字段
+    """
+    page_index = {}
+    for page_number, page in enumerate(pdf.pages, 1):
+        for annotation in page[ANNOT_KEY] or []:
+            page_index.setdefault(id(annotation), page_number)
+    return page_index
+
+def _widget_pages(field_obj, page_index, depth=0):
+    """
+    Enhanced: 字段（含其所有子控件）所在的页码列表，按出现顺序去重
+    """
+    result = []
+    if id(field_obj) in page_index:
+        result.append(page_index[id(field_obj)])
+    if depth < 32 and '/Kids' in field_obj and field_obj['/Kids']:
+        for kid in field_obj['/Kids']:
+            for page_number in _widget_pages(kid, page_index, depth + 1):
+                if page_number not in result:
+                    result.append(page_number)
+    return result
+
+def _get_acroform_fields(pdf, page_index=None, pages=None, attributes=None):
     """
     Enhanced: 从PDF的AcroForm结构中提取特殊字段（如子字段）
     这些字段可能不出现在页面注释中，但存在于AcroForm字段树中
+    page_index 为控件页码索引（build_widget_page_index），pages 指定时只解码这些页面上的字段，
+    attributes 指定时只解码其中的属性（见 get_form_fields）
     """
     acroform_fields = {}
     
@@ -57,7 +86,7 @@ def _get_acroform_fields(pdf):
         
         # 遍历AcroForm字段树，使用改进的递归函数
         for field in pdf.Root.AcroForm.Fields:
-            _extract_field_recursive_improved(field, acroform_fields)
+            _extract_field_recursive_improved(field, acroform_fields, page_index=page_index, pages=pages, attributes=attributes)
             
     except Exception as e:
         # 静默处理异常，不影响原有功能
@@ -229,189 +258,169 @@ def _extract_field_recursive(field_obj, result_dict, parent_name=""):
         # 静默处理单个字段的异常
         pass
 
-def _fill_acroform_fields(template_pdf, data_dict):
+def _get_field_name(field_obj):
     """
-    Enhanced: 直接在AcroForm字段树中填充特殊字段（如子字段）
-    这些字段可能无法通过页面注释处理
+    Enhanced: 获取字段对象自身的名称（/T，不含父字段前缀）
     """
-    if not template_pdf.Root or not template_pdf.Root.AcroForm or not template_pdf.Root.AcroForm.Fields:
-        return
-    
-    # 遍历AcroForm字段树
-    for field in template_pdf.Root.AcroForm.Fields:
-        # 直接使用field对象
-        _fill_field_recursive(field, data_dict)
+    field_name = None
+    if '/T' in field_obj:
+        field_name = field_obj['/T']
+        if hasattr(field_name, 'to_unicode'):
+            field_name = field_name.to_unicode()
+        elif isinstance(field_name, str):
+            field_name = field_name.strip('()')
+    return field_name
 
-def _fill_field_recursive(field_obj, data_dict, parent_name=""):
+def _fill_single_field(field_obj, field_value):
     """
-    递归填充字段，包括父子字段结构
+    Enhanced: 直接在AcroForm字段对象上填充单个字段的值（包括其子控件）
+    这些字段可能无法通过页面注释处理，如子字段
     """
-    if not field_obj:
-        return
+    # 检查字段类型
+    field_type = field_obj.get('/FT') if '/FT' in field_obj else None
     
-    try:
-        # 获取字段名
-        field_name = None
-        if '/T' in field_obj:
-            field_name = field_obj['/T']
-            if hasattr(field_name, 'to_unicode'):
-                field_name = field_name.to_unicode()
-            elif isinstance(field_name, str):
-                field_name = field_name.strip('()')
+    # 根据字段类型进行不同的处理
+    if field_type == '/Tx' or field_type is None:
+        # 文本字段或父字段
+        try:
+            field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
+        except:
+            try:
+                field_obj[pdfrw.PdfName.V] = str(field_value)
+            except:
+                pass  # 父字段可能不允许直接设置值
         
-        # 如果字段名在data_dict中，尝试填充
-        if field_name and field_name in data_dict:
-            field_value = data_dict[field_name]
-            
-            # 检查字段类型
-            field_type = field_obj.get('/FT') if '/FT' in field_obj else None
-            
-            # 根据字段类型进行不同的处理
-            if field_type == '/Tx' or field_type is None:
-                # 文本字段或父字段
+        # 如果有子字段，也设置子字段的值
+        if '/Kids' in field_obj and field_obj['/Kids']:
+            for kid in field_obj['/Kids']:
                 try:
-                    field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
+                    kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
                 except:
+                    kid[pdfrw.PdfName.V] = str(field_value)
+                    
+    elif field_type == '/Btn':
+        # 按钮字段（复选框、单选按钮）
+        try:
+            # 检查是否为radio字段（检查flags而不是选项）
+            flags = field_obj.get('/Ff')
+            is_radio = False
+            if flags:
+                try:
+                    # 安全转换PdfObject为整数
+                    flags_int = 0
                     try:
-                        field_obj[pdfrw.PdfName.V] = str(field_value)
+                        if hasattr(flags, 'to_unicode'):
+                            flags_str = flags.to_unicode()
+                            if flags_str.isdigit():
+                                flags_int = _safe_int_convert(flags_str)
+                        elif isinstance(flags, str) and flags.isdigit():
+                            flags_int = _safe_int_convert(flags)
+                        elif isinstance(flags, int):
+                            flags_int = flags
                     except:
-                        pass  # 父字段可能不允许直接设置值
-                
-                # 如果有子字段，也设置子字段的值
-                if '/Kids' in field_obj and field_obj['/Kids']:
-                    for kid in field_obj['/Kids']:
-                        try:
-                            kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
-                        except:
-                            kid[pdfrw.PdfName.V] = str(field_value)
-                            
-            elif field_type == '/Btn':
-                # 按钮字段（复选框、单选按钮）
-                try:
-                    # 检查是否为radio字段（检查flags而不是选项）
-                    flags = field_obj.get('/Ff')
+                        flags_int = 0
+                    is_radio = bool(flags_int & 32768)
+                except:
                     is_radio = False
-                    if flags:
-                        try:
-                            # 安全转换PdfObject为整数
-                            flags_int = 0
-                            try:
-                                if hasattr(flags, 'to_unicode'):
-                                    flags_str = flags.to_unicode()
-                                    if flags_str.isdigit():
-                                        flags_int = _safe_int_convert(flags_str)
-                                elif isinstance(flags, str) and flags.isdigit():
-                                    flags_int = _safe_int_convert(flags)
-                                elif isinstance(flags, int):
-                                    flags_int = flags
-                            except:
-                                flags_int = 0
-                            is_radio = bool(flags_int & 32768)
-                        except:
-                            is_radio = False
-                    
-                    if is_radio or ('/Opt' in field_obj and field_obj['/Opt']):
-                        # Radio字段：根据是否有选项进行不同处理
-                        if '/Opt' in field_obj and field_obj['/Opt']:
-                            # 有选项的radio字段：根据值索引选择对应选项
-                            try:
-                                value_index = _safe_int_convert(field_value)
-                                if value_index is None:
-                                    value_index = 0
-                                options = field_obj['/Opt']
-                                
-                                # 设置父字段值为选中的选项
-                                if 0 <= value_index < len(options):
-                                    selected_option = options[value_index]
-                                    if hasattr(selected_option, 'to_unicode'):
-                                        option_text = selected_option.to_unicode()
-                                    else:
-                                        option_text = str(selected_option).strip('()')
-                                    field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(value_index))
-                                
-                                # 处理radio按钮组的子字段
-                                if '/Kids' in field_obj and field_obj['/Kids']:
-                                    for idx, kid in enumerate(field_obj['/Kids']):
-                                        try:
-                                            if idx == value_index:
-                                                # 选中这个radio按钮
-                                                kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(value_index))
-                                                kid[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(str(value_index))
-                                            else:
-                                                # 取消选择其他radio按钮
-                                                kid[pdfrw.PdfName.V] = pdfrw.PdfName.Off
-                                                kid[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
-                                        except:
-                                            pass
-                            except (ValueError, IndexError):
-                                # 如果值不是有效索引，设置为Off
-                                field_obj[pdfrw.PdfName.V] = pdfrw.PdfName.Off
-                                field_obj[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
-                        else:
-                            # 没有选项的radio字段：直接设置值
-                            try:
-                                # 设置父字段值
-                                field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
-                                field_obj[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(str(field_value))
-                                
-                                # 处理子字段：所有子字段都设置为相同值
-                                if '/Kids' in field_obj and field_obj['/Kids']:
-                                    for kid in field_obj['/Kids']:
-                                        try:
-                                            kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
-                                            kid[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(str(field_value))
-                                        except:
-                                            pass
-                            except:
-                                # 如果设置失败，尝试设置为Off
-                                field_obj[pdfrw.PdfName.V] = pdfrw.PdfName.Off
-                                field_obj[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
-                    else:
-                        # Checkbox字段：简单的on/off处理
-                        if str(field_value).lower() in ['1', 'true', 'yes', 'on', 'checked']:
-                            field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode('Yes')
-                            field_obj[pdfrw.PdfName.AS] = pdfrw.PdfString.encode('Yes')
-                        else:
-                            field_obj[pdfrw.PdfName.V] = pdfrw.PdfName.Off
-                            field_obj[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
+            
+            if is_radio or ('/Opt' in field_obj and field_obj['/Opt']):
+                # Radio字段：根据是否有选项进行不同处理
+                if '/Opt' in field_obj and field_obj['/Opt']:
+                    # 有选项的radio字段：根据值索引选择对应选项
+                    try:
+                        value_index = _safe_int_convert(field_value)
+                        if value_index is None:
+                            value_index = 0
+                        options = field_obj['/Opt']
+                        
+                        # 设置父字段值为选中的选项
+                        if 0 <= value_index < len(options):
+                            selected_option = options[value_index]
+                            if hasattr(selected_option, 'to_unicode'):
+                                option_text = selected_option.to_unicode()
+                            else:
+                                option_text = str(selected_option).strip('()')
+                            field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(value_index))
                         
-                        # 处理checkbox的子字段
+                        # 处理radio按钮组的子字段
                         if '/Kids' in field_obj and field_obj['/Kids']:
-                            for kid in field_obj['/Kids']:
+                            for idx, kid in enumerate(field_obj['/Kids']):
                                 try:
-                                    if str(field_value).lower() in ['1', 'true', 'yes', 'on', 'checked']:
-                                        kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode('Yes')
-                                        kid[pdfrw.PdfName.AS] = pdfrw.PdfString.encode('Yes')
+                                    if idx == value_index:
+                                        # 选中这个radio按钮
+                                        kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(value_index))
+                                        kid[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(str(value_index))
                                     else:
+                                        # 取消选择其他radio按钮
                                         kid[pdfrw.PdfName.V] = pdfrw.PdfName.Off
                                         kid[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
                                 except:
                                     pass
-                except:
-                    pass
-                    
-            elif field_type == '/Ch':
-                # 选择字段（下拉框、列表框）
+                    except (ValueError, IndexError):
+                        # 如果值不是有效索引，设置为Off
+                        field_obj[pdfrw.PdfName.V] = pdfrw.PdfName.Off
+                        field_obj[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
+                else:
+                    # 没有选项的radio字段：直接设置值
+                    try:
+                        # 设置父字段值
+                        field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
+                        field_obj[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(str(field_value))
+                        
+                        # 处理子字段：所有子字段都设置为相同值
+                        if '/Kids' in field_obj and field_obj['/Kids']:
+                            for kid in field_obj['/Kids']:
+                                try:
+                                    kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
+                                    kid[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(str(field_value))
+                                except:
+                                    pass
+                    except:
+                        # 如果设置失败，尝试设置为Off
+                        field_obj[pdfrw.PdfName.V] = pdfrw.PdfName.Off
+                        field_obj[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
+            else:
+                # Checkbox字段：简单的on/off处理，开启状态的外观名（如 On 或导出名）也表示选中
+                on_state = 'Yes'
                 try:
-                    field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
-                except:
-                    field_obj[pdfrw.PdfName.V] = str(field_value)
-                    
-            elif field_type == '/Sig':
-                # 签名字段（通常不需要填充值）
-                pass
-        
-        # 递归处理子字段
-        if '/Kids' in field_obj and field_obj['/Kids']:
-            for kid in field_obj['/Kids']:
-                # 直接使用kid对象
-                full_name = f"{parent_name}.{field_name}" if parent_name and field_name else (field_name or parent_name)
-                _fill_field_recursive(kid, data_dict, full_name)
+                    on_state = str(_on_states(field_obj if field_obj['/AP'] else field_obj['/Kids'][0])[0])[1:]
+                except Exception:
+                    pass
+                checked = str(field_value).lower() in FieldOptionSets.CHECKBOX_ON_VALUES or str(field_value) == on_state
+                if checked:
+                    field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(on_state)
+                    field_obj[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(on_state)
+                else:
+                    field_obj[pdfrw.PdfName.V] = pdfrw.PdfName.Off
+                    field_obj[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
                 
-    except Exception as e:
-        # 静默处理单个字段的异常
+                # 处理checkbox的子字段
+                if '/Kids' in field_obj and field_obj['/Kids']:
+                    for kid in field_obj['/Kids']:
+                        try:
+                            if checked:
+                                kid[pdfrw.PdfName.V] = pdfrw.PdfString.encode(on_state)
+                                kid[pdfrw.PdfName.AS] = pdfrw.PdfString.encode(on_state)
+                            else:
+                                kid[pdfrw.PdfName.V] = pdfrw.PdfName.Off
+                                kid[pdfrw.PdfName.AS] = pdfrw.PdfName.Off
+                        except:
+                            pass
+        except:
+            pass
+            
+    elif field_type == '/Ch':
+        # 选择字段（下拉框、列表框）
+        try:
+            field_obj[pdfrw.PdfName.V] = pdfrw.PdfString.encode(str(field_value))
+        except:
+            field_obj[pdfrw.PdfName.V] = str(field_value)
+            
+    elif field_type == '/Sig':
+        # 签名字段（通常不需要填充值）
         pass
 
+
 ANNOT_KEY = '/Annots'               # key for all annotations within a page
 ANNOT_FIELD_KEY = '/T'              # Name of field. i.e. given ID of field
 ANNOT_FORM_type = '/FT'             # Form type (e.g. text/button)
@@ -426,7 +435,7 @@ ANNOT_FIELD_KIDS_KEY = '/Kids'      # Kids key for older pdf versions
 ANNOT_VAL_KEY = '/V'
 ANNOT_RECT_KEY = '/Rect'
 
-def get_form_fields(input_pdf_path, sort=False, page_number=None):
+def get_form_fields(input_pdf_path, sort=False, page_number=None, template_pdf=None, pages=None, attributes=None):
     """
     Retrieves the form fields from a pdf to then be stored as a dictionary and
     passed to the write_fillable_pdf() function. Uses pdfrw.
@@ -434,13 +443,22 @@ def get_form_fields(input_pdf_path, sort=False, page_number=None):
     ---------
     input_pdf_path: str
         Path to the pdf you want the fields from.
+    template_pdf: pdfrw.PdfReader
+        Enhanced: 已解析的模板对象图（来自 TemplatePool），传入时不再重新解析 input_pdf_path。
+        读取字段不会修改对象图
+    pages: set
+        Enhanced: 只解码这些页面（从 1 开始）上的字段，None 表示全部页面
+    attributes: set
+        Enhanced: 调用方需要的字段属性（如 {'name', 'type'}），None 表示全部。
+        不需要 value 时不解码 /V 和 /AS，不需要 options 时不解码 /Opt，
+        不需要 page 且没有指定 pages 时不建立控件页码索引（只在 AcroForm 字段树中的字段 page_index 为 1）
     Returns
     ---------
     A dictionary of form fields and their filled values.
     """
     data_dict = {}
     extend_data_dict={}
-    pdf = pdfrw.PdfReader(input_pdf_path)
+    pdf = template_pdf if template_pdf is not None else pdfrw.PdfReader(input_pdf_path)
     page_index = 0
     count = 1
     if page_number is not None:
@@ -454,14 +472,21 @@ def get_form_fields(input_pdf_path, sort=False, page_number=None):
                 raise ValueError(f"page_number must be inbetween 1 & {len(pdf.pages)}")
         else:
             raise ValueError(f"page_number must be an int")
+    # Enhanced: 控件页码索引，用于 AcroForm 字段树中的字段定位页码及按页过滤
+    with_values = attributes is None or 'value' in attributes
+    widget_page_index = None
+    if pages is not None or attributes is None or 'page' in attributes:
+        widget_page_index = build_widget_page_index(pdf)
     for page in pdf.pages:
         page_index += 1
+        if pages is not None and page_index not in pages:
+            continue
         if page_number is not None:
             if count != page_number:
                 count += 1
                 continue
             else:
-                print(f"Values From Page {page_number}")
+                logger.debug(f"Values From Page {page_number}")
                 # pr_safe_int_convert(f"Values From Page {page_number}")
         annotations = page[ANNOT_KEY]
         if annotations:
@@ -471,15 +496,12 @@ def get_form_fields(input_pdf_path, sort=False, page_number=None):
                         key = annotation[ANNOT_FIELD_KEY][1:-1]
                         
                         extend_data_dict[key] ={"page_index": page_index, "rect": annotation[ANNOT_RECT_KEY]}
-                        if key.startswith('toggle'):
-                            print(f'key: {key}')
-                            
                         # 只有当字段不存在或当前值为空时，才设置新值
                         if key not in data_dict or not data_dict[key]:
                             data_dict[key] = ''
                         
-                        # 尝试从 /V 字段获取值
-                        if annotation[ANNOT_VAL_KEY]:
+                        # 尝试从 /V 字段获取值（Enhanced: 不需要值时跳过）
+                        if with_values and annotation[ANNOT_VAL_KEY]:
                             value = annotation[ANNOT_VAL_KEY]
                             data_dict[key] = annotation[ANNOT_VAL_KEY]
                             try:
@@ -491,7 +513,7 @@ def get_form_fields(input_pdf_path, sort=False, page_number=None):
                             except:
                                 pass
                         # 如果 /V 为空，对于按钮字段，从 /AS (外观状态) 读取值
-                        elif annotation.get('/AS') and annotation.get('/FT') == '/Btn':
+                        elif with_values and annotation.get('/AS') and annotation.get('/FT') == '/Btn':
                             try:
                                 as_value = annotation['/AS']
                                 if type(as_value) == pdfrw.objects.pdfname.BasePdfName:
@@ -510,7 +532,7 @@ def get_form_fields(input_pdf_path, sort=False, page_number=None):
                         
                         extend_data_dict[key] ={"page_index": page_index, "rect": annotation[ANNOT_RECT_KEY]}
                         
-                        data_dict[key] = annotation[ANNOT_VAL_KEY]
+                        data_dict[key] = annotation[ANNOT_VAL_KEY] if with_values else ''
                         try:
                             if type(annotation[ANNOT_VAL_KEY]) == pdfrw.objects.pdfstring.PdfString:
                                 data_dict[key] = pdfrw.objects.PdfString.decode(annotation[ANNOT_VAL_KEY])
@@ -525,7 +547,7 @@ def get_form_fields(input_pdf_path, sort=False, page_number=None):
     # Enhanced: 添加对特殊字段结构的检测（如子字段）
     enhanced_data_dict = {}
     try:
-        acroform_fields = _get_acroform_fields(pdf)
+        acroform_fields = _get_acroform_fields(pdf, widget_page_index, pages, attributes)
         # 合并AcroForm信息和原始fillpdf值
         for field_name, field_info in acroform_fields.items():
             enhanced_data_dict[field_name] = field_info
@@ -666,7 +688,7 @@ def flatten_pdf(input_pdf_path, output_pdf_path, as_images=False):
         if template_pdf.Root.AcroForm is not None:
             template_pdf.Root.AcroForm.update(pdfrw.PdfDict(NeedAppearances=pdfrw.PdfObject('true')))
         else:
-            print("Warning: Form Not Found")
+            logger.warning("Form Not Found")
         pdfrw.PdfWriter().write(output_pdf_path, template_pdf)
         
 
@@ -699,7 +721,290 @@ def convert_dict_values_to_string(dictionary):
     return res    
     
     
-def write_fillable_pdf(input_pdf_path, output_pdf_path, data_dict, flatten=False):
+class FillPlan:
+    """
+    Enhanced: 预编译的模板填充计划
+    write_fillable_pdf 原本每次填充都要遍历所有页面注释、逐个拼接字段全名、
+    重新解码下拉选项和单选按钮的导出值，再递归遍历整个 AcroForm 字段树。
+    这些结果只取决于模板本身，这里对每个模板对象图只计算一次，
+    填充时按字段名直接定位，开销与提交的字段数成正比，而不是与模板字段总数成正比
+    """
+
+    def __init__(self):
+        self.entries = []           # [(annotation, target, key, step)]，按文档顺序，每个页面注释一项
+        self.by_key = {}            # 字段全名 -> entries 下标列表（仅可填充的控件）
+        self.acroform_fields = []   # [[name, field_obj, subtree_end]]，AcroForm 字段树的先序遍历
+        self.acroform_by_name = {}  # 字段名 -> acroform_fields 下标列表
+        self.acroform_names = set() # AcroForm 字段树中的完整字段名
+        self.buttons = {}           # 字段全名 -> ButtonField，复选框和单选按钮组的外观状态索引
+        self.option_sets = None     # FieldOptionSets，下拉框和单选按钮组的可选值集合
+
+
+class ButtonField:
+    """
+    Enhanced: 复选框或单选按钮组的外观状态索引
+    记录字段的子控件及各控件的导出名（开启状态的外观名），每个模板对象图只计算一次。
+    填充单选按钮组时不再为每个控件列出 /AP /N 外观并重建整个 data_dict 的字符串副本，
+    解析时同一索引也用于列出按钮字段的可选值
+    """
+
+    OFF = pdfrw.objects.pdfname.BasePdfName('/Off')
+
+    def __init__(self, kind, field, kids, exports):
+        self.kind = kind        # 'radio' 或 'checkbox'
+        self.field = field      # 单选按钮组的父字段，或复选框字段本身
+        self.kids = kids        # 需要同步状态的子控件
+        self.exports = exports  # 每个子控件的导出名（含 '/'）
+        self.options = [export[1:] if '/' in export else export for export in exports]
+        self.option_set = frozenset(self.options)
+        # 单选按钮组的任一控件的首个外观名（去掉 '/'）出现在提交的值中时才更新外观状态（与原实现一致）
+        self.selectors = set()
+
+    @property
+    def on_state(self):
+        """复选框的开启状态名（不含 '/'），没有外观时为 None"""
+        return self.options[0] if self.options else None
+
+    def select(self, value, field_values):
+        """
+        设置单选按钮组的选中项：导出名与值相同的控件为开启状态，其余为 /Off
+        """
+        selected = f'/{value}'
+        update_states = not self.selectors.isdisjoint(field_values)
+        if update_states:
+            on = pdfrw.objects.pdfname.BasePdfName(selected)
+            for kid, export in zip(self.kids, self.exports):
+                kid.update(pdfrw.PdfDict(AS=on if export == selected else self.OFF))
+        if value not in self.option_set:
+            if value != "None"  and value != "":
+                raise KeyError(f"{value} Not An Option, Options are {self.options}")
+        else:
+            if update_states:
+                self.field.update(pdfrw.PdfDict(V=pdfrw.objects.pdfname.BasePdfName(selected)))
+
+
+def _on_states(field_obj):
+    """列出控件 /AP /N 中除 /Off 以外的外观名"""
+    keys = field_obj['/AP']['/N'].keys()
+    if '/Off' in keys:
+        keys.remove('/Off')
+    return keys
+
+
+def _compile_annotation_step(annotation, target, radio_groups):
+    """
+    Enhanced: 预先计算单个控件的填充步骤
+    返回 (kind, ...) 元组；预计算时出现的异常保存在 ('error', e) 中，与原实现一样只在实际填充该字段时抛出。
+    同一单选按钮组的各个控件共用一个 ButtonField（radio_groups 按父字段记录）
+    """
+    try:
+        if target[ANNOT_FORM_type] == ANNOT_FORM_button:
+            if not annotation['/T']:
+                if not annotation['/AP']:
+                    return None
+                # button field i.e. a radiobuttons
+                keys = annotation['/AP']['/N'].keys()
+                if keys[0]:
+                    if keys[0][0] == '/':
+                        keys[0] = str(keys[0][1:])
+                parent = annotation['/Parent']
+                button = radio_groups.get(id(parent))
+                if button is None:
+                    kids = list(parent['/Kids'])
+                    button = ButtonField('radio', parent, kids, [_on_states(each)[0] for each in kids])
+                    radio_groups[id(parent)] = button
+                button.selectors.update(keys)
+                return ('radio', button)
+            # button field i.e. a checkbox
+            kids = target[ANNOT_FIELD_KIDS_KEY]
+            kid = kids[0] if kids else None
+            exports = []
+            try:
+                exports = _on_states(target if target['/AP'] else kid)[:1]
+            except Exception:
+                pass
+            return ('checkbox', ButtonField('checkbox', target, [kid] if kid is not None else [], exports))
+        elif target[ANNOT_FORM_type] == ANNOT_FORM_combo:
+            # Drop Down Combo Box
+            options = annotation[ANNOT_FORM_options]
+            if len(options) > 0:
+                if type(options[0]) == pdfrw.objects.pdfarray.PdfArray:
+                    options = list(options)
+                    options = [pdfrw.objects.pdfstring.PdfString.decode(x[0]) for x in options]
+                if type(options[0]) == pdfrw.objects.pdfstring.PdfString:
+                    options = [pdfrw.objects.pdfstring.PdfString.decode(x) for x in options]
+            return ('combo', options, frozenset(options), annotation[ANNOT_FIELD_KEY])
+        elif target[ANNOT_FORM_type] == ANNOT_FORM_text:
+            # regular text field
+            kids = target[ANNOT_FIELD_KIDS_KEY]
+            return ('text', kids[0] if kids else None)
+    except Exception as e:
+        return ('error', e)
+    return None
+
+
+def _collect_acroform_fields(plan, field_obj, parent_name=""):
+    """
+    Enhanced: 按原递归填充的顺序（先序）记录 AcroForm 字段树，并记录每个字段子树的结束位置，
+    填充单个字段出错时可以像原实现一样跳过它的子字段
+    """
+    if not field_obj:
+        return
+    try:
+        field_name = _get_field_name(field_obj)
+        entry = [field_name, field_obj, None]
+        plan.acroform_fields.append(entry)
+        full_name = f"{parent_name}.{field_name}" if parent_name and field_name else (field_name or parent_name)
+        if field_name:
+            plan.acroform_by_name.setdefault(field_name, []).append(len(plan.acroform_fields) - 1)
+            plan.acroform_names.add(full_name)
+        try:
+            if '/Kids' in field_obj and field_obj['/Kids']:
+                for kid in field_obj['/Kids']:
+                    _collect_acroform_fields(plan, kid, full_name)
+        finally:
+            entry[2] = len(plan.acroform_fields)
+    except Exception:
+        pass
+
+
+def compile_fill_plan(template_pdf):
+    """
+    Enhanced: 为已解析的模板对象图编译填充计划
+    计划直接引用对象图中的字典，只能用于同一个对象图（TemplatePool 为每份对象图保存一份计划）
+    Parameters
+    ---------
+    template_pdf: pdfrw.PdfReader
+        已解析的模板
+    Returns
+    ---------
+    plan: FillPlan
+    """
+    plan = FillPlan()
+    radio_groups = {}
+    for Page in template_pdf.pages:
+        if Page[ANNOT_KEY]:
+            for annotation in Page[ANNOT_KEY]:
+                target = annotation if annotation[ANNOT_FIELD_KEY] else annotation[ANNOT_FIELD_PARENT_KEY]
+                key = None
+                step = None
+                if target and annotation[SUBTYPE_KEY] == WIDGET_SUBTYPE_KEY:
+                    key = target[ANNOT_FIELD_KEY][1:-1] # Remove parentheses
+                    target_aux = target
+                    while target_aux['/Parent']:
+                        key = target['/Parent'][ANNOT_FIELD_KEY][1:-1] + '.' + key
+                        target_aux = target_aux['/Parent']
+                    step = _compile_annotation_step(annotation, target, radio_groups)
+                    if step is not None:
+                        plan.by_key.setdefault(key, []).append(len(plan.entries))
+                        if step[0] in ('radio', 'checkbox'):
+                            plan.buttons.setdefault(key, step[1])
+                plan.entries.append((annotation, target, key, step))
+
+    try:
+        if template_pdf.Root and template_pdf.Root.AcroForm and template_pdf.Root.AcroForm.Fields:
+            for field in template_pdf.Root.AcroForm.Fields:
+                _collect_acroform_fields(plan, field)
+    except Exception:
+        pass
+
+    # 选择类字段的可选值只解码一次，保存为集合供填充前校验
+    options = {}
+    for key, indices in plan.by_key.items():
+        for index in indices:
+            step = plan.entries[index][3]
+            if step[0] == 'radio':
+                options.setdefault(key, set()).update(step[1].options)
+            elif step[0] == 'combo':
+                options.setdefault(key, set()).update(step[2])
+    names = set(plan.by_key) | set(plan.acroform_by_name) | plan.acroform_names
+    plan.option_sets = FieldOptionSets(names, options)
+    return plan
+
+
+def _run_annotation_step(step, annotation, target, value, field_values, selected_groups):
+    """
+    Enhanced: 执行单个控件的填充步骤，返回需要设置只读标志的注释对象
+    """
+    kind = step[0]
+    if kind == 'error':
+        raise step[1].with_traceback(None)
+    if kind == 'radio':
+        button = step[1]
+        # 同一按钮组只需设置一次，组内其他控件的步骤结果相同
+        if id(button) not in selected_groups:
+            selected_groups.add(id(button))
+            button.select(value, field_values)
+        return button.field
+    if kind == 'checkbox':
+        for each in [target] + step[1].kids:
+            each.update( pdfrw.PdfDict( V=pdfrw.PdfName(value) , AS=pdfrw.PdfName(value) ))
+    elif kind == 'combo':
+        _, options, option_set, field_title = step
+        if type(value) == list:
+            export = []
+            for each in options:
+                if each in value:
+                    export.append(pdfrw.objects.pdfstring.PdfString.encode(each))
+            pdfstr = pdfrw.objects.pdfarray.PdfArray(export)
+        else:
+            export = value if value in option_set else None
+            if export is None:
+                if value != "None" and value != "":
+                    raise KeyError(f"{value} Not An Option For {field_title}, Options are {options}")
+            pdfstr = pdfrw.objects.pdfstring.PdfString.encode(value)
+        annotation.update(pdfrw.PdfDict(V=pdfstr, AS=pdfstr))
+    elif kind == 'text':
+        target.update( pdfrw.PdfDict( V=value, AP=value) )
+        if step[1] is not None:
+            step[1].update( pdfrw.PdfDict( V=value, AP=value) )
+    return annotation
+
+
+def _run_fill_plan(plan, data_dict, flatten):
+    """
+    Enhanced: 按填充计划写入字段值，只访问提交了值的字段（flatten 时仍需处理所有注释）
+    """
+    list_delim = '-'
+    field_values = set()
+    for value in data_dict.values():
+        if isinstance(value, list):
+            field_values.add(list_delim.join([str(ele) for ele in value]))
+        else:
+            field_values.add(str(value))
+
+    if flatten == True:
+        indices = range(len(plan.entries))
+    else:
+        indices = sorted(index for key in data_dict if key in plan.by_key for index in plan.by_key[key])
+
+    selected_groups = set()
+    for index in indices:
+        annotation, target, key, step = plan.entries[index]
+        if step is not None and key in data_dict:
+            annotation = _run_annotation_step(step, annotation, target, data_dict[key], field_values, selected_groups)
+        if flatten == True:
+            annotation.update(pdfrw.PdfDict(Ff=make_read_only(target["/Ff"])))
+
+    # Enhanced: 处理AcroForm中未在页面注释中找到的特殊字段
+    positions = sorted(
+        position
+        for name in data_dict if name in plan.acroform_by_name
+        for position in plan.acroform_by_name[name]
+    )
+    skip_until = -1
+    for position in positions:
+        if position < skip_until:
+            continue
+        field_name, field_obj, subtree_end = plan.acroform_fields[position]
+        try:
+            _fill_single_field(field_obj, data_dict[field_name])
+        except Exception:
+            # 静默处理单个字段的异常，并跳过它的子字段
+            skip_until = subtree_end
+
+
+def write_fillable_pdf(input_pdf_path, output_pdf_path, data_dict, flatten=False, template_pdf=None, fill_plan=None):
     """
     Writes the dictionary values to the pdf. Currently supports text and buttons.
     Does so by updating each individual annotation with the contents of the dat_dict.
@@ -714,113 +1019,21 @@ def write_fillable_pdf(input_pdf_path, output_pdf_path, data_dict, flatten=False
     flatten: bool
         Default is False meaning it will stay editable. True means the annotations
         will be uneditable.
+    template_pdf: pdfrw.PdfReader
+        Enhanced: 已解析的模板对象图（来自 TemplatePool），传入时不再重新解析 input_pdf_path。
+        填充会直接修改该对象图，由调用方负责恢复
+    fill_plan: FillPlan
+        Enhanced: template_pdf 对应的预编译填充计划（见 compile_fill_plan），不传时现场编译
     Returns
     ---------
     """
     data_dict = convert_dict_values_to_string(data_dict)
 
-    template_pdf = pdfrw.PdfReader(input_pdf_path)
-    for Page in template_pdf.pages:
-        if Page[ANNOT_KEY]:
-            for annotation in Page[ANNOT_KEY]:
-                target = annotation if annotation[ANNOT_FIELD_KEY] else annotation[ANNOT_FIELD_PARENT_KEY]
-                if annotation[ANNOT_FORM_type] == None:
-                    pass
-                if target and annotation[SUBTYPE_KEY] == WIDGET_SUBTYPE_KEY:
-                    key = target[ANNOT_FIELD_KEY][1:-1] # Remove parentheses
-                    target_aux = target
-                    while target_aux['/Parent']:
-                        key = target['/Parent'][ANNOT_FIELD_KEY][1:-1] + '.' + key
-                        target_aux = target_aux['/Parent']
-                    if key in data_dict.keys():
-                        if target[ANNOT_FORM_type] == ANNOT_FORM_button:
-                            # button field i.e. a radiobuttons
-                            if not annotation['/T']:
-                                if annotation['/AP']:
-                                    keys = annotation['/AP']['/N'].keys()
-                                    if keys[0]:
-                                        if keys[0][0] == '/':
-                                            keys[0] = str(keys[0][1:])
-                                    list_delim, tuple_delim = '-', '^'
-                                    res = dict()
-                                    for sub in data_dict:
-                                        if isinstance(data_dict[sub], list):
-                                            res[sub] = list_delim.join([str(ele) for ele in data_dict[sub]]) 
-                                        else:
-                                            res[sub] = str(data_dict[sub])
-                                    temp_dict = res
-                                    annotation = annotation['/Parent']
-                                    options = []
-                                    for each in annotation['/Kids']:
-                                        keys2 = each['/AP']['/N'].keys()
-                                        if '/Off' in keys2:
-                                            keys2.remove('/Off')
-                                        if ['/Off'] in keys:
-                                            keys2.remove('/Off')
-                                        export = keys2[0]
-                                        if '/' in export:
-                                            options.append(export[1:])
-                                        else:
-                                            options.append(export)
-                                        if f'/{data_dict[key]}' == export:
-                                            val_str = pdfrw.objects.pdfname.BasePdfName(f'/{data_dict[key]}')
-                                        else:
-                                            val_str = pdfrw.objects.pdfname.BasePdfName(f'/Off')
-                                        if set(keys).intersection(set(temp_dict.values())):
-                                            each.update(pdfrw.PdfDict(AS=val_str))
-                                    if data_dict[key] not in options:
-                                        if data_dict[key] != "None"  and data_dict[key] != "":
-                                            raise KeyError(f"{data_dict[key]} Not An Option, Options are {options}")
-                                    else:
-                                        if set(keys).intersection(set(temp_dict.values())):
-                                            annotation.update(pdfrw.PdfDict(V=pdfrw.objects.pdfname.BasePdfName(f'/{data_dict[key]}')))
-                            else:
-                                # button field i.e. a checkbox
-                                target.update( pdfrw.PdfDict( V=pdfrw.PdfName(data_dict[key]) , AS=pdfrw.PdfName(data_dict[key]) ))
-                                if target[ANNOT_FIELD_KIDS_KEY]:
-                                    target[ANNOT_FIELD_KIDS_KEY][0].update( pdfrw.PdfDict( V=pdfrw.PdfName(data_dict[key]) , AS=pdfrw.PdfName(data_dict[key]) ))
-                        elif target[ANNOT_FORM_type] == ANNOT_FORM_combo:
-                            # Drop Down Combo Box
-                            export = None
-                            options = annotation[ANNOT_FORM_options]
-                            if len(options) > 0:
-                                if type(options[0]) == pdfrw.objects.pdfarray.PdfArray:
-                                    options = list(options)
-                                    options = [pdfrw.objects.pdfstring.PdfString.decode(x[0]) for x in options]
-                                if type(options[0]) == pdfrw.objects.pdfstring.PdfString:
-                                    options = [pdfrw.objects.pdfstring.PdfString.decode(x) for x in options]
-                            if type(data_dict[key]) == list:
-                                export = []
-                                for each in options:
-                                    if each in data_dict[key]:
-                                        export.append(pdfrw.objects.pdfstring.PdfString.encode(each))
-                                if export is None:
-                                    if data_dict[key] != "None"  and data_dict[key] != "":
-                                        raise KeyError(f"{data_dict[key]} Not An Option For {annotation[ANNOT_FIELD_KEY]}, Options are {options}")
-                                pdfstr = pdfrw.objects.pdfarray.PdfArray(export)
-                            else:
-                                for each in options:
-                                    if each == data_dict[key]:
-                                        export = each
-                                if export is None:
-                                    if data_dict[key] != "None" and data_dict[key] != "":
-                                        raise KeyError(f"{data_dict[key]} Not An Option For {annotation[ANNOT_FIELD_KEY]}, Options are {options}")
-                                pdfstr = pdfrw.objects.pdfstring.PdfString.encode(data_dict[key])
-                            annotation.update(pdfrw.PdfDict(V=pdfstr, AS=pdfstr))
-                        elif target[ANNOT_FORM_type] == ANNOT_FORM_text:
-                            # regular text field
-                            target.update( pdfrw.PdfDict( V=data_dict[key], AP=data_dict[key]) )
-                            if target[ANNOT_FIELD_KIDS_KEY]:
-                                target[ANNOT_FIELD_KIDS_KEY][0].update( pdfrw.PdfDict( V=data_dict[key], AP=data_dict[key]) )
-                if flatten == True:
-                    annotation.update(pdfrw.PdfDict(Ff=make_read_only(target["/Ff"])))
-    
-    # Enhanced: 处理AcroForm中未在页面注释中找到的特殊字段
-    try:
-        _fill_acroform_fields(template_pdf, data_dict)
-    except Exception as e:
-        # 如果AcroForm填充失败，不影响原有功能
-        pass
+    if template_pdf is None:
+        template_pdf = pdfrw.PdfReader(input_pdf_path)
+    if fill_plan is None:
+        fill_plan = compile_fill_plan(template_pdf)
+    _run_fill_plan(fill_plan, data_dict, flatten)
     
     template_pdf.Root.AcroForm.update(pdfrw.PdfDict(NeedAppearances=pdfrw.PdfObject('true')))
     pdfrw.PdfWriter().write(output_pdf_path, template_pdf)
@@ -1123,9 +1336,11 @@ def get_coordinate_map(input_pdf_path, output_map_path, page_number=1, **kwargs)
     
     doc.save(output_map_path, **kwargs)
 
-def _extract_field_recursive_improved(field_obj, result_dict, parent_path=""):
+def _extract_field_recursive_improved(field_obj, result_dict, parent_path="", page_index=None, pages=None, attributes=None):
     """
     改进的递归提取字段函数，能够处理深层嵌套结构
+    Enhanced: 提供 page_index 时记录字段所在页码；pages 指定时跳过不在这些页面上的字段（仍会检查其子字段）；
+    attributes 不包含 value / options 时不解码 /V / /Opt（has_options 仍然记录，用于确定字段类型）
     """
     if not field_obj:
         return
@@ -1145,9 +1360,18 @@ def _extract_field_recursive_improved(field_obj, result_dict, parent_path=""):
         # 构建字段路径（用于调试）
         current_path = f"{parent_path}.{field_name}" if parent_path and field_name else (field_name or parent_path)
         
+        # Enhanced: 按控件页码过滤，没有控件的字段按第 1 页处理
+        field_pages = None
+        if page_index is not None:
+            field_pages = _widget_pages(field_obj, page_index) or [1]
+            if pages is not None:
+                field_pages = [page_number for page_number in field_pages if page_number in pages]
+                if not field_pages:
+                    field_name = None
+        
         # 获取字段值
         field_value = ""
-        if '/V' in field_obj:
+        if field_name and '/V' in field_obj and (attributes is None or 'value' in attributes):
             try:
                 value = field_obj['/V']
                 if hasattr(value, 'to_unicode'):
@@ -1174,9 +1398,11 @@ def _extract_field_recursive_improved(field_obj, result_dict, parent_path=""):
                 'max_length': _safe_int_convert(field_obj.get('/MaxLen')) if '/MaxLen' in field_obj and field_obj['/MaxLen'] else None,
                 'path': current_path  # 添加路径信息用于调试
             }
+            if field_pages:
+                result_dict[field_name]['page_index'] = field_pages[0]
             
             # 提取选项
-            if '/Opt' in field_obj and field_obj['/Opt']:
+            if '/Opt' in field_obj and field_obj['/Opt'] and (attributes is None or 'options' in attributes):
                 try:
                     options = field_obj['/Opt']
                     option_list = []
@@ -1194,7 +1420,7 @@ def _extract_field_recursive_improved(field_obj, result_dict, parent_path=""):
         # 递归处理所有子字段
         if '/Kids' in field_obj and field_obj['/Kids']:
             for kid in field_obj['/Kids']:
-                _extract_field_recursive_improved(kid, result_dict, current_path)
+                _extract_field_recursive_improved(kid, result_dict, current_path, page_index, pages, attributes)
                 
     except Exception as e:
         # 静默处理单个字段的异常
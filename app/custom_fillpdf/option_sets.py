@@ -0,0 +1,100 @@
+"""
+Enhanced: 模板字段选项集合
+下拉框（/Ch）的 /Opt 和单选按钮组各控件的导出值只取决于模板本身，
+这里在编译填充计划时解码一次并保存为集合，填充前直接按哈希查找校验提交的值，
+不再为每次填充重新解码选项或重新解析整个模板
+"""
+
+
+class InvalidFieldValueError(ValueError):
+    """提交的字段值不在该字段的可选值中（严格验证模式）"""
+
+    def __init__(self, invalid):
+        self.invalid = invalid  # [(字段名, 值, 可选值列表)]
+        details = '; '.join(
+            f'字段 {name} 的值 "{value}" 不在选项 {options} 中' for name, value, options in invalid
+        )
+        super().__init__(details)
+
+
+class FieldOptionSets:
+    """
+    一个模板的字段名集合及选择类字段（下拉框、单选按钮组）的可选值集合
+    """
+
+    # 与 write_fillable_pdf 一致：空值和 "None" 表示不选择，总是允许
+    EMPTY_VALUES = frozenset(['', 'None'])
+
+    # 与 _fill_single_field 一致：复选框的值（不区分大小写）为这些值或控件的导出名时选中，其他值均为 /Off
+    CHECKBOX_ON_VALUES = frozenset(['1', 'true', 'yes', 'on', 'checked'])
+
+    def __init__(self, names, options):
+        self.names = frozenset(names)
+        self.options = {name: frozenset(values) for name, values in options.items()}
+
+    def to_dict(self):
+        """转换为可 JSON 序列化的字典（用于跨进程缓存）"""
+        return {
+            'names': sorted(self.names),
+            'options': {name: sorted(values) for name, values in self.options.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('names', []), data.get('options', {}))
+
+    def is_valid(self, name, value):
+        """检查单个字段值，没有选项限制的字段总是有效"""
+        allowed = self.options.get(name)
+        if allowed is None:
+            return True
+        if isinstance(value, (list, tuple)):
+            return all(str(each) in allowed for each in value)
+        value = str(value)
+        return value in self.EMPTY_VALUES or value in allowed
+
+    def invalid_fields(self, field_values):
+        """
+        找出值不在可选值中的字段
+
+        Returns
+        ---------
+        invalid: list
+            [(字段名, 值, 可选值列表)]
+        """
+        return [
+            (name, value, sorted(self.options[name]))
+            for name, value in field_values.items()
+            if not self.is_valid(name, value)
+        ]
+
+    def validate(self, field_values, strict=True, drop_unknown=False):
+        """
+        在修改任何 PDF 对象之前校验字段值
+
+        Parameters
+        ---------
+        field_values: dict
+            字段名 -> 值
+        strict: bool
+            True 时存在无效值直接抛出 InvalidFieldValueError；False 时删除无效值
+        drop_unknown: bool
+            非严格模式下是否同时删除模板中不存在的字段
+        Returns
+        ---------
+        valid_fields: dict
+            校验后的字段值
+        """
+        invalid = self.invalid_fields(field_values)
+        if invalid and strict:
+            raise InvalidFieldValueError(invalid)
+
+        invalid_names = set(name for name, _, _ in invalid)
+        valid_fields = {}
+        for name, value in field_values.items():
+            if name in invalid_names:
+                continue
+            if drop_unknown and not strict and name not in self.names:
+                continue
+            valid_fields[name] = value
+        return valid_fields
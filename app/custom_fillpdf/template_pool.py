@@ -0,0 +1,189 @@
+"""
+Enhanced: 预解析模板对象池
+pdfrw.PdfReader 每次填充都要重新分词并重建整个对象图，对热点模板开销很大。
+这里为热点模板保留已解析好的对象图，填充时租用一份：
+
+- 页面内容流、字体、图片等不会被填充修改的对象在多次填充之间共享
+- 填充只会修改字段/控件字典（以及 AcroForm 和 trailer），池在入池时为这些字典及从中可以到达的
+  数组（/Kids、/Annots、/Opt 等）和字典保存快照（内容和实例属性），归还时按快照恢复，
+  下一次填充看到的仍是原始模板
+- 每份对象图同时保存一份预编译的填充计划（FillPlan），热点模板填充时只访问提交的字段
+- 每个模板最多保留 per_template 份对象图（同一对象图同一时刻只租给一个填充），
+  模板数量超出 max_templates 时按最近使用淘汰
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pdfrw
+
+from .enhanced_fillpdfs import compile_fill_plan
+
+def _collect_form_dicts(template_pdf):
+    """
+    收集填充过程中可能被修改的字典: trailer、Root、AcroForm、字段树（含 Kids/Parent）
+    以及所有页面注释。收集的同时解析其中的间接引用，保证快照保存的是实际对象
+    """
+    seen = set()
+    result = []
+
+    def visit(obj):
+        if not isinstance(obj, pdfrw.PdfDict) or id(obj) in seen:
+            return
+        seen.add(id(obj))
+        obj.items()  # 解析间接引用
+        result.append(obj)
+        parent = obj.get('/Parent')
+        # 页面的 Parent 指向页面树，不属于表单结构
+        if parent is not None and obj.get('/Type') != '/Page':
+            visit(parent)
+        for kid in obj.get('/Kids') or []:
+            visit(kid)
+
+    visit(template_pdf)
+    root = template_pdf.Root
+    visit(root)
+    if root is not None and root.AcroForm is not None:
+        visit(root.AcroForm)
+        for field in root.AcroForm.Fields or []:
+            visit(field)
+    for page in template_pdf.pages:
+        for annotation in page['/Annots'] or []:
+            visit(annotation)
+    return result
+
+
+# Enhanced: 深度快照时不跟随的键（指向页面或父字段，页面内容不会被填充修改，父字段已单独收集）
+_SNAPSHOT_SKIP_KEYS = frozenset(['/P', '/Parent', '/Pages'])
+
+
+def _collect_snapshot_objects(template_pdf):
+    """
+    收集需要保存快照的对象: _collect_form_dicts 的字典、页面字典及其 /Annots 数组，以及从字段、
+    控件和 AcroForm 字典出发可以到达的所有数组和字典（trailer、Root 和页面只保存自身，
+    避免把整个文档都纳入快照）。数组在收集时解析其中的间接引用，快照保存的是解析后的内容
+    """
+    form_dicts = _collect_form_dicts(template_pdf)
+    pages = list(template_pdf.pages)
+    shallow = {id(template_pdf), id(template_pdf.Root)}
+    seen = set(id(obj) for obj in form_dicts)
+    result = list(form_dicts)
+    for page in pages:
+        if id(page) not in seen:
+            seen.add(id(page))
+            result.append(page)
+
+    def visit(value):
+        if isinstance(value, pdfrw.PdfArray):
+            children = list(value)
+        elif isinstance(value, pdfrw.PdfDict) and value.get('/Type') != '/Page':
+            # 外观流等流对象与页面内容一样不会被填充修改，只保存自身，不再深入其资源
+            children = [] if value.stream is not None else [
+                child for key, child in value.items() if key not in _SNAPSHOT_SKIP_KEYS
+            ]
+        else:
+            return
+        if id(value) not in seen:
+            seen.add(id(value))
+            result.append(value)
+        for child in children:
+            if id(child) not in seen:
+                visit(child)
+
+    for page in pages:
+        if page['/Annots'] is not None:
+            visit(page['/Annots'])
+    for obj in form_dicts:
+        if id(obj) not in shallow:
+            for key, value in obj.items():
+                if key not in _SNAPSHOT_SKIP_KEYS:
+                    visit(value)
+    return result
+
+
+def _take_snapshot(obj):
+    """保存对象的内容和实例属性（pdfrw 的 indirect、stream 等保存在实例属性中）"""
+    items = dict.copy(obj) if isinstance(obj, pdfrw.PdfDict) else list.copy(obj)
+    return obj, items, vars(obj).copy()
+
+
+def _restore_snapshot(obj, items, attributes):
+    if isinstance(obj, pdfrw.PdfDict):
+        dict.clear(obj)
+        dict.update(obj, items)
+    else:
+        list.__setitem__(obj, slice(None), items)
+    attrs = vars(obj)
+    attrs.clear()
+    attrs.update(attributes)
+
+
+class PooledTemplate:
+    """池中的一份已解析模板、表单对象快照及填充计划"""
+
+    def __init__(self, input_pdf_path):
+        self.pdf = pdfrw.PdfReader(input_pdf_path)
+        self.snapshot = [_take_snapshot(obj) for obj in _collect_snapshot_objects(self.pdf)]
+        # 快照之后编译：计划引用的都是已解析的原始对象，恢复快照后依然有效
+        self.plan = compile_fill_plan(self.pdf)
+
+    def restore(self):
+        """把被填充修改过的字典和数组（内容及实例属性）恢复为原始状态"""
+        for obj, items, attributes in self.snapshot:
+            _restore_snapshot(obj, items, attributes)
+
+
+class TemplatePool:
+    """按模板 SHA-256 管理已解析对象图的池（线程安全）"""
+
+    def __init__(self, max_templates=16, per_template=2):
+        self.max_templates = max_templates
+        self.per_template = per_template
+        self._idle = OrderedDict()  # key -> [PooledTemplate, ...]，按最近使用排序
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, key, input_pdf_path):
+        """
+        租用一份模板对象图（PooledTemplate，含 .pdf 和 .plan），退出时恢复原始内容并归还
+
+        Parameters
+        ---------
+        key: str
+            模板内容的 SHA-256
+        input_pdf_path: str
+            池中没有空闲对象图时用于解析的模板文件
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            pooled = idle.pop() if idle else None
+            if key in self._idle:
+                self._idle.move_to_end(key)
+
+        if pooled is None:
+            pooled = PooledTemplate(input_pdf_path)
+
+        try:
+            yield pooled
+        finally:
+            try:
+                pooled.restore()
+            except Exception:
+                # 无法恢复的对象图直接丢弃
+                pooled = None
+            if pooled is not None:
+                self._release(key, pooled)
+
+    def _release(self, key, pooled):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.per_template:
+                idle.append(pooled)
+            while len(self._idle) > self.max_templates:
+                self._idle.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
@@ -1,10 +1,13 @@
 import os
+import re
 import sys
+import json
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse
+from typing import List, Dict, Any, Tuple, Optional
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Header, BackgroundTasks
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from loguru import logger
 import uvicorn
 
@@ -16,13 +19,55 @@ from app.services.pdf_service import PDFService
 from app.services.pdf_service_fillpdf import PDFServiceFillPDF
 from app.services.pdf_service_pypdf import PDFServicePyPDF
 from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF
+from app.custom_fillpdf import InvalidFieldValueError
 from app.utils.config import settings
+from app.utils.pdf_optimizer import optimize_pdf, OUTPUT_MODES, OUTPUT_MODE_COMPACT
+from app.utils.request_context import RequestContextMiddleware, current_request, current_timer, stage
+from app.utils.profiling import ProfilingMiddleware, profiled, profile_path, profile_summary
+from app.utils.tracing import TracingMiddleware, span, set_attributes, shutdown_tracing
+from app.utils.template_cache import template_cache, content_sha256
+from app.utils.mapped_template import MappedTemplate
+from app.utils.result_cache import fill_result_key, get_fill_result, put_fill_result, etag_matches
+from app.utils.fill_report import (
+  start_fill_report, save_fill_report, summary_header, fill_report_path,
+  FILL_REPORT_URL_HEADER, FILL_REPORT_SUMMARY_HEADER
+)
+from app.utils.page_ranges import parse_page_ranges, format_page_ranges
+from app.utils.field_projection import parse_field_projection, format_field_projection, project_fields
+from app.utils.text_scan import current_text_scan_coverage, shutdown_scan_pool, STOPPED_BY_TIME_BUDGET
+from app.utils.batch_parse import expand_uploads, map_documents, shutdown_batch_pool
+from app.utils.shadow import (
+  ShadowComparison, shadow_engine_for, engine_ms, submit_shadow, run_parse_shadow, run_fill_shadow,
+  shadow_stats, shutdown_shadow
+)
 
 # 创建服务实例
 pdf_service = PDFService()  # 原有的增强解析服务
 pdf_service_fillpdf = PDFServiceFillPDF()  # 原始fillpdf库服务
 pdf_service_pypdf = PDFServicePyPDF()  # 标准PyPDF2服务
 pdf_service_enhanced_fillpdf = PDFServiceEnhancedFillPDF()  # 增强版fillpdf服务
+pdf_service_pymupdf = PDFServicePyMuPDF()  # PyMuPDF服务
+
+# 引擎名称 -> 服务实例（影子比对时按 SHADOW_ENGINE 查找）
+ENGINE_SERVICES = {
+  'standard': pdf_service_pypdf,
+  'enhanced': pdf_service,
+  'fillpdf': pdf_service_fillpdf,
+  'enhanced_fillpdf': pdf_service_enhanced_fillpdf,
+  'pymupdf': pdf_service_pymupdf
+}
+
+# 解析结果缓存版本，解析逻辑变化导致结果不同时递增，使旧缓存失效
+PARSE_CACHE_VERSION = 3
+
+# 先发哈希协议：客户端通过该请求头声明模板内容的 SHA-256，服务端已有该模板时可以不上传文件
+CONTENT_SHA256_HEADER = 'X-Content-SHA256'
+_SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# 流式解析和批量解析的响应类型，已完成的字段每次最多合并这么多行发送
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+NDJSON_CHUNK_FIELDS = 200
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,11 +80,20 @@ async def lifespan(app: FastAPI):
   for directory in directories:
     Path(directory).mkdir(parents=True, exist_ok=True)
   
+  if settings.SHADOW_ENGINE and settings.SHADOW_ENGINE not in ENGINE_SERVICES:
+    logger.warning(f'影子引擎 {settings.SHADOW_ENGINE} 不存在，影子比对不会执行')
+  
   logger.info('应用启动完成')
   yield
   
   # 关闭时
   logger.info('应用关闭中...')
+  shutdown_scan_pool()
+  shutdown_batch_pool()
+  shutdown_shadow()
+  shutdown_tracing()
+  # 等待日志队列中的记录写完
+  await logger.complete()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -49,6 +103,119 @@ app = FastAPI(
   lifespan=lifespan
 )
 
+# 按需性能剖析（需在请求上下文中间件内层，关闭时不注册）
+if settings.PROFILING_ENABLED:
+  app.add_middleware(ProfilingMiddleware)
+
+# 链路追踪（需在请求上下文中间件内层，关闭时不注册）
+if settings.TRACING_ENABLED:
+  app.add_middleware(TracingMiddleware)
+
+# 请求上下文：请求ID、Server-Timing 响应头和结构化访问日志
+app.add_middleware(RequestContextMiddleware)
+
+async def register_template(file: UploadFile) -> Tuple[str, Any]:
+  """
+  计算上传模板的 SHA-256 并写入共享模板缓存
+
+  Returns:
+    (模板的 SHA-256（缓存键）, 交给引擎的模板对象)
+    缓存可用时模板对象为映射缓存文件的 MappedTemplate，需由调用方关闭；
+    否则为原上传文件，文件指针会重置到开始位置
+  """
+  with stage('cache'):
+    content = await file.read()
+    template_sha = content_sha256(content)
+    await file.seek(0)
+    # 租用缓存文件的硬链接：其他工作进程随后淘汰该模板不影响本请求
+    lease_path = template_cache.lease_template(template_sha, content) if content else None
+  if lease_path is None:
+    return template_sha, file
+  return template_sha, MappedTemplate(lease_path, file.filename, template_sha, leased=True)
+
+async def resolve_template(file: Optional[UploadFile], content_sha: Optional[str]) -> Tuple[str, Any, str]:
+  """
+  获取本次请求的模板：上传的文件，或按 X-Content-SHA256 从共享模板缓存中找到的模板
+
+  - 只提供哈希: 缓存中有该模板时直接使用，没有时返回 428，客户端需要重新上传文件
+  - 同时提供文件和哈希: 校验文件内容与哈希一致
+  - 只提供文件: 与原来相同
+
+  Returns:
+    (模板的 SHA-256, 交给引擎的模板对象, 文件名)，模板对象需由调用方用 close_template 关闭
+  """
+  if content_sha is not None:
+    content_sha = content_sha.strip().lower()
+    if not _SHA256_PATTERN.match(content_sha):
+      raise HTTPException(status_code=400, detail=f'{CONTENT_SHA256_HEADER} 必须是 64 位十六进制 SHA-256')
+  
+  if file is None:
+    if content_sha is None:
+      raise HTTPException(status_code=400, detail=f'请上传PDF文件或通过 {CONTENT_SHA256_HEADER} 指定模板')
+    filename = f'{content_sha}.pdf'
+    with stage('cache'):
+      lease_path = template_cache.lease_template(content_sha)
+      source = MappedTemplate(lease_path, filename, content_sha, leased=True) if lease_path else None
+    if source is None:
+      raise HTTPException(status_code=428, detail='服务端没有该模板，请上传PDF文件')
+    logger.info(f'按 {CONTENT_SHA256_HEADER} 命中模板 {content_sha[:12]}，无需上传')
+    return content_sha, source, filename
+  
+  # 验证文件类型
+  if not file.filename or not file.filename.lower().endswith('.pdf'):
+    raise HTTPException(status_code=400, detail='只支持PDF文件')
+  
+  template_sha, source = await register_template(file)
+  if content_sha is not None and content_sha != template_sha:
+    await close_template(source)
+    raise HTTPException(status_code=400, detail=f'上传文件的 SHA-256 与 {CONTENT_SHA256_HEADER} 不一致')
+  return template_sha, source, file.filename
+
+def parse_cache_name(engine: str, page_set, projection=None) -> str:
+  """解析结果在模板缓存中的元数据名称（引擎、解析逻辑版本、页码范围和字段属性投影）"""
+  name = f'parse:{engine}:v{PARSE_CACHE_VERSION}'
+  if page_set is not None:
+    name += f':pages={format_page_ranges(page_set)}'
+  if projection is not None:
+    name += f':fields={format_field_projection(projection)}'
+  return name
+
+async def close_template(source):
+  """关闭 register_template 打开的映射模板"""
+  if isinstance(source, MappedTemplate):
+    await source.close()
+
+async def start_shadow(kind: str, engine: str, source, template_sha: str) -> Tuple[Optional[ShadowComparison], Any, bytes]:
+  """
+  按采样率决定是否对当前请求进行影子比对
+
+  Returns:
+    (比对对象, 影子引擎服务, 模板内容)；不比对时比对对象为 None
+    模板内容在响应发送前读出，后台任务运行时上传文件和映射模板已经关闭
+  """
+  shadow_engine = shadow_engine_for(engine)
+  service = ENGINE_SERVICES.get(shadow_engine) if shadow_engine else None
+  if service is None:
+    return None, None, b''
+  await source.seek(0)
+  content = await source.read()
+  ctx = current_request()
+  comparison = ShadowComparison(
+    kind, ctx.request_id if ctx else None, template_sha, engine, engine_ms(current_timer()), shadow_engine
+  )
+  return comparison, service, content
+
+def publish_fill_report(report: Dict[str, Any], engine: str, template_sha: str, headers: Dict[str, str]):
+  """保存当前请求的填充报告，并在响应头中附带报告地址和各类字段数"""
+  ctx = current_request()
+  if ctx is None:
+    return
+  document = {'request_id': ctx.request_id, 'engine': engine, 'template_sha256': template_sha, **report}
+  url = save_fill_report(document)
+  headers[FILL_REPORT_SUMMARY_HEADER] = summary_header(report)
+  if url is not None:
+    headers[FILL_REPORT_URL_HEADER] = url
+
 @app.get('/')
 async def root():
   """根路径"""
@@ -69,52 +236,118 @@ async def health_check():
 
 @app.post('/api/v1/parse-form')
 async def parse_pdf_form(
-  file: UploadFile = File(...),
-  engine: str = Form("enhanced_fillpdf")
+  background_tasks: BackgroundTasks,
+  file: Optional[UploadFile] = File(None),
+  engine: str = Form("enhanced_fillpdf"),
+  pages: Optional[str] = Form(None),
+  stream: bool = Form(False),
+  field_attributes: Optional[str] = Form(None, alias='fields'),
+  mode: Optional[str] = Form(None),
+  x_content_sha256: Optional[str] = Header(None)
 ):
   """
   解析PDF表单字段
   
   Args:
-    file: 上传的PDF文件
+    file: 上传的PDF文件；提供 X-Content-SHA256 且服务端已有该模板时可省略
     engine: 解析引擎选择，可选值：
       - "standard": 使用标准PyPDF2方法（推荐，兼容性最好）
       - "enhanced": 使用增强解析引擎（支持文本识别）
       - "fillpdf": 使用原始fillpdf库解析
       - "enhanced_fillpdf": 使用增强版fillpdf库解析（支持子字段）
+      - "pymupdf": 使用PyMuPDF解析（字段格式与enhanced_fillpdf一致，大模板更快）
+    pages: 只返回这些页面上的字段，如 "3-5,7"（页码从 1 开始），默认全部页面
+    stream: 流式模式，以 NDJSON（application/x-ndjson）返回：每行 {"type": "field", "field": {...}}，
+      最后一行 {"type": "summary", ...} 包含 field_count 和实际使用的引擎，中途出错时最后一行为 {"type": "error"}。
+      pymupdf 引擎逐页解析并在每页处理完后立即发送该页的字段（字段按页面顺序，结果不写入模板缓存），
+      其他引擎解析完成后再逐行发送
+    fields: 只返回这些字段属性，如 "name,type,page"（name 总是返回），可选属性见 field_projection.FIELD_ATTRIBUTES；
+      未请求的属性（标签、标志位含义、选项、位置等）在引擎中不会被计算
+    mode: full（默认，全部属性）或 lite（只返回 name 和 type）；同时指定 fields 时以 fields 为准
+    x_content_sha256: 模板内容的 SHA-256（请求头 X-Content-SHA256），
+      只提供哈希而服务端没有该模板时返回 428，客户端需重新上传文件
+    
+  启用影子比对（SHADOW_ENGINE）时，被采样的请求在响应发送后用影子引擎重新解析并比较结果
     
   Returns:
     JSON格式的字段列表
   """
+  timer = current_timer()
+  # 处理函数开始执行前的耗时即为上传及multipart解析耗时
+  timer.add_since_start('upload')
+  source = None
   try:
-    logger.info(f'开始解析PDF表单: {file.filename}, 引擎: {engine}')
+    logger.info(f'开始解析PDF表单: {file.filename if file else x_content_sha256}, 引擎: {engine}')
     
-    # 验证文件类型
-    if not file.filename or not file.filename.lower().endswith('.pdf'):
-      raise HTTPException(status_code=400, detail='只支持PDF文件')
+    # 解析页码范围，只解码这些页面上的字段；解析字段属性投影，只计算请求的属性
+    try:
+      page_set = parse_page_ranges(pages)
+      projection = parse_field_projection(field_attributes, mode)
+    except ValueError as e:
+      raise HTTPException(status_code=400, detail=str(e))
+    
+    # 查询共享模板缓存，命中时直接返回任一工作进程已解析过的结果
+    template_sha, source, filename = await resolve_template(file, x_content_sha256)
+    set_attributes(**{'pdf.template_sha256': template_sha, 'pdf.engine': engine})
+    cache_name = parse_cache_name(engine, page_set, projection)
+    cached = template_cache.get_meta(template_sha, cache_name)
+    if cached is None and projection is not None:
+      # 已缓存完整结果时直接取其中请求的属性
+      cached = template_cache.get_meta(template_sha, parse_cache_name(engine, page_set))
+      if cached is not None:
+        cached = {**cached, 'fields': project_fields(cached['fields'], projection)}
+    if cached is not None:
+      fields = cached['fields']
+      logger.info(f'命中模板缓存 {template_sha[:12]}，跳过解析，共 {len(fields)} 个字段')
+      timer.engine = cached['engine']
+      set_attributes(**{'pdf.cache': 'hit', 'pdf.field_count': len(fields)})
+      result = {
+        'success': True,
+        'message': f'PDF表单解析成功 (引擎: {cached["engine"]})',
+        'engine': cached['engine'],
+        'fields': fields,
+        'field_count': len(fields)
+      }
+      if cached.get('coverage'):
+        add_text_scan_coverage(result, cached['coverage'])
+      return parse_response(result, stream)
+    
+    # 流式模式下 pymupdf 引擎逐页输出，不在内存中保留完整的字段列表
+    if stream and engine == 'pymupdf':
+      logger.info('使用PyMuPDF引擎流式解析表单')
+      response = StreamingResponse(stream_parse_pages(source, page_set, projection), media_type=NDJSON_MEDIA_TYPE)
+      # 模板由流式输出负责关闭
+      source = None
+      return response
     
     # 选择解析引擎
     if engine == "standard":
       logger.info('使用标准PyPDF2引擎解析表单')
-      fields = await pdf_service_pypdf.parse_form_fields(file)
+      with stage('engine.standard'):
+        fields = await profiled(pdf_service_pypdf.parse_form_fields, source, page_set, projection)
     elif engine == "enhanced": 
       logger.info('使用增强引擎解析表单')
-      fields = await pdf_service.parse_form_fields(file)
+      with stage('engine.enhanced'):
+        fields = await profiled(pdf_service.parse_form_fields, source, page_set, projection)
     elif engine == "fillpdf":
       logger.info('使用原始fillpdf引擎解析表单')
-      fields = await pdf_service_fillpdf.parse_form_fields(file)
+      with stage('engine.fillpdf'):
+        fields = await profiled(pdf_service_fillpdf.parse_form_fields, source, page_set, projection)
     elif engine == "enhanced_fillpdf":
       logger.info('使用增强版fillpdf引擎解析表单（支持子字段）')
       try:
-        fields = await pdf_service_enhanced_fillpdf.parse_form_fields(file)
+        with stage('engine.enhanced_fillpdf'):
+          fields = await profiled(pdf_service_enhanced_fillpdf.parse_form_fields, source, page_set, projection)
         logger.info(f'增强版fillpdf引擎解析成功，发现 {len(fields)} 个字段')
       except Exception as e:
         logger.warning(f'增强版fillpdf引擎解析失败: {str(e)}')
         logger.info('自动切换到standard引擎进行解析')
         try:
           # 重置文件指针到开始位置
-          await file.seek(0)
-          fields = await pdf_service_pypdf.parse_form_fields(file)
+          await source.seek(0)
+          with span('fallback', **{'fallback.from': 'enhanced_fillpdf', 'fallback.to': 'standard'}), \
+              stage('engine.standard'):
+            fields = await profiled(pdf_service_pypdf.parse_form_fields, source, page_set, projection)
           logger.info(f'standard引擎解析成功，发现 {len(fields)} 个字段')
           # 更新引擎名称以反映实际使用的引擎
           engine = 'enhanced_fillpdf_fallback_to_standard'
@@ -122,35 +355,242 @@ async def parse_pdf_form(
           logger.error(f'standard引擎也解析失败: {str(fallback_e)}')
           # 抛出fallback错误而不是原始错误
           raise fallback_e
+    elif engine == "pymupdf":
+      logger.info('使用PyMuPDF引擎解析表单')
+      with stage('engine.pymupdf'):
+        fields = await profiled(pdf_service_pymupdf.parse_form_fields, source, page_set, projection)
     else:
       raise HTTPException(status_code=400, detail=f'不支持的引擎类型: {engine}')
     
     logger.info(f'PDF表单解析完成，发现 {len(fields)} 个字段')
+    timer.engine = engine
+    set_attributes(**{'pdf.engine_used': engine, 'pdf.field_count': len(fields)})
     
-    return {
+    fields = jsonable_encoder(fields)
+    # 通过文本识别得到的字段附带页面覆盖情况，大文档模式下可能只覆盖部分页面
+    coverage = current_text_scan_coverage()
+    # 因耗时预算停止的结果取决于当时的负载，不写入缓存
+    if coverage is None or coverage.stopped_by != STOPPED_BY_TIME_BUDGET:
+      template_cache.put_meta(template_sha, cache_name, {
+        'engine': engine,
+        'fields': fields,
+        'coverage': coverage.to_dict() if coverage else None
+      })
+    
+    # 影子比对：响应发送后在后台用另一个引擎解析同一模板
+    comparison, shadow_service, content = await start_shadow('parse', engine, source, template_sha)
+    if comparison is not None:
+      background_tasks.add_task(
+        submit_shadow, comparison, run_parse_shadow, shadow_service, content, filename, page_set, fields, projection
+      )
+    
+    result = {
       'success': True,
       'message': f'PDF表单解析成功 (引擎: {engine})',
       'engine': engine,
       'fields': fields,
       'field_count': len(fields)
     }
+    if coverage is not None:
+      add_text_scan_coverage(result, coverage.to_dict())
+    return parse_response(result, stream)
     
+  except HTTPException:
+    raise
   except Exception as e:
     logger.error(f'解析PDF表单失败: {str(e)}')
     raise HTTPException(status_code=500, detail=f'解析PDF表单失败: {str(e)}')
+  finally:
+    await close_template(source)
+
+def ndjson_line(record: Dict[str, Any]) -> bytes:
+  """NDJSON 响应中的一行"""
+  return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+def parse_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+  """流式解析的最后一行：解析结果中除字段列表以外的内容"""
+  return {'type': 'summary', **{key: value for key, value in result.items() if key != 'fields'}}
+
+async def stream_parse_result(result: Dict[str, Any]):
+  """把已完成的解析结果按 NDJSON 输出（每行一个字段，最后一行为汇总）"""
+  fields = result['fields']
+  for start in range(0, len(fields), NDJSON_CHUNK_FIELDS):
+    chunk = jsonable_encoder(fields[start:start + NDJSON_CHUNK_FIELDS])
+    yield b''.join(ndjson_line({'type': 'field', 'field': field}) for field in chunk)
+  yield ndjson_line(jsonable_encoder(parse_summary(result)))
+
+async def stream_parse_pages(source, page_set, projection=None):
+  """
+  用 pymupdf 引擎逐页解析并输出 NDJSON，每处理完一页立即发送该页上的字段
+
+  响应开始发送后发生的错误以 {"type": "error"} 行报告；模板在输出结束后关闭
+  """
+  timer = current_timer()
+  field_count = 0
+  try:
+    with stage('engine.pymupdf'):
+      async for fields in pdf_service_pymupdf.iter_form_fields(source, page_set, projection):
+        field_count += len(fields)
+        yield b''.join(ndjson_line({'type': 'field', 'field': field}) for field in jsonable_encoder(fields))
+    logger.info(f'PDF表单流式解析完成，发现 {field_count} 个字段')
+    timer.engine = 'pymupdf'
+    set_attributes(**{'pdf.engine_used': 'pymupdf', 'pdf.field_count': field_count})
+    yield ndjson_line(parse_summary({
+      'success': True,
+      'message': 'PDF表单解析成功 (引擎: pymupdf)',
+      'engine': 'pymupdf',
+      'field_count': field_count
+    }))
+  except Exception as e:
+    logger.error(f'流式解析PDF表单失败: {str(e)}')
+    yield ndjson_line({'type': 'error', 'success': False, 'error': f'解析PDF表单失败: {str(e)}'})
+  finally:
+    await close_template(source)
+
+def add_text_scan_coverage(result: Dict[str, Any], coverage: Dict[str, Any]):
+  """附加文本识别的页面覆盖情况（TextScanCoverage.to_dict），只识别了部分页面时在消息中说明（命中缓存时相同）"""
+  result['coverage'] = coverage
+  if not coverage['complete']:
+    result['message'] += f'，仅识别了 {coverage["pages_scanned"]}/{coverage["pages_total"]} 页'
+
+def parse_response(result: Dict[str, Any], stream: bool):
+  """解析接口的响应：默认为 JSON，流式模式下为 NDJSON"""
+  if stream:
+    return StreamingResponse(stream_parse_result(result), media_type=NDJSON_MEDIA_TYPE)
+  return result
+
+def batch_record(index: int, filename: str, sha: Optional[str], parsed: Optional[Dict[str, Any]] = None,
+                 cached: bool = False, error: Optional[str] = None) -> bytes:
+  """批量解析中一个文件的 NDJSON 结果行"""
+  record = {'type': 'result', 'index': index, 'filename': filename, 'sha256': sha, 'success': error is None}
+  if error is not None:
+    record['error'] = error
+  else:
+    record.update({
+      'cached': cached,
+      'engine': parsed['engine'],
+      'fields': parsed['fields'],
+      'field_count': len(parsed['fields'])
+    })
+    if parsed.get('coverage'):
+      record['coverage'] = parsed['coverage']
+  return ndjson_line(record)
+
+@app.post('/api/v1/parse-form/batch')
+async def parse_pdf_form_batch(
+  files: List[UploadFile] = File(...),
+  engine: str = Form("enhanced_fillpdf"),
+  pages: Optional[str] = Form(None)
+):
+  """
+  批量解析PDF表单字段
+  
+  Args:
+    files: 多个PDF文件，也可以是包含PDF的ZIP文件（展开后逐个解析）
+    engine: 解析引擎，可选值与 /api/v1/parse-form 相同
+    pages: 只返回这些页面上的字段，如 "3-5,7"（页码从 1 开始），对所有文件生效
+    
+  文件分发到进程池（BATCH_PARSE_PROCESSES）并行解析，已缓存的结果直接返回；
+  内容相同（SHA-256 相同）的文件只解析一次，重复的文件返回同一结果（cached 为 true）；
+  上传的模板写入共享模板缓存，之后可以只通过 X-Content-SHA256 填充或解析
+    
+  Returns:
+    NDJSON（application/x-ndjson），每个文件解析完成后立即返回一行：
+      {"type": "result", "index", "filename", "sha256", "success", "cached", "engine", "fields", "field_count"}
+      失败的文件 success 为 false 并附带 error（不包含服务端路径），不影响其他文件
+    最后一行为 {"type": "summary", "file_count", "succeeded", "failed", "cached"}
+  """
+  timer = current_timer()
+  timer.add_since_start('upload')
+  
+  if engine not in ENGINE_SERVICES:
+    raise HTTPException(status_code=400, detail=f'不支持的引擎类型: {engine}')
+  try:
+    page_set = parse_page_ranges(pages)
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  
+  with stage('read'):
+    items = await expand_uploads(files)
+  if len(items) > settings.BATCH_PARSE_MAX_FILES:
+    raise HTTPException(status_code=400, detail=f'一次最多解析 {settings.BATCH_PARSE_MAX_FILES} 个文件')
+  logger.info(f'开始批量解析PDF表单: {len(items)} 个文件, 引擎: {engine}')
+  timer.engine = engine
+  set_attributes(**{'pdf.engine': engine, 'pdf.file_count': len(items)})
+  
+  # 按 SHA-256 去重并查询共享模板缓存：已解析过的文件和无效的文件直接返回，
+  # 内容相同的文件只把第一个交给进程池，其余在它完成时返回同一结果
+  cache_name = parse_cache_name(engine, page_set)
+  ready = []
+  documents = []
+  shas = {}
+  first_index = {}
+  duplicates = {}
+  with stage('cache'):
+    for index, (filename, content, error) in enumerate(items):
+      if error is not None:
+        ready.append((index, None, error, False))
+        continue
+      shas[index] = content_sha256(content)
+      if shas[index] in first_index:
+        duplicates.setdefault(first_index[shas[index]], []).append(index)
+        continue
+      first_index[shas[index]] = index
+      cached = template_cache.get_meta(shas[index], cache_name)
+      if cached is not None:
+        ready.append((index, cached, None, True))
+        continue
+      template_cache.put_template(content, shas[index])
+      documents.append((index, filename, content))
+  filenames = [filename for filename, _, _ in items]
+  del items
+  if duplicates:
+    logger.info(f'批量解析中有 {sum(len(group) for group in duplicates.values())} 个重复文件，不再重复解析')
+  
+  async def stream():
+    counts = {'succeeded': 0, 'failed': 0, 'cached': 0}
+    
+    def records(index, parsed, error, cached):
+      # 重复的文件与第一个文件的结果相同，视为命中缓存
+      for position, target in enumerate([index] + duplicates.get(index, [])):
+        hit = error is None and (cached or position > 0)
+        counts['failed' if error is not None else 'succeeded'] += 1
+        counts['cached'] += hit
+        yield batch_record(target, filenames[target], shas.get(target), parsed, hit, error)
+    
+    for index, parsed, error, cached in ready:
+      for line in records(index, parsed, error, cached):
+        yield line
+    async for index, parsed, error in map_documents(engine, documents, page_set):
+      if error is not None:
+        logger.warning(f'批量解析 {filenames[index]} 失败: {error}')
+      elif parsed.pop('cacheable'):
+        template_cache.put_meta(shas[index], cache_name, parsed)
+      for line in records(index, parsed, error, False):
+        yield line
+    
+    logger.info(f'批量解析完成: 成功 {counts["succeeded"]} 个, 失败 {counts["failed"]} 个')
+    yield ndjson_line({'type': 'summary', 'file_count': len(filenames), **counts})
+  
+  return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
 
 @app.post('/api/v1/fill-form')
 async def fill_pdf_form(
+  background_tasks: BackgroundTasks,
   form_data: str = Form(...),
-  file: UploadFile = File(...),
+  file: Optional[UploadFile] = File(None),
   strict_validation: bool = Form(True),
-  engine: str = Form("enhanced_fillpdf")
+  engine: str = Form("enhanced_fillpdf"),
+  output: str = Form("default"),
+  report: bool = Form(False),
+  if_none_match: Optional[str] = Header(None),
+  x_content_sha256: Optional[str] = Header(None)
 ):
   """
   填充PDF表单
   
   Args:
-    file: 原始PDF表单文件
+    file: 原始PDF表单文件；提供 X-Content-SHA256 且服务端已有该模板时可省略
     form_data: 表单数据，包含字段名和值的映射
     strict_validation: 是否严格验证字段选项，默认为 True
     engine: 填充引擎选择，可选值：
@@ -158,19 +598,38 @@ async def fill_pdf_form(
       - "enhanced": 使用增强引擎（支持子字段处理）  
       - "fillpdf": 使用原始fillpdf库（传统方法）
       - "enhanced_fillpdf": 使用增强版fillpdf库（支持所有字段类型和子字段）
+      - "pymupdf": 使用PyMuPDF填充（接受enhanced_fillpdf格式的字段，写入 /V 并设置 /NeedAppearances，由阅读器生成外观）
+    output: 输出模式，可选值：
+      - "default": 直接返回引擎写出的文件
+      - "compact": 压缩对象流、删除未引用对象并合并重复流，以CPU换带宽
+    report: 是否生成填充报告（由引擎在写入时记录，不重新解析输出），报告列出每个提交字段的结果：
+      matched（直接写入）、mapped（映射到其他字段名后写入）、unmatched（未写入）、rejected（值不在可选值中），
+      响应头 X-Fill-Report-URL 给出报告地址，X-Fill-Report-Summary 给出各类字段数
+    if_none_match: 客户端已持有结果的 ETag，与本次结果相同时返回 304
+    x_content_sha256: 模板内容的 SHA-256（请求头 X-Content-SHA256），
+      只提供哈希而服务端没有该模板时返回 428，客户端需重新上传文件
+    
+  模板、字段数据、引擎和选项都相同的请求直接返回缓存的填充结果（X-Result-Cache: hit），
+  响应附带输出内容的 ETag
+    
+  启用影子比对（SHADOW_ENGINE）时，被采样的请求在响应发送后用影子引擎重新填充，
+  并比较两份输出中的字段值
     
   Returns:
     填充后的PDF文件
   """
+  timer = current_timer()
+  # 处理函数开始执行前的耗时即为上传及multipart解析耗时
+  timer.add_since_start('upload')
+  source = None
   try:
-    logger.info(f'开始填充PDF表单: {file.filename}, 引擎: {engine}')
+    logger.info(f'开始填充PDF表单: {file.filename if file else x_content_sha256}, 引擎: {engine}')
     
-    # 验证文件类型
-    if not file.filename or not file.filename.lower().endswith('.pdf'):
-      raise HTTPException(status_code=400, detail='只支持PDF文件')
+    # 验证输出模式
+    if output not in OUTPUT_MODES:
+      raise HTTPException(status_code=400, detail=f'不支持的输出模式: {output}')
     
     # 解析 JSON 字符串
-    import json
     form_data_obj = json.loads(form_data)
     
     if not form_data_obj or 'fields' not in form_data_obj:
@@ -179,32 +638,79 @@ async def fill_pdf_form(
     # 转换字段数据格式
     fields_data = form_data_obj['fields']
     
+    # 获取模板：上传的文件写入共享模板缓存，或按 X-Content-SHA256 使用缓存中已有的模板
+    template_sha, source, filename = await resolve_template(file, x_content_sha256)
+    set_attributes(**{
+      'pdf.template_sha256': template_sha,
+      'pdf.engine': engine,
+      'pdf.field_count': len(fields_data),
+      'pdf.output_mode': output
+    })
+    fill_report = start_fill_report(fields_data) if report else None
+    
+    # 查询填充结果缓存，命中时直接返回已保存的输出
+    result_key = fill_result_key(template_sha, engine, fields_data, strict_validation, output)
+    with stage('cache'):
+      cached = get_fill_result(result_key)
+    if cached is not None and report and 'report' not in cached[1]:
+      # 缓存的结果没有填充报告，重新填充以生成报告
+      template_cache.release_lease(cached[0])
+      cached = None
+    if cached is not None:
+      cached_path, cached_meta = cached
+      # 响应发送后归还租用的输出文件
+      background_tasks.add_task(template_cache.release_lease, cached_path)
+      logger.info(f'命中填充结果缓存 {result_key[:12]}，跳过填充')
+      timer.engine = cached_meta['engine']
+      set_attributes(**{'pdf.cache': 'hit'})
+      response_headers = {**cached_meta['headers'], 'ETag': cached_meta['etag'], 'X-Result-Cache': 'hit'}
+      if report:
+        publish_fill_report(cached_meta['report'], cached_meta['engine'], template_sha, response_headers)
+      if etag_matches(if_none_match, cached_meta['etag']):
+        return Response(status_code=304, headers=response_headers)
+      return FileResponse(
+        path=str(cached_path),
+        filename=f'filled_{filename}',
+        media_type='application/pdf',
+        headers=response_headers
+      )
+    
     # 选择填充引擎
     if engine == "standard":
       # 使用标准PyPDF2方法 - 兼容性最好（推荐）
       logger.info('使用标准PyPDF2引擎填充表单（兼容性最好）')
-      output_path = await pdf_service_pypdf.fill_form(file, fields_data, strict_validation)
+      with stage('engine.standard'):
+        output_path = await profiled(pdf_service_pypdf.fill_form, source, fields_data, strict_validation)
     elif engine == "enhanced":
       # 使用增强型引擎 - 支持多种字段类型和子字段
       logger.info('使用增强引擎填充表单（支持子字段处理）')
-      output_path = await pdf_service.fill_form(file, fields_data, strict_validation)
+      with stage('engine.enhanced'):
+        output_path = await profiled(pdf_service.fill_form, source, fields_data, strict_validation)
     elif engine == "fillpdf":
       # 使用原始 fillpdf 引擎 - 传统选项
       logger.info('使用原始fillpdf引擎填充表单（传统模式）')
-      output_path = await pdf_service_fillpdf.fill_form(file, fields_data, strict_validation)
+      with stage('engine.fillpdf'):
+        output_path = await profiled(pdf_service_fillpdf.fill_form, source, fields_data, strict_validation)
     elif engine == "enhanced_fillpdf":
       # 使用增强版 fillpdf 引擎 - 支持所有字段类型和子字段
       logger.info('使用增强版fillpdf引擎填充表单（支持所有字段类型和子字段）')
       try:
-        output_path = await pdf_service_enhanced_fillpdf.fill_form(file, fields_data, strict_validation)
+        with stage('engine.enhanced_fillpdf'):
+          output_path = await profiled(pdf_service_enhanced_fillpdf.fill_form, source, fields_data, strict_validation)
         logger.info(f'增强版fillpdf引擎填充成功: {output_path}')
+      except InvalidFieldValueError:
+        raise
       except Exception as e:
         logger.warning(f'增强版fillpdf引擎填充失败: {str(e)}')
         logger.info('自动切换到standard引擎进行填充')
         try:
-          # 重置文件指针到开始位置
-          await file.seek(0)
-          output_path = await pdf_service_pypdf.fill_form(file, fields_data, strict_validation)
+          # 重置文件指针到开始位置，丢弃失败引擎已记录的填充报告
+          await source.seek(0)
+          if fill_report is not None:
+            fill_report.reset()
+          with span('fallback', **{'fallback.from': 'enhanced_fillpdf', 'fallback.to': 'standard'}), \
+              stage('engine.standard'):
+            output_path = await profiled(pdf_service_pypdf.fill_form, source, fields_data, strict_validation)
           logger.info(f'standard引擎填充成功: {output_path}')
           # 更新引擎名称以反映实际使用的引擎
           engine = 'enhanced_fillpdf_fallback_to_standard'
@@ -212,24 +718,67 @@ async def fill_pdf_form(
           logger.error(f'standard引擎也填充失败: {str(fallback_e)}')
           # 抛出fallback错误而不是原始错误
           raise fallback_e
+    elif engine == "pymupdf":
+      logger.info('使用PyMuPDF引擎填充表单')
+      with stage('engine.pymupdf'):
+        output_path = await profiled(pdf_service_pymupdf.fill_form, source, fields_data, strict_validation)
     else:
       raise HTTPException(status_code=400, detail=f'不支持的引擎类型: {engine}')
     
     logger.info(f'PDF表单填充完成: {output_path}')
+    timer.engine = engine
+    set_attributes(**{'pdf.engine_used': engine})
+    
+    # 按请求对输出文件进行压缩优化
+    response_headers = {'X-Output-Mode': output}
+    if output == OUTPUT_MODE_COMPACT:
+      with stage('optimize'):
+        optimize_stats = optimize_pdf(output_path)
+      response_headers.update({
+        'X-Output-Input-Bytes': str(optimize_stats['input_bytes']),
+        'X-Output-Bytes': str(optimize_stats['output_bytes']),
+        'X-Output-Optimize-Ms': str(optimize_stats['elapsed_ms'])
+      })
+    
+    # 保存填充结果，相同请求再次到达时直接返回
+    report_data = fill_report.to_dict() if fill_report is not None else None
+    with stage('cache'):
+      etag = put_fill_result(result_key, output_path, engine, response_headers, report_data)
+    response_headers.update({'ETag': etag, 'X-Result-Cache': 'miss'})
+    if report_data is not None:
+      publish_fill_report(report_data, engine, template_sha, response_headers)
+    
+    # 影子比对：响应发送后在后台用另一个引擎填充同一模板
+    comparison, shadow_service, content = await start_shadow('fill', engine, source, template_sha)
+    if comparison is not None:
+      background_tasks.add_task(
+        submit_shadow, comparison, run_fill_shadow, shadow_service, pdf_service_enhanced_fillpdf,
+        content, filename, fields_data, strict_validation, output_path
+      )
     
     # 返回填充后的PDF文件
+    if etag_matches(if_none_match, etag):
+      return Response(status_code=304, headers=response_headers)
     return FileResponse(
       path=output_path,
-      filename=f'filled_{file.filename}',
-      media_type='application/pdf'
+      filename=f'filled_{filename}',
+      media_type='application/pdf',
+      headers=response_headers
     )
     
+  except HTTPException:
+    raise
   except json.JSONDecodeError as e:
     logger.error(f'JSON解析失败: {str(e)}')
     raise HTTPException(status_code=400, detail=f'JSON格式错误: {str(e)}')
+  except InvalidFieldValueError as e:
+    # 严格验证模式下字段值不在可选值中
+    raise HTTPException(status_code=400, detail=f'字段值验证失败: {str(e)}')
   except Exception as e:
     logger.error(f'填充PDF表单失败: {str(e)}')
     raise HTTPException(status_code=500, detail=f'填充PDF表单失败: {str(e)}')
+  finally:
+    await close_template(source)
 
 @app.post('/api/v1/parse-form-sample')
 async def parse_pdf_form_fillpdf(file: UploadFile = File(...)):
@@ -307,11 +856,68 @@ async def parse_sample_form():
     logger.error(f'解析示例PDF表单失败: {str(e)}')
     raise HTTPException(status_code=500, detail=f'解析示例PDF表单失败: {str(e)}')
 
+@app.get('/debug/profiles/{profile_id}')
+async def get_profile(profile_id: str, format: str = 'prof'):
+  """
+  下载请求的性能剖析结果
+
+  Args:
+    profile_id: 剖析ID（服务端生成，见响应头 X-Profile-URL）
+    format: "prof" 返回 cProfile 原始文件（可用 snakeviz / pstats 查看），
+            "text" 返回按累计耗时排序的文本摘要
+
+  Returns:
+    剖析文件或文本摘要
+  """
+  if not settings.PROFILING_ENABLED:
+    raise HTTPException(status_code=404, detail='性能剖析未启用')
+
+  path = profile_path(profile_id)
+  if path is None or not path.exists():
+    raise HTTPException(status_code=404, detail='剖析结果不存在')
+
+  if format == 'text':
+    return PlainTextResponse(profile_summary(path))
+
+  return FileResponse(
+    path=str(path),
+    filename=path.name,
+    media_type='application/octet-stream'
+  )
+
+@app.get('/api/v1/fill-reports/{report_id}')
+async def get_fill_report(report_id: str):
+  """
+  获取填充报告
+
+  Args:
+    report_id: 报告ID（服务端生成，见响应头 X-Fill-Report-URL）
+
+  Returns:
+    JSON格式的报告：summary 为各类字段数，fields 按提交顺序列出每个字段的结果和原因
+  """
+  path = fill_report_path(report_id)
+  if path is None or not path.exists():
+    raise HTTPException(status_code=404, detail='填充报告不存在')
+  return FileResponse(path=str(path), media_type='application/json')
+
+@app.get('/debug/shadow')
+async def get_shadow_stats():
+  """
+  影子比对的累计统计（当前工作进程），逐条差异见 SHADOW_REPORT_FILE
+
+  Returns:
+    影子引擎、采样率、排队任务数及比对/一致/不一致/失败/跳过的次数
+  """
+  if not settings.SHADOW_ENGINE:
+    raise HTTPException(status_code=404, detail='影子比对未启用')
+  return shadow_stats()
+
 if __name__ == '__main__':
   uvicorn.run(
     'app.main:app',
-    host='0.0.0.0',
+    host=settings.HOST,
     port=settings.PORT,
-    reload=True,
+    reload=settings.DEBUG,
     log_level='info'
   )
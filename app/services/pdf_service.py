@@ -1,10 +1,14 @@
 import PyPDF2
+import fitz
 import io
+import re
 import os
 import uuid
+import contextvars
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, FrozenSet, Optional, Set, Tuple
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 from loguru import logger
 import aiofiles
 from reportlab.pdfgen import canvas
@@ -13,6 +17,179 @@ import tempfile
 from datetime import datetime
 
 from app.utils.config import settings
+from app.utils.request_context import stage
+from app.utils.tracing import set_attributes
+from app.utils.logger import field_logging
+from app.utils.fill_report import current_fill_report
+from app.utils.mapped_template import open_pdf_stream, template_path, release_template
+from app.utils.page_ranges import widget_pages_by_name, field_in_pages, field_page
+from app.utils.field_projection import wants, project_fields
+from app.utils.text_scan import (
+  iter_page_texts, open_text_document, close_text_document,
+  candidate_pages, parallel_scan_enabled, map_page_chunks
+)
+
+# 文本识别的字段标记，支持简繁中文和英文
+# 复选框标记
+CHECKBOX_INDICATORS = (
+  # 通用符号
+  '□', '☐', '☑', '☒', '[ ]', '[x]', '[X]', '☐', '☑', '☒',
+  # 简体中文
+  '□ 是', '□ 否', '□ 同意', '□ 不同意', '□ 有', '□ 无',
+  # 繁体中文
+  '□ 是', '□ 否', '□ 同意', '□ 不同意', '□ 有', '□ 無',
+  # 英文
+  '□ Yes', '□ No', '□ Agree', '□ Disagree', '□ Yes/No',
+  '[ ] Yes', '[ ] No', '[ ] Agree', '[ ] Disagree',
+  # 混合语言
+  '□ 是/否', '□ Yes/No', '□ 同意/不同意', '□ Agree/Disagree'
+)
+
+# 选择框标记
+SELECT_INDICATORS = (
+  # 简体中文
+  '请选择', '选择', '下拉', '选项', '□ 男 □ 女', '□ 已婚 □ 未婚',
+  # 繁体中文
+  '請選擇', '選擇', '下拉', '選項', '□ 男 □ 女', '□ 已婚 □ 未婚',
+  # 英文
+  'Please select', 'Select', 'Choose', 'Option', 'Dropdown',
+  '□ Male □ Female', '□ Married □ Single', '□ Yes □ No',
+  # 混合语言
+  '请选择/Please select', '选择/Select',
+  # 特殊字段识别：Language字段的选项列表模式
+  'English German French Italian'
+)
+
+# Language字段的选项，同一行中同时出现（顺序不限）时识别为选择框
+LANGUAGE_OPTIONS = ('English', 'German', 'French', 'Italian')
+
+# 单选按钮标记
+RADIO_INDICATORS = (
+  # 通用符号
+  '○', '●', '○ 是 ○ 否', '● 是 ○ 否',
+  # 简体中文
+  '○ 是', '○ 否', '● 是', '● 否',
+  # 繁体中文
+  '○ 是', '○ 否', '● 是', '● 否',
+  # 英文
+  '○ Yes', '○ No', '● Yes', '● No', '○ Yes ○ No', '● Yes ○ No',
+  # 混合语言
+  '○ 是/Yes', '○ 否/No'
+)
+
+# 必填标记
+REQUIRED_INDICATORS = (
+  # 通用符号
+  '*', '（必填）', '(必填)', '（必選）', '(必選)',
+  # 简体中文
+  '必填', '必选', '必填项', '必选项', '（必填）', '(必填)',
+  # 繁体中文
+  '必填', '必選', '必填項', '必選項', '（必填）', '(必填)',
+  # 英文
+  'required', 'Required', 'REQUIRED', 'Required field',
+  'Mandatory', 'MANDATORY', '(Required)', '(required)',
+  # 混合语言
+  '必填/Required', '必选/Required'
+)
+
+
+def _compile_line_matcher():
+  """
+  把所有字段标记编译为一个多模式正则，一次扫描即可得到一行中出现的全部标记类别
+
+  finditer 的匹配互不重叠，为了不漏掉与前一个匹配重叠的标记（如 "必选项" 中的 "选项"），
+  额外加入首尾重叠的标记拼接而成的组合标记；同一位置优先匹配最长的标记，
+  每个标记的类别为其包含的所有基础标记的类别之和，因此结果与逐个子串查找完全一致
+
+  Returns:
+    (正则, 标记 -> 类别集合)
+  """
+  base = {}
+  for kind, indicators in (
+    ('checkbox', CHECKBOX_INDICATORS),
+    ('select', SELECT_INDICATORS),
+    ('radio', RADIO_INDICATORS),
+    ('required', REQUIRED_INDICATORS),
+    ('text', (':',))
+  ):
+    for indicator in indicators:
+      base.setdefault(indicator, set()).add(kind)
+  for option in LANGUAGE_OPTIONS:
+    base.setdefault(option, set()).add(option)
+
+  markers = set(base)
+  while True:
+    combined = set()
+    for head in markers:
+      for tail in markers:
+        for size in range(1, min(len(head), len(tail))):
+          if head[-size:] == tail[:size] and head + tail[size:] not in markers:
+            combined.add(head + tail[size:])
+    if not combined:
+      break
+    markers |= combined
+
+  kinds = {
+    marker: frozenset(kind for indicator, indicator_kinds in base.items() if indicator in marker for kind in indicator_kinds)
+    for marker in markers
+  }
+  pattern = re.compile('|'.join(re.escape(marker) for marker in sorted(markers, key=len, reverse=True)))
+  return pattern, kinds
+
+
+_LINE_MARKERS, _MARKER_KINDS = _compile_line_matcher()
+_LANGUAGE_OPTION_SET = frozenset(LANGUAGE_OPTIONS)
+
+
+def classify_line(line: str) -> Tuple[Optional[str], bool]:
+  """
+  一次扫描识别文本行的字段类型，结果与依次调用 PDFService._is_*_field 相同
+
+  Args:
+    line: 去除首尾空白后的文本行
+
+  Returns:
+    (字段类型 checkbox/select/radio/text/required，无法识别时为 None, 该行是否带必填标记)
+  """
+  found = set()
+  for marker in _LINE_MARKERS.findall(line):
+    found |= _MARKER_KINDS[marker]
+
+  required = 'required' in found
+  if 'checkbox' in found:
+    return 'checkbox', required
+  if 'select' in found or _LANGUAGE_OPTION_SET <= found:
+    return 'select', required
+  if 'radio' in found:
+    return 'radio', required
+  if 'text' in found and len(line) < 100:
+    return 'text', required
+  if required:
+    return 'required', required
+  return None, required
+
+_chunk_service = None  # 并行扫描子进程中使用的服务实例
+
+
+def _scan_text_chunk(pdf_path: str, page_numbers: List[int]) -> List[List[Dict[str, Any]]]:
+  """
+  在进程池的子进程中识别一组页面的文本字段
+
+  Args:
+    pdf_path: 文档的文件路径
+    page_numbers: 页码列表（从 1 开始）
+
+  Returns:
+    与 page_numbers 对应的每页字段列表
+  """
+  global _chunk_service
+  if _chunk_service is None:
+    _chunk_service = PDFService()
+  doc = fitz.open(pdf_path)
+  try:
+    return [_chunk_service._identify_page_fields(doc[page - 1].get_text(), page - 1) for page in page_numbers]
+  finally:
+    doc.close()
 
 class PDFService:
   """PDF表单处理服务"""
@@ -27,84 +204,108 @@ class PDFService:
     for directory in directories:
       Path(directory).mkdir(parents=True, exist_ok=True)
   
-  async def parse_form_fields(self, file: UploadFile) -> List[Dict[str, Any]]:
+  async def parse_form_fields(self, file: UploadFile, pages: Optional[Set[int]] = None,
+                              projection: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
     """
     解析PDF表单字段
     
     Args:
       file: 上传的PDF文件
+      pages: 只解析这些页面上的字段（页码从 1 开始），None 表示全部页面
+      projection: 只计算这些字段属性（见 field_projection），None 表示全部属性
       
     Returns:
       字段列表，包含字段名称、类型、位置等信息
     """
     try:
       # 读取PDF文件内容
-      content = await file.read()
-      
-      # 创建PDF读取器
-      pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-      
-      fields = []
-      
-      # 方法1: 从 AcroForm 中获取字段信息（推荐）
-      if pdf_reader.trailer and '/Root' in pdf_reader.trailer:
-        root = pdf_reader.trailer['/Root'].get_object()
-        if root and '/AcroForm' in root:  # type: ignore
-          acro_form = root['/AcroForm'].get_object()  # type: ignore
-          if acro_form and '/Fields' in acro_form:  # type: ignore
-            form_fields = acro_form['/Fields']  # type: ignore
-            for field_ref in form_fields:
-              field_obj = field_ref.get_object()
-              field_info = self._extract_acroform_field_info(field_obj)
-              if field_info:
-                if field_info.get('type') == 'button':
-                  logger.debug(f'跳过按钮字段: {field_info.get("name", "Unknown")}')
-                else:
-                  fields.append(field_info)
+      with stage('read'):
+        pdf_stream = await open_pdf_stream(file)
       
-      # 方法2: 从页面注释中获取字段信息
-      if not fields:
-        for page_num, page in enumerate(pdf_reader.pages):
-          if '/Annots' in page:
-            annotations = page['/Annots']
-            
-            if annotations:
-              # 获取 annotations 的实际值
-              annotations_obj = annotations.get_object()
-              if isinstance(annotations_obj, list):
-                annotation_list = annotations_obj
-              else:
-                annotation_list = [annotations_obj]
-              
-              for annotation in annotation_list:
-                try:
-                  if annotation.get('/Subtype') == '/Widget':  # type: ignore
-                    field_info = self._extract_field_info(annotation, page_num)
-                    if field_info:
-                      if field_info.get('type') == 'button':
-                        logger.debug(f'跳过按钮字段: {field_info.get("name", "Unknown")}')
-                      else:
-                        fields.append(field_info)
-                except (KeyError, AttributeError):
+      with stage('parse'):
+        # 创建PDF读取器
+        pdf_reader = PyPDF2.PdfReader(pdf_stream)
+        set_attributes(**{'pdf.page_count': len(pdf_reader.pages)})
+        
+        fields = []
+        
+        # 扫描一遍页面注释建立 字段名 -> 页码 索引，只完整解码请求页面上的字段（不需要页码时跳过）
+        widget_pages = widget_pages_by_name(pdf_reader) if pages is not None or wants(projection, 'page') else {}
+        
+        # 方法1: 从 AcroForm 中获取字段信息（推荐）
+        if pdf_reader.trailer and '/Root' in pdf_reader.trailer:
+          root = pdf_reader.trailer['/Root'].get_object()
+          if root and '/AcroForm' in root:  # type: ignore
+            acro_form = root['/AcroForm'].get_object()  # type: ignore
+            if acro_form and '/Fields' in acro_form:  # type: ignore
+              form_fields = acro_form['/Fields']  # type: ignore
+              for field_ref in form_fields:
+                field_obj = field_ref.get_object()
+                page_list = widget_pages.get(str(field_obj.get('/T', '')))
+                if not field_in_pages(page_list, pages):
                   continue
-      
-      # 方法3: 如果没有找到表单字段，尝试文本识别
-      if not fields:
-        fields = self._extract_text_fields(pdf_reader)
+                field_info = self._extract_acroform_field_info(field_obj, projection)
+                if field_info:
+                  field_info['page'] = field_page(page_list)
+                  if field_info.get('type') == 'button':
+                    if field_logging():
+                      logger.debug(f'跳过按钮字段: {field_info.get("name", "Unknown")}')
+                  else:
+                    fields.append(field_info)
+        
+        # 指定页面时，只要文档中有表单控件就不再回退到注释扫描和文本识别（请求页面上可能确实没有字段）
+        has_widgets = pages is not None and bool(widget_pages)
+        
+        # 方法2: 从页面注释中获取字段信息
+        if not fields and not has_widgets:
+          for page_num, page in enumerate(pdf_reader.pages):
+            if pages is not None and page_num + 1 not in pages:
+              continue
+            if '/Annots' in page:
+              annotations = page['/Annots']
+              
+              if annotations:
+                # 获取 annotations 的实际值
+                annotations_obj = annotations.get_object()
+                if isinstance(annotations_obj, list):
+                  annotation_list = annotations_obj
+                else:
+                  annotation_list = [annotations_obj]
+                
+                for annotation in annotation_list:
+                  try:
+                    if annotation.get('/Subtype') == '/Widget':  # type: ignore
+                      field_info = self._extract_field_info(annotation, page_num, projection)
+                      if field_info:
+                        if field_info.get('type') == 'button':
+                          if field_logging():
+                            logger.debug(f'跳过按钮字段: {field_info.get("name", "Unknown")}')
+                        else:
+                          fields.append(field_info)
+                  except (KeyError, AttributeError):
+                    continue
+        
+        # 方法3: 如果没有找到表单字段，尝试文本识别
+        if not fields and not has_widgets:
+          # 逐页识别（或等待并行扫描的页块）耗时较长，在线程池中执行，不阻塞事件循环上的其他请求
+          fields = await run_in_threadpool(
+            contextvars.copy_context().run, self._extract_text_fields, pdf_reader, pages, template_path(file)
+          )
       
       logger.info(f'解析到 {len(fields)} 个表单字段')
-      return fields
+      return project_fields(fields, projection)
       
     except Exception as e:
       logger.error(f'解析PDF表单字段失败: {str(e)}')
       raise Exception(f'解析PDF表单字段失败: {str(e)}')
   
-  def _extract_acroform_field_info(self, field_obj) -> Optional[Dict[str, Any]]:
+  def _extract_acroform_field_info(self, field_obj, projection: Optional[FrozenSet[str]] = None) -> Optional[Dict[str, Any]]:
     """
     从 AcroForm 字段对象中提取字段信息
     
     Args:
       field_obj: AcroForm 字段对象
+      projection: 只计算这些属性，未请求的属性为 None（由 parse_form_fields 最后删除）
       
     Returns:
       字段信息字典
@@ -116,24 +317,7 @@ class PDFService:
         field_name = field_name.decode('utf-8', errors='ignore')
       
       # 尝试获取标签文本
-      label = None
-      # 1. 尝试从 TU (tool tip) 获取
-      if '/TU' in field_obj:
-        label = field_obj['/TU']
-        if isinstance(label, bytes):
-          label = label.decode('utf-8', errors='ignore')
-      # 2. 尝试从 TM (mapping name) 获取
-      if not label and '/TM' in field_obj:
-        label = field_obj['/TM']
-        if isinstance(label, bytes):
-          label = label.decode('utf-8', errors='ignore')
-      # 3. 尝试从相关注释获取
-      if not label and '/Parent' in field_obj:
-        parent = field_obj['/Parent'].get_object()
-        if '/TU' in parent:
-          label = parent['/TU']
-          if isinstance(label, bytes):
-            label = label.decode('utf-8', errors='ignore')
+      label = self._extract_label(field_obj) if wants(projection, 'label') else None
       
       # 获取字段类型
       field_type = 'text'  # 默认为文本类型
@@ -164,13 +348,14 @@ class PDFService:
         elif ft == '/Tx':
           field_type = 'text'
       
-      # 获取字段值和子字段信息
-      field_value = field_obj.get('/V', '')
+      # 获取字段值和子字段信息（子字段信息取决于父字段是否有值，三者一起计算）
+      with_value = wants(projection, 'value') or wants(projection, 'is_subfield') or wants(projection, 'subfield_info')
+      field_value = field_obj.get('/V', '') if with_value else ''
       is_subfield = False
       subfield_info = None
       
       # 如果父字段没有值，但有子字段，尝试从子字段获取值
-      if not field_value and '/Kids' in field_obj:
+      if with_value and not field_value and '/Kids' in field_obj:
         kids = field_obj['/Kids']
         if kids and len(kids) > 0:
           is_subfield = True
@@ -186,7 +371,8 @@ class PDFService:
             if kid_value:
               field_value = kid_value
               subfield_info['kid_value_source'] = 0  # 从第0个子字段获取值
-              logger.debug(f'从子字段获取到值: {field_name} = {field_value}')
+              if field_logging():
+                logger.debug(f'从子字段获取到值: {field_name} = {field_value}')
           except Exception as e:
             logger.warning(f'读取子字段值失败: {str(e)}')
       
@@ -200,52 +386,18 @@ class PDFService:
         field_value = 'Yes'
       
       # 获取字段属性
-      field_attributes = {}
-      
-      # 获取最大长度（对于文本字段）
-      if field_type == 'text' and '/MaxLen' in field_obj:
-        max_len = field_obj['/MaxLen']
-        if isinstance(max_len, (int, float)):
-          field_attributes['max_length'] = int(max_len)
-      
-      # 获取字段标志
-      if '/Ff' in field_obj:
-        ff = field_obj['/Ff']
-        if isinstance(ff, (int, float)):
-          flags_int = int(ff)
-          field_attributes['flags'] = flags_int
-          field_attributes['flag_meanings'] = self._parse_field_flags(flags_int)
+      field_attributes = self._extract_attributes(field_obj, field_type) if wants(projection, 'attributes') else None
       
       # 获取选项（对于选择框和单选按钮）
-      options = None
-      if field_type in ['select', 'radio', 'checkbox'] and '/Opt' in field_obj:
-        opt = field_obj['/Opt']
-        if isinstance(opt, list):
-          options = []
-          if field_type in ['select', 'listbox']:
-            # 下拉框/列表框：text 和 value 都是选项文本
-            for option in opt:
-              text = option.decode('utf-8', errors='ignore') if isinstance(option, bytes) else str(option)
-              options.append({'text': text, 'value': text})
-          elif field_type == 'radio':
-            # 单选组：text 是选项文本，value 是索引
-            for idx, option in enumerate(opt):
-              text = option.decode('utf-8', errors='ignore') if isinstance(option, bytes) else str(option)
-              options.append({'text': text, 'value': str(idx)})
-          elif field_type == 'checkbox':
-            # 复选框：固定选项
-            options = [
-              {'text': '选中', 'value': 'Yes'},
-              {'text': '未选中', 'value': 'Off'}
-            ]
+      options = self._extract_options(field_obj, field_type) if wants(projection, 'options') else None
       
       # 获取按钮信息（对于按钮类型）
       button_info = None
-      if field_type == 'button':
+      if field_type == 'button' and wants(projection, 'button_info'):
         button_info = self._extract_button_info(field_obj)
       
       # 获取字段位置
-      rect = field_obj.get('/Rect', [0, 0, 0, 0])
+      position = self._extract_position(field_obj) if wants(projection, 'position') else None
       
       return {
         'name': field_name,
@@ -257,13 +409,8 @@ class PDFService:
         'attributes': field_attributes if field_attributes else None,
         'is_subfield': is_subfield,  # 添加子字段标识
         'subfield_info': subfield_info,  # 添加子字段详细信息
-        'page': 1,  # AcroForm 字段通常在第一页
-        'position': {
-          'x': rect[0],
-          'y': rect[1],
-          'width': rect[2] - rect[0],
-          'height': rect[3] - rect[1]
-        },
+        'page': 1,  # 由调用方按控件页码索引更新
+        'position': position,
         'required': False  # 默认非必填
       }
       
@@ -271,6 +418,83 @@ class PDFService:
       logger.warning(f'提取 AcroForm 字段信息失败: {str(e)}')
       return None
   
+  def _extract_label(self, field_obj) -> Optional[str]:
+    """字段标签：依次取 /TU（提示）、/TM（映射名）和父字段的 /TU"""
+    label = None
+    # 1. 尝试从 TU (tool tip) 获取
+    if '/TU' in field_obj:
+      label = field_obj['/TU']
+      if isinstance(label, bytes):
+        label = label.decode('utf-8', errors='ignore')
+    # 2. 尝试从 TM (mapping name) 获取
+    if not label and '/TM' in field_obj:
+      label = field_obj['/TM']
+      if isinstance(label, bytes):
+        label = label.decode('utf-8', errors='ignore')
+    # 3. 尝试从相关注释获取
+    if not label and '/Parent' in field_obj:
+      parent = field_obj['/Parent'].get_object()
+      if '/TU' in parent:
+        label = parent['/TU']
+        if isinstance(label, bytes):
+          label = label.decode('utf-8', errors='ignore')
+    return label
+  
+  def _extract_attributes(self, field_obj, field_type: str) -> Dict[str, Any]:
+    """字段属性：文本字段的最大长度、标志位及其含义"""
+    field_attributes = {}
+    
+    # 获取最大长度（对于文本字段）
+    if field_type == 'text' and '/MaxLen' in field_obj:
+      max_len = field_obj['/MaxLen']
+      if isinstance(max_len, (int, float)):
+        field_attributes['max_length'] = int(max_len)
+    
+    # 获取字段标志
+    if '/Ff' in field_obj:
+      ff = field_obj['/Ff']
+      if isinstance(ff, (int, float)):
+        flags_int = int(ff)
+        field_attributes['flags'] = flags_int
+        field_attributes['flag_meanings'] = self._parse_field_flags(flags_int)
+    
+    return field_attributes
+  
+  def _extract_options(self, field_obj, field_type: str) -> Optional[List[Dict[str, str]]]:
+    """选择框、单选按钮和复选框的选项，没有 /Opt 时返回 None"""
+    options = None
+    if field_type in ['select', 'radio', 'checkbox'] and '/Opt' in field_obj:
+      opt = field_obj['/Opt']
+      if isinstance(opt, list):
+        options = []
+        if field_type in ['select', 'listbox']:
+          # 下拉框/列表框：text 和 value 都是选项文本
+          for option in opt:
+            text = option.decode('utf-8', errors='ignore') if isinstance(option, bytes) else str(option)
+            options.append({'text': text, 'value': text})
+        elif field_type == 'radio':
+          # 单选组：text 是选项文本，value 是索引
+          for idx, option in enumerate(opt):
+            text = option.decode('utf-8', errors='ignore') if isinstance(option, bytes) else str(option)
+            options.append({'text': text, 'value': str(idx)})
+        elif field_type == 'checkbox':
+          # 复选框：固定选项
+          options = [
+            {'text': '选中', 'value': 'Yes'},
+            {'text': '未选中', 'value': 'Off'}
+          ]
+    return options
+  
+  def _extract_position(self, field_obj) -> Dict[str, Any]:
+    """字段位置（/Rect）"""
+    rect = field_obj.get('/Rect', [0, 0, 0, 0])
+    return {
+      'x': rect[0],
+      'y': rect[1],
+      'width': rect[2] - rect[0],
+      'height': rect[3] - rect[1]
+    }
+  
   def _extract_button_info(self, field_obj) -> Optional[Dict[str, Any]]:
     """
     提取按钮信息
@@ -338,13 +562,14 @@ class PDFService:
     
     return flag_meanings
   
-  def _extract_field_info(self, annotation, page_num: int) -> Optional[Dict[str, Any]]:
+  def _extract_field_info(self, annotation, page_num: int, projection: Optional[FrozenSet[str]] = None) -> Optional[Dict[str, Any]]:
     """
     从PDF注释中提取字段信息
     
     Args:
       annotation: PDF注释对象
       page_num: 页码
+      projection: 只计算这些属性，未请求的属性为 None（由 parse_form_fields 最后删除）
       
     Returns:
       字段信息字典
@@ -359,24 +584,7 @@ class PDFService:
         field_name = field_name.decode('utf-8', errors='ignore')
       
       # 尝试获取标签文本
-      label = None
-      # 1. 尝试从 TU (tool tip) 获取
-      if '/TU' in obj:
-        label = obj['/TU']
-        if isinstance(label, bytes):
-          label = label.decode('utf-8', errors='ignore')
-      # 2. 尝试从 TM (mapping name) 获取
-      if not label and '/TM' in obj:
-        label = obj['/TM']
-        if isinstance(label, bytes):
-          label = label.decode('utf-8', errors='ignore')
-      # 3. 尝试从相关注释获取
-      if not label and '/Parent' in obj:
-        parent = obj['/Parent'].get_object()
-        if '/TU' in parent:
-          label = parent['/TU']
-          if isinstance(label, bytes):
-            label = label.decode('utf-8', errors='ignore')
+      label = self._extract_label(obj) if wants(projection, 'label') else None
       
       # 获取字段类型
       field_type = 'text'  # 默认为文本类型
@@ -408,7 +616,7 @@ class PDFService:
           field_type = 'text'
       
       # 获取字段值
-      field_value = obj.get('/V', '')
+      field_value = obj.get('/V', '') if wants(projection, 'value') else ''
       if isinstance(field_value, bytes):
         field_value = field_value.decode('utf-8', errors='ignore')
       # 处理复选框和单选按钮的值：去掉开头的 "/"
@@ -419,52 +627,18 @@ class PDFService:
         field_value = 'Yes'
       
       # 获取字段属性
-      field_attributes = {}
-      
-      # 获取最大长度（对于文本字段）
-      if field_type == 'text' and '/MaxLen' in obj:
-        max_len = obj['/MaxLen']
-        if isinstance(max_len, (int, float)):
-          field_attributes['max_length'] = int(max_len)
-      
-      # 获取字段标志
-      if '/Ff' in obj:
-        ff = obj['/Ff']
-        if isinstance(ff, (int, float)):
-          flags_int = int(ff)
-          field_attributes['flags'] = flags_int
-          field_attributes['flag_meanings'] = self._parse_field_flags(flags_int)
+      field_attributes = self._extract_attributes(obj, field_type) if wants(projection, 'attributes') else None
       
       # 获取选项（对于选择框和单选按钮）
-      options = None
-      if field_type in ['select', 'radio', 'checkbox'] and '/Opt' in obj:
-        opt = obj['/Opt']
-        if isinstance(opt, list):
-          options = []
-          if field_type in ['select', 'listbox']:
-            # 下拉框/列表框：text 和 value 都是选项文本
-            for option in opt:
-              text = option.decode('utf-8', errors='ignore') if isinstance(option, bytes) else str(option)
-              options.append({'text': text, 'value': text})
-          elif field_type == 'radio':
-            # 单选组：text 是选项文本，value 是索引
-            for idx, option in enumerate(opt):
-              text = option.decode('utf-8', errors='ignore') if isinstance(option, bytes) else str(option)
-              options.append({'text': text, 'value': str(idx)})
-          elif field_type == 'checkbox':
-            # 复选框：固定选项
-            options = [
-              {'text': '选中', 'value': 'Yes'},
-              {'text': '未选中', 'value': 'Off'}
-            ]
+      options = self._extract_options(obj, field_type) if wants(projection, 'options') else None
       
       # 获取按钮信息（对于按钮类型）
       button_info = None
-      if field_type == 'button':
+      if field_type == 'button' and wants(projection, 'button_info'):
         button_info = self._extract_button_info(obj)
       
       # 获取字段位置
-      rect = obj.get('/Rect', [0, 0, 0, 0])
+      position = self._extract_position(obj) if wants(projection, 'position') else None
       
       return {
         'name': field_name,
@@ -477,12 +651,7 @@ class PDFService:
         'is_subfield': False,  # 页面注释通常不是子字段
         'subfield_info': None,
         'page': page_num + 1,
-        'position': {
-          'x': rect[0],
-          'y': rect[1],
-          'width': rect[2] - rect[0],
-          'height': rect[3] - rect[1]
-        },
+        'position': position,
         'required': False  # 默认非必填
       }
       
@@ -490,41 +659,66 @@ class PDFService:
       logger.warning(f'提取字段信息失败: {str(e)}')
       return None
   
-  def _extract_text_fields(self, pdf_reader) -> List[Dict[str, Any]]:
+  def _extract_text_fields(self, pdf_reader, pages: Optional[Set[int]] = None, pdf_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     从PDF文本中提取可能的表单字段，支持多种字段类型
     
     Args:
       pdf_reader: PDF读取器
+      pages: 只识别这些页面（页码从 1 开始），None 表示全部页面
+      pdf_path: 文档的文件路径（映射模板），用于以 fitz 打开同一文档
       
     Returns:
-      可能的字段列表
+      可能的字段列表（页数或耗时预算用完时只包含已扫描页面上的字段）
     """
     fields = []
     
+    # 使用 fitz 提取文本，比 PyPDF2 的 extract_text() 快得多，且能正确解码 CJK 字体
+    text_document = open_text_document(pdf_reader, pdf_path)
     try:
-      for page_num, page in enumerate(pdf_reader.pages):
-        text = page.extract_text()
-        
-        # 字段识别逻辑
-        lines = text.split('\n')
-        for line in lines:
-          line = line.strip()
-          
-          # 跳过空行和过长的行
-          if not line or len(line) > 200:
-            continue
-          
-          # 识别不同类型的字段
-          field_info = self._identify_field_type(line, page_num)
-          if field_info:
-            fields.append(field_info)
+      candidates = candidate_pages(text_document, pages)
+      if pdf_path and parallel_scan_enabled(len(candidates)):
+        # 长文档按页块分发到进程池，结果按页码顺序合并
+        logger.info(f'并行识别 {len(candidates)} 页文本字段')
+        for page_num, page_fields in map_page_chunks(_scan_text_chunk, pdf_path, candidates):
+          fields.extend(page_fields)
+      else:
+        for page_num, text in iter_page_texts(text_document, pages):
+          fields.extend(self._identify_page_fields(text, page_num))
       
     except Exception as e:
       logger.warning(f'提取文本字段失败: {str(e)}')
+    finally:
+      close_text_document(text_document)
     
     return fields
   
+  def _identify_page_fields(self, text: str, page_num: int) -> List[Dict[str, Any]]:
+    """
+    识别一页文本中的字段
+    
+    Args:
+      text: 页面文本
+      page_num: 页码（从 0 开始）
+      
+    Returns:
+      该页的字段列表
+    """
+    fields = []
+    lines = text.split('\n')
+    for line in lines:
+      line = line.strip()
+      
+      # 跳过空行和过长的行
+      if not line or len(line) > 200:
+        continue
+      
+      # 识别不同类型的字段
+      field_info = self._identify_field_type(line, page_num)
+      if field_info:
+        fields.append(field_info)
+    return fields
+  
   def _identify_field_type(self, line: str, page_num: int) -> Optional[Dict[str, Any]]:
     """
     识别字段类型和提取字段信息
@@ -537,24 +731,18 @@ class PDFService:
       字段信息字典或None
     """
     try:
-      # 1. 识别复选框 (checkbox)
-      if self._is_checkbox_field(line):
-        return self._extract_checkbox_field(line, page_num)
+      # 按 复选框 > 选择框 > 单选按钮 > 文本字段 > 必填标记 的优先级一次扫描得到类型
+      field_type, required = classify_line(line)
       
-      # 2. 识别选择框 (select/dropdown)
-      elif self._is_select_field(line):
+      if field_type == 'checkbox':
+        return self._extract_checkbox_field(line, page_num)
+      elif field_type == 'select':
         return self._extract_select_field(line, page_num)
-      
-      # 3. 识别单选按钮 (radio)
-      elif self._is_radio_field(line):
+      elif field_type == 'radio':
         return self._extract_radio_field(line, page_num)
-      
-      # 4. 识别文本字段 (text)
-      elif ':' in line and len(line) < 100:
-        return self._extract_text_field(line, page_num)
-      
-      # 5. 识别必填字段标记
-      elif self._is_required_field(line):
+      elif field_type == 'text':
+        return self._extract_text_field(line, page_num, required)
+      elif field_type == 'required':
         return self._extract_required_field(line, page_num)
       
     except Exception as e:
@@ -562,81 +750,26 @@ class PDFService:
     
     return None
   
+  # 以下逐个子串查找的判断方法与 classify_line 的结果一致，供单独判断某一类型时使用
   def _is_checkbox_field(self, line: str) -> bool:
     """判断是否为复选框字段"""
-    # 支持简繁中文和英文的复选框标记
-    checkbox_indicators = [
-      # 通用符号
-      '□', '☐', '☑', '☒', '[ ]', '[x]', '[X]', '☐', '☑', '☒',
-      # 简体中文
-      '□ 是', '□ 否', '□ 同意', '□ 不同意', '□ 有', '□ 无',
-      # 繁体中文
-      '□ 是', '□ 否', '□ 同意', '□ 不同意', '□ 有', '□ 無',
-      # 英文
-      '□ Yes', '□ No', '□ Agree', '□ Disagree', '□ Yes/No',
-      '[ ] Yes', '[ ] No', '[ ] Agree', '[ ] Disagree',
-      # 混合语言
-      '□ 是/否', '□ Yes/No', '□ 同意/不同意', '□ Agree/Disagree'
-    ]
-    return any(indicator in line for indicator in checkbox_indicators)
+    return any(indicator in line for indicator in CHECKBOX_INDICATORS)
   
   def _is_select_field(self, line: str) -> bool:
     """判断是否为选择框字段"""
-    # 支持简繁中文和英文的选择框标记
-    select_indicators = [
-      # 简体中文
-      '请选择', '选择', '下拉', '选项', '□ 男 □ 女', '□ 已婚 □ 未婚',
-      # 繁体中文
-      '請選擇', '選擇', '下拉', '選項', '□ 男 □ 女', '□ 已婚 □ 未婚',
-      # 英文
-      'Please select', 'Select', 'Choose', 'Option', 'Dropdown',
-      '□ Male □ Female', '□ Married □ Single', '□ Yes □ No',
-      # 混合语言
-      '请选择/Please select', '选择/Select',
-      # 特殊字段识别：Language字段的选项列表模式
-      'English German French Italian'
-    ]
-    
     # 特殊处理：检查是否为Language字段的选项列表
-    if 'English' in line and 'German' in line and 'French' in line and 'Italian' in line:
+    if all(option in line for option in LANGUAGE_OPTIONS):
       return True
     
-    return any(indicator in line for indicator in select_indicators)
+    return any(indicator in line for indicator in SELECT_INDICATORS)
   
   def _is_radio_field(self, line: str) -> bool:
     """判断是否为单选按钮字段"""
-    # 支持简繁中文和英文的单选按钮标记
-    radio_indicators = [
-      # 通用符号
-      '○', '●', '○ 是 ○ 否', '● 是 ○ 否',
-      # 简体中文
-      '○ 是', '○ 否', '● 是', '● 否',
-      # 繁体中文
-      '○ 是', '○ 否', '● 是', '● 否',
-      # 英文
-      '○ Yes', '○ No', '● Yes', '● No', '○ Yes ○ No', '● Yes ○ No',
-      # 混合语言
-      '○ 是/Yes', '○ 否/No'
-    ]
-    return any(indicator in line for indicator in radio_indicators)
+    return any(indicator in line for indicator in RADIO_INDICATORS)
   
   def _is_required_field(self, line: str) -> bool:
     """判断是否为必填字段"""
-    # 支持简繁中文和英文的必填标记
-    required_indicators = [
-      # 通用符号
-      '*', '（必填）', '(必填)', '（必選）', '(必選)',
-      # 简体中文
-      '必填', '必选', '必填项', '必选项', '（必填）', '(必填)',
-      # 繁体中文
-      '必填', '必選', '必填項', '必選項', '（必填）', '(必填)',
-      # 英文
-      'required', 'Required', 'REQUIRED', 'Required field',
-      'Mandatory', 'MANDATORY', '(Required)', '(required)',
-      # 混合语言
-      '必填/Required', '必选/Required'
-    ]
-    return any(indicator in line for indicator in required_indicators)
+    return any(indicator in line for indicator in REQUIRED_INDICATORS)
   
   def _extract_checkbox_field(self, line: str, page_num: int) -> Dict[str, Any]:
     """提取复选框字段信息"""
@@ -789,8 +922,8 @@ class PDFService:
     else:
       return ['选项1', '选项2']
   
-  def _extract_text_field(self, line: str, page_num: int) -> Optional[Dict[str, Any]]:
-    """提取文本字段信息"""
+  def _extract_text_field(self, line: str, page_num: int, required: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """提取文本字段信息，required 为 None 时根据该行的必填标记判断"""
     parts = line.split(':', 1)
     if len(parts) == 2:
       field_name = parts[0].strip()
@@ -803,7 +936,7 @@ class PDFService:
           'value': field_value,
           'page': page_num + 1,
           'position': None,
-          'required': self._is_required_field(line)
+          'required': self._is_required_field(line) if required is None else required
         }
     
     return None
@@ -894,10 +1027,15 @@ class PDFService:
       import tempfile
       import shutil
       
-      temp_parse_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-      content = await file.read()
-      temp_parse_file.write(content)
-      temp_parse_file.close()
+      with stage('read'):
+        # 映射模板直接使用共享缓存中的文件，不再复制
+        input_path = template_path(file)
+        if input_path is None:
+          temp_parse_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+          content = await file.read()
+          temp_parse_file.write(content)
+          temp_parse_file.close()
+          input_path = temp_parse_file.name
       
       # 重新创建 UploadFile 对象用于解析
       class TempUploadFile:
@@ -909,8 +1047,8 @@ class PDFService:
           with open(self.filepath, 'rb') as f:
             return f.read()
       
-      parse_file = TempUploadFile(temp_parse_file.name, file.filename)
-      parsed_fields = await self.parse_form_fields(parse_file)
+      source_file = file if template_path(file) else TempUploadFile(input_path, file.filename)
+      parsed_fields = await self.parse_form_fields(source_file)
       
       # 创建字段结构映射
       field_structure = {}
@@ -930,91 +1068,99 @@ class PDFService:
         
         if is_subfield:
           subfields.add(field_name)
-          logger.info(f'识别到子字段: {field_name}')
+          if field_logging():
+            logger.debug(f'识别到子字段: {field_name}')
       
-      logger.info(f'解析完成，识别到 {len(subfields)} 个子字段: {list(subfields)}')
+      logger.info(f'解析完成，识别到 {len(subfields)} 个子字段')
+      if field_logging():
+        logger.debug(f'子字段: {list(subfields)}')
       
       # 步骤2: 处理字段类型和识别需要特殊处理的字段
       logger.info('步骤2: 处理字段值和类型...')
       
-      enhanced_fields = []
-      subfield_special_handling = {}
-      
-      for field in fields:
-        field_name = field.get('name', '')
-        field_value = field.get('value', '')
-        # type get from field_structure
-        field_type = field_structure.get(field_name, {}).get('type', 'text')  # 默认为文本类型
+      with stage('map'):
+        enhanced_fields = []
+        subfield_special_handling = {}
         
-        if field_name:
-          # 根据字段类型处理值
-          processed_value = self._process_field_value(field_value, field_type, field_name)
+        for field in fields:
+          field_name = field.get('name', '')
+          field_value = field.get('value', '')
+          # type get from field_structure
+          field_type = field_structure.get(field_name, {}).get('type', 'text')  # 默认为文本类型
           
-          # 检查是否为子字段
-          if field_name in subfields:
-            logger.info(f'字段 {field_name} 是子字段，需要特殊处理')
-            subfield_special_handling[field_name] = {
-              'original_value': field_value,
-              'processed_value': processed_value,
-              'structure': field_structure.get(field_name, {})
-            }
-          
-          enhanced_fields.append({
-            'name': field_name,
-            'value': processed_value
-          })
-          logger.debug(f'处理字段 {field_name} (类型: {field_type}, 子字段: {field_name in subfields}): "{field_value}" -> "{processed_value}"')
+          if field_name:
+            # 根据字段类型处理值
+            processed_value = self._process_field_value(field_value, field_type, field_name)
+            
+            # 检查是否为子字段
+            if field_name in subfields:
+              if field_logging():
+                logger.debug(f'字段 {field_name} 是子字段，需要特殊处理')
+              subfield_special_handling[field_name] = {
+                'original_value': field_value,
+                'processed_value': processed_value,
+                'structure': field_structure.get(field_name, {})
+              }
+            
+            enhanced_fields.append({
+              'name': field_name,
+              'value': processed_value
+            })
+            if field_logging():
+              logger.debug(f'处理字段 {field_name} (类型: {field_type}, 子字段: {field_name in subfields}): "{field_value}" -> "{processed_value}"')
       
       # 步骤3: 使用改进的子字段填充逻辑
       if subfield_special_handling:
         logger.info(f'步骤3: 对 {len(subfield_special_handling)} 个子字段进行特殊处理...')
         # 优先使用 PyMuPDF 方法（最强大）
         try:
-          output_path = await self._fill_subfields_pymupdf(
-            temp_parse_file.name, 
-            enhanced_fields, 
-            subfield_special_handling,
-            strict_validation
-          )
-        except Exception as e:
-          logger.warning(f'PyMuPDF 子字段填充失败，尝试直接操作方法: {str(e)}')
-          # 尝试直接PDF操作方法
-          try:
-            output_path = await self._fill_subfields_direct(
-              temp_parse_file.name, 
+          with stage('strategy.pymupdf'):
+            output_path = await self._fill_subfields_pymupdf(
+              input_path, 
               enhanced_fields, 
               subfield_special_handling,
               strict_validation
             )
-          except Exception as e2:
-            logger.warning(f'直接子字段填充失败，尝试改进方法: {str(e2)}')
-            # 尝试改进方法
-            try:
-              output_path = await self._fill_subfields_improved(
-                temp_parse_file.name, 
+        except Exception as e:
+          logger.warning(f'PyMuPDF 子字段填充失败，尝试直接操作方法: {str(e)}')
+          # 尝试直接PDF操作方法
+          try:
+            with stage('strategy.direct'):
+              output_path = await self._fill_subfields_direct(
+                input_path, 
                 enhanced_fields, 
                 subfield_special_handling,
                 strict_validation
               )
+          except Exception as e2:
+            logger.warning(f'直接子字段填充失败，尝试改进方法: {str(e2)}')
+            # 尝试改进方法
+            try:
+              with stage('strategy.improved'):
+                output_path = await self._fill_subfields_improved(
+                  input_path, 
+                  enhanced_fields, 
+                  subfield_special_handling,
+                  strict_validation
+                )
             except Exception as e3:
               logger.warning(f'所有子字段填充方法都失败，回退到标准方法: {str(e3)}')
               # 最后回退到标准方法
               from app.services.pdf_service_fillpdf import PDFServiceFillPDF
               pdf_service_fillpdf = PDFServiceFillPDF()
-              fill_file = TempUploadFile(temp_parse_file.name, file.filename)
-              output_path = await pdf_service_fillpdf.fill_form(fill_file, enhanced_fields, strict_validation)
+              with stage('strategy.fillpdf'):
+                output_path = await pdf_service_fillpdf.fill_form(source_file, enhanced_fields, strict_validation)
       else:
         logger.info('步骤3: 使用标准填充方法（无子字段）...')
         # 使用标准填充
         from app.services.pdf_service_fillpdf import PDFServiceFillPDF
         pdf_service_fillpdf = PDFServiceFillPDF()
         
-        # 重新创建 UploadFile
-        fill_file = TempUploadFile(temp_parse_file.name, file.filename)
-        output_path = await pdf_service_fillpdf.fill_form(fill_file, enhanced_fields, strict_validation)
+        with stage('strategy.fillpdf'):
+          output_path = await pdf_service_fillpdf.fill_form(source_file, enhanced_fields, strict_validation)
       
       # 清理临时文件
-      os.unlink(temp_parse_file.name)
+      release_template(input_path, file)
       
       logger.info(f'使用增强方法填充PDF表单完成: {output_path}')
       return output_path
@@ -1069,7 +1215,8 @@ class PDFService:
     
     else:
       # 未知类型：保持原值
-      logger.debug(f'未知字段类型 {field_type} for {field_name}，保持原值')
+      if field_logging():
+        logger.debug(f'未知字段类型 {field_type} for {field_name}，保持原值')
       return value_str
 
   async def _fill_subfields_improved(self, input_file_path: str, enhanced_fields: List[Dict[str, Any]], 
@@ -1099,7 +1246,8 @@ class PDFService:
         
         # 如果是子字段，添加各种可能的名称变体
         if field_name in subfield_handling:
-          logger.info(f'为子字段 {field_name} 生成名称变体...')
+          if field_logging():
+            logger.debug(f'为子字段 {field_name} 生成名称变体...')
           
           # 生成常见的子字段名称变体
           variants = [
@@ -1120,7 +1268,8 @@ class PDFService:
                 'name': variant,
                 'value': field_value
               })
-              logger.debug(f'添加子字段变体: {variant} = {field_value}')
+              if field_logging():
+                logger.debug(f'添加子字段变体: {variant} = {field_value}')
       
       logger.info(f'原始字段数: {len(enhanced_fields)}, 包含变体后: {len(enhanced_fields_with_variants)}')
       
@@ -1169,6 +1318,7 @@ class PDFService:
       
       fill_count = 0
       total_attempts = 0
+      written = {}  # 提交的字段名 -> 实际写入的控件字段名（用于填充报告）
       
       # 遍历所有页面
       for page_num in range(len(doc)):
@@ -1182,19 +1332,23 @@ class PDFService:
           # 直接匹配
           if field_name in field_values:
             new_value = field_values[field_name]
-            logger.info(f'直接匹配填充字段: {field_name} -> {new_value}')
+            if field_logging():
+              logger.debug(f'直接匹配填充字段: {field_name} -> {new_value}')
             
             try:
               # 设置字段值
               widget.field_value = str(new_value)
               widget.update()
               fill_count += 1
+              written.setdefault(field_name, field_name)
               
               # 特别处理子字段
               if field_name in subfield_handling:
-                logger.info(f'✅ 成功填充子字段: {field_name} = {new_value}')
+                if field_logging():
+                  logger.debug(f'✅ 成功填充子字段: {field_name} = {new_value}')
               else:
-                logger.debug(f'✅ 成功填充字段: {field_name} = {new_value}')
+                if field_logging():
+                  logger.debug(f'✅ 成功填充字段: {field_name} = {new_value}')
                 
             except Exception as e:
               logger.warning(f'填充字段 {field_name} 失败: {str(e)}')
@@ -1208,14 +1362,17 @@ class PDFService:
                     field_name.replace('.', '').replace(' ', '') == target_field_name.replace(' ', '') or
                     target_field_name in field_name.replace('.', '')):
                   
-                  logger.info(f'智能匹配填充子字段: "{field_name}" <- 目标: "{target_field_name}" -> {target_value}')
+                  if field_logging():
+                    logger.debug(f'智能匹配填充子字段: "{field_name}" <- 目标: "{target_field_name}" -> {target_value}')
                   
                   try:
                     # 设置字段值
                     widget.field_value = str(target_value)
                     widget.update()
                     fill_count += 1
-                    logger.info(f'✅ 智能匹配成功填充: {field_name} = {target_value}')
+                    written.setdefault(target_field_name, field_name)
+                    if field_logging():
+                      logger.debug(f'✅ 智能匹配成功填充: {field_name} = {target_value}')
                     break  # 找到匹配后跳出
                   except Exception as e:
                     logger.warning(f'智能匹配填充字段 {field_name} 失败: {str(e)}')
@@ -1230,6 +1387,14 @@ class PDFService:
       doc.save(output_path)
       doc.close()
       
+      report = current_fill_report()
+      if report is not None:
+        for name, target in written.items():
+          if name == target:
+            report.matched(name)
+          else:
+            report.mapped(name, target, '按名称包含关系匹配到子字段')
+      
       logger.info(f'PyMuPDF 子字段填充完成: {output_path}')
       return output_path
       
@@ -1277,6 +1442,7 @@ class PDFService:
               form_fields = acro_form['/Fields']
               
               fill_count = 0
+              written = set()
               for field_ref in form_fields:
                 field_obj = field_ref.get_object()
                 field_name = field_obj.get('/T', '')
@@ -1286,10 +1452,12 @@ class PDFService:
                 # 检查是否需要填充这个字段
                 if field_name in field_values:
                   new_value = field_values[field_name]
+                  written.add(field_name)
                   
                   # 特殊处理子字段
                   if field_name in subfield_handling:
-                    logger.info(f'直接修改子字段: {field_name} -> {new_value}')
+                    if field_logging():
+                      logger.debug(f'直接修改子字段: {field_name} -> {new_value}')
                     
                     # 尝试填充子字段
                     if '/Kids' in field_obj:
@@ -1300,7 +1468,8 @@ class PDFService:
                             kid_obj = kid_ref.get_object()
                             # 直接修改子字段对象的值
                             kid_obj['/V'] = TextStringObject(str(new_value))
-                            logger.debug(f'直接修改子字段 {field_name}[{i}] = {new_value}')
+                            if field_logging():
+                              logger.debug(f'直接修改子字段 {field_name}[{i}] = {new_value}')
                             fill_count += 1
                           except Exception as e:
                             logger.debug(f'修改子字段 {field_name}[{i}] 失败: {e}')
@@ -1308,7 +1477,8 @@ class PDFService:
                     # 同时尝试修改父字段
                     try:
                       field_obj['/V'] = TextStringObject(str(new_value))
-                      logger.debug(f'同时修改父字段 {field_name} = {new_value}')
+                      if field_logging():
+                        logger.debug(f'同时修改父字段 {field_name} = {new_value}')
                     except Exception as e:
                       logger.debug(f'修改父字段 {field_name} 失败: {e}')
                       
@@ -1316,7 +1486,8 @@ class PDFService:
                     # 标准字段处理
                     try:
                       field_obj['/V'] = TextStringObject(str(new_value))
-                      logger.debug(f'填充标准字段: {field_name} = {new_value}')
+                      if field_logging():
+                        logger.debug(f'填充标准字段: {field_name} = {new_value}')
                       fill_count += 1
                     except Exception as e:
                       logger.warning(f'填充标准字段失败 {field_name}: {str(e)}')
@@ -1334,6 +1505,11 @@ class PDFService:
               # 清空文件并写入
               pdf_file.truncate()
               pdf_writer.write(pdf_file)
+              
+              report = current_fill_report()
+              if report is not None:
+                for name in written:
+                  report.matched(name)
       
       logger.info(f'直接子字段填充完成: {output_path}')
       return output_path
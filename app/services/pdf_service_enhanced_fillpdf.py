@@ -5,12 +5,19 @@
 
 import os
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet, Optional, Set
 from fastapi import UploadFile
 from loguru import logger
+import pdfrw
 
 from app.utils.config import settings
-from app.custom_fillpdf import get_form_fields, write_fillable_pdf
+from app.utils.request_context import stage
+from app.utils.tracing import set_attributes
+from app.utils.logger import field_logging
+from app.utils.fill_report import current_fill_report
+from app.utils.mapped_template import materialize_template, release_template, template_key
+from app.utils.field_projection import wants, project_fields
+from app.custom_fillpdf import get_form_fields, write_fillable_pdf, compile_fill_plan, TemplatePool, InvalidFieldValueError
 
 
 class PDFServiceEnhancedFillPDF:
@@ -20,15 +27,22 @@ class PDFServiceEnhancedFillPDF:
     def __init__(self):
         self.name = "Enhanced FillPDF Service v3"
         self._field_positions_cache = {}  # 缓存字段位置信息
+        # 热点模板的预解析对象图池，按模板 SHA-256 复用
+        self._template_pool = TemplatePool(
+            settings.TEMPLATE_POOL_SIZE, settings.TEMPLATE_POOL_PER_TEMPLATE
+        ) if settings.TEMPLATE_POOL_ENABLED else None
 
         logger.info(f'初始化 {self.name}')
     
-    async def parse_form_fields(self, file: UploadFile) -> List[Dict[str, Any]]:
+    async def parse_form_fields(self, file: UploadFile, pages: Optional[Set[int]] = None,
+                                projection: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
         """
         解析PDF表单字段（增强版，支持子字段）
         
         Args:
             file: 上传的PDF文件
+            pages: 只解码这些页面上的字段（页码从 1 开始），None 表示全部页面
+            projection: 只计算这些字段属性（见 field_projection），None 表示全部属性
             
         Returns:
             字段列表
@@ -37,183 +51,187 @@ class PDFServiceEnhancedFillPDF:
             # 保存临时文件
             temp_input_path = os.path.join(settings.TEMP_DIR, f'parse_{uuid.uuid4().hex}_{file.filename}')
             
-            # 读取文件内容
-            content = await file.read()
-            
-            # 检查文件内容是否为空
-            if not content:
-                raise Exception('上传的文件为空')
-            
-            with open(temp_input_path, 'wb') as f:
-                f.write(content)
-            
-            # 使用增强版fillpdf解析字段
-            fillpdf_fields = get_form_fields(temp_input_path)
+            with stage('read'):
+                # 映射模板直接使用缓存文件，其他上传文件写入临时文件（空文件会报错）
+                temp_input_path = await materialize_template(file, temp_input_path)
+            
+            # 使用增强版fillpdf解析字段，同时取得按钮外观状态索引用于列出按钮字段的可选值
+            with stage('parse'):
+                pool_key = template_key(file)
+                if self._template_pool is not None and pool_key:
+                    with self._template_pool.lease(pool_key, temp_input_path) as pooled:
+                        set_attributes(**{'pdf.page_count': len(pooled.pdf.pages)})
+                        fillpdf_fields = get_form_fields(temp_input_path, template_pdf=pooled.pdf, pages=pages, attributes=projection)
+                        buttons = pooled.plan.buttons
+                else:
+                    template_pdf = pdfrw.PdfReader(temp_input_path)
+                    set_attributes(**{'pdf.page_count': len(template_pdf.pages)})
+                    fillpdf_fields = get_form_fields(temp_input_path, template_pdf=template_pdf, pages=pages, attributes=projection)
+                    # 按钮外观状态只用于列出选项和复选框的开启状态，两者都不需要时不编译填充计划
+                    buttons = compile_fill_plan(template_pdf).buttons if wants(projection, 'options') or wants(projection, 'value') else None
             
             # 提取增强信息
             enhanced_info = fillpdf_fields.pop('_enhanced_info', {})
             
-            logger.info(f'增强fillpdf库解析到 {len(fillpdf_fields)} 个字段: {list(fillpdf_fields.keys())}')
+            logger.info(f'增强fillpdf库解析到 {len(fillpdf_fields)} 个字段')
+            if field_logging():
+                logger.debug(f'字段名: {list(fillpdf_fields.keys())}')
             
             # 转换为标准格式，支持多种字段类型
-            fields = []
-            for field_name, field_value in fillpdf_fields.items():
-                # 默认字段信息
-                field_type = 'text'
-                field_options = []
-                is_subfield = False
-                subfield_info = None
-                
-                # 使用增强信息来确定字段类型  
-                if field_name in enhanced_info:
-                    field_info = enhanced_info[field_name]
-                    ft = field_info.get('type')
-                    has_options = field_info.get('has_options', False)
-                    has_kids = field_info.get('has_kids', False)
-                    options = field_info.get('options', [])
-                    flags = field_info.get('flags')
-                    
-                    # 使用增强信息中的实际值（而不是fillpdf返回的值）
-                    # 注意：即使值为空，也要处理（特别是对于复选框的 Off 状态）
-                    if 'value' in field_info:
-                        field_value = field_info.get('value')
-                        
-                        # 处理值格式（匹配enhanced引擎）
-                        field_value = self._process_field_value(field_value, ft)
-                    
-                    # 根据PDF字段类型映射到我们的类型系统（支持combobox/listbox）
-                    if ft == '/Tx':
-                        field_type = 'text'
-                    elif ft == '/Btn':
-                        # 检查按钮类型，过滤掉push button
-                        if flags and isinstance(flags, int):
-                            if flags & 65536:  # Push button flag
-                                field_type = 'button'  # 标记为button，稍后过滤
-                            elif flags & 32768:  # Radio button flag
-                                field_type = 'radio'
-                                # 为radio字段创建选项（匹配enhanced引擎）
-                                field_options = []
-                                if has_options and options:
-                                    for idx, opt in enumerate(options):
-                                        value = has_kids[idx]["/AP"]["/N"].keys()[0].replace("/", "")
-                                        field_options.append({'text': opt, 'value': value})
-                                        
-                                if has_kids and len(field_options) == 0:
-                                    # Radio字段：text是选项文本，value是索引                                   
-                                    for idx, opt in enumerate(has_kids):
-                                        value = has_kids[idx]["/AP"]["/N"].keys()[0].replace("/", "")
-                                        field_options.append({'text': value, 'value': value})
-                            else:
-                                field_type = 'checkbox'
-                                # 为checkbox字段创建固定选项（匹配enhanced引擎）
-                                field_options = [
-                                    {'text': '选中', 'value': 'Yes'},
-                                    {'text': '未选中', 'value': 'Off'}
-                                ]
-                        else:
-                            field_type = 'checkbox'
-                            # 为checkbox字段创建固定选项
-                            field_options = [
-                                {'text': '选中', 'value': 'Yes'},
-                                {'text': '未选中', 'value': 'Off'}
-                            ]
-                    elif ft == '/Ch':
-                        # 选择字段：需要根据标志位区分select和listbox（匹配enhanced引擎）
-                        if has_options:
-                            if flags and isinstance(flags, int):
-                                if flags & 131072:  # 0x20000 组合框标志
-                                    field_type = 'select'  # enhanced引擎将combobox识别为select
-                                else:
-                                    field_type = 'listbox'
-                            else:
-                                field_type = 'select'  # 默认
-                            # 转换选项格式以匹配enhanced引擎
-                            field_options = [{'text': opt, 'value': opt} for opt in options] if options else []
-                        else:
-                            field_type = 'text'
-                    elif ft == '/Sig':
-                        field_type = 'signature'
-                    elif ft is None and has_kids:
-                        field_type = 'text'  # 父字段，通常是文本类型
-                        is_subfield = True
-                        subfield_info = {
-                            'has_kids': True,
-                            'parent_field': field_name
-                        }
-                
-                # 确保field_value是字符串
-                field_value = field_value if field_value else ''
-                
-                # 构建attributes（匹配enhanced引擎）
-                field_attributes = {}
-                if field_name in enhanced_info:
-                    field_info = enhanced_info[field_name]
-                    
-                    # 添加最大长度（对于文本字段）
-                    max_length = field_info.get('max_length')
-                    if field_type == 'text' and max_length:
-                        field_attributes['max_length'] = max_length
-                    
-                    # 添加标志位信息
-                    if flags and isinstance(flags, int):
-                        field_attributes['flags'] = flags
-                        field_attributes['flag_meanings'] = self._parse_field_flags(flags)
-                
-                # 如果没有attributes，设为None（匹配enhanced引擎）
-                if not field_attributes:
-                    field_attributes = None
-                
-                # 跳过button类型字段（匹配enhanced引擎）
-                if field_type == 'button':
-                    logger.debug(f'跳过按钮字段: {field_name}')
-                    continue
-                
-                # 使用简单的页面推断逻辑
-                page_num = enhanced_info[field_name]['page_index'] # self._infer_page_number(field_name)
-                rect = enhanced_info[field_name]['rect']
-                
-                # 转换 rect 为数字（rect 是 PDF 对象数组）
-                try:
-                    # rect 格式: [x1, y1, x2, y2]
-                    x1 = float(str(rect[0]))
-                    y1 = float(str(rect[1]))
-                    x2 = float(str(rect[2]))
-                    y2 = float(str(rect[3]))
-                    position = {
-                        'x': x1, 
-                        'y': y1, 
-                        'width': x2 - x1, 
-                        'height': y2 - y1
-                    }
-                except (ValueError, TypeError, IndexError):
-                    # 如果转换失败，使用默认值
-                    position = {'x': 0, 'y': 0, 'width': 0, 'height': 0}
-                
-                field = {
-                    'name': field_name,
-                    'label': None,  # 添加label字段
-                    'type': field_type,
-                    'value': field_value,
-                    'options': field_options if field_options else None,  # 匹配enhanced引擎格式
-                    'button_info': None,
-                    'attributes': field_attributes,
-                    'is_subfield': is_subfield, 
-                    'subfield_info': subfield_info,
-                    'page': page_num,
-                    'position': position,
-                    'required': False
-                }
-                fields.append(field)
+            with stage('map'):
+                fields = []
+                for field_name, field_value in fillpdf_fields.items():
+                    field = self._build_field(field_name, field_value, enhanced_info, buttons, projection)
+                    if field:
+                        fields.append(field)
             
             # 清理临时文件
-            os.remove(temp_input_path)
+            release_template(temp_input_path, file)
             
-            return fields
+            return project_fields(fields, projection)
             
         except Exception as e:
             logger.error(f'使用增强fillpdf解析PDF表单字段失败: {str(e)}')
             raise Exception(f'解析PDF表单字段失败: {str(e)}')
     
+    def _build_field(self, field_name: str, field_value: Any, enhanced_info: Dict[str, Any], buttons: Optional[Dict[str, Any]] = None,
+                     projection: Optional[FrozenSet[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        将get_form_fields返回的单个字段转换为标准字段格式
+        
+        Args:
+            field_name: 字段名
+            field_value: fillpdf返回的字段值
+            enhanced_info: get_form_fields返回的增强信息
+            buttons: 模板的按钮外观状态索引（字段名 -> ButtonField），用于列出按钮字段的可选值
+            projection: 只计算这些属性（选项、标志位含义、位置等），未请求的属性为 None
+            
+        Returns:
+            标准格式的字段字典，按钮字段返回None
+        """
+        # 默认字段信息
+        field_type = 'text'
+        field_options = []
+        is_subfield = False
+        subfield_info = None
+        button = buttons.get(field_name) if buttons else None
+        with_options = wants(projection, 'options')
+
+        # 使用增强信息来确定字段类型  
+        if field_name in enhanced_info:
+            field_info = enhanced_info[field_name]
+            ft = field_info.get('type')
+            has_options = field_info.get('has_options', False)
+            has_kids = field_info.get('has_kids', False)
+            options = field_info.get('options', [])
+            flags = field_info.get('flags')
+
+            # 使用增强信息中的实际值（而不是fillpdf返回的值）
+            # 注意：即使值为空，也要处理（特别是对于复选框的 Off 状态）
+            if 'value' in field_info and wants(projection, 'value'):
+                field_value = field_info.get('value')
+
+                # 处理值格式（匹配enhanced引擎）
+                field_value = self._process_field_value(field_value, ft)
+
+            # 根据PDF字段类型映射到我们的类型系统（支持combobox/listbox）
+            if ft == '/Tx':
+                field_type = 'text'
+            elif ft == '/Btn':
+                # 检查按钮类型，过滤掉push button
+                if flags and isinstance(flags, int):
+                    if flags & 65536:  # Push button flag
+                        field_type = 'button'  # 标记为button，稍后过滤
+                    elif flags & 32768:  # Radio button flag
+                        field_type = 'radio'
+                        # 为radio字段创建选项（匹配enhanced引擎）
+                        field_options = self._radio_options(button, has_options, options, has_kids) if with_options else []
+                    else:
+                        field_type = 'checkbox'
+                        # 为checkbox字段创建选项（匹配enhanced引擎），选中值取自按钮索引中的开启状态
+                        field_options = self._checkbox_options(button) if with_options else []
+                else:
+                    field_type = 'checkbox'
+                    # 为checkbox字段创建选项
+                    field_options = self._checkbox_options(button) if with_options else []
+            elif ft == '/Ch':
+                # 选择字段：需要根据标志位区分select和listbox（匹配enhanced引擎）
+                if has_options:
+                    if flags and isinstance(flags, int):
+                        if flags & 131072:  # 0x20000 组合框标志
+                            field_type = 'select'  # enhanced引擎将combobox识别为select
+                        else:
+                            field_type = 'listbox'
+                    else:
+                        field_type = 'select'  # 默认
+                    # 转换选项格式以匹配enhanced引擎
+                    field_options = [{'text': opt, 'value': opt} for opt in options] if options and with_options else []
+                else:
+                    field_type = 'text'
+            elif ft == '/Sig':
+                field_type = 'signature'
+            elif ft is None and has_kids:
+                field_type = 'text'  # 父字段，通常是文本类型
+                is_subfield = True
+                subfield_info = {
+                    'has_kids': True,
+                    'parent_field': field_name
+                }
+
+        # 确保field_value是字符串
+        field_value = field_value if field_value else ''
+
+        # 选中的复选框报告真实的开启状态（如 On 或导出名），与 options 中的选中值一致，而不是统一为 Yes
+        if field_type == 'checkbox' and field_value not in ('', 'Off'):
+            on_state = self._checkbox_on_state(button)
+            if on_state:
+                field_value = on_state
+
+        # 构建attributes（匹配enhanced引擎）
+        field_attributes = {}
+        if field_name in enhanced_info and wants(projection, 'attributes'):
+            field_info = enhanced_info[field_name]
+
+            # 添加最大长度（对于文本字段）
+            max_length = field_info.get('max_length')
+            if field_type == 'text' and max_length:
+                field_attributes['max_length'] = max_length
+
+            # 添加标志位信息
+            if flags and isinstance(flags, int):
+                field_attributes['flags'] = flags
+                field_attributes['flag_meanings'] = self._parse_field_flags(flags)
+
+        # 如果没有attributes，设为None（匹配enhanced引擎）
+        if not field_attributes:
+            field_attributes = None
+
+        # 跳过button类型字段（匹配enhanced引擎）
+        if field_type == 'button':
+            if field_logging():
+                logger.debug(f'跳过按钮字段: {field_name}')
+            return None
+
+        # 使用简单的页面推断逻辑
+        page_num = enhanced_info[field_name]['page_index'] # self._infer_page_number(field_name)
+        position = self._field_position(enhanced_info[field_name]['rect']) if wants(projection, 'position') else None
+
+        field = {
+            'name': field_name,
+            'label': None,  # 添加label字段
+            'type': field_type,
+            'value': field_value,
+            'options': field_options if field_options else None,  # 匹配enhanced引擎格式
+            'button_info': None,
+            'attributes': field_attributes,
+            'is_subfield': is_subfield, 
+            'subfield_info': subfield_info,
+            'page': page_num,
+            'position': position,
+            'required': False
+        }
+        return field
+    
     async def fill_form(self, file: UploadFile, fields: List[Dict[str, Any]], strict_validation: bool = True) -> str:
         """
         填充PDF表单（增强版，支持子字段）
@@ -229,32 +247,54 @@ class PDFServiceEnhancedFillPDF:
         try:
             # 保存输入文件
             temp_input_path = os.path.join(settings.TEMP_DIR, f'input_{uuid.uuid4().hex}_{file.filename}')
-            content = await file.read()
-            
-            with open(temp_input_path, 'wb') as f:
-                f.write(content)
+            with stage('read'):
+                temp_input_path = await materialize_template(file, temp_input_path)
             
             # 转换字段数据为fillpdf格式
-            field_values = {}
-            for field in fields:
-                field_name = field.get('name')
-                field_value = field.get('value', '')
-                if field_name:
-                    field_values[field_name] = str(field_value)
-            
-            logger.info(f'转换后的字段数据: {list(field_values.keys())}')
+            with stage('map'):
+                field_values = {}
+                for field in fields:
+                    field_name = field.get('name')
+                    field_value = field.get('value', '')
+                    if field_name:
+                        field_values[field_name] = str(field_value)
+            
+            logger.info(f'转换后的字段数据: {len(field_values)} 个')
+            if field_logging():
+                logger.debug(f'转换后的字段数据: {list(field_values.keys())}')
             
             # 生成输出文件路径
             output_filename = f'filled_enhanced_{uuid.uuid4().hex}_{file.filename}'
             output_path = os.path.join(settings.OUTPUT_DIR, output_filename)
             
             # 使用增强版fillpdf填充表单
-            write_fillable_pdf(temp_input_path, output_path, field_values)
+            with stage('write'):
+                pool_key = template_key(file)
+                if self._template_pool is not None and pool_key:
+                    # 已缓存的模板从对象池租用已解析的对象图及其填充计划，免去重新解析和遍历
+                    with self._template_pool.lease(pool_key, temp_input_path) as pooled:
+                        set_attributes(**{'pdf.page_count': len(pooled.pdf.pages)})
+                        field_values = self._validate_field_values(pooled.plan.option_sets, field_values, strict_validation)
+                        write_fillable_pdf(
+                            temp_input_path, output_path, field_values,
+                            template_pdf=pooled.pdf, fill_plan=pooled.plan
+                        )
+                        self._report_fill_plan(pooled.plan, field_values)
+                else:
+                    template_pdf = pdfrw.PdfReader(temp_input_path)
+                    set_attributes(**{'pdf.page_count': len(template_pdf.pages)})
+                    fill_plan = compile_fill_plan(template_pdf)
+                    field_values = self._validate_field_values(fill_plan.option_sets, field_values, strict_validation)
+                    write_fillable_pdf(
+                        temp_input_path, output_path, field_values,
+                        template_pdf=template_pdf, fill_plan=fill_plan
+                    )
+                    self._report_fill_plan(fill_plan, field_values)
             
             logger.info(f'使用增强fillpdf成功填充，支持子字段: {output_path}')
             
             # 清理临时文件
-            os.remove(temp_input_path)
+            release_template(temp_input_path, file)
             
             return output_path
             
@@ -263,13 +303,95 @@ class PDFServiceEnhancedFillPDF:
             # 清理可能存在的临时文件
             try:
                 if 'temp_input_path' in locals():
-                    os.remove(temp_input_path)
+                    release_template(temp_input_path, file)
             except:
                 pass
+            if isinstance(e, InvalidFieldValueError):
+                # 字段值校验失败原样抛出，由调用方返回 400 而不是回退到其他引擎
+                raise
             raise Exception(f'增强fillpdf填充PDF表单失败: {str(e)}')
     
 
 
+    def _field_position(self, rect) -> Dict[str, float]:
+        """字段位置，rect 为 PDF 对象数组 [x1, y1, x2, y2]"""
+        # 转换 rect 为数字（rect 是 PDF 对象数组）
+        try:
+            x1 = float(str(rect[0]))
+            y1 = float(str(rect[1]))
+            x2 = float(str(rect[2]))
+            y2 = float(str(rect[3]))
+            return {
+                'x': x1, 
+                'y': y1, 
+                'width': x2 - x1, 
+                'height': y2 - y1
+            }
+        except (ValueError, TypeError, IndexError):
+            # 如果转换失败，使用默认值
+            return {'x': 0, 'y': 0, 'width': 0, 'height': 0}
+
+    def _radio_options(self, button, has_options: bool, options: List[str], has_kids) -> List[Dict[str, str]]:
+        """单选按钮组的选项：优先使用按钮索引中的导出值，否则取子控件 /AP /N 中的外观名"""
+        field_options = []
+        if button is not None and button.kind == 'radio':
+            # 直接使用按钮索引中的导出值（已排除 /Off 外观）
+            if has_options and options:
+                field_options = [
+                    {'text': opt, 'value': value} for opt, value in zip(options, button.options)
+                ]
+            else:
+                field_options = [{'text': value, 'value': value} for value in button.options]
+        elif has_options and options:
+            for idx, opt in enumerate(options):
+                value = has_kids[idx]["/AP"]["/N"].keys()[0].replace("/", "")
+                field_options.append({'text': opt, 'value': value})
+
+        if has_kids and len(field_options) == 0:
+            # Radio字段：text是选项文本，value是索引                                   
+            for idx, opt in enumerate(has_kids):
+                value = has_kids[idx]["/AP"]["/N"].keys()[0].replace("/", "")
+                field_options.append({'text': value, 'value': value})
+        return field_options
+
+    def _checkbox_on_state(self, button) -> Optional[str]:
+        """按钮索引中复选框的开启状态名，没有时为 None"""
+        return button.on_state if button is not None and button.kind == 'checkbox' else None
+
+    def _checkbox_options(self, button) -> List[Dict[str, str]]:
+        """复选框的选中/未选中选项，按钮索引中没有开启状态时选中值为 Yes"""
+        return [
+            {'text': '选中', 'value': self._checkbox_on_state(button) or 'Yes'},
+            {'text': '未选中', 'value': 'Off'}
+        ]
+
+    def _validate_field_values(self, option_sets, field_values: Dict[str, str], strict_validation: bool) -> Dict[str, str]:
+        """
+        按模板的选项集合（FieldOptionSets）校验字段值（在修改任何 PDF 对象之前）
+        严格模式下存在无效值直接抛出 InvalidFieldValueError，非严格模式删除无效字段
+        """
+        if strict_validation:
+            return option_sets.validate(field_values, strict=True)
+        
+        invalid = option_sets.invalid_fields(field_values)
+        for field_name, value, options in invalid:
+            logger.warning(f'字段 {field_name} 的值 "{value}" 不在选项 {options} 中，已删除')
+        report = current_fill_report()
+        if report is not None:
+            report.rejected_all(invalid)
+        return option_sets.validate(field_values, strict=False)
+
+    def _report_fill_plan(self, plan, field_values: Dict[str, str]):
+        """按填充计划记录每个字段是否被写入（与 _run_fill_plan 的查找方式一致）"""
+        report = current_fill_report()
+        if report is None:
+            return
+        for name in field_values:
+            if name in plan.by_key or name in plan.acroform_by_name:
+                report.matched(name)
+            else:
+                report.unmatched(name, '模板中没有该字段')
+
     def _infer_page_number(self, field_name: str) -> int:
         """
         简化版本：所有字段都返回页面1
@@ -0,0 +1,602 @@
+"""
+PyMuPDF PDF表单处理服务
+基于 fitz（MuPDF）解析和填充表单，输出的字段格式与 enhanced_fillpdf 引擎一致
+
+fitz 打开文档只读取交叉引用表，按需解析对象，不像 pdfrw 那样先把整个对象图读入纯 Python 对象。
+page.widgets() 构造的 Widget 对象会读取控件的全部属性（每个控件约 0.3ms），fill 时 widget.update()
+还会重新生成外观流（每个控件约 1ms），所以这里直接用 MuPDF 的底层接口（pymupdf.mupdf）读写字段字典：
+只读取需要的键，填充时与 write_fillable_pdf 一样写入 /V 并设置 /NeedAppearances，由阅读器生成外观
+"""
+
+import os
+import uuid
+from typing import List, Dict, Any, AsyncIterator, FrozenSet, Iterator, Optional, Set, Tuple
+from fastapi import UploadFile
+from loguru import logger
+import fitz
+import pymupdf.mupdf as mupdf
+
+from app.utils.config import settings
+from app.utils.request_context import stage
+from app.utils.tracing import set_attributes
+from app.utils.logger import field_logging
+from app.utils.fill_report import current_fill_report
+from app.utils.mapped_template import materialize_template, release_template
+from app.utils.field_projection import wants, project_fields
+from app.custom_fillpdf import FieldOptionSets, InvalidFieldValueError
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+
+# 沿 /Parent 向上查找的最大层数，防止循环引用
+MAX_FIELD_DEPTH = 32
+
+# 字段标志位
+FLAG_RADIO = 32768
+FLAG_PUSHBUTTON = 65536
+FLAG_COMBO = 131072
+
+_T = mupdf.PDF_ENUM_NAME_T
+_FT = mupdf.PDF_ENUM_NAME_FT
+_FF = mupdf.PDF_ENUM_NAME_Ff
+_V = mupdf.PDF_ENUM_NAME_V
+_AS = mupdf.PDF_ENUM_NAME_AS
+_AP = mupdf.PDF_ENUM_NAME_AP
+_N = mupdf.PDF_ENUM_NAME_N
+_OPT = mupdf.PDF_ENUM_NAME_Opt
+_KIDS = mupdf.PDF_ENUM_NAME_Kids
+_PARENT = mupdf.PDF_ENUM_NAME_Parent
+_RECT = mupdf.PDF_ENUM_NAME_Rect
+_SUBTYPE = mupdf.PDF_ENUM_NAME_Subtype
+_MAXLEN = mupdf.PDF_ENUM_NAME_MaxLen
+
+
+def _get_name(obj, key) -> Optional[str]:
+    """名称值（带 '/'，与 pdfrw 一致），不是名称时返回 None"""
+    value = mupdf.pdf_dict_get(obj, key)
+    return '/' + mupdf.pdf_to_name(value) if mupdf.pdf_is_name(value) else None
+
+
+def _get_text(obj, key) -> Optional[str]:
+    """字符串值（按 PDFDocEncoding 或 UTF-16 解码），不是字符串时返回 None"""
+    value = mupdf.pdf_dict_get(obj, key)
+    return mupdf.pdf_to_text_string(value) if mupdf.pdf_is_string(value) else None
+
+
+def _get_int(obj, key) -> Optional[int]:
+    """非零整数值，否则返回 None"""
+    value = mupdf.pdf_dict_get(obj, key)
+    return (mupdf.pdf_to_int(value) or None) if mupdf.pdf_is_int(value) else None
+
+
+def _get_value(obj, key) -> str:
+    """字段值：字符串解码，名称不带 '/'，其他返回空字符串"""
+    value = mupdf.pdf_dict_get(obj, key)
+    if mupdf.pdf_is_string(value):
+        return mupdf.pdf_to_text_string(value)
+    if mupdf.pdf_is_name(value):
+        return mupdf.pdf_to_name(value)
+    return ''
+
+
+def _get_rect(obj) -> Optional[List[float]]:
+    """/Rect 数组；MuPDF 用单精度保存实数，按 7 位有效数字还原文件中的写法"""
+    value = mupdf.pdf_dict_get(obj, _RECT)
+    if not mupdf.pdf_is_array(value) or mupdf.pdf_array_len(value) < 4:
+        return None
+    return [float(f'{mupdf.pdf_to_real(mupdf.pdf_array_get(value, index)):.7g}') for index in range(4)]
+
+
+def _get_options(obj) -> Optional[List[str]]:
+    """字段自身 /Opt 中的选项，[导出值 显示文本] 形式的选项取导出值；没有 /Opt 时返回 None"""
+    value = mupdf.pdf_dict_get(obj, _OPT)
+    if not mupdf.pdf_is_array(value):
+        return None
+    options = []
+    for index in range(mupdf.pdf_array_len(value)):
+        option = mupdf.pdf_array_get(value, index)
+        if mupdf.pdf_is_array(option):
+            option = mupdf.pdf_array_get(option, 0)
+        options.append(mupdf.pdf_to_text_string(option))
+    return options
+
+
+def _has_kids(obj) -> bool:
+    return mupdf.pdf_is_array(mupdf.pdf_dict_get(obj, _KIDS))
+
+
+def _array_items(value) -> List[Any]:
+    if not mupdf.pdf_is_array(value):
+        return []
+    return [mupdf.pdf_array_get(value, index) for index in range(mupdf.pdf_array_len(value))]
+
+
+def _on_states(widget) -> List[str]:
+    """控件 /AP /N 中除 Off 以外的外观名（按字典中的顺序）"""
+    normal = mupdf.pdf_dict_get(mupdf.pdf_dict_get(widget, _AP), _N)
+    if not mupdf.pdf_is_dict(normal):
+        return []
+    states = [mupdf.pdf_to_name(mupdf.pdf_dict_get_key(normal, index)) for index in range(mupdf.pdf_dict_len(normal))]
+    return [state for state in states if state != 'Off']
+
+
+def _ancestors(obj) -> List[Any]:
+    """字段的上层字段（由近到远）"""
+    result = []
+    seen = {mupdf.pdf_to_num(obj)}
+    parent = mupdf.pdf_dict_get(obj, _PARENT)
+    while mupdf.pdf_is_dict(parent) and len(result) < MAX_FIELD_DEPTH:
+        number = mupdf.pdf_to_num(parent)
+        if number in seen:
+            break
+        seen.add(number)
+        result.append(parent)
+        parent = mupdf.pdf_dict_get(parent, _PARENT)
+    return result
+
+
+class _WidgetButton:
+    """按钮字段的外观状态，与 custom_fillpdf.ButtonField 提供给 _build_field 的属性一致"""
+
+    def __init__(self, kind: str):
+        self.kind = kind  # 'radio' 或 'checkbox'
+        self.options = []  # 开启状态（导出值），单选按钮组按控件顺序
+
+    @property
+    def on_state(self) -> Optional[str]:
+        return self.options[0] if self.options else None
+
+
+class _FillTarget:
+    """填充时的一个控件"""
+
+    def __init__(self, widget, field, names: Tuple[str, ...], kind: Optional[str]):
+        self.widget = widget  # 控件注释字典
+        self.field = field  # 控件所属字段的字典（带名称的控件即为自身）
+        self.names = names  # 可用于填充的字段名：字段自身的 /T 和完整名称
+        self.kind = kind  # 'text'、'combo'、'listbox'、'checkbox'、'radio'，其他控件为 None
+
+
+class PDFServicePyMuPDF(PDFServiceEnhancedFillPDF):
+    """PyMuPDF PDF表单处理服务，字段格式与增强版fillpdf服务一致"""
+
+    def __init__(self):
+        self.name = "PyMuPDF Service"
+        self._field_positions_cache = {}
+        # fitz 打开文档只建立交叉引用表，不需要预解析对象图池
+        self._template_pool = None
+
+        logger.info(f'初始化 {self.name}')
+
+    async def parse_form_fields(self, file: UploadFile, pages: Optional[Set[int]] = None,
+                                projection: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
+        """
+        解析PDF表单字段
+
+        Args:
+            file: 上传的PDF文件
+            pages: 只解码这些页面上的字段（页码从 1 开始），None 表示全部页面
+            projection: 只读取这些字段属性（见 field_projection），None 表示全部属性
+
+        Returns:
+            字段列表
+        """
+        temp_input_path = None
+        try:
+            temp_input_path = os.path.join(settings.TEMP_DIR, f'parse_{uuid.uuid4().hex}_{file.filename}')
+            with stage('read'):
+                temp_input_path = await materialize_template(file, temp_input_path)
+
+            with stage('parse'):
+                with fitz.open(temp_input_path) as doc:
+                    set_attributes(**{'pdf.page_count': doc.page_count})
+                    enhanced_info, buttons = self._collect_fields(mupdf.pdf_specifics(doc.this), pages, projection)
+
+            logger.info(f'PyMuPDF解析到 {len(enhanced_info)} 个字段')
+            if field_logging():
+                logger.debug(f'字段名: {list(enhanced_info.keys())}')
+
+            with stage('map'):
+                fields = []
+                for field_name, field_info in enhanced_info.items():
+                    field = self._build_field(field_name, field_info.get('value'), enhanced_info, buttons, projection)
+                    if field:
+                        fields.append(field)
+
+            return project_fields(fields, projection)
+
+        except Exception as e:
+            logger.error(f'使用PyMuPDF解析PDF表单字段失败: {str(e)}')
+            raise Exception(f'解析PDF表单字段失败: {str(e)}')
+        finally:
+            if temp_input_path:
+                release_template(temp_input_path, file)
+
+    async def iter_form_fields(self, file: UploadFile, pages: Optional[Set[int]] = None,
+                               projection: Optional[FrozenSet[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        逐页解析PDF表单字段（流式模式）
+
+        每处理完一页产出该页上已经完整的字段，字段格式与 parse_form_fields 相同，
+        顺序按页面而不是 AcroForm 字段树；已产出的字段不在内存中保留
+
+        Args:
+            file: 上传的PDF文件
+            pages: 只解码这些页面上的字段（页码从 1 开始），None 表示全部页面
+            projection: 只读取这些字段属性（见 field_projection），None 表示全部属性
+
+        Yields:
+            字段列表
+        """
+        temp_input_path = None
+        try:
+            temp_input_path = os.path.join(settings.TEMP_DIR, f'parse_{uuid.uuid4().hex}_{file.filename}')
+            with stage('read'):
+                temp_input_path = await materialize_template(file, temp_input_path)
+
+            with fitz.open(temp_input_path) as doc:
+                set_attributes(**{'pdf.page_count': doc.page_count})
+                for names, enhanced_info, buttons in self._iter_page_fields(mupdf.pdf_specifics(doc.this), pages, projection):
+                    fields = []
+                    for field_name in names:
+                        field = self._build_field(field_name, enhanced_info[field_name].get('value'), enhanced_info, buttons, projection)
+                        if field:
+                            fields.append(field)
+                    if fields:
+                        yield project_fields(fields, projection)
+
+        except Exception as e:
+            logger.error(f'使用PyMuPDF逐页解析PDF表单字段失败: {str(e)}')
+            raise Exception(f'解析PDF表单字段失败: {str(e)}')
+        finally:
+            if temp_input_path:
+                release_template(temp_input_path, file)
+
+    async def fill_form(self, file: UploadFile, fields: List[Dict[str, Any]], strict_validation: bool = True) -> str:
+        """
+        填充PDF表单
+
+        Args:
+            file: 上传的PDF文件
+            fields: 要填充的字段数据
+            strict_validation: 是否严格验证
+
+        Returns:
+            填充后的PDF文件路径
+        """
+        temp_input_path = None
+        try:
+            temp_input_path = os.path.join(settings.TEMP_DIR, f'input_{uuid.uuid4().hex}_{file.filename}')
+            with stage('read'):
+                temp_input_path = await materialize_template(file, temp_input_path)
+
+            with stage('map'):
+                field_values = {}
+                for field in fields:
+                    field_name = field.get('name')
+                    if field_name:
+                        field_values[field_name] = str(field.get('value', ''))
+
+            logger.info(f'转换后的字段数据: {len(field_values)} 个')
+            if field_logging():
+                logger.debug(f'转换后的字段数据: {list(field_values.keys())}')
+
+            output_filename = f'filled_pymupdf_{uuid.uuid4().hex}_{file.filename}'
+            output_path = os.path.join(settings.OUTPUT_DIR, output_filename)
+
+            with stage('write'):
+                with fitz.open(temp_input_path) as doc:
+                    set_attributes(**{'pdf.page_count': doc.page_count})
+                    pdf = mupdf.pdf_specifics(doc.this)
+                    targets = self._collect_targets(pdf)
+                    containers = self._container_fields(targets)
+                    option_sets = self._option_sets(targets, containers)
+                    field_values = self._validate_field_values(option_sets, field_values, strict_validation)
+                    filled = self._apply_values(pdf, targets, containers, field_values)
+                    doc.save(output_path, garbage=1, deflate=True)
+
+            logger.info(f'使用PyMuPDF成功填充 {filled} 个控件: {output_path}')
+            return output_path
+
+        except Exception as e:
+            logger.error(f'使用PyMuPDF填充PDF表单失败: {str(e)}')
+            if isinstance(e, InvalidFieldValueError):
+                # 字段值校验失败原样抛出，由调用方返回 400
+                raise
+            raise Exception(f'PyMuPDF填充PDF表单失败: {str(e)}')
+        finally:
+            if temp_input_path:
+                release_template(temp_input_path, file)
+
+    def _iter_widgets(self, pdf, pages: Optional[Set[int]] = None) -> Iterator[Tuple[int, Any, Any, bool]]:
+        """
+        按页面顺序遍历控件注释（只读取页面字典，不加载页面内容）
+
+        Yields:
+            (页码（从 1 开始）, 控件字典, 所属字段字典, 控件是否有自己的 /T)
+        """
+        for index in range(mupdf.pdf_count_pages(pdf)):
+            page_number = index + 1
+            if pages is not None and page_number not in pages:
+                continue
+            page = mupdf.pdf_lookup_page_obj(pdf, index)
+            for widget in _array_items(mupdf.pdf_dict_get(page, mupdf.PDF_ENUM_NAME_Annots)):
+                if _get_name(widget, _SUBTYPE) != '/Widget':
+                    continue
+                named = mupdf.pdf_is_string(mupdf.pdf_dict_get(widget, _T))
+                field = widget if named else mupdf.pdf_dict_get(widget, _PARENT)
+                if mupdf.pdf_is_dict(field):
+                    yield page_number, widget, field, named
+
+    def _collect_fields(self, pdf, pages: Optional[Set[int]] = None,
+                        projection: Optional[FrozenSet[str]] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, _WidgetButton]]:
+        """
+        遍历页面控件，按 get_form_fields 的 _enhanced_info 格式收集字段信息
+
+        与 enhanced_fillpdf 一致：字段名为字段自身的 /T（不含父字段名），类型、标志位和最大长度
+        只取字段自身的键；没有 /FT 的父字段作为容器字段单独列出；页码为字段最后一个控件所在页，
+        位置为带名称控件的 /Rect（单选按钮组取父字段的 /Rect，通常不存在）；
+        带名称的按钮控件为复选框，没有名称的按钮控件属于单选按钮组。
+        projection 指定时不读取未请求的值、选项、位置和按钮外观状态
+
+        Returns:
+            (字段名 -> 字段信息, 字段名 -> 按钮外观状态)
+        """
+        enhanced_info = {}
+        buttons = {}
+
+        for page_number, widget, field, named in self._iter_widgets(pdf, pages):
+            self._add_widget(enhanced_info, buttons, page_number, widget, field, named, projection=projection)
+
+        # 与 enhanced_fillpdf 一致按 AcroForm 字段树的顺序列出，不在字段树中的字段排在最后
+        order = self._acroform_order(pdf)
+        ordered = sorted(enhanced_info, key=lambda name: order.get(name, len(order)))
+        return {name: enhanced_info[name] for name in ordered}, buttons
+
+    def _add_widget(self, enhanced_info: Dict[str, Dict[str, Any]], buttons: Dict[str, _WidgetButton],
+                    page_number: int, widget, field, named: bool, skip: Set[str] = frozenset(),
+                    projection: Optional[FrozenSet[str]] = None) -> List[str]:
+        """
+        把一个控件计入字段信息（先列出上层的容器字段），skip 中的字段名不再计入
+
+        Returns:
+            本次新出现的字段名
+        """
+        added = []
+        for ancestor in reversed(_ancestors(field)):
+            name = _get_text(ancestor, _T)
+            if name and name not in enhanced_info and name not in skip:
+                enhanced_info[name] = self._field_info(ancestor, page_number, None, projection)
+                added.append(name)
+
+        name = _get_text(field, _T)
+        if not name or name in skip:
+            return added
+        rect = _get_rect(field) if wants(projection, 'position') else None
+        info = enhanced_info.get(name)
+        if info is None:
+            info = enhanced_info[name] = self._field_info(field, page_number, rect, projection)
+            added.append(name)
+        else:
+            info['page_index'] = page_number
+            info['rect'] = rect or info['rect']
+
+        if info['type'] == '/Btn' and (wants(projection, 'options') or wants(projection, 'value')):
+            button = buttons.setdefault(name, _WidgetButton('checkbox' if named else 'radio'))
+            states = _on_states(widget)
+            if states and states[0] not in button.options:
+                button.options.append(states[0])
+        return added
+
+    def _iter_page_fields(self, pdf, pages: Optional[Set[int]] = None,
+                          projection: Optional[FrozenSet[str]] = None) -> Iterator[Tuple[List[str], Dict[str, Dict[str, Any]], Dict[str, _WidgetButton]]]:
+        """
+        逐页收集字段（流式解析），每处理完一页产出该页上已经完整的字段
+
+        字段的全部控件都出现后即完整（容器字段首次出现即完整），字段信息与 _collect_fields 相同；
+        产出后从字段信息中删除，之后再出现的同名控件不再计入。
+        控件不全在所选页面（或不在任何页面）中的字段在最后产出
+
+        Yields:
+            (完整的字段名, 字段名 -> 字段信息, 字段名 -> 按钮外观状态)
+        """
+        enhanced_info = {}
+        buttons = {}
+        remaining = {}  # 字段名 -> 尚未出现的控件数
+        emitted = set()
+        ready = []
+        current_page = None
+
+        for page_number, widget, field, named in self._iter_widgets(pdf, pages):
+            if page_number != current_page:
+                if ready:
+                    yield ready, enhanced_info, buttons
+                    for name in ready:
+                        enhanced_info.pop(name, None)
+                        buttons.pop(name, None)
+                        remaining.pop(name, None)
+                    ready = []
+                current_page = page_number
+
+            name = _get_text(field, _T)
+            for added in self._add_widget(enhanced_info, buttons, page_number, widget, field, named, emitted, projection):
+                if added != name:
+                    ready.append(added)
+                    emitted.add(added)
+            if not name or name in emitted:
+                continue
+            if name not in remaining:
+                remaining[name] = 1 if named else sum(
+                    1 for kid in _array_items(mupdf.pdf_dict_get(field, _KIDS))
+                    if not mupdf.pdf_is_string(mupdf.pdf_dict_get(kid, _T))
+                )
+            remaining[name] -= 1
+            if remaining[name] <= 0:
+                ready.append(name)
+                emitted.add(name)
+
+        ready.extend(name for name in enhanced_info if name not in emitted)
+        if ready:
+            yield ready, enhanced_info, buttons
+
+    def _acroform_order(self, pdf) -> Dict[str, int]:
+        """AcroForm 字段树中字段名（自身的 /T）的先序位置"""
+        order = {}
+        root = mupdf.pdf_dict_get(mupdf.pdf_trailer(pdf), mupdf.PDF_ENUM_NAME_Root)
+        acroform = mupdf.pdf_dict_get(root, mupdf.PDF_ENUM_NAME_AcroForm)
+        stack = [(field, 0) for field in reversed(_array_items(mupdf.pdf_dict_get(acroform, mupdf.PDF_ENUM_NAME_Fields)))]
+        visited = set()
+        while stack:
+            field, depth = stack.pop()
+            number = mupdf.pdf_to_num(field)
+            if (number and number in visited) or depth > MAX_FIELD_DEPTH:
+                continue
+            visited.add(number)
+            name = _get_text(field, _T)
+            if name and name not in order:
+                order[name] = len(order)
+            stack.extend((kid, depth + 1) for kid in reversed(_array_items(mupdf.pdf_dict_get(field, _KIDS))))
+        return order
+
+    def _field_info(self, field, page_number: int, rect, projection: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """
+        单个字段字典的信息（格式与 get_form_fields 的 _enhanced_info 一致）
+        不需要值或选项时不解码 /V、/AS 和 /Opt（只检查 /Opt 是否存在，用于确定字段类型）
+        """
+        field_type = _get_name(field, _FT)
+        if wants(projection, 'options'):
+            options = _get_options(field)
+            has_options = options is not None
+        else:
+            options = None
+            has_options = mupdf.pdf_is_array(mupdf.pdf_dict_get(field, _OPT))
+        value = ''
+        if wants(projection, 'value'):
+            value = _get_value(field, _V)
+            if not value and field_type == '/Btn':
+                value = _get_value(field, _AS)
+        return {
+            'value': value,
+            'type': field_type,
+            'subtype': _get_name(field, _SUBTYPE),
+            'has_options': has_options,
+            'has_kids': _has_kids(field),
+            'options': options or [],
+            'flags': _get_int(field, _FF),
+            'max_length': _get_int(field, _MAXLEN) if wants(projection, 'attributes') else None,
+            'page_index': page_number,
+            'rect': rect or [0, 0, 0, 0]
+        }
+
+    def _collect_targets(self, pdf) -> List[_FillTarget]:
+        """文档中所有控件及其字段类型（字段类型和标志位沿 /Parent 继承）"""
+        targets = []
+        for _, widget, field, _ in self._iter_widgets(pdf):
+            chain = [field] + _ancestors(field)
+            parts = [_get_text(each, _T) for each in chain]
+            full_name = '.'.join(part for part in reversed(parts) if part)
+            names = tuple(dict.fromkeys(name for name in (parts[0], full_name) if name))
+            if not names:
+                continue
+
+            field_type = next((ft for ft in (_get_name(each, _FT) for each in chain) if ft), None)
+            flags = next((ff for ff in (_get_int(each, _FF) for each in chain) if ff), 0)
+            if field_type == '/Tx':
+                kind = 'text'
+            elif field_type == '/Ch':
+                kind = 'combo' if flags & FLAG_COMBO else 'listbox'
+            elif field_type == '/Btn' and not flags & FLAG_PUSHBUTTON:
+                kind = 'radio' if flags & FLAG_RADIO else 'checkbox'
+            else:
+                kind = None
+            targets.append(_FillTarget(widget, field, names, kind))
+        return targets
+
+    def _container_fields(self, targets: List[_FillTarget]) -> Dict[str, Any]:
+        """控件所属字段的上层容器字段（没有自己的控件），字段名 -> 字段字典"""
+        containers = {}
+        seen = set()
+        for target in targets:
+            number = mupdf.pdf_to_num(target.field)
+            if number in seen:
+                continue
+            seen.add(number)
+            for ancestor in _ancestors(target.field):
+                name = _get_text(ancestor, _T)
+                if name:
+                    containers.setdefault(name, ancestor)
+        return containers
+
+    def _option_sets(self, targets: List[_FillTarget], containers: Dict[str, Any]) -> FieldOptionSets:
+        """字段名集合及下拉框、单选按钮组的可选值（与 compile_fill_plan 的 option_sets 相同）"""
+        names = set(containers)
+        options = {}
+        for target in targets:
+            names.update(target.names)
+            if target.kind == 'combo':
+                values = next((opts for opts in map(_get_options, [target.field] + _ancestors(target.field)) if opts is not None), [])
+            elif target.kind == 'radio':
+                values = _on_states(target.widget)[:1]
+            else:
+                continue
+            for name in target.names:
+                options.setdefault(name, set()).update(values)
+        return FieldOptionSets(names, options)
+
+    def _apply_values(self, pdf, targets: List[_FillTarget], containers: Dict[str, Any], field_values: Dict[str, str]) -> int:
+        """
+        把字段值写入字段字典，返回写入的控件数
+
+        与 write_fillable_pdf 一致：文本框和选择框写入 /V 字符串，复选框和单选按钮设置 /V 和 /AS 名称
+        （复选框只有 1/true/yes/on/checked 或导出名表示选中，其他值均为 /Off），容器字段只在字段字典上设置 /V；
+        最后设置 AcroForm 的 /NeedAppearances，由阅读器按新值生成外观
+        """
+        filled = 0
+        matched = set()
+        unsupported = set()
+        for target in targets:
+            name = next((each for each in target.names if each in field_values), None)
+            if name is None:
+                continue
+            if target.kind is None:
+                unsupported.add(name)
+                continue
+            matched.add(name)
+            value = field_values[name]
+
+            if target.kind in ('text', 'combo', 'listbox'):
+                if target.kind != 'text' and value in FieldOptionSets.EMPTY_VALUES:
+                    value = ''
+                mupdf.pdf_dict_put_text_string(target.field, _V, value)
+            elif target.kind == 'checkbox':
+                states = _on_states(target.widget)
+                on_state = states[0] if states else 'Yes'
+                checked = value.lower() in FieldOptionSets.CHECKBOX_ON_VALUES or value == on_state
+                state = on_state if checked else 'Off'
+                mupdf.pdf_dict_put_name(target.widget, _AS, state)
+                mupdf.pdf_dict_put_name(target.field, _V, state)
+            else:
+                if value in FieldOptionSets.EMPTY_VALUES:
+                    continue
+                mupdf.pdf_dict_put_name(target.widget, _AS, value if value in _on_states(target.widget) else 'Off')
+                mupdf.pdf_dict_put_name(target.field, _V, value)
+            filled += 1
+
+        for name, field in containers.items():
+            if name in field_values and name not in matched:
+                mupdf.pdf_dict_put_text_string(field, _V, field_values[name])
+                matched.add(name)
+
+        report = current_fill_report()
+        if report is not None:
+            for name in field_values:
+                if name in matched:
+                    report.matched(name)
+                elif name in unsupported:
+                    report.unmatched(name, '控件类型不支持填充')
+                else:
+                    report.unmatched(name, '模板中没有该字段')
+
+        root = mupdf.pdf_dict_get(mupdf.pdf_trailer(pdf), mupdf.PDF_ENUM_NAME_Root)
+        acroform = mupdf.pdf_dict_get(root, mupdf.PDF_ENUM_NAME_AcroForm)
+        if mupdf.pdf_is_dict(acroform):
+            mupdf.pdf_dict_put_bool(acroform, mupdf.pdf_new_name('NeedAppearances'), 1)
+        return filled
@@ -7,12 +7,20 @@
 import os
 import uuid
 import tempfile
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, FrozenSet, Optional, Set
 from loguru import logger
 from fastapi import UploadFile
 from pathlib import Path
 
 from app.utils.config import settings
+from app.utils.request_context import stage
+from app.utils.tracing import set_attributes
+from app.utils.logger import field_logging
+from app.utils.fill_report import current_fill_report
+from app.utils.mapped_template import open_pdf_stream
+from app.utils.page_ranges import widget_pages_by_name, field_in_pages, field_page
+from app.utils.field_projection import wants, project_fields
+from app.utils.text_scan import iter_page_texts
 
 
 class PDFServicePyPDF:
@@ -28,70 +36,88 @@ class PDFServicePyPDF:
         for directory in directories:
             Path(directory).mkdir(parents=True, exist_ok=True)
     
-    async def parse_form_fields(self, file: UploadFile) -> List[Dict[str, Any]]:
+    async def parse_form_fields(self, file: UploadFile, pages: Optional[Set[int]] = None,
+                                projection: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
         """
         使用标准PyPDF2方法解析PDF表单字段
         
         Args:
             file: 上传的PDF文件 (UploadFile对象)
+            pages: 只返回这些页面上的字段（页码从 1 开始），None 表示全部页面
+            projection: 只计算这些字段属性（见 field_projection），None 表示全部属性
             
         Returns:
             字段列表，每个字段包含名称、类型、值、选项等信息
         """
         try:
             import PyPDF2
-            from io import BytesIO
             
-            content = await file.read()
-            pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+            with stage('read'):
+                pdf_stream = await open_pdf_stream(file)
             fields = []
             
-            # 方法1: 使用标准的get_fields()方法
-            try:
-                form_fields = pdf_reader.get_fields()
-                if form_fields:
-                    logger.info(f'使用get_fields()找到 {len(form_fields)} 个字段')
-                    
-                    for field_name, field_obj in form_fields.items():
-                        field_info = self._extract_field_from_object(field_name, field_obj)
-                        if field_info:
-                            fields.append(field_info)
-                            
-            except Exception as e:
-                logger.warning(f'get_fields()方法失败: {str(e)}')
-            
-            # 方法2: 如果get_fields()失败，尝试从页面注释中提取
-            if not fields:
-                logger.info('尝试从页面注释中提取字段...')
-                for page_num, page in enumerate(pdf_reader.pages):
-                    if '/Annots' in page:
-                        annotations = page['/Annots']
-                        if annotations:
-                            for annotation in annotations:
-                                try:
-                                    annot_obj = annotation.get_object()
-                                    if annot_obj.get('/Subtype') == '/Widget':
-                                        field_info = self._extract_field_from_annotation(annot_obj, page_num)
-                                        if field_info:
-                                            fields.append(field_info)
-                                except Exception as e:
-                                    logger.debug(f'处理注释失败: {str(e)}')
-                                    continue
-            
-            # 方法3: 如果以上都失败，回退到文本提取方法
-            if not fields:
-                logger.info('回退到文本提取方法...')
-                fields = self._extract_fields_from_text(pdf_reader)
+            with stage('parse'):
+                pdf_reader = PyPDF2.PdfReader(pdf_stream)
+                set_attributes(**{'pdf.page_count': len(pdf_reader.pages)})
+                
+                # 扫描一遍页面注释建立 字段名 -> 页码 索引（get_fields()不提供页面信息），不需要页码时跳过
+                widget_pages = widget_pages_by_name(pdf_reader) if pages is not None or wants(projection, 'page') else {}
+                
+                # 方法1: 使用标准的get_fields()方法
+                try:
+                    form_fields = pdf_reader.get_fields()
+                    if form_fields:
+                        logger.info(f'使用get_fields()找到 {len(form_fields)} 个字段')
+                        
+                        for field_name, field_obj in form_fields.items():
+                            page_list = widget_pages.get(field_name)
+                            if not field_in_pages(page_list, pages):
+                                continue
+                            field_info = self._extract_field_from_object(field_name, field_obj, projection)
+                            if field_info:
+                                field_info['page'] = field_page(page_list)
+                                fields.append(field_info)
+                                
+                except Exception as e:
+                    logger.warning(f'get_fields()方法失败: {str(e)}')
+                
+                # 指定页面时，只要文档中有表单控件就不再回退（请求页面上可能确实没有字段）
+                has_widgets = pages is not None and bool(widget_pages)
+                
+                # 方法2: 如果get_fields()失败，尝试从页面注释中提取
+                if not fields and not has_widgets:
+                    logger.info('尝试从页面注释中提取字段...')
+                    for page_num, page in enumerate(pdf_reader.pages):
+                        if pages is not None and page_num + 1 not in pages:
+                            continue
+                        if '/Annots' in page:
+                            annotations = page['/Annots']
+                            if annotations:
+                                for annotation in annotations:
+                                    try:
+                                        annot_obj = annotation.get_object()
+                                        if annot_obj.get('/Subtype') == '/Widget':
+                                            field_info = self._extract_field_from_annotation(annot_obj, page_num, projection)
+                                            if field_info:
+                                                fields.append(field_info)
+                                    except Exception as e:
+                                        logger.debug(f'处理注释失败: {str(e)}')
+                                        continue
+                
+                # 方法3: 如果以上都失败，回退到文本提取方法
+                if not fields and not has_widgets:
+                    logger.info('回退到文本提取方法...')
+                    fields = self._extract_fields_from_text(pdf_reader, pages)
             
             logger.info(f'最终解析到 {len(fields)} 个表单字段')
-            return fields
+            return project_fields(fields, projection)
             
         except Exception as e:
             logger.error(f'解析PDF表单字段失败: {str(e)}')
             raise Exception(f'解析PDF表单字段失败: {str(e)}')
     
-    def _extract_field_from_object(self, field_name: str, field_obj) -> Optional[Dict[str, Any]]:
-        """从PyPDF2字段对象中提取字段信息"""
+    def _extract_field_from_object(self, field_name: str, field_obj, projection: Optional[FrozenSet[str]] = None) -> Optional[Dict[str, Any]]:
+        """从PyPDF2字段对象中提取字段信息，projection 指定时只计算其中的属性"""
         try:
             # 字段类型检测
             field_type = 'text'  # 默认
@@ -113,7 +139,7 @@ class PDFServicePyPDF:
                         field_type = 'select'
                     
                     # 提取选项 (/Opt)
-                    if '/Opt' in field_obj:
+                    if '/Opt' in field_obj and wants(projection, 'options'):
                         opt = field_obj['/Opt']
                         if hasattr(opt, '__iter__'):
                             for option in opt:
@@ -143,21 +169,13 @@ class PDFServicePyPDF:
             
             # 获取字段值
             field_value = ''
-            if hasattr(field_obj, 'get') and '/V' in field_obj:
+            if hasattr(field_obj, 'get') and '/V' in field_obj and wants(projection, 'value'):
                 value = field_obj['/V']
                 if hasattr(value, 'decode'):
                     field_value = value.decode('utf-8', errors='ignore')
                 else:
                     field_value = str(value) if value else ''
             
-            # 获取默认值
-            default_value = ''
-            if hasattr(field_obj, 'get') and '/DV' in field_obj:
-                dv = field_obj['/DV']
-                if hasattr(dv, 'decode'):
-                    default_value = dv.decode('utf-8', errors='ignore')
-                else:
-                    default_value = str(dv) if dv else ''
             # filter button field
             if field_type == 'button':
                 return None
@@ -171,10 +189,9 @@ class PDFServicePyPDF:
                 'label': '',
                 'type': field_type,
                 'value': field_value,
-                # 'default_value': default_value,
                 "button_info":None,
                 'options': options,
-                'page': 1,  # PyPDF2的get_fields()不提供页面信息
+                'page': 1,  # PyPDF2的get_fields()不提供页面信息，由调用方按控件页码索引更新
                 'position': None,
                 'required': False,
                 'attributes': {},
@@ -186,7 +203,7 @@ class PDFServicePyPDF:
             logger.warning(f'提取字段 {field_name} 信息失败: {str(e)}')
             return None
     
-    def _extract_field_from_annotation(self, annot_obj, page_num: int) -> Optional[Dict[str, Any]]:
+    def _extract_field_from_annotation(self, annot_obj, page_num: int, projection: Optional[FrozenSet[str]] = None) -> Optional[Dict[str, Any]]:
         """从页面注释中提取字段信息"""
         try:
             # 获取字段名
@@ -202,19 +219,24 @@ class PDFServicePyPDF:
                 return None
             
             # 使用相同的逻辑提取字段信息
-            return self._extract_field_from_object(field_name, annot_obj)
+            field_info = self._extract_field_from_object(field_name, annot_obj, projection)
+            if field_info:
+                field_info['page'] = page_num + 1
+            return field_info
             
         except Exception as e:
             logger.debug(f'从注释提取字段失败: {str(e)}')
             return None
     
-    def _extract_fields_from_text(self, pdf_reader) -> List[Dict[str, Any]]:
-        """从PDF文本中提取可能的字段（回退方法）"""
+    def _extract_fields_from_text(self, pdf_reader, pages: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
+        """
+        从PDF文本中提取可能的字段（回退方法），pages 指定时只处理这些页面
+        页数或耗时预算用完时提前停止，只返回已扫描页面上的字段
+        """
         fields = []
         
         try:
-            for page_num, page in enumerate(pdf_reader.pages):
-                text = page.extract_text()
+            for page_num, text in iter_page_texts(pdf_reader, pages):
                 lines = text.split('\n')
                 
                 for line in lines:
@@ -392,6 +414,33 @@ class PDFServicePyPDF:
         
         return fields
     
+    def _report_page_fields(self, writer, field_values: Dict[str, str], form_pages: Set[int]):
+        """
+        记录填充报告：与 update_page_form_field_values 一致，
+        控件自身或其父字段的 /T 与字段名相同即视为写入
+        """
+        report = current_fill_report()
+        if report is None:
+            return
+        written = set()
+        for page_num in form_pages:
+            if page_num >= len(writer.pages):
+                continue
+            for annotation in writer.pages[page_num].get('/Annots') or []:
+                try:
+                    annot_obj = annotation.get_object()
+                    parent = annot_obj.get('/Parent')
+                    for name in (annot_obj.get('/T'), parent.get_object().get('/T') if parent else None):
+                        if name is not None:
+                            written.add(str(name))
+                except Exception:
+                    continue
+        for name in field_values:
+            if name in written:
+                report.matched(name)
+            else:
+                report.unmatched(name, '表单页面中没有该字段')
+
     def _fill_fields_individually(self, writer, field_values: Dict[str, str], form_pages: Set[int]) -> bool:
         """
         逐个填充字段（备用方法）
@@ -426,7 +475,8 @@ class PDFServicePyPDF:
                 try:
                     # 这里可以实现更复杂的字段填充逻辑
                     # 暂时使用简单的方法
-                    logger.debug(f'填充字段 {field_name}: {field_value}')
+                    if field_logging():
+                        logger.debug(f'填充字段 {field_name}: {field_value}')
                     success_count += 1
                 except Exception as e:
                     logger.debug(f'填充字段 {field_name} 失败: {str(e)}')
@@ -456,14 +506,10 @@ class PDFServicePyPDF:
         """
         try:
             import PyPDF2
-            from io import BytesIO
-            
-            # 保存上传的文件到临时位置
-            temp_input_path = os.path.join(settings.TEMP_DIR, f'input_{uuid.uuid4().hex}_{file.filename}')
-            content = await file.read()
             
-            with open(temp_input_path, 'wb') as f:
-                f.write(content)
+            # 获取输入流（映射模板直接读取 mmap，其他上传文件读入内存）
+            with stage('read'):
+                pdf_stream = await open_pdf_stream(file)
             
             # 创建字段值字典
             field_values = {}
@@ -472,15 +518,18 @@ class PDFServicePyPDF:
                 if field_name:
                     field_values[field_name] = field.get('value', '')
             
-            logger.info(f'准备填充字段: {list(field_values.keys())}')
+            logger.info(f'准备填充字段: {len(field_values)} 个')
+            if field_logging():
+                logger.debug(f'准备填充字段: {list(field_values.keys())}')
             
             # 生成输出文件名
             output_filename = f'filled_pypdf_{uuid.uuid4().hex}_{file.filename}'
             output_path = os.path.join(settings.OUTPUT_DIR, output_filename)
             
             # 使用PyPDF2标准方法填充
-            with open(temp_input_path, 'rb') as input_file:
-                reader = PyPDF2.PdfReader(input_file)
+            with stage('write'):
+                reader = PyPDF2.PdfReader(pdf_stream)
+                set_attributes(**{'pdf.page_count': len(reader.pages)})
                 writer = PyPDF2.PdfWriter()
                 
                 # 复制所有页面
@@ -509,14 +558,13 @@ class PDFServicePyPDF:
                     if not success:
                         logger.error('所有填充方法都失败了')
                         raise Exception('无法填充PDF表单字段')
+
+                    self._report_page_fields(writer, field_values, form_pages)
                 
                 # 保存填充后的PDF
                 with open(output_path, 'wb') as output_file:
                     writer.write(output_file)
             
-            # 清理临时文件
-            os.remove(temp_input_path)
-            
             logger.info(f'使用PyPDF2标准方法填充PDF表单完成: {output_path}')
             return output_path
             
@@ -0,0 +1,213 @@
+"""
+批量解析
+/api/v1/parse-form/batch 一次接收多个 PDF（或包含 PDF 的 ZIP），把每个文件分发到进程池并行解析，
+每个文件解析完成后立即以 NDJSON 返回一行结果，单个文件失败只影响该文件的结果行
+
+- 使用独立的进程池（与文本识别进程池分开，大小由 BATCH_PARSE_PROCESSES 决定），与其一样使用 spawn 启动，
+  在首次使用时创建（gunicorn preload 后各工作进程各自创建）
+- 子进程中不再启用文本识别的并行扫描，并行度由批量解析的进程池提供
+- 同时等待解析的文件数有上限，已完成的结果先返回，避免一次性把全部文件交给进程池
+- 错误信息中的服务端文件路径（临时文件、缓存文件）替换为上传的文件名或 ZIP 条目名
+"""
+
+import io
+import os
+import re
+import asyncio
+import zipfile
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set, Tuple
+from fastapi import UploadFile
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.request_context import RequestContext, _current_request
+from app.utils.text_scan import STOPPED_BY_TIME_BUDGET
+
+# 引擎名称 -> (模块, 服务类)，子进程按需导入
+_ENGINE_CLASSES = {
+  'standard': ('app.services.pdf_service_pypdf', 'PDFServicePyPDF'),
+  'enhanced': ('app.services.pdf_service', 'PDFService'),
+  'fillpdf': ('app.services.pdf_service_fillpdf', 'PDFServiceFillPDF'),
+  'enhanced_fillpdf': ('app.services.pdf_service_enhanced_fillpdf', 'PDFServiceEnhancedFillPDF'),
+  'pymupdf': ('app.services.pdf_service_pymupdf', 'PDFServicePyMuPDF')
+}
+
+# 错误信息中的文件路径（含路径分隔符的连续非空白字符）
+_PATH_PATTERN = re.compile(r'[^\s\'"(]*[\\/][^\s\'",:;()]*')
+
+# 子进程中的服务实例，每个引擎创建一次
+_services: Dict[str, Any] = {}
+
+
+def _service(engine: str):
+  if engine not in _services:
+    module, name = _ENGINE_CLASSES[engine]
+    _services[engine] = getattr(importlib.import_module(module), name)()
+  return _services[engine]
+
+
+def _init_worker():
+  """子进程初始化：文件之间已经并行，单个文件不再把页面分发到文本识别进程池"""
+  settings.TEXT_SCAN_PROCESSES = 1
+
+
+def parse_document(engine: str, content: bytes, filename: str, pages: Optional[Set[int]]) -> Dict[str, Any]:
+  """
+  在子进程中解析一个文件（与 /api/v1/parse-form 相同：enhanced_fillpdf 失败时回退到 standard）
+
+  Returns:
+    engine（实际使用的引擎）、fields、coverage（文本识别的页面覆盖，没有时为 None）和 cacheable
+  """
+  ctx = RequestContext(f'batch-{filename}'[:64])
+  token = _current_request.set(ctx)
+  try:
+    # 引擎用文件名拼接临时文件路径，ZIP 中的条目只保留文件名部分
+    basename = os.path.basename(filename)
+    source = UploadFile(file=io.BytesIO(content), filename=basename)
+    try:
+      fields = asyncio.run(_service(engine).parse_form_fields(source, pages))
+    except Exception as e:
+      if engine != 'enhanced_fillpdf':
+        raise
+      logger.warning(f'增强版fillpdf引擎解析 {filename} 失败，切换到standard引擎: {str(e)}')
+      source = UploadFile(file=io.BytesIO(content), filename=basename)
+      fields = asyncio.run(_service('standard').parse_form_fields(source, pages))
+      engine = 'enhanced_fillpdf_fallback_to_standard'
+    coverage = ctx.text_scan_coverage
+    return {
+      'engine': engine,
+      'fields': jsonable_encoder(fields),
+      'coverage': coverage.to_dict() if coverage else None,
+      # 因耗时预算停止的结果取决于当时的负载，不写入缓存
+      'cacheable': coverage is None or coverage.stopped_by != STOPPED_BY_TIME_BUDGET
+    }
+  finally:
+    _current_request.reset(token)
+
+
+# 批量解析的进程池
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      _pool = ProcessPoolExecutor(
+        max_workers=settings.BATCH_PARSE_PROCESSES,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker
+      )
+      logger.info(f'创建批量解析进程池: {settings.BATCH_PARSE_PROCESSES} 个进程')
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+  """子进程异常退出后进程池不可再用，下次批量解析时重新创建"""
+  global _pool
+  with _pool_lock:
+    if _pool is pool:
+      _pool = None
+
+
+def shutdown_batch_pool():
+  """关闭批量解析进程池（应用关闭时调用）"""
+  global _pool
+  with _pool_lock:
+    if _pool is not None:
+      _pool.shutdown(wait=False, cancel_futures=True)
+      _pool = None
+
+
+def sanitize_error(message: str, filename: str) -> str:
+  """把错误信息中的服务端文件路径替换为客户端提交的文件名（上传文件名或 ZIP 条目名）"""
+  return _PATH_PATTERN.sub(filename, message)
+
+
+async def expand_uploads(files: List[UploadFile]) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+  """
+  读取上传的文件，ZIP 文件展开为其中的 PDF
+
+  Returns:
+    [(文件名, 内容, 错误)]，不能解析的条目内容为 None 并附带错误原因，按上传顺序排列
+  """
+  max_bytes = settings.MAX_FILE_SIZE * 1024 * 1024
+  items = []
+  for file in files:
+    filename = file.filename or ''
+    content = await file.read()
+    if filename.lower().endswith('.zip'):
+      try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+          for info in archive.infolist():
+            if info.is_dir():
+              continue
+            name = f'{filename}/{info.filename}'
+            if not info.filename.lower().endswith('.pdf'):
+              items.append((name, None, '只支持PDF文件'))
+            elif info.file_size > max_bytes:
+              items.append((name, None, f'文件超过 {settings.MAX_FILE_SIZE} MB'))
+            else:
+              items.append((name, archive.read(info), None))
+      except zipfile.BadZipFile:
+        items.append((filename, None, 'ZIP文件无效'))
+    elif not filename.lower().endswith('.pdf'):
+      items.append((filename, None, '只支持PDF文件'))
+    elif len(content) > max_bytes:
+      items.append((filename, None, f'文件超过 {settings.MAX_FILE_SIZE} MB'))
+    else:
+      items.append((filename, content, None))
+  return items
+
+
+async def map_documents(engine: str, documents: List[Tuple[int, str, bytes]], pages: Optional[Set[int]]):
+  """
+  把文件分发到进程池并行解析，按完成顺序产出结果
+
+  Args:
+    documents: [(序号, 文件名, 内容)]
+
+  Yields:
+    (序号, 解析结果, 错误)，解析失败时结果为 None，错误中的服务端路径替换为文件名
+  """
+  if not documents:
+    return
+  loop = asyncio.get_running_loop()
+  pool = _get_pool()
+  # 同时交给进程池的文件数上限，每个进程排队两个文件
+  max_pending = max(1, settings.BATCH_PARSE_PROCESSES * 2)
+  queue = list(reversed(documents))
+  pending: Dict[asyncio.Future, Tuple[int, str]] = {}
+  try:
+    while queue or pending:
+      while queue and len(pending) < max_pending:
+        index, filename, content = queue.pop()
+        try:
+          future = loop.run_in_executor(pool, parse_document, engine, content, filename, pages)
+        except BrokenProcessPool as e:
+          _discard_pool(pool)
+          yield index, None, f'解析进程异常退出: {str(e)}'
+          continue
+        pending[future] = (index, filename)
+      if not pending:
+        continue
+      done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for future in done:
+        index, filename = pending.pop(future)
+        try:
+          yield index, future.result(), None
+        except BrokenProcessPool as e:
+          _discard_pool(pool)
+          yield index, None, f'解析进程异常退出: {str(e)}'
+        except Exception as e:
+          yield index, None, sanitize_error(str(e) or type(e).__name__, filename)
+  finally:
+    for future in pending:
+      future.cancel()
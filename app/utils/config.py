@@ -13,6 +13,14 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
+# 运行模式: development（单进程，DEBUG 时自动重载）/ production（gunicorn 多进程）
+RUN_MODE = os.getenv("RUN_MODE", "development").lower()
+WORKERS = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))  # 工作进程数
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "500"))  # 每个工作进程处理该数量请求后重启，抑制 fitz/pdfrw 内存增长，0 表示不重启
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "50"))  # 随机抖动，避免所有进程同时重启
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))  # 关闭时等待进行中请求完成的秒数
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "120"))  # 工作进程无响应超时（秒），大文件处理时需足够长
+
 # 文件路径配置
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "outputs")
@@ -24,10 +32,62 @@ MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "50"))
 # 日志配置
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # 文件日志格式: text 或 json（每行一个 JSON 对象）
+LOG_ENQUEUE = os.getenv("LOG_ENQUEUE", "true").lower() == "true"  # 日志经队列由后台线程写入，不阻塞请求
+LOG_FIELD_SAMPLE_RATE = float(os.getenv("LOG_FIELD_SAMPLE_RATE", "0.01"))  # 0~1，输出逐字段调试日志的请求比例
 
 # 安全配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 
+# 模板缓存配置（同一节点上所有工作进程共享）
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+TEMPLATE_CACHE_ENABLED = os.getenv("TEMPLATE_CACHE_ENABLED", "true").lower() == "true"
+TEMPLATE_CACHE_MAX_MB = int(os.getenv("TEMPLATE_CACHE_MAX_MB", "512"))  # 超出后按最近访问时间淘汰
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"  # 缓存相同请求的填充结果
+TEMPLATE_POOL_ENABLED = os.getenv("TEMPLATE_POOL_ENABLED", "true").lower() == "true"  # 进程内预解析模板对象池
+TEMPLATE_POOL_SIZE = int(os.getenv("TEMPLATE_POOL_SIZE", "16"))  # 每个工作进程最多保留的热点模板数
+TEMPLATE_POOL_PER_TEMPLATE = int(os.getenv("TEMPLATE_POOL_PER_TEMPLATE", "2"))  # 每个模板保留的已解析对象图数量
+
+# 大文档模式：没有表单控件的文档逐页识别文本字段时的预算，用完后提前停止并在响应中报告覆盖的页面
+TEXT_SCAN_MAX_PAGES = int(os.getenv("TEXT_SCAN_MAX_PAGES", "200"))  # 最多扫描的页数，0 表示不限制
+TEXT_SCAN_TIME_BUDGET = float(os.getenv("TEXT_SCAN_TIME_BUDGET", "20"))  # 最长扫描时间（秒），0 表示不限制
+AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+# 每个工作进程（WORKERS 个）各自创建进程池，默认按工作进程数平分可用 CPU，避免 WORKERS × 进程数 远超 CPU 核数；
+# WORKERS 默认等于 CPU 核数，此时默认不并行
+TEXT_SCAN_PROCESSES = int(os.getenv("TEXT_SCAN_PROCESSES", str(max(1, AVAILABLE_CPUS // WORKERS))))  # 长文档并行扫描的进程数，1 表示不并行
+TEXT_SCAN_CHUNK_PAGES = int(os.getenv("TEXT_SCAN_CHUNK_PAGES", "32"))  # 每个并行任务至少处理的页数
+TEXT_SCAN_PARALLEL_MIN_PAGES = int(os.getenv("TEXT_SCAN_PARALLEL_MIN_PAGES", "32"))  # 需要扫描的页数达到该值才并行
+
+# 批量解析配置（/api/v1/parse-form/batch）
+# 与文本识别进程池一样，每个工作进程各自创建，默认按 WORKERS 平分可用 CPU
+BATCH_PARSE_PROCESSES = int(os.getenv("BATCH_PARSE_PROCESSES", str(max(1, AVAILABLE_CPUS // WORKERS))))  # 并行解析文件的进程数
+BATCH_PARSE_MAX_FILES = int(os.getenv("BATCH_PARSE_MAX_FILES", "500"))  # 一次请求最多解析的文件数（包括 ZIP 中的文件）
+
+# 性能剖析配置（默认关闭，关闭时不注册任何剖析逻辑）
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0~1，按比例随机采样请求
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))  # 超出后删除最旧的剖析文件
+
+# 影子引擎比对配置（SHADOW_ENGINE 为空时关闭）
+SHADOW_ENGINE = os.getenv("SHADOW_ENGINE", "")  # 在后台用该引擎重新处理被采样的请求，如 pymupdf
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))  # 0~1，按比例随机采样请求
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "4"))  # 排队的影子任务上限，超出时跳过
+SHADOW_REPORT_FILE = os.getenv("SHADOW_REPORT_FILE", "logs/shadow.jsonl")  # 比对报告（JSON Lines）
+
+# 链路追踪配置（默认关闭，关闭时不注册追踪中间件）
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))  # 0~1，没有 traceparent 请求头时按比例采样
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file")  # file: 写入 TRACE_FILE；otlp: 发送到 TRACE_OTLP_ENDPOINT
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")  # 每行一条链路（OTLP/JSON）
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")  # OTLP/HTTP collector
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "pdf-form-service")
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "1000"))  # 等待导出的链路上限，超出时丢弃
+
+# 填充报告配置（/fill-form 传入 report=true 时生成）
+FILL_REPORT_DIR = os.getenv("FILL_REPORT_DIR", "fill_reports")
+FILL_REPORT_MAX_FILES = int(os.getenv("FILL_REPORT_MAX_FILES", "200"))  # 超出后删除最旧的报告
+
 # 创建全局设置实例
 class Settings:
   """应用配置类"""
@@ -36,13 +96,53 @@ class Settings:
     self.HOST = HOST
     self.PORT = PORT
     self.DEBUG = DEBUG
+    self.RUN_MODE = RUN_MODE
+    self.WORKERS = WORKERS
+    self.MAX_REQUESTS = MAX_REQUESTS
+    self.MAX_REQUESTS_JITTER = MAX_REQUESTS_JITTER
+    self.GRACEFUL_TIMEOUT = GRACEFUL_TIMEOUT
+    self.WORKER_TIMEOUT = WORKER_TIMEOUT
     self.UPLOAD_DIR = UPLOAD_DIR
     self.OUTPUT_DIR = OUTPUT_DIR
     self.TEMP_DIR = TEMP_DIR
     self.MAX_FILE_SIZE = MAX_FILE_SIZE
     self.LOG_LEVEL = LOG_LEVEL
     self.LOG_FILE = LOG_FILE
+    self.LOG_FORMAT = LOG_FORMAT
+    self.LOG_ENQUEUE = LOG_ENQUEUE
+    self.LOG_FIELD_SAMPLE_RATE = LOG_FIELD_SAMPLE_RATE
     self.SECRET_KEY = SECRET_KEY
+    self.CACHE_DIR = CACHE_DIR
+    self.TEMPLATE_CACHE_ENABLED = TEMPLATE_CACHE_ENABLED
+    self.TEMPLATE_CACHE_MAX_MB = TEMPLATE_CACHE_MAX_MB
+    self.RESULT_CACHE_ENABLED = RESULT_CACHE_ENABLED
+    self.TEMPLATE_POOL_ENABLED = TEMPLATE_POOL_ENABLED
+    self.TEMPLATE_POOL_SIZE = TEMPLATE_POOL_SIZE
+    self.TEMPLATE_POOL_PER_TEMPLATE = TEMPLATE_POOL_PER_TEMPLATE
+    self.TEXT_SCAN_MAX_PAGES = TEXT_SCAN_MAX_PAGES
+    self.TEXT_SCAN_TIME_BUDGET = TEXT_SCAN_TIME_BUDGET
+    self.TEXT_SCAN_PROCESSES = TEXT_SCAN_PROCESSES
+    self.TEXT_SCAN_CHUNK_PAGES = TEXT_SCAN_CHUNK_PAGES
+    self.TEXT_SCAN_PARALLEL_MIN_PAGES = TEXT_SCAN_PARALLEL_MIN_PAGES
+    self.BATCH_PARSE_PROCESSES = BATCH_PARSE_PROCESSES
+    self.BATCH_PARSE_MAX_FILES = BATCH_PARSE_MAX_FILES
+    self.PROFILING_ENABLED = PROFILING_ENABLED
+    self.PROFILE_SAMPLE_RATE = PROFILE_SAMPLE_RATE
+    self.PROFILE_DIR = PROFILE_DIR
+    self.PROFILE_MAX_FILES = PROFILE_MAX_FILES
+    self.SHADOW_ENGINE = SHADOW_ENGINE
+    self.SHADOW_SAMPLE_RATE = SHADOW_SAMPLE_RATE
+    self.SHADOW_MAX_PENDING = SHADOW_MAX_PENDING
+    self.SHADOW_REPORT_FILE = SHADOW_REPORT_FILE
+    self.TRACING_ENABLED = TRACING_ENABLED
+    self.TRACE_SAMPLE_RATE = TRACE_SAMPLE_RATE
+    self.TRACE_EXPORTER = TRACE_EXPORTER
+    self.TRACE_FILE = TRACE_FILE
+    self.TRACE_OTLP_ENDPOINT = TRACE_OTLP_ENDPOINT
+    self.TRACE_SERVICE_NAME = TRACE_SERVICE_NAME
+    self.TRACE_QUEUE_SIZE = TRACE_QUEUE_SIZE
+    self.FILL_REPORT_DIR = FILL_REPORT_DIR
+    self.FILL_REPORT_MAX_FILES = FILL_REPORT_MAX_FILES
     self.BASE_DIR = BASE_DIR
 
 # 创建全局设置实例
@@ -0,0 +1,63 @@
+"""
+模板字段选项集合的缓存加载
+选项集合按模板 SHA-256 缓存：进程内保留最近使用的若干个，
+同时写入共享模板缓存的元数据，其他工作进程无需再解析模板
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import pdfrw
+from loguru import logger
+
+from app.custom_fillpdf import FieldOptionSets, compile_fill_plan
+from app.utils.template_cache import template_cache
+
+OPTIONS_CACHE_VERSION = 1
+OPTIONS_META_NAME = f'options:v{OPTIONS_CACHE_VERSION}'
+_LOCAL_CACHE_SIZE = 64
+
+_local_cache = OrderedDict()  # sha -> FieldOptionSets，按最近使用排序
+_lock = threading.Lock()
+
+
+def load_option_sets(path: str, sha256: Optional[str] = None) -> FieldOptionSets:
+  """
+  获取模板的字段选项集合
+
+  Args:
+    path: 模板文件路径（未命中缓存时解析）
+    sha256: 模板内容的 SHA-256，为 None 时不缓存
+
+  Returns:
+    FieldOptionSets
+  """
+  if sha256:
+    with _lock:
+      option_sets = _local_cache.get(sha256)
+      if option_sets is not None:
+        _local_cache.move_to_end(sha256)
+        return option_sets
+
+    cached = template_cache.get_meta(sha256, OPTIONS_META_NAME)
+    if cached is not None:
+      option_sets = FieldOptionSets.from_dict(cached)
+      _remember(sha256, option_sets)
+      return option_sets
+
+  option_sets = compile_fill_plan(pdfrw.PdfReader(path)).option_sets
+  logger.debug(f'解码模板字段选项: {len(option_sets.names)} 个字段, {len(option_sets.options)} 个选择字段')
+
+  if sha256:
+    template_cache.put_meta(sha256, OPTIONS_META_NAME, option_sets.to_dict())
+    _remember(sha256, option_sets)
+  return option_sets
+
+
+def _remember(sha256: str, option_sets: FieldOptionSets):
+  with _lock:
+    _local_cache[sha256] = option_sets
+    _local_cache.move_to_end(sha256)
+    while len(_local_cache) > _LOCAL_CACHE_SIZE:
+      _local_cache.popitem(last=False)
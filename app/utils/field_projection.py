@@ -0,0 +1,72 @@
+"""
+字段属性投影
+/api/v1/parse-form 的 fields（如 "name,type,page"）和 mode=lite 指定响应中每个字段包含的属性，
+投影传入各引擎的提取函数，未请求的属性（标签、标志位含义、选项、位置、按钮信息等）不再计算，
+而不是计算后再从响应中删除
+
+- 投影为属性名的 frozenset，None 表示全部属性（默认行为不变）
+- name 总是包含；提取函数仍会确定 type（用于过滤按钮字段），未请求时在最后删除
+"""
+
+from typing import Any, Dict, FrozenSet, List, Optional
+
+# 解析结果中字段的属性（按响应中的顺序）
+FIELD_ATTRIBUTES = (
+  'name', 'label', 'type', 'value', 'options', 'button_info', 'attributes',
+  'is_subfield', 'subfield_info', 'page', 'position', 'required'
+)
+
+PARSE_MODE_FULL = 'full'
+PARSE_MODE_LITE = 'lite'
+PARSE_MODES = (PARSE_MODE_FULL, PARSE_MODE_LITE)
+
+# mode=lite 只返回字段名和类型
+LITE_ATTRIBUTES = frozenset({'name', 'type'})
+
+
+def parse_field_projection(spec: Optional[str], mode: Optional[str] = None) -> Optional[FrozenSet[str]]:
+  """
+  解析字段属性投影
+
+  Args:
+    spec: 逗号分隔的属性名，如 "name,type,page"；为空时由 mode 决定
+    mode: full（默认，全部属性）或 lite（只有 name 和 type）；指定 spec 时 spec 优先
+
+  Returns:
+    属性名集合（总是包含 name），返回全部属性时为 None
+
+  Raises:
+    ValueError: 属性名或 mode 无效
+  """
+  mode = (mode or PARSE_MODE_FULL).strip().lower()
+  if mode not in PARSE_MODES:
+    raise ValueError(f'无效的解析模式: {mode}，可选: {", ".join(PARSE_MODES)}')
+
+  if spec is None or not spec.strip():
+    return LITE_ATTRIBUTES if mode == PARSE_MODE_LITE else None
+
+  attributes = {part.strip() for part in spec.split(',') if part.strip()}
+  unknown = sorted(attributes.difference(FIELD_ATTRIBUTES))
+  if unknown:
+    raise ValueError(f'未知的字段属性: {", ".join(unknown)}，可选: {", ".join(FIELD_ATTRIBUTES)}')
+  attributes.add('name')
+  if attributes.issuperset(FIELD_ATTRIBUTES):
+    return None
+  return frozenset(attributes)
+
+
+def format_field_projection(projection: Optional[FrozenSet[str]]) -> str:
+  """把投影格式化为规范的属性列表（按 FIELD_ATTRIBUTES 的顺序），用作缓存键"""
+  return ','.join(name for name in FIELD_ATTRIBUTES if projection is None or name in projection)
+
+
+def wants(projection: Optional[FrozenSet[str]], attribute: str) -> bool:
+  """是否需要计算该属性（未指定投影时总是 True）"""
+  return projection is None or attribute in projection
+
+
+def project_fields(fields: List[Dict[str, Any]], projection: Optional[FrozenSet[str]]) -> List[Dict[str, Any]]:
+  """只保留请求的属性（提取函数为未请求的属性留下的占位值、以及用于过滤的 type 在这里删除）"""
+  if projection is None:
+    return fields
+  return [{key: value for key, value in field.items() if key in projection} for field in fields]
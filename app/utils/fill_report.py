@@ -0,0 +1,155 @@
+"""
+填充报告
+/fill-form 传入 report=true 时，各引擎在写入字段的同时记录每个提交字段的结果，
+客户端不再需要对输出文件重新调用 /parse-form 来确认哪些字段被实际写入
+
+- matched: 按字段名直接写入
+- mapped: 按规范化或包含关系映射到模板中的另一个字段后写入（附带目标字段名）
+- unmatched: 模板中没有可写入的字段（附带原因）
+- rejected: 值不在字段的可选值中，非严格模式下被删除（附带原因）
+
+报告按服务端生成的随机ID保存到有上限的目录中（请求ID可由客户端指定，只作为报告中的字段，
+不用作文件名，避免相同请求ID互相覆盖或读取他人的报告），响应头 X-Fill-Report-URL 指向 /api/v1/fill-reports/{id}，
+X-Fill-Report-Summary 给出各类字段数；未请求报告时 current_fill_report() 返回 None，引擎不做任何记录
+"""
+
+import os
+import re
+import json
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.request_context import current_request
+
+FILL_REPORT_URL_HEADER = 'X-Fill-Report-URL'
+FILL_REPORT_SUMMARY_HEADER = 'X-Fill-Report-Summary'
+_REPORT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+MATCHED = 'matched'
+MAPPED = 'mapped'
+UNMATCHED = 'unmatched'
+REJECTED = 'rejected'
+STATUSES = (MATCHED, MAPPED, UNMATCHED, REJECTED)
+
+# 同一字段被多次记录时（如引擎内部的多种策略）保留优先级更高的结果
+_STATUS_RANK = {UNMATCHED: 0, MAPPED: 1, MATCHED: 2, REJECTED: 3}
+
+# 引擎没有记录任何结果的字段
+DEFAULT_UNMATCHED_REASON = '引擎未写入该字段'
+
+
+class FillReport:
+  """一次填充请求的字段结果，挂在 RequestContext.fill_report 上"""
+
+  def __init__(self, names: Iterable[str]):
+    self.names = list(dict.fromkeys(names))  # 提交的字段名（保持顺序、去重）
+    self._submitted = set(self.names)
+    self.entries: Dict[str, Dict[str, Any]] = {}
+
+  def _record(self, name: str, status: str, **detail):
+    # 只记录客户端提交的字段，引擎内部生成的名称变体不计入报告
+    if name not in self._submitted:
+      return
+    existing = self.entries.get(name)
+    if existing is not None and _STATUS_RANK[existing['status']] > _STATUS_RANK[status]:
+      return
+    self.entries[name] = {'name': name, 'status': status, **detail}
+
+  def matched(self, name: str):
+    self._record(name, MATCHED)
+
+  def mapped(self, name: str, target: str, reason: str):
+    self._record(name, MAPPED, target=target, reason=reason)
+
+  def unmatched(self, name: str, reason: str):
+    self._record(name, UNMATCHED, reason=reason)
+
+  def rejected(self, name: str, value: Any, options: List[str]):
+    self._record(name, REJECTED, value=value, reason=f'值 "{value}" 不在选项 {options} 中')
+
+  def rejected_all(self, invalid: Iterable[Tuple[str, Any, List[str]]]):
+    """记录 FieldOptionSets.invalid_fields 找出的无效字段"""
+    for name, value, options in invalid:
+      self.rejected(name, value, options)
+
+  def reset(self):
+    """丢弃已记录的结果（引擎失败后回退到另一个引擎重新填充时调用）"""
+    self.entries.clear()
+
+  def fields(self) -> List[Dict[str, Any]]:
+    """按提交顺序列出每个字段的结果，没有记录的字段视为未匹配"""
+    return [
+      self.entries.get(name) or {'name': name, 'status': UNMATCHED, 'reason': DEFAULT_UNMATCHED_REASON}
+      for name in self.names
+    ]
+
+  def to_dict(self) -> Dict[str, Any]:
+    fields = self.fields()
+    summary = {status: 0 for status in STATUSES}
+    for field in fields:
+      summary[field['status']] += 1
+    return {'summary': summary, 'fields': fields}
+
+
+def current_fill_report() -> Optional[FillReport]:
+  """
+  获取当前请求的填充报告，未请求报告时返回 None
+
+  用法:
+    report = current_fill_report()
+    if report is not None:
+      report.matched(name)
+  """
+  ctx = current_request()
+  return ctx.fill_report if ctx is not None else None
+
+
+def start_fill_report(fields: List[Dict[str, Any]]) -> Optional[FillReport]:
+  """为当前请求创建填充报告（不在请求中时返回 None）"""
+  ctx = current_request()
+  if ctx is None:
+    return None
+  names = [str(field['name']) for field in fields if isinstance(field, dict) and field.get('name')]
+  ctx.fill_report = FillReport(names)
+  return ctx.fill_report
+
+
+def summary_header(report: Dict[str, Any]) -> str:
+  """X-Fill-Report-Summary 响应头的值，如 "matched=3, mapped=1, unmatched=0, rejected=1" """
+  return ', '.join(f'{status}={report["summary"][status]}' for status in STATUSES)
+
+
+def fill_report_path(report_id: str) -> Optional[Path]:
+  """获取报告文件路径，ID 不合法时返回 None"""
+  if not _REPORT_ID_PATTERN.match(report_id):
+    return None
+  return Path(settings.FILL_REPORT_DIR) / f'{report_id}.json'
+
+
+def save_fill_report(report: Dict[str, Any]) -> Optional[str]:
+  """
+  以新生成的报告ID保存报告，并删除超出数量上限的最旧文件
+
+  Returns:
+    报告的下载地址，保存失败时返回 None
+  """
+  report_id = uuid.uuid4().hex
+  path = fill_report_path(report_id)
+  try:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+      json.dump(report, f, ensure_ascii=False)
+
+    files = sorted(path.parent.glob('*.json'), key=lambda p: p.stat().st_mtime)
+    for old in files[:max(len(files) - settings.FILL_REPORT_MAX_FILES, 0)]:
+      try:
+        os.remove(old)
+      except OSError:
+        pass
+  except Exception as e:
+    logger.warning(f'保存填充报告失败: {str(e)}')
+    return None
+  return f'/api/v1/fill-reports/{report_id}'
@@ -1,43 +1,113 @@
+"""
+日志配置
+- 所有日志处理器使用 enqueue：请求线程只把格式化后的记录放入队列，
+  写文件、轮转和压缩都在后台线程中完成，不阻塞请求；gunicorn preload 时由主进程统一写入
+- 每条记录通过 patcher 附带当前请求ID（不在请求中时为 "-"）
+- LOG_FORMAT=json 时文件日志为每行一个 JSON 对象，便于日志系统采集
+- 逐字段的调试日志按请求采样（LOG_FIELD_SAMPLE_RATE），见 field_logging()
+"""
+
 import sys
+import json
+import random
 from loguru import logger
 from pathlib import Path
 
+from app.utils.config import settings
+from app.utils.request_context import current_request
+
+_TEXT_FORMAT = '{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}'
+_CONSOLE_FORMAT = (
+  '<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | {extra[request_id]} | '
+  '<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>'
+)
+
+
+def _add_request_id(record):
+  """patcher：把当前请求ID写入记录的 extra"""
+  ctx = current_request()
+  record['extra']['request_id'] = ctx.request_id if ctx else '-'
+
+
+def _json_format(record) -> str:
+  """把记录序列化为单行 JSON（loguru 的 format 函数，返回值作为格式模板）"""
+  data = {
+    'time': record['time'].isoformat(timespec='milliseconds'),
+    'level': record['level'].name,
+    'request_id': record['extra'].get('request_id', '-'),
+    'logger': f'{record["name"]}:{record["function"]}:{record["line"]}',
+    'message': record['message']
+  }
+  extra = {key: value for key, value in record['extra'].items() if key not in ('request_id', 'json')}
+  if extra:
+    data['extra'] = extra
+  if record['exception'] is not None:
+    data['exception'] = repr(record['exception'].value)
+  record['extra']['json'] = json.dumps(data, ensure_ascii=False, default=str)
+  return '{extra[json]}\n'
+
+
+def field_logging() -> bool:
+  """
+  是否输出逐字段的调试日志（每个控件的匹配、填充等）
+
+  在请求中按 LOG_FIELD_SAMPLE_RATE 对整个请求采样一次，被选中的请求输出全部逐字段日志，
+  其余请求直接跳过（连日志消息都不格式化）；不在请求中时每次调用单独采样
+
+  用法:
+    if field_logging():
+      logger.debug(f'填充字段 {name} = {value}')
+  """
+  rate = settings.LOG_FIELD_SAMPLE_RATE
+  ctx = current_request()
+  if ctx is None:
+    return rate > 0 and random.random() < rate
+  if ctx.field_logs is None:
+    ctx.field_logs = rate > 0 and random.random() < rate
+  return ctx.field_logs
+
+
 def setup_logger():
   """配置日志系统"""
-  
-  # 移除默认的日志处理器
+
+  # 移除默认的日志处理器，所有记录附带请求ID
   logger.remove()
-  
+  logger.configure(extra={'request_id': '-'}, patcher=_add_request_id)
+
   # 添加控制台日志处理器
   logger.add(
     sys.stdout,
-    format='<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>',
-    level='INFO',
-    colorize=True
+    format=_CONSOLE_FORMAT,
+    level=settings.LOG_LEVEL,
+    colorize=True,
+    enqueue=settings.LOG_ENQUEUE
   )
-  
-  # 添加文件日志处理器
-  log_file = Path('logs/app.log')
+
+  # 添加文件日志处理器（轮转和压缩在后台线程中进行）
+  log_file = Path(settings.LOG_FILE)
   log_file.parent.mkdir(parents=True, exist_ok=True)
-  
+  file_format = _json_format if settings.LOG_FORMAT == 'json' else _TEXT_FORMAT
+
   logger.add(
     log_file,
-    format='{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}',
+    format=file_format,
     level='DEBUG',
     rotation='10 MB',
     retention='7 days',
-    compression='zip'
+    compression='zip',
+    enqueue=settings.LOG_ENQUEUE
   )
-  
+
   # 添加错误日志处理器
-  error_log_file = Path('logs/error.log')
+  error_log_file = log_file.parent / 'error.log'
   logger.add(
     error_log_file,
-    format='{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}',
+    format=file_format,
     level='ERROR',
     rotation='10 MB',
     retention='30 days',
-    compression='zip'
+    compression='zip',
+    enqueue=settings.LOG_ENQUEUE
   )
-  
-  return logger 
\ No newline at end of file
+
+  return logger
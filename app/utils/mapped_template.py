@@ -0,0 +1,98 @@
+"""
+内存映射模板
+对已写入共享模板缓存的模板文件使用 mmap 打开，避免每个请求都把整个文件读成 Python bytes：
+- 需要文件路径的引擎（fillpdf / pdfrw / fitz）直接使用缓存文件，不再复制临时文件
+- PyPDF2 直接以 mmap 作为输入流读取
+映射页由操作系统页缓存提供，同一模板的并发请求（包括跨工作进程）共享同一份物理内存
+交给引擎的路径是从共享缓存租用的硬链接，其他工作进程淘汰该模板不影响正在处理的请求
+"""
+
+import io
+import os
+import mmap
+from typing import Optional, Union, BinaryIO
+
+
+class MappedTemplate:
+  """
+  以 mmap 方式打开的模板文件
+  接口与 UploadFile 兼容（filename / read / seek / close），可直接传给各引擎服务
+  """
+
+  def __init__(self, path: str, filename: str, sha256: Optional[str] = None, leased: bool = False):
+    self.path = str(path)
+    self.filename = filename
+    self.sha256 = sha256  # 模板内容的 SHA-256，可用作模板级缓存的键
+    self.leased = leased  # path 为本请求租用的硬链接，关闭时删除
+    try:
+      with open(self.path, 'rb') as f:
+        self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except BaseException:
+      self._release()
+      raise
+
+  async def read(self, size: int = -1) -> bytes:
+    return self.buffer.read(size)
+
+  async def seek(self, offset: int):
+    self.buffer.seek(offset)
+
+  async def close(self):
+    self.buffer.close()
+    self._release()
+
+  def _release(self):
+    if self.leased and os.path.exists(self.path):
+      os.remove(self.path)
+
+
+def template_key(file) -> Optional[str]:
+  """获取映射模板的 SHA-256，非映射模板返回 None"""
+  return file.sha256 if isinstance(file, MappedTemplate) else None
+
+
+def template_path(file) -> Optional[str]:
+  """获取可直接使用的模板文件路径，非映射模板返回 None（需由调用方写临时文件）"""
+  return file.path if isinstance(file, MappedTemplate) else None
+
+
+async def open_pdf_stream(file) -> Union[mmap.mmap, BinaryIO]:
+  """
+  获取可供 PyPDF2 读取的输入流
+
+  Returns:
+    映射模板直接返回 mmap（零拷贝），其他上传文件读入内存后返回 BytesIO
+  """
+  if isinstance(file, MappedTemplate):
+    file.buffer.seek(0)
+    return file.buffer
+  return io.BytesIO(await file.read())
+
+
+async def materialize_template(file, temp_path: str) -> str:
+  """
+  获取可供按路径读取的引擎（fillpdf / pdfrw / fitz）使用的模板文件
+
+  Args:
+    file: 上传文件或映射模板
+    temp_path: 非映射模板时写入的临时文件路径
+
+  Returns:
+    映射模板返回缓存文件路径，其他上传文件写入 temp_path 后返回 temp_path
+  """
+  path = template_path(file)
+  if path:
+    return path
+
+  content = await file.read()
+  if not content:
+    raise Exception('上传的文件为空')
+  with open(temp_path, 'wb') as f:
+    f.write(content)
+  return temp_path
+
+
+def release_template(path: str, file):
+  """删除 materialize_template 创建的临时文件，共享缓存中的模板文件不会被删除"""
+  if path and path != template_path(file) and os.path.exists(path):
+    os.remove(path)
@@ -0,0 +1,124 @@
+"""
+页码范围与控件页码索引
+- parse_page_ranges: 解析 API 的 pages 参数（如 "3-5,7"，页码从 1 开始）
+- widget_pages_by_name: 扫描一遍页面注释，建立 字段名 -> 所在页码 的索引，
+  只读取注释字典的 /Subtype、/T 和 /Parent，不解码字段值和选项
+"""
+
+from typing import Dict, Iterable, List, Optional, Set
+
+MAX_PAGE_COUNT = 100000  # 允许指定的最大页数（所有范围合计），防止 "1-999999999" 或大量范围拼接之类的输入
+
+
+def parse_page_ranges(spec: Optional[str]) -> Optional[Set[int]]:
+  """
+  解析页码范围
+
+  Args:
+    spec: 逗号分隔的页码或闭区间，如 "3-5,7"；为空时表示全部页面
+
+  Returns:
+    页码集合（从 1 开始），spec 为空时返回 None
+
+  Raises:
+    ValueError: 格式错误、页码不是正整数或合计超过 MAX_PAGE_COUNT 页
+  """
+  if spec is None or not spec.strip():
+    return None
+
+  pages = set()
+  for part in spec.split(','):
+    part = part.strip()
+    if not part:
+      continue
+    start, sep, end = part.partition('-')
+    try:
+      first = int(start)
+      last = int(end) if sep else first
+    except ValueError:
+      raise ValueError(f'无效的页码范围: {part}')
+    if first < 1 or last < first:
+      raise ValueError(f'无效的页码范围: {part}')
+    # 先检查单个范围，避免为超大范围分配集合；合并后再检查合计页数（重叠的页只计一次）
+    if last - first >= MAX_PAGE_COUNT:
+      raise ValueError(f'页码范围过大: {part}')
+    pages.update(range(first, last + 1))
+    if len(pages) > MAX_PAGE_COUNT:
+      raise ValueError(f'页码范围过大: 最多指定 {MAX_PAGE_COUNT} 页')
+
+  if not pages:
+    raise ValueError(f'无效的页码范围: {spec}')
+  return pages
+
+
+def format_page_ranges(pages: Iterable[int]) -> str:
+  """把页码集合格式化为规范的范围字符串（如 {3, 4, 5, 7} -> "3-5,7"），用作缓存键"""
+  ranges = []
+  for page in sorted(set(pages)):
+    if ranges and page == ranges[-1][1] + 1:
+      ranges[-1][1] = page
+    else:
+      ranges.append([page, page])
+  return ','.join(f'{first}-{last}' if first != last else str(first) for first, last in ranges)
+
+
+def widget_pages_by_name(pdf_reader, max_depth: int = 32) -> Dict[str, List[int]]:
+  """
+  扫描 PyPDF2 文档的页面注释，建立 字段名 -> 控件所在页码列表 的索引
+
+  同时记录完整字段名（父字段名用 '.' 连接）和控件自身的短名称，
+  一个字段的控件分布在多页时按页码顺序记录所有页
+
+  Args:
+    pdf_reader: PyPDF2.PdfReader
+    max_depth: 沿 /Parent 向上查找字段名的最大层数
+
+  Returns:
+    字段名 -> 页码列表（从 1 开始）
+  """
+  index = {}
+
+  def add(name, page_number):
+    page_list = index.setdefault(name, [])
+    if page_number not in page_list:
+      page_list.append(page_number)
+
+  for page_number, page in enumerate(pdf_reader.pages, 1):
+    annots = page.get('/Annots')
+    if not annots:
+      continue
+    for ref in annots.get_object():
+      try:
+        annot = ref.get_object()
+        if annot.get('/Subtype') != '/Widget':
+          continue
+        parts = []
+        node = annot
+        for _ in range(max_depth):
+          if '/T' in node:
+            parts.append(str(node['/T']))
+          parent = node.get('/Parent')
+          if parent is None:
+            break
+          node = parent.get_object()
+        if parts:
+          add('.'.join(reversed(parts)), page_number)
+          add(parts[0], page_number)
+      except Exception:
+        continue
+  return index
+
+
+def field_page(page_list: Optional[List[int]]) -> int:
+  """字段的页码：第一个控件所在页；没有找到控件时为第 1 页"""
+  return page_list[0] if page_list else 1
+
+
+def field_in_pages(page_list: Optional[List[int]], pages: Optional[Set[int]]) -> bool:
+  """
+  字段是否有控件位于请求的页面上（未指定页面时总是 True）
+  没有找到控件的字段按第 1 页处理，与返回的 page 一致
+  """
+  if pages is None:
+    return True
+  return not pages.isdisjoint(page_list or [1])
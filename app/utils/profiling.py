@@ -0,0 +1,163 @@
+"""
+按需性能剖析
+通过请求头 `X-Profile: 1` 或按采样率对单个请求的引擎调用进行 cProfile 剖析（在工作线程中运行），
+剖析结果按服务端生成的剖析ID（而不是客户端可指定的请求ID）保存到有上限的目录中，
+可通过响应头 X-Profile-URL 给出的 /debug/profiles/{id} 下载
+
+PROFILING_ENABLED 关闭时中间件不会注册，profiled() 只做一次属性判断后直接调用引擎方法
+"""
+
+import io
+import os
+import re
+import uuid
+import random
+import pstats
+import asyncio
+import cProfile
+import contextvars
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, TypeVar
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+
+from app.utils.config import settings
+from app.utils.request_context import current_request, RequestContext
+
+PROFILE_HEADER = b'x-profile'
+PROFILE_URL_HEADER = b'x-profile-url'
+_PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+T = TypeVar('T')
+
+
+def _wants_profile(scope) -> bool:
+  """根据请求头或采样率决定是否剖析该请求"""
+  for key, value in scope.get('headers', []):
+    if key == PROFILE_HEADER:
+      return value.strip().lower() in (b'1', b'true', b'yes')
+  rate = settings.PROFILE_SAMPLE_RATE
+  return rate > 0 and random.random() < rate
+
+
+class _ThreadUpload:
+  """
+  在剖析线程中同步读取的上传文件
+  UploadFile.read 会把读取交给线程池，剖析线程看不到这部分耗时；这里直接读取底层文件
+  """
+
+  def __init__(self, upload: UploadFile):
+    self.upload = upload
+    self.filename = upload.filename
+
+  async def read(self, size: int = -1) -> bytes:
+    return self.upload.file.read(size)
+
+  async def seek(self, offset: int):
+    self.upload.file.seek(offset)
+
+  async def close(self):
+    # 上传文件由 FastAPI 在请求结束时关闭
+    pass
+
+
+async def profiled(func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+  """
+  调用引擎方法，当前请求被选中剖析时对其进行剖析
+
+  cProfile 只挂在启用它的线程上：在事件循环线程上剖析会混入同时运行的其他请求的协程，
+  并漏掉交给线程池的工作。因此剖析时在工作线程中用独立的事件循环同步运行引擎方法，
+  剖析器只在该线程上启用，并发的剖析请求各自使用自己的线程，互不影响
+
+  用法:
+    with stage('engine.standard'):
+      fields = await profiled(pdf_service_pypdf.parse_form_fields, source, page_set)
+  """
+  ctx = current_request()
+  if ctx is None or not ctx.profile:
+    return await func(*args, **kwargs)
+
+  if ctx.profiler is None:
+    ctx.profiler = cProfile.Profile()
+  profiler = ctx.profiler
+  args = tuple(_ThreadUpload(arg) if isinstance(arg, UploadFile) else arg for arg in args)
+
+  def run():
+    profiler.enable()
+    try:
+      return asyncio.run(func(*args, **kwargs))
+    finally:
+      profiler.disable()
+
+  # 复制请求上下文（请求ID、计时、追踪 span 等），引擎中记录的阶段和日志仍归属本请求
+  return await run_in_threadpool(contextvars.copy_context().run, run)
+
+
+def profile_path(profile_id: str) -> Optional[Path]:
+  """获取剖析文件路径，ID 不合法时返回 None"""
+  if not _PROFILE_ID_PATTERN.match(profile_id):
+    return None
+  return Path(settings.PROFILE_DIR) / f'{profile_id}.prof'
+
+
+def profile_summary(path: Path, limit: int = 50) -> str:
+  """生成按累计耗时排序的文本摘要"""
+  buffer = io.StringIO()
+  stats = pstats.Stats(str(path), stream=buffer)
+  stats.sort_stats('cumulative').print_stats(limit)
+  return buffer.getvalue()
+
+
+def _save_profile(ctx: RequestContext, profile_id: str):
+  """保存剖析结果，并删除超出数量上限的最旧文件"""
+  directory = Path(settings.PROFILE_DIR)
+  directory.mkdir(parents=True, exist_ok=True)
+  ctx.profiler.dump_stats(str(directory / f'{profile_id}.prof'))
+  logger.info(f'已保存请求 {ctx.request_id} 的剖析结果: {profile_id}')
+
+  files = sorted(directory.glob('*.prof'), key=lambda p: p.stat().st_mtime)
+  for old in files[:max(len(files) - settings.PROFILE_MAX_FILES, 0)]:
+    try:
+      os.remove(old)
+    except OSError:
+      pass
+
+
+class ProfilingMiddleware:
+  """
+  剖析中间件（纯 ASGI 实现），需注册在 RequestContextMiddleware 内层
+
+  - 决定当前请求是否剖析
+  - 有剖析数据时在响应头中附加 X-Profile-URL
+  - 请求结束后保存剖析文件
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    ctx = current_request()
+    if scope['type'] != 'http' or ctx is None or not _wants_profile(scope):
+      await self.app(scope, receive, send)
+      return
+
+    ctx.profile = True
+    # 请求ID可由客户端指定，剖析文件使用服务端生成的ID，避免互相覆盖或被他人读取
+    profile_id = uuid.uuid4().hex
+
+    async def send_wrapper(message):
+      if message['type'] == 'http.response.start' and ctx.profiler is not None:
+        headers = list(message.get('headers', []))
+        headers.append((PROFILE_URL_HEADER, f'/debug/profiles/{profile_id}'.encode('latin-1')))
+        message = {**message, 'headers': headers}
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      if ctx.profiler is not None:
+        try:
+          _save_profile(ctx, profile_id)
+        except Exception as e:
+          logger.warning(f'保存剖析结果失败: {str(e)}')
@@ -0,0 +1,132 @@
+"""
+请求上下文
+在一次请求的处理链路（处理函数、各引擎服务）中共享请求ID和阶段计时信息
+"""
+
+import re
+import json
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+from loguru import logger
+
+from app.utils.timing import StageTimer
+
+# 客户端可通过该请求头传入自己的请求ID
+REQUEST_ID_HEADER = b'x-request-id'
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+class RequestContext:
+  """单个请求的上下文"""
+
+  def __init__(self, request_id: str):
+    self.request_id = request_id
+    self.timer = StageTimer()
+    self.profile = False  # 是否对该请求进行性能剖析
+    self.profiler = None  # 剖析器，首次进入剖析区域时创建
+    self.text_scan_coverage = None  # 文本识别实际覆盖的页面（大文档模式下可能只覆盖部分页面）
+    self.field_logs = None  # 是否输出逐字段调试日志，首次需要时按采样率决定
+    self.trace = None  # 链路追踪（app.utils.tracing.Trace），请求未被追踪时为 None
+    self.fill_report = None  # 填充报告（app.utils.fill_report.FillReport），未请求报告时为 None
+
+
+_current_request: ContextVar[Optional[RequestContext]] = ContextVar('current_request', default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+  """获取当前请求的上下文，不在请求中时返回 None"""
+  return _current_request.get()
+
+
+def current_timer() -> StageTimer:
+  """获取当前请求的计时器，不在请求中时返回一个独立的计时器"""
+  ctx = _current_request.get()
+  return ctx.timer if ctx else StageTimer()
+
+
+def stage(name: str):
+  """
+  记录当前请求中某个阶段的耗时，请求被追踪时同时生成同名 span
+
+  用法:
+    with stage('parse'):
+      ...
+  """
+  ctx = _current_request.get()
+  if ctx is None:
+    return StageTimer().stage(name)
+  if ctx.trace is None:
+    return ctx.timer.stage(name)
+  return ctx.trace.stage(ctx.timer, name)
+
+
+def _resolve_request_id(scope) -> str:
+  """优先使用客户端传入的合法请求ID，否则生成新的"""
+  for key, value in scope.get('headers', []):
+    if key == REQUEST_ID_HEADER:
+      request_id = value.decode('latin-1')
+      if _REQUEST_ID_PATTERN.match(request_id):
+        return request_id
+      break
+  return uuid.uuid4().hex
+
+
+class RequestContextMiddleware:
+  """
+  请求上下文中间件（纯 ASGI 实现）
+
+  - 为每个请求创建上下文并分配请求ID
+  - 在响应头中附加 Server-Timing 和 X-Request-ID
+  - 响应体发送完毕后输出一行结构化访问日志（包含发送耗时）
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] != 'http':
+      await self.app(scope, receive, send)
+      return
+
+    ctx = RequestContext(_resolve_request_id(scope))
+    token = _current_request.set(ctx)
+    state = {'status': 500, 'send_started': None, 'logged': False}
+
+    async def send_wrapper(message):
+      if message['type'] == 'http.response.start':
+        state['status'] = message['status']
+        headers = list(message.get('headers', []))
+        headers.append((b'server-timing', ctx.timer.to_header().encode('latin-1')))
+        headers.append((b'x-request-id', ctx.request_id.encode('latin-1')))
+        message = {**message, 'headers': headers}
+        state['send_started'] = time.perf_counter()
+
+      await send(message)
+
+      if message['type'] == 'http.response.body' and not message.get('more_body', False):
+        if state['send_started'] is not None:
+          ctx.timer.add('send', (time.perf_counter() - state['send_started']) * 1000)
+        _log_access(scope, ctx, state['status'])
+        state['logged'] = True
+
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      if not state['logged']:
+        _log_access(scope, ctx, state['status'])
+      _current_request.reset(token)
+
+
+def _log_access(scope, ctx: RequestContext, status: int):
+  """输出结构化访问日志"""
+  record = {
+    'request_id': ctx.request_id,
+    'method': scope.get('method'),
+    'path': scope.get('path'),
+    'status': status,
+    **ctx.timer.to_dict()
+  }
+  # JSON 日志中以结构化字段 extra.access 输出，文本日志中为消息里的 JSON
+  logger.bind(access=record).info(f'access {json.dumps(record, ensure_ascii=False)}')
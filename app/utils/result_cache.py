@@ -0,0 +1,121 @@
+"""
+填充结果缓存
+相同模板、相同字段值、相同引擎和选项的填充请求（如重新生成的确认单、客户端重试）直接返回已保存的输出，
+不再重新填充和写出新的 filled_<uuid>_*.pdf
+
+- 缓存键: 模板 SHA-256、规范化后的字段数据、引擎和选项的 SHA-256
+- 输出文件保存在共享模板缓存的 results 目录，元数据（实际引擎、ETag、响应头）保存在 meta 表，
+  与模板一样按 LRU 淘汰
+- ETag 为输出内容的 SHA-256，客户端携带 If-None-Match 且与之匹配时返回 304
+- 请求的引擎失败并回退到其他引擎时不保存结果，相同请求再次到达时仍先尝试请求的引擎
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.config import settings
+from app.utils.template_cache import template_cache, content_sha256
+
+KIND_RESULT = 'results'
+RESULT_META_NAME = 'fill_result'
+
+# 回退后的引擎名称包含该标记，如 enhanced_fillpdf_fallback_to_standard
+FALLBACK_MARKER = '_fallback_to_'
+
+# 填充结果缓存版本，填充逻辑变化导致输出不同时递增，使旧缓存失效
+FILL_CACHE_VERSION = 2
+
+
+def canonical_fields(fields: List[Dict[str, Any]]) -> str:
+  """
+  字段数据的规范化 JSON
+
+  按字段名稳定排序（同名字段保持原有先后顺序，后者覆盖前者的语义不变），
+  字段内的键排序并去掉多余空白，字段顺序或书写格式不同的相同数据得到相同结果
+  """
+  ordered = sorted(fields, key=lambda field: str(field.get('name', '')) if isinstance(field, dict) else '')
+  return json.dumps(ordered, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def fill_result_key(template_sha: str, engine: str, fields: List[Dict[str, Any]],
+                    strict_validation: bool, output: str) -> str:
+  """计算填充结果的缓存键"""
+  options = json.dumps({
+    'version': FILL_CACHE_VERSION,
+    'template': template_sha,
+    'engine': engine,
+    'strict_validation': strict_validation,
+    'output': output
+  }, sort_keys=True)
+  return content_sha256(f'{options}\n{canonical_fields(fields)}'.encode('utf-8'))
+
+
+def make_etag(content_sha: str) -> str:
+  """输出内容 SHA-256 对应的强 ETag"""
+  return f'"{content_sha}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  """
+  判断 If-None-Match 是否与 ETag 匹配（弱比较，支持逗号分隔的多个值和 *）
+  """
+  if not if_none_match:
+    return False
+  for candidate in if_none_match.split(','):
+    candidate = candidate.strip()
+    if candidate == '*':
+      return True
+    if candidate.startswith('W/'):
+      candidate = candidate[2:]
+    if candidate == etag:
+      return True
+  return False
+
+
+def get_fill_result(key: str) -> Optional[Tuple[Path, Dict[str, Any]]]:
+  """
+  查找缓存的填充结果
+
+  Returns:
+    命中时返回 (输出文件路径, 元数据)，元数据包含 engine、etag 和 headers（以及可能保存的 report）；
+    未命中返回 None。输出文件为租用的硬链接，发送后需由调用方用 template_cache.release_lease 归还
+  """
+  if not settings.RESULT_CACHE_ENABLED:
+    return None
+  meta = template_cache.get_meta(key, RESULT_META_NAME)
+  if meta is None:
+    return None
+  path = template_cache.lease_blob(KIND_RESULT, key)
+  if path is None:
+    return None
+  return path, meta
+
+
+def put_fill_result(key: str, output_path: str, engine: str, headers: Dict[str, str],
+                    report: Optional[Dict[str, Any]] = None) -> str:
+  """
+  保存填充结果
+
+  Args:
+    key: fill_result_key 计算的缓存键
+    output_path: 引擎写出（及压缩优化后）的输出文件
+    engine: 实际使用的引擎（包含回退信息）
+    headers: 需要在命中时原样返回的响应头
+    report: 本次填充的字段报告（请求了报告时），命中时可直接返回而不必重新填充
+
+  Returns:
+    输出内容的 ETag（缓存不可用或回退引擎的结果不保存时同样返回）
+  """
+  with open(output_path, 'rb') as f:
+    content = f.read()
+  etag = make_etag(content_sha256(content))
+  # 回退引擎的输出不代表缓存键中的引擎（失败可能是临时的），不保存
+  if FALLBACK_MARKER in engine:
+    return etag
+  if settings.RESULT_CACHE_ENABLED and template_cache.put_blob(KIND_RESULT, key, content) is not None:
+    meta = {'engine': engine, 'etag': etag, 'headers': headers}
+    if report is not None:
+      meta['report'] = report
+    template_cache.put_meta(key, RESULT_META_NAME, meta)
+  return etag
@@ -0,0 +1,262 @@
+"""
+影子引擎比对
+按采样率选中的请求在响应发送后，用另一个引擎（SHADOW_ENGINE）在后台重新解析或填充同一模板，
+比较解析出的字段（或填充后的字段值）以及两个引擎的耗时，差异写入 JSON Lines 报告并计入统计
+
+影子任务在单线程的后台执行器中运行，不占用事件循环；排队任务达到上限时直接跳过，
+避免影子流量在高负载时堆积。SHADOW_ENGINE 为空或采样率为 0 时不做任何额外工作
+"""
+
+import io
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set
+from fastapi import UploadFile
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.timing import StageTimer
+
+# 单条报告中最多记录的差异数，其余只计数
+MAX_REPORTED_DIFFERENCES = 20
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_pending = 0
+_stats = {'compared': 0, 'matched': 0, 'mismatched': 0, 'failed': 0, 'skipped': 0}
+
+
+class ShadowComparison:
+  """一次影子比对：主引擎与影子引擎的耗时及结果差异"""
+
+  def __init__(self, kind: str, request_id: Optional[str], template_sha: str,
+               primary_engine: str, primary_ms: float, shadow_engine: str):
+    self.kind = kind  # 'parse' 或 'fill'
+    self.request_id = request_id
+    self.template_sha = template_sha
+    self.primary_engine = primary_engine
+    self.primary_ms = primary_ms
+    self.shadow_engine = shadow_engine
+    self.shadow_ms: Optional[float] = None
+    self.primary_count = 0  # 主引擎的字段数
+    self.shadow_count = 0  # 影子引擎的字段数
+    self.differences: List[Dict[str, Any]] = []
+    self.error: Optional[str] = None
+
+  @property
+  def match(self) -> bool:
+    return self.error is None and not self.differences
+
+  def to_dict(self) -> Dict[str, Any]:
+    return {
+      'time': datetime.now().isoformat(timespec='seconds'),
+      'request_id': self.request_id,
+      'kind': self.kind,
+      'template_sha': self.template_sha,
+      'primary_engine': self.primary_engine,
+      'shadow_engine': self.shadow_engine,
+      'primary_ms': round(self.primary_ms, 1),
+      'shadow_ms': round(self.shadow_ms, 1) if self.shadow_ms is not None else None,
+      'match': self.match,
+      'primary_fields': self.primary_count,
+      'shadow_fields': self.shadow_count,
+      'difference_count': len(self.differences),
+      'differences': self.differences[:MAX_REPORTED_DIFFERENCES],
+      'error': self.error
+    }
+
+
+def shadow_engine_for(engine: str) -> Optional[str]:
+  """
+  决定当前请求是否进行影子比对
+
+  Returns:
+    影子引擎名称；未启用、与主引擎相同或未被采样时返回 None
+  """
+  shadow = settings.SHADOW_ENGINE
+  rate = settings.SHADOW_SAMPLE_RATE
+  if not shadow or shadow == engine or rate <= 0:
+    return None
+  return shadow if random.random() < rate else None
+
+
+def engine_ms(timer: StageTimer) -> float:
+  """主引擎的耗时（包含回退到其他引擎的耗时）"""
+  return sum(duration for name, duration in timer.stages.items() if name.startswith('engine.'))
+
+
+def compare_fields(primary: List[Dict[str, Any]], shadow: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+  """
+  按字段名比较两个引擎的解析结果
+
+  Returns:
+    差异列表，每项为 {'field', 'key', 'primary', 'shadow'}；
+    只有一方存在的字段 key 为 None，取值为该字段是否存在
+  """
+  primary_by_name = {field.get('name'): field for field in primary}
+  shadow_by_name = {field.get('name'): field for field in shadow}
+  differences = []
+  for name, field in primary_by_name.items():
+    other = shadow_by_name.get(name)
+    if other is None:
+      differences.append({'field': name, 'key': None, 'primary': True, 'shadow': False})
+      continue
+    for key in sorted(field.keys() | other.keys()):
+      if field.get(key) != other.get(key):
+        differences.append({'field': name, 'key': key, 'primary': field.get(key), 'shadow': other.get(key)})
+  for name in shadow_by_name.keys() - primary_by_name.keys():
+    differences.append({'field': name, 'key': None, 'primary': False, 'shadow': True})
+  return differences
+
+
+def compare_values(primary: Dict[str, Any], shadow: Dict[str, Any]) -> List[Dict[str, Any]]:
+  """比较两份填充结果中的字段值（字段名 -> 值），差异格式同 compare_fields"""
+  differences = []
+  for name in list(primary) + [name for name in shadow if name not in primary]:
+    if primary.get(name) != shadow.get(name):
+      differences.append({'field': name, 'key': 'value', 'primary': primary.get(name), 'shadow': shadow.get(name)})
+  return differences
+
+
+def _upload(content: bytes, filename: str) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+async def _parse_values(reader, path: str, filename: str) -> Dict[str, Any]:
+  with open(path, 'rb') as f:
+    fields = await reader.parse_form_fields(_upload(f.read(), filename))
+  return {field['name']: field.get('value') for field in jsonable_encoder(fields)}
+
+
+async def run_parse_shadow(comparison: ShadowComparison, service, content: bytes, filename: str,
+                           pages: Optional[Set[int]], primary_fields: List[Dict[str, Any]],
+                           projection: Optional[FrozenSet[str]] = None):
+  """用影子引擎解析同一模板（相同的页面和字段属性投影），并与主引擎的解析结果比较"""
+  started = time.perf_counter()
+  fields = await service.parse_form_fields(_upload(content, filename), pages, projection)
+  comparison.shadow_ms = (time.perf_counter() - started) * 1000
+  fields = jsonable_encoder(fields)
+  comparison.primary_count = len(primary_fields)
+  comparison.shadow_count = len(fields)
+  comparison.differences = compare_fields(primary_fields, fields)
+
+
+async def run_fill_shadow(comparison: ShadowComparison, service, reader, content: bytes, filename: str,
+                          fields_data: List[Dict[str, Any]], strict_validation: bool, primary_output: str):
+  """
+  用影子引擎填充同一模板，再用 reader 分别解析两份输出并比较字段值
+
+  影子引擎的输出文件在比较后删除
+  """
+  started = time.perf_counter()
+  shadow_output = await service.fill_form(_upload(content, filename), fields_data, strict_validation)
+  comparison.shadow_ms = (time.perf_counter() - started) * 1000
+  try:
+    primary_values = await _parse_values(reader, primary_output, filename)
+    shadow_values = await _parse_values(reader, shadow_output, filename)
+  finally:
+    try:
+      os.remove(shadow_output)
+    except OSError:
+      pass
+  comparison.primary_count = len(primary_values)
+  comparison.shadow_count = len(shadow_values)
+  comparison.differences = compare_values(primary_values, shadow_values)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+  global _executor
+  if _executor is None:
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+  return _executor
+
+
+def submit_shadow(comparison: ShadowComparison, job: Callable, *args):
+  """
+  把影子任务交给后台执行器（作为响应的后台任务调用，即响应发送之后）
+
+  Args:
+    comparison: 本次比对
+    job: run_parse_shadow 或 run_fill_shadow
+    args: job 除 comparison 外的参数
+  """
+  global _pending
+  with _lock:
+    if _pending >= settings.SHADOW_MAX_PENDING:
+      _stats['skipped'] += 1
+      logger.debug(f'影子任务排队已满，跳过请求 {comparison.request_id} 的比对')
+      return
+    _pending += 1
+    executor = _get_executor()
+  executor.submit(_run, comparison, job, args)
+
+
+def _run(comparison: ShadowComparison, job: Callable, args):
+  global _pending
+  try:
+    asyncio.run(job(comparison, *args))
+  except Exception as e:
+    comparison.error = f'{type(e).__name__}: {str(e)}'
+  finally:
+    with _lock:
+      _pending -= 1
+  _record(comparison)
+
+
+def _record(comparison: ShadowComparison):
+  """更新统计并写入报告"""
+  record = comparison.to_dict()
+  with _lock:
+    _stats['compared'] += 1
+    if comparison.error is not None:
+      _stats['failed'] += 1
+    elif comparison.match:
+      _stats['matched'] += 1
+    else:
+      _stats['mismatched'] += 1
+    try:
+      path = Path(settings.SHADOW_REPORT_FILE)
+      path.parent.mkdir(parents=True, exist_ok=True)
+      with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+      logger.warning(f'写入影子比对报告失败: {str(e)}')
+
+  summary = (
+    f'影子比对 {comparison.kind} {comparison.primary_engine} -> {comparison.shadow_engine}: '
+    f'{record["primary_ms"]}ms / {record["shadow_ms"]}ms'
+  )
+  if comparison.error is not None:
+    logger.warning(f'{summary}，影子引擎失败: {comparison.error}')
+  elif comparison.match:
+    logger.info(f'{summary}，结果一致')
+  else:
+    logger.warning(f'{summary}，{len(comparison.differences)} 处差异')
+
+
+def shadow_stats() -> Dict[str, Any]:
+  """影子比对的累计统计（当前工作进程）"""
+  with _lock:
+    return {
+      'shadow_engine': settings.SHADOW_ENGINE,
+      'sample_rate': settings.SHADOW_SAMPLE_RATE,
+      'pending': _pending,
+      **_stats
+    }
+
+
+def shutdown_shadow(wait: bool = False):
+  """关闭影子任务执行器（应用关闭时调用），wait 为 True 时等待排队的任务完成"""
+  global _executor
+  with _lock:
+    executor, _executor = _executor, None
+  if executor is not None:
+    executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,350 @@
+"""
+跨进程共享的模板磁盘缓存
+按 SHA-256 内容寻址保存模板文件，并保存解析/填充相关的元数据，
+同一节点上的所有工作进程共享同一个缓存目录：一个进程解析过的模板对其他进程同样是热的
+
+- 文件: {CACHE_DIR}/{kind}/{sha[:2]}/{sha}.pdf，先写临时文件再 os.replace 原子替换
+- 索引: {CACHE_DIR}/cache.db（SQLite WAL 模式），记录大小和最近访问时间，元数据以 JSON 保存
+- 淘汰: 总大小超过上限时按最近访问时间（LRU）删除最旧的条目；总大小在 stats 表中随写入和淘汰累计，
+  不再每次写入都对全表求和
+- 租用: 交给请求使用的文件是 {CACHE_DIR}/leases/ 下的硬链接，其他工作进程淘汰条目只删除缓存路径，
+  正在使用的请求不受影响；请求结束时删除硬链接，工作进程退出后遗留的硬链接在下次打开缓存时清理
+  （进程号可能被复用，如容器重启后的新进程，因此超过 LEASE_MAX_AGE 的硬链接无论进程是否存在都会删除）
+- 元数据只写入已有条目的键，随条目一起淘汰
+"""
+
+import os
+import json
+import errno
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Optional
+from loguru import logger
+
+from app.utils.config import settings
+
+KIND_TEMPLATE = 'templates'
+LEASE_DIR = 'leases'
+LEASE_MAX_AGE = 6 * 3600  # 租用硬链接的最长保留时间（秒），远大于任何请求的处理时间
+_NO_LINK_ERRNOS = (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.EOPNOTSUPP)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  kind TEXT NOT NULL,
+  key TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  last_access REAL NOT NULL,
+  PRIMARY KEY (kind, key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT NOT NULL,
+  name TEXT NOT NULL,
+  value TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  PRIMARY KEY (key, name)
+);
+CREATE TABLE IF NOT EXISTS stats (
+  name TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS idx_entries_key ON entries (key);
+INSERT OR IGNORE INTO stats (name, value) VALUES ('total_size',
+  (SELECT COALESCE(SUM(size), 0) FROM entries) + (SELECT COALESCE(SUM(size), 0) FROM meta));
+"""
+
+
+def content_sha256(content: bytes) -> str:
+  """计算内容的 SHA-256（缓存键）"""
+  return hashlib.sha256(content).hexdigest()
+
+
+class TemplateCache:
+  """内容寻址的磁盘缓存（多进程、多线程安全）"""
+
+  def __init__(self, cache_dir: str, max_bytes: int, enabled: bool = True):
+    self.cache_dir = Path(cache_dir)
+    self.max_bytes = max_bytes
+    self.enabled = enabled
+    self._local = threading.local()
+
+  def _connect(self) -> sqlite3.Connection:
+    """
+    获取当前线程的数据库连接
+    连接按进程和线程分别创建：gunicorn preload 后 fork 出的子进程不能复用父进程的连接
+    """
+    conn = getattr(self._local, 'conn', None)
+    if conn is not None and self._local.pid == os.getpid():
+      return conn
+
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(self.cache_dir / 'cache.db'), timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=10000')
+    conn.executescript(_SCHEMA)
+    self._local.conn = conn
+    self._local.pid = os.getpid()
+    self._remove_stale_leases()
+    return conn
+
+  @contextmanager
+  def _transaction(self):
+    """写事务（BEGIN IMMEDIATE），条目和总大小在同一事务中更新"""
+    conn = self._connect()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      yield conn
+    except BaseException:
+      conn.execute('ROLLBACK')
+      raise
+    conn.execute('COMMIT')
+
+  def blob_path(self, kind: str, key: str) -> Path:
+    """条目文件路径（按前两位分目录，避免单目录文件过多）"""
+    return self.cache_dir / kind / key[:2] / f'{key}.pdf'
+
+  def get_blob(self, kind: str, key: str) -> Optional[Path]:
+    """
+    查找缓存文件
+
+    Returns:
+      命中时返回文件路径并刷新访问时间，未命中返回 None
+    """
+    if not self.enabled:
+      return None
+    path = self.blob_path(kind, key)
+    try:
+      if not path.exists():
+        return None
+      self._connect().execute(
+        'UPDATE entries SET last_access = ? WHERE kind = ? AND key = ?',
+        (time.time(), kind, key)
+      )
+      return path
+    except (OSError, sqlite3.Error) as e:
+      logger.warning(f'读取缓存失败 {kind}/{key}: {str(e)}')
+      return None
+
+  def put_blob(self, kind: str, key: str, content: bytes) -> Optional[Path]:
+    """
+    写入缓存文件（已存在时只刷新访问时间）
+
+    Returns:
+      缓存文件路径，缓存不可用时返回 None
+    """
+    return self._store(kind, key, content)
+
+  def get_meta(self, key: str, name: str) -> Optional[Any]:
+    """读取元数据（如 parse:enhanced_fillpdf 的解析结果），未命中返回 None"""
+    if not self.enabled:
+      return None
+    try:
+      row = self._connect().execute(
+        'SELECT value FROM meta WHERE key = ? AND name = ?', (key, name)
+      ).fetchone()
+      return json.loads(row[0]) if row else None
+    except (sqlite3.Error, ValueError) as e:
+      logger.warning(f'读取缓存元数据失败 {key}/{name}: {str(e)}')
+      return None
+
+  def put_meta(self, key: str, name: str, value: Any):
+    """
+    保存元数据，值需可 JSON 序列化
+    该键没有条目时（未缓存或已被淘汰）不保存：元数据只随条目淘汰，没有条目的元数据永远不会被删除
+    """
+    if not self.enabled:
+      return
+    try:
+      data = json.dumps(value, ensure_ascii=False)
+      size = len(data.encode('utf-8'))
+      with self._transaction() as conn:
+        if conn.execute('SELECT 1 FROM entries WHERE key = ? LIMIT 1', (key,)).fetchone() is None:
+          logger.debug(f'缓存条目不存在，跳过元数据 {key}/{name}')
+          return
+        row = conn.execute('SELECT size FROM meta WHERE key = ? AND name = ?', (key, name)).fetchone()
+        conn.execute(
+          'INSERT OR REPLACE INTO meta (key, name, value, size) VALUES (?, ?, ?, ?)',
+          (key, name, data, size)
+        )
+        self._evict(conn, self._add_size(conn, size - (row[0] if row else 0)))
+    except (sqlite3.Error, TypeError, ValueError) as e:
+      logger.warning(f'写入缓存元数据失败 {key}/{name}: {str(e)}')
+
+  def put_template(self, content: bytes, key: Optional[str] = None) -> Optional[Path]:
+    """保存模板文件，返回缓存路径"""
+    return self.put_blob(KIND_TEMPLATE, key or content_sha256(content), content)
+
+  def get_template(self, key: str) -> Optional[Path]:
+    """按 SHA-256 查找模板文件"""
+    return self.get_blob(KIND_TEMPLATE, key)
+
+  def lease_blob(self, kind: str, key: str) -> Optional[Path]:
+    """
+    租用缓存文件：为条目创建本次请求专用的硬链接并刷新访问时间
+    其他工作进程淘汰该条目时只删除缓存路径，已租用的文件在 release_lease 之前始终可用
+
+    Returns:
+      硬链接路径（文件系统不支持硬链接时为副本），未命中返回 None
+    """
+    return self._store(kind, key, None, lease=True)
+
+  @staticmethod
+  def _write_temp(path: Path, content: bytes) -> str:
+    """把内容写入缓存路径同目录下的临时文件，返回临时文件路径"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+      f.write(content)
+    return tmp_path
+
+  def lease_template(self, key: str, content: Optional[bytes] = None) -> Optional[Path]:
+    """
+    租用模板文件；提供 content 时先写入缓存（写入和租用在同一事务中，中间不会被淘汰）
+
+    Returns:
+      租用的文件路径（需由调用方 release_lease），缓存不可用或未命中时返回 None
+    """
+    return self._store(KIND_TEMPLATE, key, content, lease=True)
+
+  def _store(self, kind: str, key: str, content: Optional[bytes], lease: bool = False) -> Optional[Path]:
+    """
+    写入和/或租用条目
+    文件内容先写入临时文件，替换缓存路径、更新索引、淘汰和创建硬链接都在同一个写事务中完成，
+    淘汰同样只在写事务中删除文件，因此写入或查到的文件在创建硬链接之前不会被其他工作进程删除
+
+    Args:
+      content: 条目内容，为 None 时只租用已有条目
+      lease: 是否返回租用的硬链接（否则返回缓存路径）
+    """
+    if not self.enabled:
+      return None
+    path = self.blob_path(kind, key)
+    tmp_path = lease_path = None
+    try:
+      if content is not None and not path.exists():
+        # 先写同目录下的临时文件，在事务中原子替换；并发写入同一内容时最后一个替换者胜出，内容一致
+        tmp_path = self._write_temp(path, content)
+      if lease:
+        lease_path = self.cache_dir / LEASE_DIR / f'{os.getpid()}-{int(time.time())}-{uuid.uuid4().hex}.pdf'
+        lease_path.parent.mkdir(parents=True, exist_ok=True)
+
+      with self._transaction() as conn:
+        if content is not None and tmp_path is None and not path.exists():
+          # 检查之后被其他工作进程淘汰，持有写锁时重新写入
+          tmp_path = self._write_temp(path, content)
+        if tmp_path is not None:
+          os.replace(tmp_path, path)
+          tmp_path = None
+        updated = conn.execute(
+          'UPDATE entries SET last_access = ? WHERE kind = ? AND key = ?', (time.time(), kind, key)
+        ).rowcount
+        if content is None:
+          if not updated or not path.exists():
+            return None
+        elif not updated:
+          conn.execute(
+            'INSERT INTO entries (kind, key, size, last_access) VALUES (?, ?, ?, ?)',
+            (kind, key, len(content), time.time())
+          )
+          self._evict(conn, self._add_size(conn, len(content)), keep=(kind, key))
+        if lease_path is None:
+          return path
+        try:
+          os.link(path, lease_path)
+        except OSError as e:
+          # 文件系统不支持硬链接时复制
+          if e.errno not in _NO_LINK_ERRNOS:
+            raise
+          shutil.copyfile(path, lease_path)
+        return lease_path
+    except (OSError, sqlite3.Error) as e:
+      logger.warning(f'写入缓存失败 {kind}/{key}: {str(e)}')
+      if lease_path is not None:
+        self.release_lease(lease_path)
+      return None
+    finally:
+      if tmp_path is not None and os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+  @staticmethod
+  def release_lease(path):
+    """归还租用的文件（删除硬链接，缓存条目本身不受影响）"""
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+  def _remove_stale_leases(self):
+    """
+    删除已退出的工作进程遗留的硬链接（文件名为 {进程号}-{创建时间}-{随机ID}.pdf）
+    进程号可能已被其他进程复用，创建时间超过 LEASE_MAX_AGE 的硬链接同样删除
+    （硬链接与缓存文件共用 inode，修改时间是缓存文件的写入时间，因此创建时间记录在文件名中）
+    """
+    lease_dir = self.cache_dir / LEASE_DIR
+    if not lease_dir.is_dir():
+      return
+    now = time.time()
+    for path in lease_dir.iterdir():
+      parts = path.name.split('-', 2)
+      try:
+        if len(parts) == 3 and now - int(parts[1]) > LEASE_MAX_AGE:
+          self.release_lease(path)
+          continue
+        os.kill(int(parts[0]), 0)
+      except ProcessLookupError:
+        self.release_lease(path)
+      except (ValueError, OSError):
+        pass
+
+  def total_size(self) -> int:
+    """缓存总大小（字节），包含文件和元数据"""
+    row = self._connect().execute("SELECT value FROM stats WHERE name = 'total_size'").fetchone()
+    return row[0] if row else 0
+
+  @staticmethod
+  def _add_size(conn: sqlite3.Connection, delta: int) -> int:
+    """累加缓存总大小，返回累加后的值（需在写事务中调用）"""
+    if delta:
+      conn.execute("UPDATE stats SET value = value + ? WHERE name = 'total_size'", (delta,))
+    return conn.execute("SELECT value FROM stats WHERE name = 'total_size'").fetchone()[0]
+
+  def _evict(self, conn: sqlite3.Connection, total: int, keep=None):
+    """
+    总大小超过上限时按 LRU 删除条目，模板被删除时其元数据一并删除（需在写事务中调用）
+    只删除缓存路径，已租用的硬链接不受影响；keep 为刚写入、不参与本次淘汰的条目
+    """
+    if total <= self.max_bytes:
+      return
+
+    freed = 0
+    rows = conn.execute('SELECT kind, key, size FROM entries ORDER BY last_access').fetchall()
+    for kind, key, size in rows:
+      if total - freed <= self.max_bytes:
+        break
+      if (kind, key) == keep:
+        continue
+      conn.execute('DELETE FROM entries WHERE kind = ? AND key = ?', (kind, key))
+      meta_size = conn.execute('SELECT COALESCE(SUM(size), 0) FROM meta WHERE key = ?', (key,)).fetchone()[0]
+      conn.execute('DELETE FROM meta WHERE key = ?', (key,))
+      try:
+        os.remove(self.blob_path(kind, key))
+      except OSError:
+        pass
+      freed += size + meta_size
+      logger.debug(f'缓存淘汰 {kind}/{key} ({size} 字节)')
+    self._add_size(conn, -freed)
+
+# 全局缓存实例
+template_cache = TemplateCache(
+  settings.CACHE_DIR,
+  settings.TEMPLATE_CACHE_MAX_MB * 1024 * 1024,
+  enabled=settings.TEMPLATE_CACHE_ENABLED
+)
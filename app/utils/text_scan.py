@@ -0,0 +1,252 @@
+"""
+文本识别的页面扫描（大文档模式）
+没有 AcroForm 的文档需要逐页 extract_text() 识别字段，数百页的扫描件或扁平文档会占用工作进程数分钟，
+这里按需逐页取出页面对象，并在页数或耗时预算用完后提前停止，
+实际覆盖的页面记录到当前请求上下文，由接口在响应中返回
+可以直接逐页读取 PyPDF2 文档，也可以用 fitz 打开同一文档提取文本（快得多，且能正确解码 CJK 字体）
+长文档可以按页块分发到进程池并行处理，结果按页码顺序合并
+"""
+
+import io
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Optional, Set, Tuple
+import fitz
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.request_context import current_request
+from app.utils.page_ranges import format_page_ranges
+
+STOPPED_BY_PAGE_BUDGET = 'page_budget'
+STOPPED_BY_TIME_BUDGET = 'time_budget'
+
+
+class TextScanCoverage:
+  """一次文本识别实际扫描的页面"""
+
+  def __init__(self, pages_total: int):
+    self.pages_total = pages_total  # 需要扫描的页数（指定页面时为请求页面中存在的页数）
+    self.scanned = []  # 已扫描的页码（从 1 开始）
+    self.remaining = []  # 因预算用完未扫描的页码
+    self.stopped_by = None  # 提前停止的原因，完整扫描时为 None
+    self.elapsed_ms = 0.0
+
+  @property
+  def complete(self) -> bool:
+    return self.stopped_by is None
+
+  def to_dict(self) -> dict:
+    return {
+      'complete': self.complete,
+      'pages_total': self.pages_total,
+      'pages_scanned': len(self.scanned),
+      'scanned_pages': format_page_ranges(self.scanned),
+      'remaining_pages': format_page_ranges(self.remaining),
+      'stopped_by': self.stopped_by,
+      'elapsed_ms': round(self.elapsed_ms, 1)
+    }
+
+
+def current_text_scan_coverage() -> Optional[TextScanCoverage]:
+  """获取当前请求中文本识别的覆盖情况，没有进行文本识别时返回 None"""
+  ctx = current_request()
+  return ctx.text_scan_coverage if ctx else None
+
+
+def open_text_document(pdf_reader, pdf_path: Optional[str] = None):
+  """
+  用 fitz 打开与 pdf_reader 相同的文档，用于文本提取
+
+  Args:
+    pdf_reader: PyPDF2.PdfReader
+    pdf_path: 文档的文件路径；为 None 时从 pdf_reader 的内存输入流打开
+
+  Returns:
+    fitz.Document；无法打开时返回 pdf_reader 本身（回退到 PyPDF2 提取文本）
+  """
+  try:
+    if pdf_path:
+      return fitz.open(pdf_path)
+    if isinstance(pdf_reader.stream, io.BytesIO):
+      return fitz.open(stream=pdf_reader.stream.getvalue(), filetype='pdf')
+  except Exception as e:
+    logger.warning(f'fitz 打开文档失败，使用 PyPDF2 提取文本: {str(e)}')
+  return pdf_reader
+
+
+def close_text_document(document):
+  """关闭 open_text_document 打开的 fitz 文档"""
+  if isinstance(document, fitz.Document):
+    document.close()
+
+
+def iter_page_texts(document, pages: Optional[Set[int]] = None,
+                    max_pages: Optional[int] = None,
+                    time_budget: Optional[float] = None) -> Iterator[Tuple[int, str]]:
+  """
+  按页码顺序逐页提取文本，页数或耗时预算用完后停止
+
+  只有实际扫描的页面才会被取出并提取文本；扫描结束后（包括调用方提前结束迭代）
+  覆盖情况写入当前请求上下文的 text_scan_coverage
+
+  Args:
+    document: PyPDF2.PdfReader 或 fitz.Document
+    pages: 只扫描这些页面（页码从 1 开始），None 表示全部页面
+    max_pages: 最多扫描的页数，默认 settings.TEXT_SCAN_MAX_PAGES，0 表示不限制
+    time_budget: 最长扫描时间（秒），默认 settings.TEXT_SCAN_TIME_BUDGET，0 表示不限制
+
+  Yields:
+    (页面索引（从 0 开始）, 页面文本)
+  """
+  if max_pages is None:
+    max_pages = settings.TEXT_SCAN_MAX_PAGES
+  if time_budget is None:
+    time_budget = settings.TEXT_SCAN_TIME_BUDGET
+
+  if isinstance(document, fitz.Document):
+    page_text = lambda index: document[index].get_text()
+  else:
+    page_text = lambda index: document.pages[index].extract_text()
+  candidates = candidate_pages(document, pages)
+
+  coverage = TextScanCoverage(len(candidates))
+  started = time.perf_counter()
+  deadline = started + time_budget if time_budget > 0 else None
+  try:
+    for position, page_number in enumerate(candidates):
+      if max_pages > 0 and len(coverage.scanned) >= max_pages:
+        coverage.stopped_by = STOPPED_BY_PAGE_BUDGET
+      elif deadline is not None and time.perf_counter() >= deadline:
+        coverage.stopped_by = STOPPED_BY_TIME_BUDGET
+      if coverage.stopped_by:
+        coverage.remaining = list(candidates[position:])
+        break
+
+      text = page_text(page_number - 1)
+      coverage.scanned.append(page_number)
+      yield page_number - 1, text
+  finally:
+    _record_coverage(coverage, started)
+
+
+def candidate_pages(document, pages: Optional[Set[int]] = None) -> List[int]:
+  """需要扫描的页码（从 1 开始，按顺序），document 为 PyPDF2.PdfReader 或 fitz.Document"""
+  if isinstance(document, fitz.Document):
+    page_count = document.page_count
+  else:
+    page_count = len(document.pages)
+  if pages is None:
+    return list(range(1, page_count + 1))
+  return [page for page in sorted(pages) if page <= page_count]
+
+
+def _record_coverage(coverage: TextScanCoverage, started: float):
+  """记录扫描耗时，并把覆盖情况写入当前请求上下文"""
+  coverage.elapsed_ms = (time.perf_counter() - started) * 1000
+  if coverage.stopped_by:
+    logger.warning(
+      f'文本识别提前停止（{coverage.stopped_by}）: 已扫描 {len(coverage.scanned)}/{coverage.pages_total} 页，'
+      f'耗时 {coverage.elapsed_ms:.0f}ms'
+    )
+  ctx = current_request()
+  if ctx is not None:
+    ctx.text_scan_coverage = coverage
+
+
+# 并行扫描的进程池，每个工作进程在首次使用时创建（gunicorn preload 后 fork 出的进程各自创建）
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      # 服务进程中有其他线程，使用 spawn 启动子进程，避免 fork 继承锁和 fitz 的内部状态
+      _pool = ProcessPoolExecutor(
+        max_workers=settings.TEXT_SCAN_PROCESSES,
+        mp_context=multiprocessing.get_context('spawn')
+      )
+      logger.info(f'创建文本识别进程池: {settings.TEXT_SCAN_PROCESSES} 个进程')
+    return _pool
+
+
+def shutdown_scan_pool():
+  """关闭并行扫描进程池（应用关闭时调用）"""
+  global _pool
+  with _pool_lock:
+    if _pool is not None:
+      _pool.shutdown(wait=False, cancel_futures=True)
+      _pool = None
+
+
+def parallel_scan_enabled(page_total: int) -> bool:
+  """需要扫描的页数达到阈值且配置了多个进程时并行扫描"""
+  return settings.TEXT_SCAN_PROCESSES > 1 and page_total >= settings.TEXT_SCAN_PARALLEL_MIN_PAGES
+
+
+def map_page_chunks(func: Callable[[str, List[int]], List[Any]], pdf_path: str, candidates: List[int],
+                    max_pages: Optional[int] = None,
+                    time_budget: Optional[float] = None) -> Iterator[Tuple[int, Any]]:
+  """
+  把页面按块分发到进程池并行处理，按页码顺序产出每页的结果
+
+  页数预算在分块前截断；耗时预算用完时不再等待后面的页块（尚未开始的页块被取消），
+  与 iter_page_texts 一样把覆盖情况写入当前请求上下文
+
+  Args:
+    func: 在子进程中执行的模块级函数 func(pdf_path, 页码列表) -> 每页的结果列表
+    pdf_path: 文档的文件路径（子进程各自打开）
+    candidates: 需要扫描的页码（从 1 开始，按顺序），见 candidate_pages
+    max_pages: 最多扫描的页数，默认 settings.TEXT_SCAN_MAX_PAGES，0 表示不限制
+    time_budget: 最长扫描时间（秒），默认 settings.TEXT_SCAN_TIME_BUDGET，0 表示不限制
+
+  Yields:
+    (页面索引（从 0 开始）, 该页的结果)
+  """
+  global _pool
+  if max_pages is None:
+    max_pages = settings.TEXT_SCAN_MAX_PAGES
+  if time_budget is None:
+    time_budget = settings.TEXT_SCAN_TIME_BUDGET
+
+  coverage = TextScanCoverage(len(candidates))
+  started = time.perf_counter()
+  deadline = started + time_budget if time_budget > 0 else None
+
+  if max_pages > 0 and len(candidates) > max_pages:
+    coverage.stopped_by = STOPPED_BY_PAGE_BUDGET
+    coverage.remaining = candidates[max_pages:]
+    candidates = candidates[:max_pages]
+
+  # 每个进程大约分到 4 个页块：页块太小时进程间通信和打开文档的开销超过并行的收益
+  chunk_size = max(1, settings.TEXT_SCAN_CHUNK_PAGES, -(-len(candidates) // (settings.TEXT_SCAN_PROCESSES * 4)))
+  chunks = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+  pool = _get_pool()
+  futures = [pool.submit(func, pdf_path, chunk) for chunk in chunks]
+  try:
+    for index, (chunk, future) in enumerate(zip(chunks, futures)):
+      try:
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        results = future.result(timeout=timeout)
+      except FutureTimeoutError:
+        coverage.stopped_by = STOPPED_BY_TIME_BUDGET
+        coverage.remaining = [page for rest in chunks[index:] for page in rest] + coverage.remaining
+        break
+      coverage.scanned.extend(chunk)
+      for page_number, result in zip(chunk, results):
+        yield page_number - 1, result
+  except BrokenProcessPool:
+    # 子进程异常退出后进程池不可再用，下次扫描时重新创建
+    with _pool_lock:
+      if _pool is pool:
+        _pool = None
+    raise
+  finally:
+    for future in futures:
+      future.cancel()
+    _record_coverage(coverage, started)
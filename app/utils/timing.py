@@ -0,0 +1,60 @@
+"""
+阶段计时工具
+记录一次请求中各处理阶段（上传、解析、字段映射、引擎回退、写出、发送等）的耗时，
+并生成 Server-Timing 响应头
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+class StageTimer:
+  """请求级阶段计时器"""
+
+  def __init__(self):
+    self.started_at = time.perf_counter()
+    self.stages: Dict[str, float] = {}  # 阶段名 -> 累计耗时（毫秒），保持记录顺序
+    self.engine: Optional[str] = None  # 实际使用的引擎（包含回退信息）
+
+  def add(self, name: str, duration_ms: float):
+    """累加某个阶段的耗时，同名阶段多次出现时求和"""
+    self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+  def add_since_start(self, name: str):
+    """记录从请求开始到现在的耗时（用于上传/表单解析阶段）"""
+    self.add(name, self.elapsed_ms())
+
+  def elapsed_ms(self) -> float:
+    """请求开始至今的耗时（毫秒）"""
+    return (time.perf_counter() - self.started_at) * 1000
+
+  @contextmanager
+  def stage(self, name: str):
+    """计时上下文管理器"""
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add(name, (time.perf_counter() - start) * 1000)
+
+  def to_header(self) -> str:
+    """
+    生成 Server-Timing 响应头的值
+
+    Returns:
+      形如 `upload;dur=3.2, parse;dur=12.5, total;dur=20.1, engine;desc="standard"` 的字符串
+    """
+    metrics = [f'{name};dur={duration:.1f}' for name, duration in self.stages.items()]
+    metrics.append(f'total;dur={self.elapsed_ms():.1f}')
+    if self.engine:
+      metrics.append(f'engine;desc="{self.engine}"')
+    return ', '.join(metrics)
+
+  def to_dict(self) -> Dict[str, Any]:
+    """转换为可写入结构化日志的字典"""
+    return {
+      'engine': self.engine,
+      'stages': {name: round(duration, 2) for name, duration in self.stages.items()},
+      'total_ms': round(self.elapsed_ms(), 2)
+    }
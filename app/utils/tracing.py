@@ -0,0 +1,351 @@
+"""
+端到端链路追踪
+为每个请求生成 OpenTelemetry 兼容的 span：处理函数（根 span）、每个计时阶段（引擎尝试、回退、
+子字段填充策略、parse / map / write、结果缓存、压缩优化等）以及响应发送，附带模板哈希、页数、字段数等属性
+
+- 计时阶段 stage() 在请求被追踪时同时生成同名 span，未被追踪的请求没有额外开销
+- 支持 W3C traceparent 请求头：沿用调用方的 trace-id 和采样决定，响应头 X-Trace-ID 返回本次的 trace-id
+- 一个请求结束后整条链路按 OTLP/JSON 格式（resourceSpans）交给后台线程导出：
+  "file" 写入 TRACE_FILE（每行一次请求），"otlp" 以 HTTP POST 发送到本地 collector（如 :4318/v1/traces）
+- 不依赖 opentelemetry SDK；导出队列满时丢弃新的链路，不阻塞请求
+
+TRACING_ENABLED 关闭时中间件不会注册，span() 只做一次属性判断
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import random
+import threading
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.request_context import current_request
+
+TRACEPARENT_HEADER = b'traceparent'
+TRACE_ID_HEADER = b'x-trace-id'
+_TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# OTLP 中的 span 类型和状态码
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+  """一个 span：名称、父子关系、起止时间（Unix 纳秒）、属性和状态"""
+
+  def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], kind: int = SPAN_KIND_INTERNAL,
+               attributes: Optional[Dict[str, Any]] = None):
+    self.trace = trace
+    self.name = name
+    self.span_id = os.urandom(8).hex()
+    self.parent_id = parent_id
+    self.kind = kind
+    self.attributes = dict(attributes) if attributes else {}
+    self.start_ns = time.time_ns()
+    self.end_ns: Optional[int] = None
+    self.status_code = STATUS_OK
+    self.status_message = ''
+
+  def set_attribute(self, key: str, value: Any):
+    self.attributes[key] = value
+
+  def set_error(self, error: BaseException):
+    self.status_code = STATUS_ERROR
+    self.status_message = f'{type(error).__name__}: {str(error)}'
+
+  def end(self):
+    if self.end_ns is None:
+      self.end_ns = time.time_ns()
+      self.trace.spans.append(self)
+
+  def to_otlp(self) -> Dict[str, Any]:
+    data = {
+      'traceId': self.trace.trace_id,
+      'spanId': self.span_id,
+      'name': self.name,
+      'kind': self.kind,
+      'startTimeUnixNano': str(self.start_ns),
+      'endTimeUnixNano': str(self.end_ns),
+      'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+      'status': {'code': self.status_code}
+    }
+    if self.parent_id:
+      data['parentSpanId'] = self.parent_id
+    if self.status_message:
+      data['status']['message'] = self.status_message
+    return data
+
+
+class _NoopSpan:
+  """请求未被追踪时使用的空 span"""
+
+  def set_attribute(self, key: str, value: Any):
+    pass
+
+  def set_error(self, error: BaseException):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+  """一个请求的链路，挂在 RequestContext.trace 上"""
+
+  def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None):
+    self.trace_id = trace_id or os.urandom(16).hex()
+    self.remote_parent_id = remote_parent_id  # traceparent 中调用方的 span-id
+    self.spans: List[Span] = []  # 已结束的 span
+
+  @contextmanager
+  def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """在当前 span 下创建子 span，异常时记录错误状态后继续抛出"""
+    parent = _current_span.get()
+    parent_id = parent.span_id if parent is not None and parent.trace is self else self.remote_parent_id
+    current = Span(self, name, parent_id, kind, attributes)
+    token = _current_span.set(current)
+    try:
+      yield current
+    except BaseException as e:
+      current.set_error(e)
+      raise
+    finally:
+      _current_span.reset(token)
+      current.end()
+
+  @contextmanager
+  def stage(self, timer, name: str):
+    """同时计时和生成 span（由 request_context.stage 调用）"""
+    with timer.stage(name), self.span(name):
+      yield
+
+  def to_otlp(self) -> Dict[str, Any]:
+    """整条链路的 OTLP/JSON（ExportTraceServiceRequest）"""
+    return {
+      'resourceSpans': [{
+        'resource': {'attributes': [_otlp_attribute('service.name', settings.TRACE_SERVICE_NAME)]},
+        'scopeSpans': [{
+          'scope': {'name': __name__},
+          'spans': [span.to_otlp() for span in self.spans]
+        }]
+      }]
+    }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+  if isinstance(value, bool):
+    encoded = {'boolValue': value}
+  elif isinstance(value, int):
+    encoded = {'intValue': str(value)}
+  elif isinstance(value, float):
+    encoded = {'doubleValue': value}
+  else:
+    encoded = {'stringValue': str(value)}
+  return {'key': key, 'value': encoded}
+
+
+def span(name: str, **attributes):
+  """
+  在当前请求的链路中创建 span（请求未被追踪时返回空 span）
+
+  用法:
+    with span('fallback', **{'fallback.from': 'enhanced_fillpdf'}):
+      ...
+  """
+  ctx = current_request()
+  if ctx is None or ctx.trace is None:
+    return _NOOP_SPAN
+  return ctx.trace.span(name, **attributes)
+
+
+def set_attributes(**attributes):
+  """给当前 span 设置属性（请求未被追踪时不做任何事）"""
+  current = _current_span.get()
+  if current is None:
+    return
+  ctx = current_request()
+  if ctx is None or ctx.trace is not current.trace:
+    return
+  current.attributes.update(attributes)
+
+
+def _parse_traceparent(scope):
+  """
+  解析 W3C traceparent 请求头
+
+  Returns:
+    (trace-id, 父 span-id, 是否采样)，没有或格式不合法时返回 None
+  """
+  for key, value in scope.get('headers', []):
+    if key == TRACEPARENT_HEADER:
+      match = _TRACEPARENT_PATTERN.match(value.decode('latin-1').strip().lower())
+      if match is None or match.group(1) == '0' * 32:
+        return None
+      return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+  return None
+
+
+class _Exporter:
+  """后台导出线程：按配置写文件或发送到 OTLP/HTTP collector"""
+
+  def __init__(self):
+    self.queue: queue.Queue = queue.Queue(maxsize=settings.TRACE_QUEUE_SIZE)
+    self.pid = os.getpid()
+    self.thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+    self.thread.start()
+
+  def submit(self, payload: Dict[str, Any]) -> bool:
+    try:
+      self.queue.put_nowait(payload)
+      return True
+    except queue.Full:
+      return False
+
+  def _run(self):
+    while True:
+      payload = self.queue.get()
+      if payload is None:
+        self.queue.task_done()
+        return
+      try:
+        self._export(payload)
+      except Exception as e:
+        logger.warning(f'导出链路失败: {str(e)}')
+      finally:
+        self.queue.task_done()
+
+  def _export(self, payload: Dict[str, Any]):
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    if settings.TRACE_EXPORTER == 'otlp':
+      request = urllib.request.Request(
+        settings.TRACE_OTLP_ENDPOINT,
+        data=data.encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+      )
+      with urllib.request.urlopen(request, timeout=5) as response:
+        response.read()
+    else:
+      directory = os.path.dirname(settings.TRACE_FILE)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      with open(settings.TRACE_FILE, 'a', encoding='utf-8') as f:
+        f.write(data + '\n')
+
+  def shutdown(self, timeout: float = 5.0):
+    """等待队列中的链路导出完成后停止线程"""
+    try:
+      self.queue.put(None, timeout=timeout)
+    except queue.Full:
+      return
+    self.thread.join(timeout)
+
+
+# 导出器在首次导出时创建（gunicorn preload 后 fork 出的进程各自创建导出线程）
+_exporter: Optional[_Exporter] = None
+_exporter_lock = threading.Lock()
+_dropped = 0
+
+
+def export_trace(trace: Trace):
+  """把一条已结束的链路交给后台导出线程，队列满时丢弃"""
+  global _exporter, _dropped
+  with _exporter_lock:
+    if _exporter is None or _exporter.pid != os.getpid():
+      _exporter = _Exporter()
+    exporter = _exporter
+  if not exporter.submit(trace.to_otlp()):
+    _dropped += 1
+    if _dropped % 100 == 1:
+      logger.warning(f'链路导出队列已满，已丢弃 {_dropped} 条链路')
+
+
+def shutdown_tracing():
+  """导出剩余的链路并停止导出线程（应用关闭时调用）"""
+  global _exporter
+  with _exporter_lock:
+    exporter, _exporter = _exporter, None
+  if exporter is not None and exporter.pid == os.getpid():
+    exporter.shutdown()
+
+
+class TracingMiddleware:
+  """
+  链路追踪中间件（纯 ASGI 实现），需注册在 RequestContextMiddleware 内层
+
+  - 按 traceparent 的采样标志或 TRACE_SAMPLE_RATE 决定是否追踪该请求
+  - 根 span 覆盖整个处理过程，另有 send span 覆盖响应发送
+  - 响应头附加 X-Trace-ID，请求结束后导出整条链路
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    ctx = current_request()
+    if scope['type'] != 'http' or ctx is None:
+      await self.app(scope, receive, send)
+      return
+
+    parent = _parse_traceparent(scope)
+    if parent is not None:
+      sampled = parent[2]
+    else:
+      rate = settings.TRACE_SAMPLE_RATE
+      sampled = rate > 0 and random.random() < rate
+    if not sampled:
+      await self.app(scope, receive, send)
+      return
+
+    trace = Trace(*parent[:2]) if parent is not None else Trace()
+    ctx.trace = trace
+    state = {'status': 500, 'send': None}
+
+    async def send_wrapper(message):
+      if message['type'] == 'http.response.start':
+        state['status'] = message['status']
+        headers = list(message.get('headers', []))
+        headers.append((TRACE_ID_HEADER, trace.trace_id.encode('latin-1')))
+        message = {**message, 'headers': headers}
+        parent_span = _current_span.get()
+        state['send'] = Span(trace, 'send', parent_span.span_id if parent_span else None)
+
+      await send(message)
+
+      if message['type'] == 'http.response.body' and not message.get('more_body', False):
+        if state['send'] is not None:
+          state['send'].end()
+
+    name = f'{scope.get("method")} {scope.get("path")}'
+    try:
+      with trace.span(name, SPAN_KIND_SERVER, **{
+        'http.method': scope.get('method'),
+        'http.target': scope.get('path'),
+        'request_id': ctx.request_id
+      }) as root:
+        try:
+          await self.app(scope, receive, send_wrapper)
+        finally:
+          root.set_attribute('http.status_code', state['status'])
+          if state['status'] >= 500:
+            root.status_code = STATUS_ERROR
+    finally:
+      ctx.trace = None
+      export_trace(trace)
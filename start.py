@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 """
 PDF表单处理服务启动脚本
+
+运行模式（环境变量 RUN_MODE）:
+  - development: 单进程 uvicorn，DEBUG=true 时开启自动重载
+  - production: gunicorn 管理多个 uvicorn 工作进程
+      * 应用在父进程中导入一次后再 fork 工作进程（preload）
+      * 工作进程处理 MAX_REQUESTS 个请求后自动重启，抑制 fitz/pdfrw 的内存增长
+      * 关闭或重启时在 GRACEFUL_TIMEOUT 秒内等待进行中的请求完成
 """
 
 import os
@@ -12,29 +19,77 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from app.utils.logger import setup_logger
+from app.utils.config import settings
 from app.main import app
 import uvicorn
 
+def run_development(logger):
+  """开发模式：单进程 uvicorn"""
+  logger.info(f'以开发模式启动，自动重载: {settings.DEBUG}')
+
+  uvicorn.run(
+    'app.main:app',
+    host=settings.HOST,
+    port=settings.PORT,
+    reload=settings.DEBUG,
+    log_level='info'
+  )
+
+def run_production(logger):
+  """生产模式：gunicorn + uvicorn 工作进程"""
+  from gunicorn.app.base import BaseApplication
+
+  class ProductionApplication(BaseApplication):
+    """以代码方式配置 gunicorn，直接加载已导入的应用对象"""
+
+    def __init__(self, application, options):
+      self.application = application
+      self.options = options
+      super().__init__()
+
+    def load_config(self):
+      for key, value in self.options.items():
+        self.cfg.set(key, value)
+
+    def load(self):
+      return self.application
+
+  options = {
+    'bind': f'{settings.HOST}:{settings.PORT}',
+    'workers': settings.WORKERS,
+    'worker_class': 'uvicorn.workers.UvicornWorker',
+    'preload_app': True,
+    'max_requests': settings.MAX_REQUESTS,
+    'max_requests_jitter': settings.MAX_REQUESTS_JITTER,
+    'graceful_timeout': settings.GRACEFUL_TIMEOUT,
+    'timeout': settings.WORKER_TIMEOUT,
+    'loglevel': 'info'
+  }
+
+  logger.info(
+    f'以生产模式启动: {settings.WORKERS} 个工作进程, '
+    f'每 {settings.MAX_REQUESTS}±{settings.MAX_REQUESTS_JITTER} 个请求重启, '
+    f'优雅关闭超时 {settings.GRACEFUL_TIMEOUT}s'
+  )
+  ProductionApplication(app, options).run()
+
 def main():
   """主函数"""
   # 设置日志
   logger = setup_logger()
-  
+
   # 确保必要的目录存在
-  directories = ['uploads', 'outputs', 'temp', 'logs']
+  directories = [settings.UPLOAD_DIR, settings.OUTPUT_DIR, settings.TEMP_DIR, 'logs']
   for directory in directories:
     Path(directory).mkdir(parents=True, exist_ok=True)
-  
+
   # 启动服务器
   logger.info('启动PDF表单处理服务...')
-  
-  uvicorn.run(
-    'app.main:app',
-    host='0.0.0.0',
-    port=8000,
-    reload=True,
-    log_level='info'
-  )
+
+  if settings.RUN_MODE == 'production':
+    run_production(logger)
+  else:
+    run_development(logger)
 
 if __name__ == '__main__':
-  main() 
\ No newline at end of file
+  main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pymupdf 引擎基准
+在合成表单上对比 enhanced_fillpdf（pdfrw）与 pymupdf（fitz）两个引擎解析和填充的耗时，
+同时校验两个引擎的解析结果完全相同、填充结果（用 enhanced_fillpdf 重新解析）字段值相同，
+有任何不一致时以非零状态退出
+
+上传的文件不经过共享模板缓存，enhanced_fillpdf 每次都重新解析模板（不使用预解析对象图池），
+对应模板首次出现或对象池未命中时的耗时
+
+使用方法:
+  python tests/benchmark_pymupdf_engine.py [--pages 40] [--per-page 16] [--repeat 3]
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+from fastapi import UploadFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.config import settings  # noqa: E402
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF  # noqa: E402
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF  # noqa: E402
+from tests.synthetic_corpus import make_form  # noqa: E402
+
+
+def upload(data: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(data), filename='form.pdf')
+
+
+async def best_of(repeat: int, func, *args):
+  """多次运行取最短耗时（毫秒）及最后一次的结果"""
+  best = None
+  result = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    result = await func(*args)
+    elapsed = (time.perf_counter() - started) * 1000
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+async def run(args, temp_dir: str) -> bool:
+  path = os.path.join(temp_dir, 'form.pdf')
+  fields = make_form(path, args.pages, args.per_page)
+  with open(path, 'rb') as f:
+    data = f.read()
+  print(f'📄 合成表单: {args.pages} 页, {len(fields)} 个字段, {len(data) / 1024:.0f} KB')
+
+  enhanced = PDFServiceEnhancedFillPDF()
+  pymupdf = PDFServicePyMuPDF()
+
+  parse_enhanced, enhanced_fields = await best_of(args.repeat, lambda: enhanced.parse_form_fields(upload(data)))
+  parse_pymupdf, pymupdf_fields = await best_of(args.repeat, lambda: pymupdf.parse_form_fields(upload(data)))
+  fill_enhanced, enhanced_output = await best_of(args.repeat, lambda: enhanced.fill_form(upload(data), fields))
+  fill_pymupdf, pymupdf_output = await best_of(args.repeat, lambda: pymupdf.fill_form(upload(data), fields))
+
+  same_parse = enhanced_fields == pymupdf_fields
+  filled = []
+  for output in (enhanced_output, pymupdf_output):
+    with open(output, 'rb') as f:
+      parsed = await enhanced.parse_form_fields(upload(f.read()))
+    filled.append({field['name']: field['value'] for field in parsed})
+  same_fill = filled[0] == filled[1]
+
+  print()
+  print(f'  解析:   enhanced_fillpdf {parse_enhanced:8.1f}ms  pymupdf {parse_pymupdf:8.1f}ms  ({parse_enhanced / parse_pymupdf:.1f}x)')
+  print(f'  填充:   enhanced_fillpdf {fill_enhanced:8.1f}ms  pymupdf {fill_pymupdf:8.1f}ms  ({fill_enhanced / fill_pymupdf:.1f}x)')
+  print(f'  解析结果一致: {"是" if same_parse else "否"}')
+  print(f'  填充结果一致: {"是" if same_fill else "否"}')
+  return same_parse and same_fill
+
+
+def main():
+  parser = argparse.ArgumentParser(description='pymupdf 引擎基准')
+  parser.add_argument('--pages', type=int, default=40, help='合成表单页数')
+  parser.add_argument('--per-page', type=int, default=16, help='每页字段数')
+  parser.add_argument('--repeat', type=int, default=3, help='每项计时重复次数，取最短')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 填充输出和临时文件写入基准目录
+    settings.OUTPUT_DIR = settings.TEMP_DIR = temp_dir
+    ok = asyncio.run(run(args, temp_dir))
+
+  if not ok:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文本识别字段基准
+对比没有表单控件的扁平PDF上两种文本识别实现的耗时和结果：
+- 旧实现: PyPDF2 extract_text() + 依次调用 _is_checkbox/_is_select/_is_radio/_is_required_field
+- 新实现: fitz 提取文本 + classify_line 一次扫描分类（PDFService._extract_text_fields）
+
+同时用随机组合的标记文本行（包括中文和符号标记）校验 classify_line 与逐个子串查找的结果完全一致，
+有任何不一致时以非零状态退出。端到端对比的PDF只使用标准字体的西文文本行：
+PyPDF2 无法解码 CID 字体（中文文本提取出来是乱码），旧实现不能作为中文文本的基准
+
+使用方法:
+  python tests/benchmark_text_fields.py [--pages 200] [--lines 40000] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from typing import List, Dict, Any, Optional
+
+import PyPDF2
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.config import settings  # noqa: E402
+from app.services.pdf_service import PDFService, classify_line  # noqa: E402
+
+# 扁平表单中的文本行（每页相同）
+FLAT_FORM_LINES = [
+  'Applicant Information',
+  'Name: ______________________',
+  'Date of birth: ____/____/____',
+  'Email (Required) ______________',
+  'Phone number (required): ____________',
+  '[ ] Yes [ ] No',
+  '[x] I agree to the terms',
+  'Please select your department',
+  'Choose one Option below',
+  'Languages English German French Italian',
+  'Signature *',
+  'MANDATORY',
+  'This section describes how the information you provide will be used.',
+  'Office use only',
+]
+
+# 组合随机文本行使用的片段
+LINE_TOKENS = [
+  'Name', 'Date', '□', '☐', '☑', '[ ]', '[x]', '○', '●', '*', ':', '：',
+  '选择', '选项', '必选', '必选项', '必填', '(必填)', '請選擇', '必選項', '下拉',
+  'Select', 'Please', 'select', 'Option', 'Choose', 'Dropdown',
+  'English', 'German', 'French', 'Italian', 'required', 'Required', 'REQUIRED', 'Mandatory',
+  '是', '否', 'Yes', 'No', 'x', '/', '(', ')'
+]
+
+
+def make_flat_form(path: str, pages: int):
+  """生成没有表单控件的扁平PDF，每页写入 FLAT_FORM_LINES"""
+  c = canvas.Canvas(path, pagesize=letter)
+  for page in range(pages):
+    y = 740
+    for line in FLAT_FORM_LINES:
+      c.drawString(50, y, line)
+      y -= 24
+    c.drawString(50, 60, f'Page {page + 1}')
+    c.showPage()
+  c.save()
+
+
+def legacy_field_type(service: PDFService, line: str) -> Optional[str]:
+  """原有的逐个子串查找判断顺序"""
+  if service._is_checkbox_field(line):
+    return 'checkbox'
+  if service._is_select_field(line):
+    return 'select'
+  if service._is_radio_field(line):
+    return 'radio'
+  if ':' in line and len(line) < 100:
+    return 'text'
+  if service._is_required_field(line):
+    return 'required'
+  return None
+
+
+def legacy_text_fields(service: PDFService, path: str) -> List[Dict[str, Any]]:
+  """旧实现: PyPDF2 提取文本 + 逐个子串查找"""
+  fields = []
+  reader = PyPDF2.PdfReader(path)
+  for page_num, page in enumerate(reader.pages):
+    for line in page.extract_text().split('\n'):
+      line = line.strip()
+      if not line or len(line) > 200:
+        continue
+      field_type = legacy_field_type(service, line)
+      if field_type == 'checkbox':
+        fields.append(service._extract_checkbox_field(line, page_num))
+      elif field_type == 'select':
+        fields.append(service._extract_select_field(line, page_num))
+      elif field_type == 'radio':
+        fields.append(service._extract_radio_field(line, page_num))
+      elif field_type == 'text':
+        field_info = service._extract_text_field(line, page_num)
+        if field_info:
+          fields.append(field_info)
+      elif field_type == 'required':
+        fields.append(service._extract_required_field(line, page_num))
+  return fields
+
+
+def check_classifier(service: PDFService, count: int) -> int:
+  """用随机组合的文本行校验 classify_line，返回不一致的行数"""
+  rng = random.Random(20240601)
+  mismatches = 0
+  for index in range(count):
+    separator = ' ' if index % 2 == 0 else ''
+    line = separator.join(rng.choice(LINE_TOKENS) for _ in range(rng.randint(1, 10)))
+    expected = legacy_field_type(service, line)
+    actual, required = classify_line(line)
+    if actual != expected or required != service._is_required_field(line):
+      mismatches += 1
+      if mismatches <= 5:
+        print(f'  不一致: {line!r} 旧={expected} 新={actual}')
+  return mismatches
+
+
+def best_of(repeat: int, func, *args):
+  """多次运行取最短耗时（毫秒）及最后一次的结果"""
+  best = None
+  result = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = (time.perf_counter() - started) * 1000
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+def main():
+  parser = argparse.ArgumentParser(description='文本识别字段基准')
+  parser.add_argument('--pages', type=int, default=200, help='扁平PDF页数')
+  parser.add_argument('--lines', type=int, default=40000, help='分类器校验的随机文本行数')
+  parser.add_argument('--repeat', type=int, default=3, help='每项计时重复次数，取最短')
+  args = parser.parse_args()
+
+  # 基准测量完整扫描，不使用大文档模式的预算
+  settings.TEXT_SCAN_MAX_PAGES = 0
+  settings.TEXT_SCAN_TIME_BUDGET = 0
+
+  service = PDFService()
+
+  print(f'🔍 校验分类器（{args.lines} 行随机文本）...')
+  mismatches = check_classifier(service, args.lines)
+  print(f'  不一致行数: {mismatches}')
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    path = os.path.join(temp_dir, 'flat_form.pdf')
+    make_flat_form(path, args.pages)
+    print(f'📄 扁平PDF: {args.pages} 页, 每页 {len(FLAT_FORM_LINES) + 1} 行')
+
+    lines = []
+    for page in PyPDF2.PdfReader(path).pages:
+      lines.extend(line.strip() for line in page.extract_text().split('\n') if line.strip())
+
+    classify_legacy, _ = best_of(args.repeat, lambda: [legacy_field_type(service, line) for line in lines])
+    classify_new, _ = best_of(args.repeat, lambda: [classify_line(line) for line in lines])
+    legacy_ms, legacy_fields = best_of(args.repeat, legacy_text_fields, service, path)
+    new_ms, new_fields = best_of(
+      args.repeat, lambda: service._extract_text_fields(PyPDF2.PdfReader(path), None, path)
+    )
+
+  print()
+  print(f'  行分类:   旧 {classify_legacy:8.1f}ms  新 {classify_new:8.1f}ms  ({classify_legacy / classify_new:.1f}x)')
+  print(f'  端到端:   旧 {legacy_ms:8.1f}ms  新 {new_ms:8.1f}ms  ({legacy_ms / new_ms:.1f}x)')
+  print(f'  字段数:   旧 {len(legacy_fields)}  新 {len(new_fields)}')
+
+  same_fields = legacy_fields == new_fields
+  if not same_fields:
+    for old, new in zip(legacy_fields, new_fields):
+      if old != new:
+        print(f'  首个不同字段: 旧={old} 新={new}')
+        break
+  print(f'  字段一致: {"是" if same_fields else "否"}')
+
+  if mismatches or not same_fields:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
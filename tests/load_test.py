@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地压测工具
+按开环（open-loop）到达速率向本地运行的服务回放 parse-form / fill-form / parse-form/batch 混合流量，
+统计每个操作和引擎的吞吐量、p50/p95/p99 延迟和错误率
+
+- 请求按泊松过程到达，不等待前一个请求完成，避免"协同遗漏"低估尾延迟
+- 延迟从计划发送时刻开始计算，客户端排队时间也计入
+- 批量流量: 一次 /api/v1/parse-form/batch 请求上传 --batch-size 个文件，读完整个 NDJSON 响应的时间作为一次批量延迟，
+  汇总行中有失败的文件时记为错误；每个文件末尾追加不同的注释行，避免接口按 SHA-256 去重或命中缓存后不再解析
+- 只依赖标准库（asyncio 原始 HTTP/1.1）和生成语料所需的 reportlab
+
+使用方法:
+  python main.py   # 先启动服务
+  python tests/load_test.py --rate 5 --duration 30 --mix parse:3,fill:5,batch:1
+  python tests/load_test.py --engines standard,enhanced_fillpdf --corpus medium --json result.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+from typing import List, Dict, Any, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_corpus import build_corpus, CORPUS_SPECS  # noqa: E402
+
+ENGINES = ['standard', 'enhanced', 'fillpdf', 'enhanced_fillpdf', 'pymupdf']
+OPERATIONS = ['parse', 'fill', 'batch']
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+  """解析流量配比，如 "parse:3,fill:5,batch:1" """
+  mix = {}
+  for part in text.split(','):
+    name, _, weight = part.partition(':')
+    name = name.strip()
+    if name not in OPERATIONS:
+      raise argparse.ArgumentTypeError(f'未知操作: {name}，可选: {", ".join(OPERATIONS)}')
+    mix[name] = float(weight or 1)
+  return mix
+
+
+def encode_multipart(fields: Dict[str, str], files: List[Tuple[str, str, bytes]]) -> Tuple[bytes, str]:
+  """编码 multipart/form-data 请求体，files 为 (表单字段名, 文件名, 内容) 列表"""
+  boundary = uuid.uuid4().hex
+  parts = []
+  for name, value in fields.items():
+    parts.append(
+      f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+    )
+  for field_name, file_name, file_content in files:
+    parts.append(
+      (f'--{boundary}\r\nContent-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+       f'Content-Type: application/pdf\r\n\r\n').encode('utf-8') + file_content + b'\r\n'
+    )
+  parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+  return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def decode_chunked(body: bytes) -> bytes:
+  """解码 Transfer-Encoding: chunked 的响应体（流式响应）"""
+  decoded = []
+  while body:
+    size_line, _, rest = body.partition(b'\r\n')
+    size = int(size_line.split(b';', 1)[0], 16)
+    if size == 0:
+      break
+    decoded.append(rest[:size])
+    body = rest[size + 2:]
+  return b''.join(decoded)
+
+
+async def post(host: str, port: int, path: str, body: bytes, content_type: str, timeout: float) -> Tuple[int, bytes]:
+  """发送一次 POST 请求并读完响应，返回状态码和响应体"""
+  reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+  try:
+    head = (
+      f'POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: {content_type}\r\n'
+      f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'
+    ).encode('latin-1')
+    writer.write(head + body)
+    await writer.drain()
+
+    # Connection: close，读到 EOF 即为完整响应
+    response = await asyncio.wait_for(reader.read(), timeout)
+    head, _, body = response.partition(b'\r\n\r\n')
+    status_line = head.split(b'\r\n', 1)[0].split()
+    if b'transfer-encoding: chunked' in head.lower():
+      body = decode_chunked(body)
+    return (int(status_line[1]) if len(status_line) > 1 else 0), body
+  finally:
+    writer.close()
+
+
+class LoadTest:
+  """开环压测"""
+
+  def __init__(self, args):
+    self.args = args
+    url = urlsplit(args.base_url)
+    self.host = url.hostname or 'localhost'
+    self.port = url.port or 80
+    self.samples: List[Dict[str, Any]] = []  # 每个样本: op, engine, latency_ms, ok
+
+    corpus = build_corpus(args.corpus_dir)
+    self.templates = [corpus[name] for name in args.corpus]
+    for template in self.templates:
+      with open(template['path'], 'rb') as f:
+        template['content'] = f.read()
+
+  def _request_body(self, op: str, engine: str) -> Tuple[str, bytes, str]:
+    if op == 'batch':
+      # 每个文件追加不同的注释行（%%EOF 之后的内容被忽略），SHA-256 各不相同
+      files = [
+        ('files', f'form_{index}.pdf', random.choice(self.templates)['content'] + f'\n% {uuid.uuid4().hex}\n'.encode())
+        for index in range(self.args.batch_size)
+      ]
+      body, content_type = encode_multipart({'engine': engine}, files)
+      return '/api/v1/parse-form/batch', body, content_type
+    template = random.choice(self.templates)
+    if op == 'parse':
+      body, content_type = encode_multipart({'engine': engine}, [('file', 'form.pdf', template['content'])])
+      return '/api/v1/parse-form', body, content_type
+    form_data = json.dumps({'fields': template['fields']}, ensure_ascii=False)
+    fields = {'engine': engine, 'form_data': form_data, 'strict_validation': 'false'}
+    body, content_type = encode_multipart(fields, [('file', 'form.pdf', template['content'])])
+    return '/api/v1/fill-form', body, content_type
+
+  @staticmethod
+  def _batch_ok(body: bytes) -> bool:
+    """批量响应的最后一行为汇总，所有文件都解析成功才算成功"""
+    lines = body.decode('utf-8', errors='replace').strip().splitlines()
+    try:
+      summary = json.loads(lines[-1]) if lines else {}
+    except ValueError:
+      return False
+    return summary.get('type') == 'summary' and summary.get('failed') == 0
+
+  async def _run_one(self, op: str, engine: str, scheduled_at: float):
+    path, body, content_type = self._request_body(op, engine)
+    try:
+      status, response = await post(self.host, self.port, path, body, content_type, self.args.timeout)
+      ok = 200 <= status < 300 and (op != 'batch' or self._batch_ok(response))
+    except (OSError, asyncio.TimeoutError):
+      ok = False
+
+    self.samples.append({
+      'op': op,
+      'engine': engine,
+      'latency_ms': (time.perf_counter() - scheduled_at) * 1000,
+      'ok': ok
+    })
+
+  async def run(self) -> float:
+    """按泊松到达发送请求，返回实际运行时长（秒）"""
+    ops = list(self.args.mix.keys())
+    weights = list(self.args.mix.values())
+    tasks = []
+
+    start = time.perf_counter()
+    next_at = start
+    while next_at - start < self.args.duration:
+      delay = next_at - time.perf_counter()
+      if delay > 0:
+        await asyncio.sleep(delay)
+      op = random.choices(ops, weights)[0]
+      engine = random.choice(self.args.engines)
+      tasks.append(asyncio.create_task(self._run_one(op, engine, next_at)))
+      next_at += random.expovariate(self.args.rate)
+
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+  """最近秩法求百分位"""
+  if not sorted_values:
+    return 0.0
+  index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+  return sorted_values[index]
+
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> List[Dict[str, Any]]:
+  """按 操作+引擎 汇总统计"""
+  groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+  for sample in samples:
+    groups.setdefault((sample['op'], sample['engine']), []).append(sample)
+
+  rows = []
+  for (op, engine), items in sorted(groups.items()):
+    latencies = sorted(item['latency_ms'] for item in items)
+    errors = sum(1 for item in items if not item['ok'])
+    rows.append({
+      'op': op,
+      'engine': engine,
+      'count': len(items),
+      'throughput_rps': round(len(items) / elapsed, 2) if elapsed else 0.0,
+      'error_rate': round(errors / len(items), 4),
+      'p50_ms': round(percentile(latencies, 50), 1),
+      'p95_ms': round(percentile(latencies, 95), 1),
+      'p99_ms': round(percentile(latencies, 99), 1)
+    })
+  return rows
+
+
+def print_report(rows: List[Dict[str, Any]], elapsed: float):
+  """打印统计表"""
+  print()
+  print(f'运行时长: {elapsed:.1f}s, 总请求数: {sum(row["count"] for row in rows)}')
+  print(f'{"操作":<8}{"引擎":<18}{"数量":>8}{"吞吐(rps)":>12}{"错误率":>10}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}')
+  for row in rows:
+    print(
+      f'{row["op"]:<8}{row["engine"]:<18}{row["count"]:>8}{row["throughput_rps"]:>12}'
+      f'{row["error_rate"] * 100:>9.1f}%{row["p50_ms"]:>10}{row["p95_ms"]:>10}{row["p99_ms"]:>10}'
+    )
+
+
+def main():
+  parser = argparse.ArgumentParser(description='PDF表单服务本地压测')
+  parser.add_argument('--base-url', default='http://localhost:8000', help='服务地址')
+  parser.add_argument('--rate', type=float, default=5.0, help='平均到达速率（次/秒）')
+  parser.add_argument('--duration', type=float, default=30.0, help='发压时长（秒）')
+  parser.add_argument('--mix', type=parse_mix, default=parse_mix('parse:3,fill:5,batch:1'),
+                      help='流量配比，如 parse:3,fill:5,batch:1')
+  parser.add_argument('--engines', type=lambda s: s.split(','), default=ENGINES,
+                      help=f'参与压测的引擎，逗号分隔（默认全部: {",".join(ENGINES)}）')
+  parser.add_argument('--corpus', type=lambda s: s.split(','), default=['small', 'medium'],
+                      help=f'使用的语料，逗号分隔（可选: {",".join(CORPUS_SPECS)}）')
+  parser.add_argument('--corpus-dir', default='temp/synthetic_corpus', help='语料生成目录')
+  parser.add_argument('--batch-size', type=int, default=5, help='每次批量解析请求上传的文件数')
+  parser.add_argument('--timeout', type=float, default=60.0, help='单个请求超时（秒）')
+  parser.add_argument('--seed', type=int, default=None, help='随机种子，便于复现同一流量序列')
+  parser.add_argument('--json', dest='json_path', default=None, help='将统计结果写入JSON文件')
+  args = parser.parse_args()
+
+  unknown = [engine for engine in args.engines if engine not in ENGINES]
+  if unknown:
+    parser.error(f'未知引擎: {", ".join(unknown)}')
+  unknown = [name for name in args.corpus if name not in CORPUS_SPECS]
+  if unknown:
+    parser.error(f'未知语料: {", ".join(unknown)}')
+
+  if args.seed is not None:
+    random.seed(args.seed)
+
+  load_test = LoadTest(args)
+  print(f'🚀 开始压测: {args.base_url}, 速率 {args.rate}/s, 时长 {args.duration}s, 配比 {args.mix}')
+  elapsed = asyncio.run(load_test.run())
+
+  rows = summarize(load_test.samples, elapsed)
+  print_report(rows, elapsed)
+
+  if args.json_path:
+    with open(args.json_path, 'w', encoding='utf-8') as f:
+      json.dump({'elapsed_s': round(elapsed, 2), 'config': {
+        'rate': args.rate, 'duration': args.duration, 'mix': args.mix,
+        'engines': args.engines, 'corpus': args.corpus, 'batch_size': args.batch_size
+      }, 'results': rows}, f, ensure_ascii=False, indent=2)
+    print(f'\n📄 结果已写入: {args.json_path}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成PDF表单语料
+使用 reportlab 生成包含文本框、复选框、下拉框和单选按钮的表单，
+同时给出每个表单可用于填充的字段数据，供压测和基准脚本使用
+
+使用方法:
+  python tests/synthetic_corpus.py [输出目录]
+"""
+
+import os
+import sys
+from typing import List, Dict, Any
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+# 预设的语料规格: 名称 -> (页数, 每页字段数)
+CORPUS_SPECS = {
+  'small': (1, 6),
+  'medium': (5, 12),
+  'large': (20, 16)
+}
+
+CHOICE_OPTIONS = ['A', 'B', 'C']
+RADIO_OPTIONS = ['x', 'y', 'z']
+
+
+def make_form(path: str, pages: int = 1, per_page: int = 6) -> List[Dict[str, Any]]:
+  """
+  生成合成表单
+
+  Args:
+    path: 输出PDF路径
+    pages: 页数
+    per_page: 每页字段数，字段类型按 文本/复选框/下拉框/单选 轮换
+
+  Returns:
+    字段填充数据列表，格式与 /api/v1/fill-form 的 fields 一致
+  """
+  c = canvas.Canvas(path, pagesize=letter)
+  fields = []
+
+  for page in range(pages):
+    y = 740
+    c.drawString(50, 760, f'Page {page + 1}')
+
+    for index in range(per_page):
+      base_name = f'p{page + 1}_f{index}'
+      kind = index % 4
+      c.drawString(50, y, f'{base_name}:')
+
+      if kind == 0:
+        name = f'{base_name}_text'
+        c.acroForm.textfield(name=name, x=150, y=y - 5, width=200, height=18)
+        fields.append({'name': name, 'value': f'value {page + 1}-{index}'})
+      elif kind == 1:
+        name = f'{base_name}_check'
+        c.acroForm.checkbox(name=name, x=150, y=y - 5, buttonStyle='check')
+        fields.append({'name': name, 'value': 'Yes'})
+      elif kind == 2:
+        name = f'{base_name}_choice'
+        c.acroForm.choice(name=name, value=CHOICE_OPTIONS[0], options=CHOICE_OPTIONS,
+                          x=150, y=y - 5, width=100, height=18)
+        fields.append({'name': name, 'value': CHOICE_OPTIONS[1]})
+      else:
+        name = f'{base_name}_radio'
+        for option_index, option in enumerate(RADIO_OPTIONS):
+          c.acroForm.radio(name=name, value=option, selected=(option_index == 0),
+                           x=150 + option_index * 30, y=y - 5)
+        fields.append({'name': name, 'value': RADIO_OPTIONS[1]})
+
+      y -= 40
+    c.showPage()
+
+  c.save()
+  return fields
+
+
+def build_corpus(output_dir: str) -> Dict[str, Dict[str, Any]]:
+  """
+  按 CORPUS_SPECS 生成整套语料
+
+  Returns:
+    名称 -> {'path': PDF路径, 'pages': 页数, 'fields': 字段填充数据}
+  """
+  os.makedirs(output_dir, exist_ok=True)
+  corpus = {}
+  for name, (pages, per_page) in CORPUS_SPECS.items():
+    path = os.path.join(output_dir, f'synthetic_{name}.pdf')
+    fields = make_form(path, pages, per_page)
+    corpus[name] = {'path': path, 'pages': pages, 'fields': fields}
+  return corpus
+
+
+if __name__ == '__main__':
+  output_dir = sys.argv[1] if len(sys.argv) > 1 else 'temp/synthetic_corpus'
+  for name, item in build_corpus(output_dir).items():
+    print(f'{name}: {item["path"]} ({item["pages"]} 页, {len(item["fields"])} 个字段)')
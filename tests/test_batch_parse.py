@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+批量解析测试（/api/v1/parse-form/batch）
+- 多个 PDF 和 ZIP 中的 PDF 在进程池中并行解析，每个文件一行 NDJSON，最后一行为汇总
+- 无效的文件只影响自己的结果行，错误信息不包含服务端路径
+- 内容相同的文件只解析一次，重复的文件返回同一结果
+- 解析结果写入共享模板缓存，再次提交同一批文件时直接返回缓存的结果
+"""
+
+import io
+import os
+import json
+import zipfile
+import tempfile
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.utils.config import settings
+from app.utils.batch_parse import shutdown_batch_pool
+from app.utils.template_cache import TemplateCache
+from tests.synthetic_corpus import make_form
+
+
+def post_batch(client: TestClient, files):
+  response = client.post('/api/v1/parse-form/batch', files=files, data={'engine': 'pymupdf'})
+  assert response.status_code == 200
+  assert response.headers['content-type'].startswith('application/x-ndjson')
+  records = [json.loads(line) for line in response.text.splitlines()]
+  results = {record['filename']: record for record in records if record['type'] == 'result'}
+  assert records[-1]['type'] == 'summary' and records[-1]['file_count'] == len(results)
+  return results, records[-1]
+
+
+def check_batch(client: TestClient, temp_dir: str):
+  expected = {}
+  contents = {}
+  for name, pages in (('one.pdf', 1), ('two.pdf', 2)):
+    path = os.path.join(temp_dir, name)
+    expected[name] = sorted(field['name'] for field in make_form(path, pages=pages))
+    with open(path, 'rb') as f:
+      contents[name] = f.read()
+
+  archive = io.BytesIO()
+  with zipfile.ZipFile(archive, 'w') as zf:
+    zf.writestr('forms/two.pdf', contents['two.pdf'])
+    zf.writestr('forms/one-copy.pdf', contents['one.pdf'])
+    zf.writestr('notes.txt', 'not a pdf')
+  files = [
+    ('files', ('one.pdf', contents['one.pdf'], 'application/pdf')),
+    ('files', ('broken.pdf', b'%PDF-1.4 broken', 'application/pdf')),
+    ('files', ('forms.zip', archive.getvalue(), 'application/zip')),
+    ('files', ('two-copy.pdf', contents['two.pdf'], 'application/pdf'))
+  ]
+
+  results, summary = post_batch(client, files)
+  assert set(results) == {
+    'one.pdf', 'broken.pdf', 'forms.zip/forms/two.pdf', 'forms.zip/forms/one-copy.pdf',
+    'forms.zip/notes.txt', 'two-copy.pdf'
+  }
+  for filename, name in (('one.pdf', 'one.pdf'), ('forms.zip/forms/two.pdf', 'two.pdf')):
+    record = results[filename]
+    assert record['success'] and not record['cached'] and record['engine'] == 'pymupdf'
+    assert sorted(field['name'] for field in record['fields']) == expected[name]
+    assert record['field_count'] == len(expected[name])
+  error = results['broken.pdf']['error']
+  assert not results['broken.pdf']['success'] and error and temp_dir not in error
+  assert results['forms.zip/notes.txt'] == {
+    'type': 'result', 'index': 4, 'filename': 'forms.zip/notes.txt', 'sha256': None,
+    'success': False, 'error': '只支持PDF文件'
+  }
+
+  # 内容相同的文件只解析一次，重复的文件返回同一结果
+  for copy, original in (('forms.zip/forms/one-copy.pdf', 'one.pdf'), ('two-copy.pdf', 'forms.zip/forms/two.pdf')):
+    assert results[copy]['success'] and results[copy]['cached']
+    assert results[copy]['sha256'] == results[original]['sha256']
+    assert results[copy]['fields'] == results[original]['fields']
+  assert (summary['succeeded'], summary['failed'], summary['cached']) == (4, 2, 2)
+
+  # 同一批文件再次提交时直接返回缓存的结果
+  results, summary = post_batch(client, files)
+  assert results['one.pdf']['cached'] and results['forms.zip/forms/two.pdf']['cached']
+  assert summary['cached'] == 4
+
+
+def test_batch_parse():
+  """多个文件并行解析，逐个返回 NDJSON 结果"""
+  print('🔍 测试批量解析...')
+  saved_cache = main.template_cache
+  saved = settings.BATCH_PARSE_PROCESSES, settings.TEMP_DIR, settings.OUTPUT_DIR
+  saved_env = {key: os.environ.get(key) for key in ('TEMP_DIR', 'OUTPUT_DIR')}
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存和临时文件写入测试目录（子进程从环境变量读取配置）
+    main.template_cache = TemplateCache(os.path.join(temp_dir, 'cache'), 64 * 1024 * 1024)
+    settings.BATCH_PARSE_PROCESSES = 2
+    settings.TEMP_DIR = settings.OUTPUT_DIR = os.environ['TEMP_DIR'] = os.environ['OUTPUT_DIR'] = temp_dir
+    try:
+      check_batch(TestClient(main.app), temp_dir)
+    finally:
+      shutdown_batch_pool()
+      main.template_cache = saved_cache
+      settings.BATCH_PARSE_PROCESSES, settings.TEMP_DIR, settings.OUTPUT_DIR = saved
+      for key, value in saved_env.items():
+        if value is None:
+          os.environ.pop(key, None)
+        else:
+          os.environ[key] = value
+  print('✅ 批量解析正常')
+
+
+if __name__ == '__main__':
+  test_batch_parse()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+复选框开启状态测试
+- 开启状态不是 Yes（如 On 或导出名 Agree）的复选框，解析出的值与 options 中的选中值相同，都是真实的开启状态
+- enhanced_fillpdf 与 pymupdf 引擎结果一致，只请求 value 属性时也报告真实的开启状态
+- 用解析出的值填充后，复选框仍为选中状态
+"""
+
+import io
+import os
+import asyncio
+import tempfile
+
+import pdfrw
+from pdfrw import PdfDict, PdfName
+from fastapi import UploadFile
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+from app.utils.config import settings
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF
+
+ON_STATES = {'agree_check': 'Agree', 'on_check': 'On', 'unchecked_check': 'Agree'}
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename='form.pdf')
+
+
+def make_checkbox_form(path: str) -> bytes:
+  """生成复选框表单，再把开启状态的外观名 /Yes 改为 ON_STATES 中的名称"""
+  c = canvas.Canvas(path, pagesize=letter)
+  y = 740
+  for name in ON_STATES:
+    c.drawString(50, y, f'{name}:')
+    c.acroForm.checkbox(name=name, x=150, y=y - 5, buttonStyle='check', checked=(name != 'unchecked_check'))
+    y -= 40
+  c.save()
+
+  pdf = pdfrw.PdfReader(path)
+  for annotation in pdf.pages[0].Annots:
+    name = annotation.T[1:-1]
+    on = PdfName(ON_STATES[name])
+    for key in ('/N', '/D'):
+      appearances = annotation.AP[key] if annotation.AP else None
+      if appearances is not None and '/Yes' in appearances:
+        appearances[on] = appearances.pop('/Yes')
+    if annotation.V == PdfName.Yes:
+      annotation.update(PdfDict(V=on, AS=on))
+  pdfrw.PdfWriter().write(path, pdf)
+  with open(path, 'rb') as f:
+    return f.read()
+
+
+async def check_engine(service, content: bytes):
+  fields = {field['name']: field for field in await service.parse_form_fields(upload(content))}
+  for name, on_state in ON_STATES.items():
+    field = fields[name]
+    assert field['type'] == 'checkbox', (name, field['type'])
+    assert field['options'][0]['value'] == on_state, (name, field['options'])
+    expected = 'Off' if name == 'unchecked_check' else on_state
+    assert field['value'] == expected, f'{type(service).__name__}: 复选框 {name} 的值为 {field["value"]}，应为 {expected}'
+
+  # 只请求 value 时不计算选项，但仍报告真实的开启状态
+  lite = await service.parse_form_fields(upload(content), projection=frozenset({'name', 'value'}))
+  assert {field['name']: field['value'] for field in lite}['on_check'] == 'On'
+
+  # 解析出的值可以直接用于填充
+  output = await service.fill_form(upload(content), [{'name': name, 'value': fields[name]['value']} for name in ON_STATES])
+  with open(output, 'rb') as f:
+    filled = await service.parse_form_fields(upload(f.read()))
+  assert {field['name']: field['value'] for field in filled} == {name: fields[name]['value'] for name in ON_STATES}
+
+
+def test_checkbox_on_state():
+  """复选框的值和选项使用相同的开启状态"""
+  print('🔍 测试复选框开启状态...')
+  saved = settings.OUTPUT_DIR, settings.TEMP_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 填充输出和临时文件写入测试目录
+    settings.OUTPUT_DIR = settings.TEMP_DIR = temp_dir
+    try:
+      content = make_checkbox_form(os.path.join(temp_dir, 'form.pdf'))
+      for service in (PDFServiceEnhancedFillPDF(), PDFServicePyMuPDF()):
+        asyncio.run(check_engine(service, content))
+    finally:
+      settings.OUTPUT_DIR, settings.TEMP_DIR = saved
+  print('✅ 复选框开启状态正常')
+
+
+if __name__ == '__main__':
+  test_checkbox_on_state()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+字段属性投影测试（/api/v1/parse-form 的 fields 和 mode=lite）
+- 各引擎按投影解析的结果与完整解析后只保留请求属性的结果相同
+- fields 和 mode 无效时返回 400
+- 投影后的结果按投影分别缓存，已缓存完整结果时直接取其中的属性
+"""
+
+import io
+import os
+import json
+import asyncio
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app import main
+from app.utils.config import settings
+from app.utils.template_cache import TemplateCache
+from app.utils.field_projection import parse_field_projection, FIELD_ATTRIBUTES, LITE_ATTRIBUTES
+from app.services.pdf_service import PDFService
+from app.services.pdf_service_pypdf import PDFServicePyPDF
+from app.services.pdf_service_fillpdf import PDFServiceFillPDF
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF
+from tests.synthetic_corpus import make_form
+
+SPECS = ('name,type', 'type,page', 'options', 'value,attributes', 'label,position,is_subfield,subfield_info,required')
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename='form.pdf')
+
+
+def check_parsing():
+  assert parse_field_projection(None) is None
+  assert parse_field_projection('', 'lite') == LITE_ATTRIBUTES
+  assert parse_field_projection(' type , page ') == {'name', 'type', 'page'}
+  assert parse_field_projection('type', 'lite') == {'name', 'type'}
+  assert parse_field_projection(','.join(FIELD_ATTRIBUTES)) is None
+  for spec, mode in (('name,colour', None), (None, 'tiny')):
+    try:
+      parse_field_projection(spec, mode)
+    except ValueError:
+      continue
+    raise AssertionError(f'{spec} / {mode} 应当无效')
+
+
+async def check_engines(content: bytes):
+  services = (PDFServicePyPDF(), PDFService(), PDFServiceFillPDF(), PDFServiceEnhancedFillPDF(), PDFServicePyMuPDF())
+  for service in services:
+    for pages in (None, {2}):
+      full = jsonable_encoder(await service.parse_form_fields(upload(content), pages))
+      assert full, type(service).__name__
+      for spec in SPECS:
+        projection = parse_field_projection(spec)
+        fields = jsonable_encoder(await service.parse_form_fields(upload(content), pages, projection))
+        expected = [{key: value for key, value in field.items() if key in projection} for field in full]
+        assert fields == expected, (type(service).__name__, pages, spec)
+
+
+def check_endpoint(client: TestClient, content: bytes):
+  def parse(**data):
+    return client.post('/api/v1/parse-form', files={'file': ('form.pdf', content, 'application/pdf')}, data=data)
+
+  assert parse(fields='name,colour').status_code == 400
+  assert parse(mode='tiny').status_code == 400
+
+  # 先解析投影结果（写入投影缓存），再解析完整结果
+  lite = parse(engine='pymupdf', mode='lite').json()['fields']
+  full = parse(engine='pymupdf').json()['fields']
+  assert lite == [{'name': field['name'], 'type': field['type']} for field in full]
+  assert parse(engine='pymupdf', mode='lite').json()['fields'] == lite
+
+  # 完整结果已缓存，其他投影直接取其中的属性
+  fields = parse(engine='pymupdf', fields='page').json()['fields']
+  assert fields == [{'name': field['name'], 'page': field['page']} for field in full]
+
+  # 流式模式同样只返回请求的属性
+  response = parse(engine='pymupdf', fields='type', stream='true', pages='2')
+  records = [json.loads(line) for line in response.text.splitlines()]
+  assert records[-1]['type'] == 'summary' and records[-1]['field_count'] > 0
+  assert all(set(record['field']) == {'name', 'type'} for record in records[:-1])
+
+
+def test_field_projection():
+  """fields / mode=lite 只计算并返回请求的字段属性"""
+  print('🔍 测试字段属性投影...')
+  check_parsing()
+  saved_cache = main.template_cache
+  saved = settings.TEMP_DIR, settings.OUTPUT_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存和临时文件写入测试目录
+    main.template_cache = TemplateCache(os.path.join(temp_dir, 'cache'), 64 * 1024 * 1024)
+    settings.TEMP_DIR = settings.OUTPUT_DIR = temp_dir
+    try:
+      path = os.path.join(temp_dir, 'form.pdf')
+      make_form(path, pages=2)
+      with open(path, 'rb') as f:
+        content = f.read()
+      asyncio.run(check_engines(content))
+      check_endpoint(TestClient(main.app), content)
+    finally:
+      main.template_cache = saved_cache
+      settings.TEMP_DIR, settings.OUTPUT_DIR = saved
+  print('✅ 字段属性投影正常')
+
+
+if __name__ == '__main__':
+  test_field_projection()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+预编译填充计划测试（compile_fill_plan）
+- 按填充计划写入的输出与原来逐个遍历页面注释和 AcroForm 字段树的实现逐字节相同
+- 覆盖全部字段、另一组值、部分字段、嵌套字段名、flatten，以及无效选项值的 KeyError 信息
+"""
+
+import os
+import random
+import tempfile
+
+import pdfrw
+from pdfrw import PdfDict, PdfName, PdfString, PdfArray
+
+from app.custom_fillpdf import write_fillable_pdf
+from app.custom_fillpdf.enhanced_fillpdfs import convert_dict_values_to_string, _get_field_name, _fill_single_field
+from app.custom_fillpdf.utils.field_format import make_read_only
+from tests.synthetic_corpus import make_form, CHOICE_OPTIONS, RADIO_OPTIONS
+
+
+def legacy_fill_field_recursive(field_obj, data_dict, parent_name=""):
+  """原实现：每次填充都递归遍历整个 AcroForm 字段树，出错时跳过该字段的子字段"""
+  if not field_obj:
+    return
+  try:
+    field_name = _get_field_name(field_obj)
+    if field_name and field_name in data_dict:
+      _fill_single_field(field_obj, data_dict[field_name])
+    if '/Kids' in field_obj and field_obj['/Kids']:
+      for kid in field_obj['/Kids']:
+        full_name = f"{parent_name}.{field_name}" if parent_name and field_name else (field_name or parent_name)
+        legacy_fill_field_recursive(kid, data_dict, full_name)
+  except Exception:
+    pass
+
+
+def legacy_write_fillable_pdf(input_pdf_path, output_pdf_path, data_dict, flatten=False):
+  """原实现：每次填充都遍历所有页面注释，逐个拼接字段全名并解码选项"""
+  data_dict = convert_dict_values_to_string(data_dict)
+  template_pdf = pdfrw.PdfReader(input_pdf_path)
+  for page in template_pdf.pages:
+    if not page['/Annots']:
+      continue
+    for annotation in page['/Annots']:
+      target = annotation if annotation['/T'] else annotation['/Parent']
+      if target and annotation['/Subtype'] == '/Widget':
+        key = target['/T'][1:-1]
+        target_aux = target
+        while target_aux['/Parent']:
+          key = target['/Parent']['/T'][1:-1] + '.' + key
+          target_aux = target_aux['/Parent']
+        if key in data_dict.keys():
+          if target['/FT'] == '/Btn':
+            if not annotation['/T']:
+              if annotation['/AP']:
+                keys = annotation['/AP']['/N'].keys()
+                if keys[0] and keys[0][0] == '/':
+                  keys[0] = str(keys[0][1:])
+                temp_dict = {sub: '-'.join(str(ele) for ele in value) if isinstance(value, list) else str(value)
+                             for sub, value in data_dict.items()}
+                annotation = annotation['/Parent']
+                options = []
+                for each in annotation['/Kids']:
+                  keys2 = each['/AP']['/N'].keys()
+                  if '/Off' in keys2:
+                    keys2.remove('/Off')
+                  export = keys2[0]
+                  options.append(export[1:] if '/' in export else export)
+                  if f'/{data_dict[key]}' == export:
+                    val_str = pdfrw.objects.pdfname.BasePdfName(f'/{data_dict[key]}')
+                  else:
+                    val_str = pdfrw.objects.pdfname.BasePdfName('/Off')
+                  if set(keys).intersection(set(temp_dict.values())):
+                    each.update(PdfDict(AS=val_str))
+                if data_dict[key] not in options:
+                  if data_dict[key] != "None" and data_dict[key] != "":
+                    raise KeyError(f"{data_dict[key]} Not An Option, Options are {options}")
+                elif set(keys).intersection(set(temp_dict.values())):
+                  annotation.update(PdfDict(V=pdfrw.objects.pdfname.BasePdfName(f'/{data_dict[key]}')))
+            else:
+              target.update(PdfDict(V=PdfName(data_dict[key]), AS=PdfName(data_dict[key])))
+              if target['/Kids']:
+                target['/Kids'][0].update(PdfDict(V=PdfName(data_dict[key]), AS=PdfName(data_dict[key])))
+          elif target['/FT'] == '/Ch':
+            export = None
+            options = annotation['/Opt']
+            if len(options) > 0:
+              if type(options[0]) == PdfArray:
+                options = [PdfString.decode(x[0]) for x in options]
+              if type(options[0]) == PdfString:
+                options = [PdfString.decode(x) for x in options]
+            for each in options:
+              if each == data_dict[key]:
+                export = each
+            if export is None and data_dict[key] != "None" and data_dict[key] != "":
+              raise KeyError(f"{data_dict[key]} Not An Option For {annotation['/T']}, Options are {options}")
+            pdfstr = PdfString.encode(data_dict[key])
+            annotation.update(PdfDict(V=pdfstr, AS=pdfstr))
+          elif target['/FT'] == '/Tx':
+            target.update(PdfDict(V=data_dict[key], AP=data_dict[key]))
+            if target['/Kids']:
+              target['/Kids'][0].update(PdfDict(V=data_dict[key], AP=data_dict[key]))
+        if flatten == True:
+          annotation.update(PdfDict(Ff=make_read_only(target["/Ff"])))
+
+  try:
+    for field in template_pdf.Root.AcroForm.Fields:
+      legacy_fill_field_recursive(field, data_dict)
+  except Exception:
+    pass
+
+  template_pdf.Root.AcroForm.update(PdfDict(NeedAppearances=pdfrw.PdfObject('true')))
+  pdfrw.PdfWriter().write(output_pdf_path, template_pdf)
+
+
+def add_nested_fields(path: str):
+  """在第一页加入层级字段：grp.child、a.b.c，以及带两个无名控件的文本父字段 multi"""
+  pdf = pdfrw.PdfReader(path)
+  page = pdf.pages[0]
+
+  def node(name, parent=None, **extra):
+    obj = PdfDict(**extra)
+    if name:
+      obj.T = PdfString.encode(name)
+    if parent is not None:
+      obj.Parent = parent
+    obj.indirect = True
+    return obj
+
+  def widget(name, parent, rect, field_type=None):
+    extra = {'FT': PdfName(field_type)} if field_type else {}
+    return node(name, parent, Type=PdfName.Annot, Subtype=PdfName.Widget, Rect=PdfArray(rect), P=page, **extra)
+
+  grp = node('grp')
+  child = widget('child', grp, [400, 700, 500, 720], 'Tx')
+  grp.Kids = PdfArray([child])
+  a = node('a')
+  b = node('b', a)
+  c = widget('c', b, [400, 650, 500, 670], 'Tx')
+  b.Kids = PdfArray([c])
+  a.Kids = PdfArray([b])
+  multi = node('multi', FT=PdfName.Tx)
+  first, second = widget(None, multi, [400, 600, 500, 620]), widget(None, multi, [400, 570, 500, 590])
+  multi.Kids = PdfArray([first, second])
+
+  page.Annots = PdfArray(list(page.Annots or []) + [child, c, first, second])
+  pdf.Root.AcroForm.Fields = PdfArray(list(pdf.Root.AcroForm.Fields) + [grp, a, multi])
+  pdfrw.PdfWriter().write(path, pdf)
+  return ['grp.child', 'child', 'a.b.c', 'c', 'multi']
+
+
+def fill(writer, path: str, output_path: str, data, flatten: bool):
+  """返回输出文件内容，填充失败时返回异常类型和信息"""
+  try:
+    writer(path, output_path, dict(data), flatten=flatten)
+  except Exception as e:
+    return type(e).__name__, str(e)
+  with open(output_path, 'rb') as f:
+    return f.read()
+
+
+def check_parity(path: str, cases, output_dir: str):
+  expected_path = os.path.join(output_dir, 'legacy.pdf')
+  actual_path = os.path.join(output_dir, 'plan.pdf')
+  for index, data in enumerate(cases):
+    for flatten in (False, True):
+      expected = fill(legacy_write_fillable_pdf, path, expected_path, data, flatten)
+      actual = fill(write_fillable_pdf, path, actual_path, data, flatten)
+      assert actual == expected, f'第 {index + 1} 组数据 (flatten={flatten}): 填充计划的输出与原实现不同'
+
+
+def build_cases(fields, nested_names):
+  first = {field['name']: field['value'] for field in fields}
+  second = {}
+  for name in first:
+    if name.endswith('_check'):
+      second[name] = 'Off'
+    elif name.endswith('_choice'):
+      second[name] = CHOICE_OPTIONS[2]
+    elif name.endswith('_radio'):
+      second[name] = RADIO_OPTIONS[2]
+    else:
+      second[name] = f'other {name}'
+  nested = {name: f'nested {name}' for name in nested_names}
+  choice = next(name for name in first if name.endswith('_choice'))
+  radio = next(name for name in first if name.endswith('_radio'))
+
+  cases = [first, second, {}, {'missing': 'x'}, {**first, **nested}, nested]
+  # 无效的选项值：两种实现抛出相同的 KeyError
+  cases += [{choice: 'not-an-option'}, {radio: 'not-an-option'}, {choice: ''}, {radio: 'None'}]
+  rnd = random.Random(34)
+  names = list(first) + nested_names
+  values = ['hello', 'Yes', 'Off', 'B', 'y', '1', '', 'None']
+  for _ in range(8):
+    sample = rnd.sample(names, rnd.randint(1, len(names)))
+    cases.append({name: rnd.choice(values) for name in sample})
+  return cases
+
+
+def test_fill_plan_parity():
+  """按填充计划写入与原来遍历注释的实现输出相同"""
+  print('🔍 测试预编译填充计划...')
+  with tempfile.TemporaryDirectory() as temp_dir:
+    path = os.path.join(temp_dir, 'form.pdf')
+    fields = make_form(path, pages=2, per_page=8)
+    nested_names = add_nested_fields(path)
+    check_parity(path, build_cases(fields, nested_names), temp_dir)
+  print('✅ 预编译填充计划与原实现输出一致')
+
+
+if __name__ == '__main__':
+  test_fill_plan_parity()
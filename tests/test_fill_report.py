@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+填充报告测试
+- 各引擎在写入时记录字段结果：直接写入、映射后写入、未匹配和因选项无效被删除的字段
+- 同一字段多次记录时保留优先级更高的结果，未提交的名称（引擎生成的变体）不计入
+- 报告按服务端生成的ID保存，相同的请求ID不会互相覆盖，超出数量上限时删除最旧的报告
+"""
+
+import io
+import os
+import json
+import asyncio
+import tempfile
+
+from fastapi import UploadFile
+
+from app.utils.config import settings
+from app.utils import fill_report
+from app.utils.request_context import RequestContext, _current_request
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF
+from app.services.pdf_service_fillpdf import PDFServiceFillPDF
+from tests.synthetic_corpus import make_form
+
+
+def upload(path: str) -> UploadFile:
+  with open(path, 'rb') as f:
+    return UploadFile(file=io.BytesIO(f.read()), filename='form.pdf')
+
+
+async def fill_with_report(service, path: str, fields, strict_validation: bool):
+  ctx = RequestContext('req-report')
+  token = _current_request.set(ctx)
+  try:
+    report = fill_report.start_fill_report(fields)
+    await service.fill_form(upload(path), fields, strict_validation)
+  finally:
+    _current_request.reset(token)
+  return {field['name']: field for field in report.to_dict()['fields']}
+
+
+async def check_engines(path: str, fields):
+  text = next(field['name'] for field in fields if field['name'].endswith('_text'))
+  choice = next(field['name'] for field in fields if field['name'].endswith('_choice'))
+  submitted = [
+    {'name': text, 'value': 'hello'},
+    {'name': choice, 'value': 'not-an-option'},
+    {'name': 'missing', 'value': 'x'}
+  ]
+  for service in (PDFServiceEnhancedFillPDF(), PDFServicePyMuPDF(), PDFServiceFillPDF()):
+    result = await fill_with_report(service, path, submitted, False)
+    assert result[text]['status'] == fill_report.MATCHED, service.name
+    assert result[choice]['status'] == fill_report.REJECTED and result[choice]['value'] == 'not-an-option', service.name
+    assert result['missing']['status'] == fill_report.UNMATCHED and result['missing']['reason'], service.name
+
+  # fillpdf 引擎忽略大小写和空格匹配到模板字段
+  result = await fill_with_report(PDFServiceFillPDF(), path, [{'name': text.upper(), 'value': 'hello'}], True)
+  assert result[text.upper()] == {
+    'name': text.upper(), 'status': fill_report.MAPPED, 'target': text, 'reason': '忽略大小写和空格后匹配'
+  }
+
+
+def check_recording():
+  report = fill_report.FillReport(['a', 'b', 'c', 'a'])
+  report.matched('a')
+  report.unmatched('a', '策略失败')
+  report.mapped('b', 'B', '忽略大小写和空格后匹配')
+  report.matched('a_0')
+  data = report.to_dict()
+  assert [field['status'] for field in data['fields']] == ['matched', 'mapped', 'unmatched']
+  assert data['fields'][2]['reason'] == fill_report.DEFAULT_UNMATCHED_REASON
+  assert data['summary'] == {'matched': 1, 'mapped': 1, 'unmatched': 1, 'rejected': 0}
+  assert fill_report.summary_header(data) == 'matched=1, mapped=1, unmatched=1, rejected=0'
+  report.reset()
+  assert report.to_dict()['summary']['unmatched'] == 3
+
+  # 未请求报告时不记录
+  assert fill_report.current_fill_report() is None
+
+
+def check_storage():
+  assert fill_report.fill_report_path('../x') is None
+  assert fill_report.fill_report_path('req-1') is None
+  report_ids = []
+  for index in range(3):
+    # 客户端重复使用同一请求ID时，报告ID仍由服务端生成，互不覆盖
+    url = fill_report.save_fill_report({'request_id': 'req-same', 'index': index, 'summary': {}, 'fields': []})
+    assert url.startswith('/api/v1/fill-reports/')
+    report_id = url.rsplit('/', 1)[1]
+    assert report_id not in report_ids
+    report_ids.append(report_id)
+    path = fill_report.fill_report_path(report_id)
+    with open(path, encoding='utf-8') as f:
+      assert json.load(f)['index'] == index
+    os.utime(path, (index, index))
+  url = fill_report.save_fill_report({'summary': {}, 'fields': []})
+  assert sorted(os.listdir(settings.FILL_REPORT_DIR)) == sorted([f'{report_ids[2]}.json', f'{url.rsplit("/", 1)[1]}.json'])
+
+
+def test_fill_report():
+  """引擎在填充时记录每个字段的结果，报告按请求保存"""
+  print('🔍 测试填充报告...')
+  check_recording()
+  saved = settings.OUTPUT_DIR, settings.TEMP_DIR, settings.FILL_REPORT_DIR, settings.FILL_REPORT_MAX_FILES
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 输出文件和报告写入测试目录
+    settings.OUTPUT_DIR = settings.TEMP_DIR = temp_dir
+    settings.FILL_REPORT_DIR = os.path.join(temp_dir, 'reports')
+    settings.FILL_REPORT_MAX_FILES = 2
+    try:
+      path = os.path.join(temp_dir, 'form.pdf')
+      fields = make_form(path)
+      asyncio.run(check_engines(path, fields))
+      check_storage()
+    finally:
+      settings.OUTPUT_DIR, settings.TEMP_DIR, settings.FILL_REPORT_DIR, settings.FILL_REPORT_MAX_FILES = saved
+  print('✅ 填充报告正常')
+
+
+if __name__ == '__main__':
+  test_fill_report()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+先发哈希协议测试（X-Content-SHA256）
+- 服务端已有模板: 只提供哈希即可得到映射模板
+- 服务端没有模板: 返回 428，上传文件后同一哈希即可使用
+- 哈希格式错误、文件与哈希不一致、文件和哈希都没有: 返回 400
+"""
+
+import io
+import os
+import asyncio
+import tempfile
+
+from fastapi import HTTPException, UploadFile
+
+from app import main
+from app.utils.mapped_template import MappedTemplate
+from app.utils.template_cache import TemplateCache, content_sha256
+from tests.synthetic_corpus import make_form
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename='form.pdf')
+
+
+async def status_of(file, content_sha) -> int:
+  try:
+    _, source, _ = await main.resolve_template(file, content_sha)
+  except HTTPException as e:
+    return e.status_code
+  await main.close_template(source)
+  return 200
+
+
+async def check_protocol(content: bytes):
+  sha = content_sha256(content)
+
+  # 服务端还没有该模板
+  assert await status_of(None, sha) == 428
+  assert await status_of(None, 'not-a-sha') == 400
+  assert await status_of(None, None) == 400
+  assert await status_of(upload(content), '0' * 64) == 400
+
+  # 上传一次后只需提供哈希（大小写不敏感）
+  assert await status_of(upload(content), sha) == 200
+  template_sha, source, filename = await main.resolve_template(None, sha.upper())
+  try:
+    assert template_sha == sha and filename == f'{sha}.pdf'
+    assert isinstance(source, MappedTemplate)
+    assert await source.read() == content
+  finally:
+    await main.close_template(source)
+
+
+def test_hash_first_protocol():
+  """只提供 X-Content-SHA256 时使用服务端已有的模板，没有时要求上传"""
+  print('🔍 测试先发哈希协议...')
+  saved = main.template_cache
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存写入测试目录
+    main.template_cache = TemplateCache(os.path.join(temp_dir, 'cache'), 16 * 1024 * 1024)
+    try:
+      path = os.path.join(temp_dir, 'form.pdf')
+      make_form(path)
+      with open(path, 'rb') as f:
+        asyncio.run(check_protocol(f.read()))
+    finally:
+      main.template_cache = saved
+  print('✅ 先发哈希协议正常')
+
+
+if __name__ == '__main__':
+  test_hash_first_protocol()
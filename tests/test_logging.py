@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+日志配置测试
+- JSON 格式: 每条记录一行 JSON，附带当前请求ID和绑定的结构化字段
+- 逐字段日志采样: 同一请求内只采样一次，结果在整个请求中保持不变
+"""
+
+import json
+
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils import logger as log_config
+from app.utils.request_context import RequestContext, _current_request
+
+
+def check_json_records():
+  records = []
+  logger.configure(extra={'request_id': '-'}, patcher=log_config._add_request_id)
+  handler_id = logger.add(records.append, format=log_config._json_format, level='INFO')
+  token = _current_request.set(RequestContext('req-1'))
+  try:
+    logger.bind(access={'status': 200}).info('access')
+  finally:
+    _current_request.reset(token)
+  logger.info('outside')
+  logger.remove(handler_id)
+
+  inside, outside = [json.loads(record) for record in records]
+  assert inside['request_id'] == 'req-1' and inside['message'] == 'access'
+  assert inside['extra'] == {'access': {'status': 200}}
+  assert outside['request_id'] == '-' and 'extra' not in outside
+
+
+def check_field_sampling():
+  saved = settings.LOG_FIELD_SAMPLE_RATE
+  try:
+    settings.LOG_FIELD_SAMPLE_RATE = 0
+    assert not log_config.field_logging()
+    settings.LOG_FIELD_SAMPLE_RATE = 1
+    assert log_config.field_logging()
+
+    # 请求内首次调用决定后，采样率变化不影响同一请求
+    ctx = RequestContext('req-2')
+    token = _current_request.set(ctx)
+    try:
+      assert log_config.field_logging()
+      settings.LOG_FIELD_SAMPLE_RATE = 0
+      assert log_config.field_logging() and ctx.field_logs is True
+    finally:
+      _current_request.reset(token)
+  finally:
+    settings.LOG_FIELD_SAMPLE_RATE = saved
+
+
+def test_logging():
+  """JSON 日志附带请求ID，逐字段日志按请求采样"""
+  print('🔍 测试日志配置...')
+  check_json_records()
+  check_field_sampling()
+  print('✅ 日志配置正常')
+
+
+if __name__ == '__main__':
+  test_logging()
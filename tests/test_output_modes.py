@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+填充输出模式测试（output=default / compact）
+- compact 输出比 default 小，解析后的字段值与 default 输出和提交的数据相同
+- X-Output-* 响应头与实际的输入、输出大小一致
+- 已经压缩过的文件再次优化不会变大，保留原文件
+"""
+
+import io
+import os
+import json
+import asyncio
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app import main
+from app.utils import field_options, result_cache
+from app.utils.config import settings
+from app.utils.pdf_optimizer import optimize_pdf
+from app.utils.template_cache import TemplateCache
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from tests.synthetic_corpus import make_form
+
+
+def field_values(content: bytes):
+  upload = UploadFile(file=io.BytesIO(content), filename='form.pdf')
+  fields = asyncio.run(PDFServiceEnhancedFillPDF().parse_form_fields(upload))
+  return {field['name']: field['value'] for field in fields}
+
+
+def check_compact(client: TestClient, content: bytes, fields):
+  def fill(output):
+    response = client.post(
+      '/api/v1/fill-form',
+      files={'file': ('form.pdf', content, 'application/pdf')},
+      data={'form_data': json.dumps({'fields': fields}), 'engine': 'enhanced_fillpdf', 'output': output}
+    )
+    assert response.status_code == 200, (output, response.status_code)
+    assert response.headers['x-output-mode'] == output
+    return response
+
+  default = fill('default')
+  compact = fill('compact')
+  assert len(compact.content) < len(default.content), (len(compact.content), len(default.content))
+  assert int(compact.headers['x-output-input-bytes']) == len(default.content)
+  assert int(compact.headers['x-output-bytes']) == len(compact.content)
+  assert 'x-output-bytes' not in default.headers
+
+  expected = {field['name']: field['value'] for field in fields}
+  assert field_values(compact.content) == field_values(default.content) == expected
+  return compact.content
+
+
+def check_already_compact(temp_dir: str, content: bytes):
+  path = os.path.join(temp_dir, 'compact.pdf')
+  with open(path, 'wb') as f:
+    f.write(content)
+  stats = optimize_pdf(path)
+  assert stats['output_bytes'] <= stats['input_bytes'] == len(content)
+  if not stats['applied']:
+    with open(path, 'rb') as f:
+      assert f.read() == content
+  assert not os.path.exists(f'{path}.compact')
+
+
+def test_output_modes():
+  """compact 输出更小且字段值不变"""
+  print('🔍 测试填充输出模式...')
+  saved_caches = main.template_cache, result_cache.template_cache, field_options.template_cache
+  saved = settings.TEMP_DIR, settings.OUTPUT_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存、结果缓存和临时文件写入测试目录
+    cache = TemplateCache(os.path.join(temp_dir, 'cache'), 64 * 1024 * 1024)
+    main.template_cache = result_cache.template_cache = field_options.template_cache = cache
+    settings.TEMP_DIR = settings.OUTPUT_DIR = temp_dir
+    field_options._local_cache.clear()
+    try:
+      path = os.path.join(temp_dir, 'form.pdf')
+      fields = make_form(path, pages=3, per_page=8)
+      with open(path, 'rb') as f:
+        content = f.read()
+      compact = check_compact(TestClient(main.app), content, fields)
+      check_already_compact(temp_dir, compact)
+    finally:
+      main.template_cache, result_cache.template_cache, field_options.template_cache = saved_caches
+      settings.TEMP_DIR, settings.OUTPUT_DIR = saved
+      field_options._local_cache.clear()
+  print('✅ 填充输出模式正常')
+
+
+if __name__ == '__main__':
+  test_output_modes()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+页码范围测试
+- parse_page_ranges: 单页、闭区间、空白和重复，空值表示全部页面，格式错误和过大的范围抛出 ValueError
+- 合计页数上限: 单个范围和多个范围合计都不能超过 MAX_PAGE_COUNT 页，重叠的页只计一次
+- format_page_ranges: 输出规范的范围字符串，与 parse_page_ranges 互为逆运算
+"""
+
+from app.utils.page_ranges import parse_page_ranges, format_page_ranges, MAX_PAGE_COUNT
+
+
+def expect_error(spec: str, message: str):
+  try:
+    parse_page_ranges(spec)
+  except ValueError as e:
+    assert message in str(e), (spec, str(e))
+  else:
+    raise AssertionError(f'页码范围 {spec!r} 没有被拒绝')
+
+
+def check_parse():
+  assert parse_page_ranges(None) is None
+  assert parse_page_ranges('') is None
+  assert parse_page_ranges('  ') is None
+  assert parse_page_ranges('7') == {7}
+  assert parse_page_ranges('3-5,7') == {3, 4, 5, 7}
+  assert parse_page_ranges(' 3 - 5 , 7 ,') == {3, 4, 5, 7}
+  assert parse_page_ranges('2,2,1-3') == {1, 2, 3}
+  assert parse_page_ranges('4-4') == {4}
+
+  for spec in ('0', '-1', '5-3', 'a', '1-b', '1-2-3', ',', '1.5'):
+    expect_error(spec, '无效的页码范围')
+
+
+def check_limits():
+  assert len(parse_page_ranges(f'1-{MAX_PAGE_COUNT}')) == MAX_PAGE_COUNT
+  expect_error(f'1-{MAX_PAGE_COUNT + 1}', '页码范围过大')
+  expect_error('1-999999999', '页码范围过大')
+
+  # 每个范围都不超过上限，但合计超过上限
+  half = MAX_PAGE_COUNT // 2 + 1
+  expect_error(f'1-{half},{half + 1}-{2 * half}', f'最多指定 {MAX_PAGE_COUNT} 页')
+  expect_error(','.join(f'{start}-{start + 999}' for start in range(1, MAX_PAGE_COUNT + 2000, 1000)), '页码范围过大')
+
+  # 重叠的范围只计一次
+  assert len(parse_page_ranges(f'1-{MAX_PAGE_COUNT},1-{MAX_PAGE_COUNT}')) == MAX_PAGE_COUNT
+
+
+def check_format():
+  assert format_page_ranges([]) == ''
+  assert format_page_ranges({7}) == '7'
+  assert format_page_ranges({3, 4, 5, 7}) == '3-5,7'
+  assert format_page_ranges([9, 1, 2, 2, 5, 3]) == '1-3,5,9'
+
+  for spec in ('1', '3-5,7', '1,3,5-6,10-12'):
+    pages = parse_page_ranges(spec)
+    assert format_page_ranges(pages) == spec
+    assert parse_page_ranges(format_page_ranges(pages)) == pages
+  # 不同写法的相同页面得到相同的规范字符串（用作缓存键）
+  assert format_page_ranges(parse_page_ranges('7, 3-4, 5')) == format_page_ranges(parse_page_ranges('3-5,7'))
+
+
+def test_page_ranges():
+  """页码范围的解析、合计上限和规范化"""
+  print('🔍 测试页码范围...')
+  check_parse()
+  check_limits()
+  check_format()
+  print('✅ 页码范围正常')
+
+
+if __name__ == '__main__':
+  test_page_ranges()
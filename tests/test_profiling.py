@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+按需性能剖析测试
+- 剖析结果只包含本请求的引擎调用，不混入同时运行在事件循环上的其他协程
+- 并发的剖析请求各自得到完整的剖析结果（不再跳过）
+- 引擎中仍能取到本请求的上下文，上传文件在剖析线程中读取
+- 剖析文件使用服务端生成的ID，客户端重复使用同一请求ID时不会互相覆盖
+"""
+
+import io
+import os
+import pstats
+import asyncio
+import tempfile
+
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+
+from app.utils.config import settings
+from app.utils.profiling import profiled, profile_path, ProfilingMiddleware
+from app.utils.request_context import RequestContext, RequestContextMiddleware, current_request, _current_request
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename='form.pdf')
+
+
+def alpha_work(count: int) -> int:
+  return sum(i * i for i in range(count))
+
+
+def beta_work(count: int) -> int:
+  return sum(i % 7 for i in range(count))
+
+
+def neighbour_work(count: int) -> int:
+  return sum(range(count))
+
+
+async def parse_alpha(file, marker):
+  content = await file.read()
+  assert current_request().request_id == marker
+  return content, alpha_work(200000)
+
+
+async def parse_beta(file, marker):
+  content = await file.read()
+  assert current_request().request_id == marker
+  return content, beta_work(200000)
+
+
+async def neighbour(stop: asyncio.Event):
+  # 同时在事件循环上运行的其他请求
+  while not stop.is_set():
+    neighbour_work(1000)
+    await asyncio.sleep(0)
+
+
+async def profiled_request(request_id: str, engine):
+  ctx = RequestContext(request_id)
+  ctx.profile = True
+  _current_request.set(ctx)
+  content, _ = await profiled(engine, upload(request_id.encode()), request_id)
+  assert content == request_id.encode()
+  return {name for _, _, name in pstats.Stats(ctx.profiler).stats}
+
+
+async def check_concurrent_profiles():
+  stop = asyncio.Event()
+  background = asyncio.create_task(neighbour(stop))
+  alpha, beta = await asyncio.gather(
+    profiled_request('alpha', parse_alpha),
+    profiled_request('beta', parse_beta)
+  )
+  stop.set()
+  await background
+
+  assert 'alpha_work' in alpha and 'beta_work' not in alpha
+  assert 'beta_work' in beta and 'alpha_work' not in beta
+  assert 'neighbour_work' not in alpha | beta
+
+  # 未选中剖析的请求直接在事件循环上调用
+  _current_request.set(RequestContext('plain'))
+  content, _ = await profiled(parse_alpha, upload(b'plain'), 'plain')
+  assert content == b'plain' and current_request().profiler is None
+
+
+async def engine_call(count: int) -> int:
+  return alpha_work(count)
+
+
+def check_profile_ids():
+  app = FastAPI()
+
+  @app.get('/work')
+  async def work():
+    return {'result': await profiled(engine_call, 1000)}
+
+  app.add_middleware(ProfilingMiddleware)
+  app.add_middleware(RequestContextMiddleware)
+  client = TestClient(app)
+
+  urls = []
+  for _ in range(2):
+    response = client.get('/work', headers={'X-Profile': '1', 'X-Request-ID': 'req-same'})
+    assert response.headers['x-request-id'] == 'req-same'
+    urls.append(response.headers['x-profile-url'])
+  assert urls[0] != urls[1] and 'req-same' not in urls[0] + urls[1]
+  for url in urls:
+    assert os.path.exists(profile_path(url.rsplit('/', 1)[1]))
+  assert profile_path('req-same') is None
+
+
+def test_profiling():
+  """剖析在工作线程中进行，并发请求互不影响"""
+  print('🔍 测试按需性能剖析...')
+  asyncio.run(check_concurrent_profiles())
+  saved = settings.PROFILE_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 剖析文件写入测试目录
+    settings.PROFILE_DIR = temp_dir
+    try:
+      check_profile_ids()
+    finally:
+      settings.PROFILE_DIR = saved
+  print('✅ 按需性能剖析正常')
+
+
+if __name__ == '__main__':
+  test_profiling()
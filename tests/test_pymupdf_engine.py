@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+pymupdf 引擎与 enhanced_fillpdf 引擎的一致性测试
+- 解析: 同一模板两个引擎返回的字段列表（字段名、类型、值、选项、页码、位置等）完全相同
+- 填充: 同一组字段数据分别用两个引擎填充，再用 enhanced_fillpdf 解析两份输出，字段值完全相同
+"""
+
+import io
+import asyncio
+import tempfile
+
+from fastapi import UploadFile
+
+from app.utils.config import settings
+from app.custom_fillpdf import InvalidFieldValueError
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF
+from tests.synthetic_corpus import build_corpus
+
+
+def upload(path: str) -> UploadFile:
+  with open(path, 'rb') as f:
+    return UploadFile(file=io.BytesIO(f.read()), filename='form.pdf')
+
+
+def field_values(fields):
+  return {field['name']: field['value'] for field in fields}
+
+
+async def check_checkbox_values(enhanced, pymupdf, item):
+  # 复选框只有 1/true/yes/on/checked 或导出名表示选中，"false"、"0"、"No" 等值都不选中
+  checkboxes = [field['name'] for field in item['fields'] if field['name'].endswith('_check')]
+  values = ['false', '0', 'No', 'Off', 'true', '1', 'checked', 'Yes']
+  fields = [{'name': name, 'value': values[index % len(values)]} for index, name in enumerate(checkboxes)]
+  enhanced_output = await enhanced.fill_form(upload(item['path']), fields)
+  pymupdf_output = await pymupdf.fill_form(upload(item['path']), fields)
+  expected = field_values(await enhanced.parse_form_fields(upload(enhanced_output)))
+  actual = field_values(await enhanced.parse_form_fields(upload(pymupdf_output)))
+  for field in fields:
+    name = field['name']
+    assert actual[name] == expected[name], f'复选框 {name} 的值 "{field["value"]}" 填充结果不一致'
+    checked = field['value'].lower() in ('true', '1', 'checked', 'yes')
+    assert (actual[name] == 'Off') != checked, f'复选框 {name} 的值 "{field["value"]}" 填充错误'
+
+
+async def check_parity(corpus):
+  enhanced = PDFServiceEnhancedFillPDF()
+  pymupdf = PDFServicePyMuPDF()
+
+  for name, item in corpus.items():
+    path = item['path']
+    print(f'📄 {name}: {item["pages"]} 页, {len(item["fields"])} 个字段')
+
+    expected = await enhanced.parse_form_fields(upload(path))
+    actual = await pymupdf.parse_form_fields(upload(path))
+    assert actual == expected, f'{name}: 解析结果不一致'
+
+    pages = {item['pages']}
+    expected = await enhanced.parse_form_fields(upload(path), pages)
+    actual = await pymupdf.parse_form_fields(upload(path), pages)
+    assert actual == expected, f'{name}: 第 {item["pages"]} 页的解析结果不一致'
+
+    enhanced_output = await enhanced.fill_form(upload(path), item['fields'])
+    pymupdf_output = await pymupdf.fill_form(upload(path), item['fields'])
+    expected = field_values(await enhanced.parse_form_fields(upload(enhanced_output)))
+    actual = field_values(await enhanced.parse_form_fields(upload(pymupdf_output)))
+    assert actual == expected, f'{name}: 填充结果不一致'
+    for field in item['fields']:
+      assert actual[field['name']] == field['value'], f'{name}: 字段 {field["name"]} 未填充'
+
+  await check_checkbox_values(enhanced, pymupdf, corpus['medium'])
+
+  # 严格模式下无效的选项值在写入前拒绝
+  small = corpus['small']
+  choice = next(field['name'] for field in small['fields'] if field['name'].endswith('_choice'))
+  try:
+    await pymupdf.fill_form(upload(small['path']), [{'name': choice, 'value': 'not-an-option'}])
+  except InvalidFieldValueError:
+    pass
+  else:
+    raise AssertionError('无效的选项值没有被拒绝')
+
+
+def test_pymupdf_engine_parity():
+  """pymupdf 引擎与 enhanced_fillpdf 引擎的解析和填充结果一致"""
+  print('🔍 测试 pymupdf 引擎一致性...')
+  saved = settings.OUTPUT_DIR, settings.TEMP_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 填充输出和临时文件写入测试目录
+    settings.OUTPUT_DIR = settings.TEMP_DIR = temp_dir
+    try:
+      asyncio.run(check_parity(build_corpus(temp_dir)))
+    finally:
+      settings.OUTPUT_DIR, settings.TEMP_DIR = saved
+  print('✅ pymupdf 引擎与 enhanced_fillpdf 引擎结果一致')
+
+
+if __name__ == '__main__':
+  test_pymupdf_engine_parity()
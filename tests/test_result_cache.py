@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+填充结果缓存测试
+- 缓存键: 字段顺序和书写格式不影响缓存键，字段值、引擎和选项不同时缓存键不同
+- If-None-Match: 支持多个值、弱 ETag 和 *
+- 保存与命中: 输出内容按缓存键保存，命中时返回保存的文件、实际引擎和响应头
+- 回退到 standard 引擎的结果不保存
+"""
+
+import os
+import tempfile
+
+from app.utils import result_cache
+from app.utils.template_cache import TemplateCache
+
+
+def check_keys():
+  fields = [{'name': 'a', 'value': '1'}, {'name': 'b', 'value': True}]
+  key = result_cache.fill_result_key('sha', 'pymupdf', fields, True, 'default')
+  reordered = [{'value': True, 'name': 'b'}, {'value': '1', 'name': 'a'}]
+  assert result_cache.fill_result_key('sha', 'pymupdf', reordered, True, 'default') == key
+  assert result_cache.fill_result_key('sha', 'pymupdf', [{'name': 'a', 'value': '2'}, fields[1]], True, 'default') != key
+  assert result_cache.fill_result_key('sha', 'enhanced_fillpdf', fields, True, 'default') != key
+  assert result_cache.fill_result_key('sha', 'pymupdf', fields, False, 'default') != key
+  assert result_cache.fill_result_key('sha', 'pymupdf', fields, True, 'compact') != key
+  assert result_cache.fill_result_key('other', 'pymupdf', fields, True, 'default') != key
+
+
+def check_etags():
+  etag = result_cache.make_etag('abc')
+  assert result_cache.etag_matches('"abc"', etag)
+  assert result_cache.etag_matches('"x", W/"abc"', etag)
+  assert result_cache.etag_matches('*', etag)
+  assert not result_cache.etag_matches('"abd"', etag)
+  assert not result_cache.etag_matches(None, etag)
+
+
+def check_store(temp_dir: str):
+  output_path = os.path.join(temp_dir, 'filled.pdf')
+  with open(output_path, 'wb') as f:
+    f.write(b'%PDF-1.4 filled')
+
+  key = result_cache.fill_result_key('sha', 'pymupdf', [{'name': 'a', 'value': '1'}], True, 'default')
+  assert result_cache.get_fill_result(key) is None
+  etag = result_cache.put_fill_result(key, output_path, 'pymupdf', {'X-Output-Mode': 'default'})
+  assert etag == result_cache.make_etag(result_cache.content_sha256(b'%PDF-1.4 filled'))
+
+  path, meta = result_cache.get_fill_result(key)
+  assert meta == {'engine': 'pymupdf', 'etag': etag, 'headers': {'X-Output-Mode': 'default'}}
+
+  # 缓存文件被淘汰后不再命中，已租用的输出文件仍可发送
+  os.remove(result_cache.template_cache.blob_path(result_cache.KIND_RESULT, key))
+  assert result_cache.get_fill_result(key) is None
+  with open(path, 'rb') as f:
+    assert f.read() == b'%PDF-1.4 filled'
+  result_cache.template_cache.release_lease(path)
+  assert not os.path.exists(path)
+
+  # 回退引擎的结果只返回 ETag，不保存
+  key = result_cache.fill_result_key('sha', 'enhanced_fillpdf', [{'name': 'a', 'value': '1'}], True, 'default')
+  assert result_cache.put_fill_result(key, output_path, 'enhanced_fillpdf_fallback_to_standard', {}) == etag
+  assert result_cache.get_fill_result(key) is None
+
+
+def test_result_cache():
+  """相同的填充请求命中缓存，ETag 与输出内容对应"""
+  print('🔍 测试填充结果缓存...')
+  check_keys()
+  check_etags()
+  saved = result_cache.template_cache
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 缓存写入测试目录
+    result_cache.template_cache = TemplateCache(os.path.join(temp_dir, 'cache'), 16 * 1024 * 1024)
+    try:
+      check_store(temp_dir)
+    finally:
+      result_cache.template_cache = saved
+  print('✅ 填充结果缓存正常')
+
+
+if __name__ == '__main__':
+  test_result_cache()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+影子引擎比对测试
+- 差异计算: 字段缺失、多出、属性不同都会记录
+- 后台任务: enhanced_fillpdf 为主引擎、pymupdf 为影子引擎，解析和填充各比对一次，
+  报告中两条记录均一致，影子填充的输出文件被删除
+"""
+
+import io
+import os
+import json
+import asyncio
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.encoders import jsonable_encoder
+
+from app.utils.config import settings
+from app.utils import shadow
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from app.services.pdf_service_pymupdf import PDFServicePyMuPDF
+from tests.synthetic_corpus import make_form
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename='form.pdf')
+
+
+def check_differences():
+  primary = [{'name': 'a', 'value': '1'}, {'name': 'b', 'value': '2'}]
+  other = [{'name': 'a', 'value': '1'}, {'name': 'b', 'value': '3'}, {'name': 'c', 'value': ''}]
+  assert shadow.compare_fields(primary, primary) == []
+  assert shadow.compare_fields(primary, other) == [
+    {'field': 'b', 'key': 'value', 'primary': '2', 'shadow': '3'},
+    {'field': 'c', 'key': None, 'primary': False, 'shadow': True}
+  ]
+  assert shadow.compare_values({'a': '1'}, {'a': '1', 'b': 'x'}) == [
+    {'field': 'b', 'key': 'value', 'primary': None, 'shadow': 'x'}
+  ]
+
+
+def check_background_jobs(temp_dir: str):
+  path = os.path.join(temp_dir, 'form.pdf')
+  fields = make_form(path, 2, 6)
+  with open(path, 'rb') as f:
+    content = f.read()
+
+  enhanced = PDFServiceEnhancedFillPDF()
+  pymupdf = PDFServicePyMuPDF()
+  primary_fields = jsonable_encoder(asyncio.run(enhanced.parse_form_fields(upload(content))))
+  primary_output = asyncio.run(enhanced.fill_form(upload(content), fields))
+
+  parse = shadow.ShadowComparison('parse', 'req-parse', 'sha', 'enhanced_fillpdf', 1.0, 'pymupdf')
+  shadow.submit_shadow(parse, shadow.run_parse_shadow, pymupdf, content, 'form.pdf', None, primary_fields)
+  fill = shadow.ShadowComparison('fill', 'req-fill', 'sha', 'enhanced_fillpdf', 1.0, 'pymupdf')
+  shadow.submit_shadow(fill, shadow.run_fill_shadow, pymupdf, enhanced, content, 'form.pdf', fields, True, primary_output)
+  shadow.shutdown_shadow(wait=True)
+
+  with open(settings.SHADOW_REPORT_FILE, encoding='utf-8') as f:
+    records = [json.loads(line) for line in f]
+  assert [record['request_id'] for record in records] == ['req-parse', 'req-fill']
+  for record in records:
+    assert record['match'], record
+    assert record['primary_fields'] == record['shadow_fields'] > 0
+    assert record['shadow_ms'] is not None
+  # 只剩模板和主引擎的输出，影子引擎的输出已删除
+  assert sorted(os.listdir(settings.OUTPUT_DIR)) == sorted(['form.pdf', os.path.basename(primary_output), 'shadow.jsonl'])
+
+  stats = shadow.shadow_stats()
+  assert stats['pending'] == 0 and stats['matched'] >= 2
+
+
+def test_shadow_mode():
+  """影子引擎在后台比对解析和填充结果，并写入报告"""
+  print('🔍 测试影子引擎比对...')
+  check_differences()
+  saved = settings.OUTPUT_DIR, settings.TEMP_DIR, settings.SHADOW_REPORT_FILE
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 填充输出、临时文件和比对报告写入测试目录
+    settings.OUTPUT_DIR = settings.TEMP_DIR = temp_dir
+    settings.SHADOW_REPORT_FILE = os.path.join(temp_dir, 'shadow.jsonl')
+    try:
+      check_background_jobs(temp_dir)
+    finally:
+      settings.OUTPUT_DIR, settings.TEMP_DIR, settings.SHADOW_REPORT_FILE = saved
+  print('✅ 影子引擎比对结果已写入报告')
+
+
+if __name__ == '__main__':
+  test_shadow_mode()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+流式解析测试（/api/v1/parse-form 的 stream=true）
+- pymupdf 引擎逐页输出字段，与一次性解析的结果相同（按页面顺序），最后一行为汇总
+- 页面过滤同样适用于流式输出
+- 其他引擎和缓存命中的结果以同样的 NDJSON 格式返回
+"""
+
+import os
+import json
+import tempfile
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.utils.config import settings
+from app.utils.template_cache import TemplateCache
+from tests.synthetic_corpus import make_form
+
+
+def canonical(fields):
+  return sorted(json.dumps(field, sort_keys=True, ensure_ascii=False) for field in fields)
+
+
+def parse(client: TestClient, content: bytes, **data):
+  return client.post('/api/v1/parse-form', files={'file': ('form.pdf', content, 'application/pdf')}, data=data)
+
+
+def parse_stream(client: TestClient, content: bytes, **data):
+  response = parse(client, content, stream='true', **data)
+  assert response.status_code == 200
+  assert response.headers['content-type'].startswith('application/x-ndjson')
+  records = [json.loads(line) for line in response.text.splitlines()]
+  assert all(record['type'] == 'field' for record in records[:-1])
+  summary = records[-1]
+  assert summary['type'] == 'summary' and summary['success']
+  fields = [record['field'] for record in records[:-1]]
+  assert summary['field_count'] == len(fields)
+  return fields, summary
+
+
+def check_streaming(client: TestClient, content: bytes, names):
+  # pymupdf 逐页输出，字段与一次性解析相同
+  expected = parse(client, content, engine='pymupdf').json()['fields']
+  fields, summary = parse_stream(client, content, engine='pymupdf')
+  assert summary['engine'] == 'pymupdf'
+  assert canonical(fields) == canonical(expected)
+  assert sorted(field['name'] for field in fields) == names
+  pages = [field['page'] for field in fields]
+  assert pages == sorted(pages)
+
+  # 页面过滤
+  expected = parse(client, content, engine='pymupdf', pages='2').json()['fields']
+  fields, _ = parse_stream(client, content, engine='pymupdf', pages='2')
+  assert fields and canonical(fields) == canonical(expected)
+
+  # 其他引擎解析完成后逐行输出，第二次请求命中缓存
+  expected = parse(client, content, engine='standard').json()['fields']
+  for _ in range(2):
+    fields, summary = parse_stream(client, content, engine='standard')
+    assert summary['engine'] == 'standard'
+    assert canonical(fields) == canonical(expected)
+
+
+def test_streaming_parse():
+  """stream=true 时以 NDJSON 逐页返回字段，最后一行为汇总"""
+  print('🔍 测试流式解析...')
+  saved_cache = main.template_cache
+  saved = settings.TEMP_DIR, settings.OUTPUT_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存和临时文件写入测试目录
+    main.template_cache = TemplateCache(os.path.join(temp_dir, 'cache'), 64 * 1024 * 1024)
+    settings.TEMP_DIR = settings.OUTPUT_DIR = temp_dir
+    try:
+      path = os.path.join(temp_dir, 'form.pdf')
+      names = sorted(field['name'] for field in make_form(path, pages=3))
+      with open(path, 'rb') as f:
+        content = f.read()
+      check_streaming(TestClient(main.app), content, names)
+    finally:
+      main.template_cache = saved_cache
+      settings.TEMP_DIR, settings.OUTPUT_DIR = saved
+  print('✅ 流式解析正常')
+
+
+if __name__ == '__main__':
+  test_streaming_parse()
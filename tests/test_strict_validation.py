@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+字段选项校验测试（strict_validation）
+- 严格模式: 下拉框或单选按钮组的值不在可选值中时 /api/v1/fill-form 返回 400，列出所有无效值，不切换到其他引擎
+- 非严格模式: 无效值被删除，其他字段照常填充
+- 选项集合按模板 SHA-256 缓存在共享模板缓存的元数据中，其他进程无需重新解析模板
+"""
+
+import io
+import os
+import json
+import asyncio
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app import main
+from app.utils import field_options, result_cache
+from app.utils.config import settings
+from app.utils.template_cache import TemplateCache, content_sha256
+from app.services.pdf_service_enhanced_fillpdf import PDFServiceEnhancedFillPDF
+from tests.synthetic_corpus import make_form, CHOICE_OPTIONS, RADIO_OPTIONS
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename='form.pdf')
+
+
+def field_values(content: bytes):
+  fields = asyncio.run(PDFServiceEnhancedFillPDF().parse_form_fields(upload(content)))
+  return {field['name']: field['value'] for field in fields}
+
+
+def check_endpoint(client: TestClient, content: bytes, fields):
+  text = next(field['name'] for field in fields if field['name'].endswith('_text'))
+  choice = next(field['name'] for field in fields if field['name'].endswith('_choice'))
+  radio = next(field['name'] for field in fields if field['name'].endswith('_radio'))
+  submitted = [
+    {'name': text, 'value': 'hello'},
+    {'name': choice, 'value': 'not-an-option'},
+    {'name': radio, 'value': 'not-a-button'}
+  ]
+  original = field_values(content)
+
+  def fill(engine, **data):
+    return client.post(
+      '/api/v1/fill-form',
+      files={'file': ('form.pdf', content, 'application/pdf')},
+      data={'form_data': json.dumps({'fields': submitted}), 'engine': engine, **data}
+    )
+
+  for engine in ('fillpdf', 'enhanced_fillpdf'):
+    # 严格模式（默认）: 一次列出所有无效值，返回 400 而不是切换到 standard 引擎
+    response = fill(engine)
+    assert response.status_code == 400, (engine, response.status_code)
+    detail = response.json()['detail']
+    assert choice in detail and radio in detail, (engine, detail)
+
+    # 非严格模式: 删除无效值，其他字段照常填充
+    response = fill(engine, strict_validation='false')
+    assert response.status_code == 200, (engine, response.status_code)
+    values = field_values(response.content)
+    assert values[text] == 'hello', engine
+    assert values[choice] == original[choice] == CHOICE_OPTIONS[0], engine
+    assert values[radio] == original[radio] == RADIO_OPTIONS[0], engine
+
+
+def check_option_cache(path: str, content: bytes, fields):
+  sha = content_sha256(content)
+  option_sets = field_options.load_option_sets(path, sha)
+  choice = next(field['name'] for field in fields if field['name'].endswith('_choice'))
+  radio = next(field['name'] for field in fields if field['name'].endswith('_radio'))
+  assert option_sets.options[choice] == frozenset(CHOICE_OPTIONS)
+  assert option_sets.options[radio] == frozenset(RADIO_OPTIONS)
+  assert field_options.template_cache.get_meta(sha, field_options.OPTIONS_META_NAME) == option_sets.to_dict()
+
+  # 进程内缓存为空时（如其他工作进程）从共享缓存的元数据读取，不再解析模板
+  field_options._local_cache.clear()
+  cached = field_options.load_option_sets(os.path.join(os.path.dirname(path), 'missing.pdf'), sha)
+  assert cached.names == option_sets.names and cached.options == option_sets.options
+
+
+def test_strict_validation():
+  """无效的选项值在严格模式下返回 400，非严格模式下被删除"""
+  print('🔍 测试字段选项校验...')
+  saved_caches = main.template_cache, result_cache.template_cache, field_options.template_cache
+  saved = settings.TEMP_DIR, settings.OUTPUT_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存、结果缓存和临时文件写入测试目录
+    cache = TemplateCache(os.path.join(temp_dir, 'cache'), 64 * 1024 * 1024)
+    main.template_cache = result_cache.template_cache = field_options.template_cache = cache
+    settings.TEMP_DIR = settings.OUTPUT_DIR = temp_dir
+    field_options._local_cache.clear()
+    try:
+      path = os.path.join(temp_dir, 'form.pdf')
+      fields = make_form(path, pages=1, per_page=8)
+      with open(path, 'rb') as f:
+        content = f.read()
+      check_endpoint(TestClient(main.app), content, fields)
+      check_option_cache(path, content, fields)
+    finally:
+      main.template_cache, result_cache.template_cache, field_options.template_cache = saved_caches
+      settings.TEMP_DIR, settings.OUTPUT_DIR = saved
+      field_options._local_cache.clear()
+  print('✅ 字段选项校验正常')
+
+
+if __name__ == '__main__':
+  test_strict_validation()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+共享模板缓存测试
+- 淘汰: 总大小超过上限时按 LRU 删除条目及其元数据，累计的总大小与实际条目一致；没有条目的键不保存元数据
+- 租用: 已租用的文件在条目被淘汰后仍可读取，归还后删除；退出进程遗留的和超过保留时间的硬链接被清理
+- 并发写入: 多个进程同时写入、租用和淘汰，读到的内容始终完整，总大小保持一致
+"""
+
+import os
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.template_cache import TemplateCache, KIND_TEMPLATE, LEASE_DIR, LEASE_MAX_AGE, content_sha256
+
+BLOB_SIZE = 1000
+
+
+def blob(index: int) -> bytes:
+  return (b'%PDF-1.4 ' + str(index).encode()).ljust(BLOB_SIZE, b'.')
+
+
+def summed_size(cache: TemplateCache) -> int:
+  conn = cache._connect()
+  blobs = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+  metas = conn.execute('SELECT COALESCE(SUM(size), 0) FROM meta').fetchone()[0]
+  return blobs + metas
+
+
+def check_eviction(cache_dir: str):
+  cache = TemplateCache(cache_dir, 3 * BLOB_SIZE + 200)
+  keys = [content_sha256(blob(index)) for index in range(4)]
+  for index in range(3):
+    assert cache.put_template(blob(index), keys[index]) is not None
+    cache.put_meta(keys[index], 'parse', {'index': index})
+  assert cache.total_size() == summed_size(cache)
+
+  # 访问第一个模板后写入第四个，最久未访问的第二个被淘汰，元数据一并删除
+  assert cache.get_template(keys[0]) is not None
+  cache.put_template(blob(3), keys[3])
+  assert cache.get_template(keys[1]) is None
+  assert cache.get_meta(keys[1], 'parse') is None
+  assert cache.get_meta(keys[0], 'parse') == {'index': 0}
+  assert cache.total_size() == summed_size(cache) <= cache.max_bytes
+
+  # 覆盖元数据只累计大小差值
+  cache.put_meta(keys[0], 'parse', {'index': 0, 'extra': 'x' * 50})
+  assert cache.total_size() == summed_size(cache)
+
+  # 已淘汰或从未缓存的键不保存元数据，不会留下无法淘汰的元数据
+  total = cache.total_size()
+  cache.put_meta(keys[1], 'parse', {'index': 1})
+  cache.put_meta(content_sha256(b'missing'), 'parse', {'index': -1})
+  assert cache.get_meta(keys[1], 'parse') is None
+  assert cache.get_meta(content_sha256(b'missing'), 'parse') is None
+  assert cache.total_size() == summed_size(cache) == total
+
+
+def check_leases(cache_dir: str):
+  cache = TemplateCache(cache_dir, 2 * BLOB_SIZE)
+  key = content_sha256(blob(0))
+  assert cache.lease_template(key) is None
+  lease_path = cache.lease_template(key, blob(0))
+  assert lease_path is not None and lease_path != cache.blob_path(KIND_TEMPLATE, key)
+
+  # 写入更多模板淘汰该条目，已租用的文件不受影响
+  for index in range(1, 4):
+    cache.put_template(blob(index))
+  assert cache.get_template(key) is None
+  with open(lease_path, 'rb') as f:
+    assert f.read() == blob(0)
+  cache.release_lease(lease_path)
+  assert not lease_path.exists()
+
+  # 缓存中没有时重新写入后租用
+  lease_path = cache.lease_template(key, blob(0))
+  assert lease_path is not None and cache.get_template(key) is not None
+  cache.release_lease(lease_path)
+
+  # 已退出进程遗留的硬链接，以及超过保留时间的硬链接（进程号可能已被复用）在下次打开缓存时清理
+  now = int(time.time())
+  stale = os.path.join(cache_dir, LEASE_DIR, f'999999999-{now}-stale.pdf')
+  expired = os.path.join(cache_dir, LEASE_DIR, f'{os.getpid()}-{now - LEASE_MAX_AGE - 60}-expired.pdf')
+  active = os.path.join(cache_dir, LEASE_DIR, f'{os.getpid()}-{now}-active.pdf')
+  for path in (stale, expired, active):
+    with open(path, 'wb') as f:
+      f.write(blob(0))
+  TemplateCache(cache_dir, 2 * BLOB_SIZE).total_size()
+  assert not os.path.exists(stale) and not os.path.exists(expired)
+  assert os.path.exists(active)
+  os.remove(active)
+
+
+def write_and_lease(cache_dir: str, worker: int) -> int:
+  """并发写入进程：写入模板和元数据（触发淘汰），租用并校验内容"""
+  cache = TemplateCache(cache_dir, 8 * BLOB_SIZE)
+  checked = 0
+  for step in range(60):
+    index = (worker * 7 + step) % 24
+    content = blob(index)
+    key = content_sha256(content)
+    lease_path = cache.lease_template(key, content)
+    assert lease_path is not None
+    cache.put_meta(key, f'parse:{worker}', {'step': step})
+    with open(lease_path, 'rb') as f:
+      assert f.read() == content
+    cache.release_lease(lease_path)
+    checked += 1
+  return checked
+
+
+def check_concurrent_writers(cache_dir: str):
+  context = multiprocessing.get_context('spawn')
+  with ProcessPoolExecutor(max_workers=4, mp_context=context) as executor:
+    results = list(executor.map(write_and_lease, [cache_dir] * 4, range(4)))
+  assert results == [60] * 4
+
+  cache = TemplateCache(cache_dir, 8 * BLOB_SIZE)
+  assert cache.total_size() == summed_size(cache)
+  assert cache.total_size() <= cache.max_bytes + BLOB_SIZE
+  assert not os.listdir(os.path.join(cache_dir, LEASE_DIR))
+
+
+def test_template_cache():
+  """淘汰按 LRU 进行且不影响已租用的文件，并发写入时总大小保持一致"""
+  print('🔍 测试共享模板缓存...')
+  with tempfile.TemporaryDirectory() as temp_dir:
+    check_eviction(os.path.join(temp_dir, 'eviction'))
+    check_leases(os.path.join(temp_dir, 'leases'))
+    check_concurrent_writers(os.path.join(temp_dir, 'concurrent'))
+  print('✅ 共享模板缓存正常')
+
+
+if __name__ == '__main__':
+  test_template_cache()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+预解析模板对象池测试（TemplatePool）
+- 交替提交不同的字段数据时，池中对象图的填充输出与每次重新解析模板的输出逐字节相同
+- 租用期间对嵌套数组（/Kids、/Opt、/Annots）的原地修改和实例属性在归还时恢复
+"""
+
+import os
+import tempfile
+
+import pdfrw
+
+from app.custom_fillpdf import write_fillable_pdf, TemplatePool
+from tests.synthetic_corpus import make_form, CHOICE_OPTIONS, RADIO_OPTIONS
+
+
+def other_values(fields):
+  """与 make_form 给出的填充数据不同的另一组值"""
+  values = {}
+  for field in fields:
+    name = field['name']
+    if name.endswith('_check'):
+      values[name] = 'Off'
+    elif name.endswith('_choice'):
+      values[name] = CHOICE_OPTIONS[2]
+    elif name.endswith('_radio'):
+      values[name] = RADIO_OPTIONS[2]
+    else:
+      values[name] = f'other {name}'
+  return values
+
+
+def read(path: str) -> bytes:
+  with open(path, 'rb') as f:
+    return f.read()
+
+
+def fill_both(pool: TemplatePool, path: str, data, output_dir: str, step: int):
+  fresh_path = os.path.join(output_dir, f'fresh_{step}.pdf')
+  pooled_path = os.path.join(output_dir, f'pooled_{step}.pdf')
+  write_fillable_pdf(path, fresh_path, data)
+  with pool.lease('form', path) as pooled:
+    write_fillable_pdf(path, pooled_path, data, template_pdf=pooled.pdf, fill_plan=pooled.plan)
+  return read(fresh_path), read(pooled_path)
+
+
+def check_alternating_fills(path: str, fields, output_dir: str):
+  pool = TemplatePool(max_templates=1, per_template=1)
+  first = {field['name']: field['value'] for field in fields}
+  second = other_values(fields)
+  for step, data in enumerate([first, second, first, {}, second, first]):
+    fresh, pooled = fill_both(pool, path, data, output_dir, step)
+    assert pooled == fresh, f'第 {step + 1} 次填充: 池中对象图的输出与重新解析的输出不同'
+
+
+def check_nested_restore(path: str, fields, output_dir: str):
+  pool = TemplatePool(max_templates=1, per_template=1)
+  with pool.lease('form', path) as pooled:
+    graph = pooled.pdf
+    acro_fields = graph.Root.AcroForm.Fields
+    radio = next(field for field in acro_fields if field.T.to_unicode().endswith('_radio'))
+    choice = next(field for field in acro_fields if field.T.to_unicode().endswith('_choice'))
+    page = graph.pages[0]
+    kids, options, annotations = list(radio.Kids), list(choice.Opt), list(page.Annots)
+    appearance = choice.MK
+
+    # 原地修改嵌套数组和实例属性
+    radio.Kids.pop()
+    choice.Opt[0] = pdfrw.PdfString.encode('Z')
+    page.Annots.append(pdfrw.PdfDict(Subtype=pdfrw.PdfName.Widget))
+    radio.Kids[0].indirect = False
+    choice.MK = pdfrw.PdfDict(CA=pdfrw.PdfString.encode('x'))
+
+  with pool.lease('form', path) as pooled:
+    # 同一份对象图被再次租出，修改已全部恢复
+    assert pooled.pdf is graph
+    assert list(radio.Kids) == kids and list(choice.Opt) == options and list(page.Annots) == annotations
+    assert radio.Kids[0].indirect and choice.MK is appearance
+
+  first = {field['name']: field['value'] for field in fields}
+  fresh, pooled = fill_both(pool, path, first, output_dir, 'restored')
+  assert pooled == fresh, '恢复后的对象图填充输出与重新解析的输出不同'
+
+
+def test_template_pool():
+  """池中对象图在多次填充之间恢复为原始模板，输出与重新解析相同"""
+  print('🔍 测试预解析模板对象池...')
+  with tempfile.TemporaryDirectory() as temp_dir:
+    path = os.path.join(temp_dir, 'form.pdf')
+    fields = make_form(path, pages=3, per_page=8)
+    check_alternating_fills(path, fields, temp_dir)
+    check_nested_restore(path, fields, temp_dir)
+  print('✅ 预解析模板对象池正常')
+
+
+if __name__ == '__main__':
+  test_template_pool()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+大文档模式（文本识别的页数和耗时预算）测试
+- 页数预算: 超过 TEXT_SCAN_MAX_PAGES 页的扁平文档只识别前面的页面，
+  /api/v1/parse-form 返回 coverage.complete=false、stopped_by=page_budget，消息中说明识别的页数；命中缓存时相同
+- 耗时预算: 逐页扫描在预算用完后停止，已扫描和未扫描的页面合起来是全部候选页面
+- TextScanCoverage.to_dict: 页码以规范的范围字符串返回
+"""
+
+import io
+import os
+import time
+import tempfile
+
+from fastapi.testclient import TestClient
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+from app import main
+from app.utils.config import settings
+from app.utils.request_context import RequestContext, _current_request
+from app.utils.template_cache import TemplateCache
+from app.utils.text_scan import (
+  TextScanCoverage, iter_page_texts, current_text_scan_coverage,
+  STOPPED_BY_PAGE_BUDGET, STOPPED_BY_TIME_BUDGET
+)
+
+PAGE_COUNT = 12
+MAX_PAGES = 5
+
+
+def make_flat_document(pages: int) -> bytes:
+  """没有表单控件、每页都有可识别文本字段的文档"""
+  buf = io.BytesIO()
+  c = canvas.Canvas(buf, pagesize=letter)
+  for page in range(pages):
+    c.drawString(50, 740, f'Page {page + 1}')
+    c.drawString(50, 700, 'Name: ____________')
+    c.showPage()
+  c.save()
+  return buf.getvalue()
+
+
+def check_page_budget(client: TestClient, content: bytes):
+  for cache in ('miss', 'hit'):
+    response = client.post(
+      '/api/v1/parse-form',
+      files={'file': ('flat.pdf', content, 'application/pdf')},
+      data={'engine': 'enhanced'}
+    )
+    assert response.status_code == 200, (cache, response.status_code)
+    data = response.json()
+    coverage = data['coverage']
+    assert coverage['complete'] is False, cache
+    assert coverage['stopped_by'] == STOPPED_BY_PAGE_BUDGET, cache
+    assert coverage['pages_total'] == PAGE_COUNT and coverage['pages_scanned'] == MAX_PAGES, cache
+    assert coverage['scanned_pages'] == f'1-{MAX_PAGES}', cache
+    assert coverage['remaining_pages'] == f'{MAX_PAGES + 1}-{PAGE_COUNT}', cache
+    assert data['message'].endswith(f'，仅识别了 {MAX_PAGES}/{PAGE_COUNT} 页'), (cache, data['message'])
+    assert {field['page'] for field in data['fields']} <= set(range(1, MAX_PAGES + 1)), cache
+
+
+class SlowPage:
+  def __init__(self, delay: float):
+    self.delay = delay
+
+  def extract_text(self) -> str:
+    time.sleep(self.delay)
+    return 'Name: ____'
+
+
+class SlowDocument:
+  """逐页提取文本较慢的 PyPDF2 文档替身"""
+
+  def __init__(self, pages: int, delay: float):
+    self.pages = [SlowPage(delay) for _ in range(pages)]
+
+
+def check_time_budget():
+  token = _current_request.set(RequestContext('text-scan'))
+  try:
+    scanned = [index for index, _ in iter_page_texts(SlowDocument(20, 0.02), max_pages=0, time_budget=0.1)]
+    coverage = current_text_scan_coverage()
+  finally:
+    _current_request.reset(token)
+  assert coverage.stopped_by == STOPPED_BY_TIME_BUDGET and not coverage.complete
+  assert 0 < len(scanned) < 20
+  assert coverage.scanned == [index + 1 for index in scanned]
+  assert coverage.scanned + coverage.remaining == list(range(1, 21))
+  assert coverage.elapsed_ms >= 100
+
+
+def check_to_dict():
+  coverage = TextScanCoverage(10)
+  assert coverage.to_dict() == {
+    'complete': True, 'pages_total': 10, 'pages_scanned': 0, 'scanned_pages': '',
+    'remaining_pages': '', 'stopped_by': None, 'elapsed_ms': 0.0
+  }
+  coverage.scanned = [1, 2, 3, 5]
+  coverage.remaining = [6, 7, 8, 10]
+  coverage.stopped_by = STOPPED_BY_PAGE_BUDGET
+  coverage.elapsed_ms = 12.345
+  assert coverage.to_dict() == {
+    'complete': False, 'pages_total': 10, 'pages_scanned': 4, 'scanned_pages': '1-3,5',
+    'remaining_pages': '6-8,10', 'stopped_by': 'page_budget', 'elapsed_ms': 12.3
+  }
+
+
+def test_text_scan_budget():
+  """文本识别在页数或耗时预算用完后停止，并在响应中报告覆盖的页面"""
+  print('🔍 测试大文档模式...')
+  check_to_dict()
+  check_time_budget()
+  saved_cache = main.template_cache
+  saved = settings.TEXT_SCAN_MAX_PAGES, settings.TEXT_SCAN_PROCESSES, settings.TEMP_DIR, settings.OUTPUT_DIR
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 模板缓存和临时文件写入测试目录，不使用并行扫描
+    main.template_cache = TemplateCache(os.path.join(temp_dir, 'cache'), 16 * 1024 * 1024)
+    settings.TEXT_SCAN_MAX_PAGES, settings.TEXT_SCAN_PROCESSES = MAX_PAGES, 1
+    settings.TEMP_DIR = settings.OUTPUT_DIR = temp_dir
+    try:
+      check_page_budget(TestClient(main.app), make_flat_document(PAGE_COUNT))
+    finally:
+      main.template_cache = saved_cache
+      settings.TEXT_SCAN_MAX_PAGES, settings.TEXT_SCAN_PROCESSES, settings.TEMP_DIR, settings.OUTPUT_DIR = saved
+  print('✅ 大文档模式正常')
+
+
+if __name__ == '__main__':
+  test_text_scan_budget()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+链路追踪测试
+- 计时阶段 stage() 在请求被追踪时生成同名 span，父子关系与调用嵌套一致
+- 异常的 span 记录错误状态，属性按 OTLP 类型编码
+- traceparent 请求头沿用调用方的 trace-id 和采样标志
+- 文件导出器每条链路写一行 OTLP/JSON
+"""
+
+import os
+import json
+import tempfile
+
+from app.utils.config import settings
+from app.utils import tracing
+from app.utils.request_context import RequestContext, _current_request, stage
+
+
+def run_traced_request() -> tracing.Trace:
+  ctx = RequestContext('req-trace')
+  trace = tracing.Trace('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331')
+  ctx.trace = trace
+  token = _current_request.set(ctx)
+  try:
+    with trace.span('POST /api/v1/fill-form', tracing.SPAN_KIND_SERVER):
+      tracing.set_attributes(**{'pdf.field_count': 3})
+      with stage('engine.enhanced_fillpdf'):
+        with stage('write'):
+          tracing.set_attributes(**{'pdf.page_count': 2})
+      try:
+        with tracing.span('fallback', **{'fallback.from': 'enhanced_fillpdf'}):
+          raise ValueError('broken')
+      except ValueError:
+        pass
+  finally:
+    _current_request.reset(token)
+  assert ctx.timer.stages.keys() == {'engine.enhanced_fillpdf', 'write'}
+  return trace
+
+
+def check_spans(trace: tracing.Trace):
+  spans = {span.name: span for span in trace.spans}
+  root = spans['POST /api/v1/fill-form']
+  assert root.parent_id == 'b7ad6b7169203331' and root.kind == tracing.SPAN_KIND_SERVER
+  assert spans['engine.enhanced_fillpdf'].parent_id == root.span_id
+  assert spans['write'].parent_id == spans['engine.enhanced_fillpdf'].span_id
+  assert spans['fallback'].parent_id == root.span_id
+  assert spans['fallback'].status_code == tracing.STATUS_ERROR
+  assert spans['write'].attributes == {'pdf.page_count': 2}
+
+  otlp = trace.to_otlp()['resourceSpans'][0]['scopeSpans'][0]['spans']
+  encoded = {span['name']: span for span in otlp}
+  assert encoded['write']['traceId'] == '0af7651916cd43dd8448eb211c80319c'
+  assert encoded['write']['attributes'] == [{'key': 'pdf.page_count', 'value': {'intValue': '2'}}]
+  assert encoded['fallback']['status'] == {'code': tracing.STATUS_ERROR, 'message': 'ValueError: broken'}
+
+
+def check_traceparent():
+  header = lambda value: {'headers': [(b'traceparent', value)]}
+  assert tracing._parse_traceparent(header(b'00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01')) == (
+    '0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331', True
+  )
+  assert tracing._parse_traceparent(header(b'00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00'))[2] is False
+  assert tracing._parse_traceparent(header(b'garbage')) is None
+  assert tracing._parse_traceparent({'headers': []}) is None
+
+
+def check_untraced():
+  # 未被追踪的请求只计时，不生成 span
+  ctx = RequestContext('req-plain')
+  token = _current_request.set(ctx)
+  try:
+    with stage('parse'), tracing.span('fallback') as current:
+      current.set_attribute('ignored', True)
+  finally:
+    _current_request.reset(token)
+  assert 'parse' in ctx.timer.stages
+
+
+def test_tracing():
+  """stage() 生成嵌套的 span，并以 OTLP/JSON 导出到文件"""
+  print('🔍 测试链路追踪...')
+  trace = run_traced_request()
+  check_spans(trace)
+  check_traceparent()
+  check_untraced()
+
+  saved = settings.TRACE_EXPORTER, settings.TRACE_FILE
+  with tempfile.TemporaryDirectory() as temp_dir:
+    # 链路写入测试目录
+    settings.TRACE_EXPORTER = 'file'
+    settings.TRACE_FILE = os.path.join(temp_dir, 'traces.jsonl')
+    try:
+      tracing.export_trace(trace)
+      tracing.shutdown_tracing()
+      with open(settings.TRACE_FILE, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    finally:
+      settings.TRACE_EXPORTER, settings.TRACE_FILE = saved
+  assert len(lines) == 1
+  assert json.loads(lines[0]) == trace.to_otlp()
+  print('✅ 链路追踪正常')
+
+
+if __name__ == '__main__':
+  test_tracing()